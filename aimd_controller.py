@@ -0,0 +1,156 @@
+"""
+Module điều chỉnh tự động tốc độ cập nhật theo kiểu AIMD (tăng cộng, giảm nhân): đo tỷ lệ lỗi và
+độ trễ của nhà cung cấp sau mỗi batch, tăng số luồng / req/s và giảm thời gian nghỉ khi nhà cung cấp
+còn khỏe, giảm mạnh khi có lỗi; đồng thời đo throughput thực tế (mã/phút) và ước tính thời gian còn lại
+"""
+
+import time
+from providers import get_provider_totals
+from config import AIMD_SETTINGS, UPDATE_SETTINGS
+
+# Bộ đếm lỗi của nhà cung cấp tính vào tỷ lệ lỗi của batch (no_data là lỗi của mã, không tính)
+ERROR_COUNTERS = ['failures', 'rate_limited', 'short_circuited']
+
+def batch_counters(counters=None):
+    """
+    Bộ đếm dùng để đo batch (requests, errors, latency_seconds)
+    
+    Args:
+        counters: Bộ đếm dạng get_provider_totals, ví dụ last_update_stats['provider_totals'] gộp từ các process con
+                  (mặc định bộ đếm của mọi nhà cung cấp trong process này; {} = chưa có request)
+    """
+    counters = counters if counters is not None else get_provider_totals()
+    return {
+        'requests': counters.get('requests', 0),
+        'errors': sum(counters.get(key, 0) for key in ERROR_COUNTERS),
+        'latency_seconds': counters.get('latency_seconds', 0.0)
+    }
+
+class AIMDController:
+    def __init__(self, workers=None, rate=None, delay=None, adaptive=True, tune_workers=True, settings=None):
+        """
+        Khởi tạo bộ điều chỉnh
+        
+        Args:
+            workers: Số luồng ban đầu (mặc định UPDATE_SETTINGS['MAX_WORKERS'])
+            rate: Số request mỗi giây ban đầu (mặc định UPDATE_SETTINGS['REQUESTS_PER_SECOND'])
+            delay: Thời gian nghỉ giữa batch ban đầu (giây)
+            adaptive: False = giữ nguyên tham số, chỉ đo throughput và ETA
+            tune_workers: False = không điều chỉnh / hiển thị số luồng (lấy dữ liệu bằng process, số process cố định)
+            settings: Giới hạn và bước điều chỉnh (mặc định AIMD_SETTINGS)
+        """
+        self.settings = settings or AIMD_SETTINGS
+        self.workers = workers or UPDATE_SETTINGS['MAX_WORKERS']
+        self.rate = float(rate or UPDATE_SETTINGS['REQUESTS_PER_SECOND'])
+        self.delay = float(delay if delay is not None else self.settings['BACKOFF_DELAY_SECONDS'])
+        self.adaptive = adaptive
+        self.tune_workers = tune_workers
+        
+        self.started_at = None
+        self.processed = 0
+        self.batches = 0
+        self.healthy_batches = 0
+        self.best_latency = None
+        self.last_batch = None
+        self._before = None
+    
+    def begin_batch(self, now=None, provider_totals=None):
+        """Ghi lại bộ đếm nhà cung cấp trước batch (gọi ngay trước bulk_cache_update; provider_totals dạng batch_counters())"""
+        now = now if now is not None else time.monotonic()
+        if self.started_at is None:
+            self.started_at = now
+        self._before = dict(provider_totals or batch_counters())
+    
+    def record_batch(self, symbols, provider_totals=None):
+        """
+        Đo batch vừa chạy và điều chỉnh tham số cho batch sau
+        
+        Args:
+            symbols: Số mã đã xử lý trong batch
+            provider_totals: Bộ đếm nhà cung cấp sau batch dạng batch_counters() (mặc định đọc bộ đếm của process;
+                             truyền vào khi request chạy ở process con)
+        
+        Returns:
+            Dict requests, errors, error_rate, avg_latency (giây/request, None nếu không có request), healthy,
+            measured (False khi batch không có request nào tới nhà cung cấp: giữ nguyên tham số)
+        """
+        after = provider_totals or batch_counters()
+        before = self._before or {'requests': 0, 'errors': 0, 'latency_seconds': 0.0}
+        requests = after['requests'] - before['requests']
+        errors = after['errors'] - before['errors']
+        latency = after['latency_seconds'] - before['latency_seconds']
+        
+        error_rate = errors / requests if requests else 0.0
+        avg_latency = latency / requests if requests else None
+        if avg_latency is not None and errors < requests:
+            self.best_latency = avg_latency if self.best_latency is None else min(self.best_latency, avg_latency)
+        
+        # Khỏe: ít lỗi và độ trễ không tăng quá LATENCY_TOLERANCE lần mức tốt nhất đã đo
+        healthy = error_rate <= self.settings['MAX_ERROR_RATE']
+        if healthy and avg_latency is not None and self.best_latency:
+            healthy = avg_latency <= self.best_latency * self.settings['LATENCY_TOLERANCE']
+        
+        # Không có request nào (mọi mã đã cập nhật, lỗi đã biết...): không đo được sức khỏe, giữ nguyên
+        measured = requests > 0
+        
+        self.processed += symbols
+        self.batches += 1
+        self.healthy_batches += int(healthy and measured)
+        if self.adaptive and measured:
+            if healthy:
+                self._increase()
+            else:
+                self._decrease()
+        
+        self.last_batch = {
+            'requests': requests,
+            'errors': errors,
+            'error_rate': round(error_rate, 3),
+            'avg_latency': round(avg_latency, 3) if avg_latency is not None else None,
+            'healthy': healthy,
+            'measured': measured
+        }
+        return self.last_batch
+    
+    def _increase(self):
+        """Tăng cộng: thêm một bước luồng và req/s, bớt một bước thời gian nghỉ"""
+        s = self.settings
+        if self.tune_workers:
+            self.workers = min(s['MAX_WORKERS'], self.workers + s['WORKERS_STEP'])
+        self.rate = min(s['MAX_RPS'], self.rate + s['RPS_STEP'])
+        self.delay = max(s['MIN_DELAY_SECONDS'], self.delay - s['DELAY_STEP_SECONDS'])
+    
+    def _decrease(self):
+        """Giảm nhân: chia luồng và req/s theo DECREASE_FACTOR, nghỉ lâu gấp đôi"""
+        s = self.settings
+        if self.tune_workers:
+            self.workers = max(s['MIN_WORKERS'], int(self.workers * s['DECREASE_FACTOR']))
+        self.rate = max(s['MIN_RPS'], self.rate * s['DECREASE_FACTOR'])
+        self.delay = min(s['MAX_DELAY_SECONDS'], max(self.delay * 2, s['BACKOFF_DELAY_SECONDS']))
+    
+    def throughput(self, now=None):
+        """Số mã xử lý mỗi phút tính từ batch đầu tiên (gồm cả thời gian nghỉ)"""
+        if self.started_at is None or not self.processed:
+            return 0.0
+        now = now if now is not None else time.monotonic()
+        elapsed = now - self.started_at
+        return self.processed / elapsed * 60 if elapsed > 0 else 0.0
+    
+    def eta_minutes(self, remaining, now=None):
+        """Số phút ước tính để xử lý `remaining` mã với throughput hiện tại (None nếu chưa đo được)"""
+        rate = self.throughput(now)
+        return remaining / rate if rate > 0 else None
+    
+    def describe(self, remaining, now=None):
+        """Dòng trạng thái: throughput, ETA và tham số cho batch sau"""
+        eta = self.eta_minutes(remaining, now)
+        eta_text = f"{eta:.1f} phút" if eta is not None else "?"
+        status = ''
+        if self.last_batch is not None and not self.last_batch['measured']:
+            status = ", không có request (giữ nguyên)"
+        elif self.last_batch is not None:
+            status = (f", lỗi {self.last_batch['error_rate']:.0%}"
+                      f"{'' if self.last_batch['healthy'] else ' ⚠️ giảm tốc'}")
+        workers = f"{self.workers} luồng, " if self.tune_workers else ''
+        return (f"⚡ {self.throughput(now):.1f} mã/phút, ETA {eta_text}{status} | "
+                f"batch sau: {workers}{self.rate:g} req/s, nghỉ {self.delay:.0f}s")
@@ -16,7 +16,7 @@ from trading_signals import TradingSignalGenerator
 from stock_screener import StockScreener
 from cached_stock_screener import CachedStockScreener
 from data_cache import DataCache
-from config import CHART_COLORS
+from config import CHART_COLORS, SCREENER_SETTINGS
 
 # Cấu hình trang
 st.set_page_config(
@@ -89,17 +89,18 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Khởi tạo session state
+if 'data_cache' not in st.session_state:
+    st.session_state.data_cache = DataCache()
+
+# Giá ngày đọc qua cache SQLite, chỉ lấy phần còn thiếu từ API
 if 'data_fetcher' not in st.session_state:
-    st.session_state.data_fetcher = DataFetcher()
+    st.session_state.data_fetcher = DataFetcher(cache=st.session_state.data_cache)
 
 if 'stock_screener' not in st.session_state:
-    st.session_state.stock_screener = StockScreener()
+    st.session_state.stock_screener = StockScreener(cache=st.session_state.data_cache)
 
 if 'cached_screener' not in st.session_state:
-    st.session_state.cached_screener = CachedStockScreener()
-
-if 'data_cache' not in st.session_state:
-    st.session_state.data_cache = DataCache()
+    st.session_state.cached_screener = CachedStockScreener(st.session_state.data_cache)
 
 def plot_candlestick_chart(df, symbol, indicators=True):
     """Vẽ biểu đồ nến với các chỉ báo kỹ thuật"""
@@ -316,6 +317,15 @@ def show_analysis_page():
                              ['1M', '3M', '6M', '1Y', '3Y', '5Y'],
                              index=default_index)
     
+    # Mã trong danh sách theo dõi được cập nhật cache trước
+    watchlist = st.session_state.data_cache.get_watchlist()
+    watched = st.checkbox("⭐ Theo dõi mã này (ưu tiên khi cập nhật cache)", value=symbol in watchlist,
+                          key=f"watch_{symbol}")
+    if watched and symbol not in watchlist:
+        st.session_state.data_cache.add_to_watchlist([symbol])
+    elif not watched and symbol in watchlist:
+        st.session_state.data_cache.remove_from_watchlist([symbol])
+    
     # Nếu đang auto-refresh, tự động phân tích
     should_analyze = False
     is_auto_refresh_mode = st.session_state.get('auto_refresh', False)
@@ -335,6 +345,9 @@ def show_analysis_page():
                 st.error(f"❌ Không thể lấy dữ liệu cho mã {symbol}. Vui lòng kiểm tra lại mã hoặc thử lại sau.")
                 return
             
+            # Mã vừa xem được ưu tiên ở lần cập nhật cache tiếp theo
+            st.session_state.data_cache.record_symbol_view(symbol)
+            
             # Lấy thông tin công ty
             company_info = st.session_state.data_fetcher.get_company_overview(symbol)
             
@@ -342,8 +355,20 @@ def show_analysis_page():
             ratios_data = st.session_state.data_fetcher.get_financial_ratios(symbol)
             financial_data = st.session_state.data_fetcher.get_financial_report(symbol)
             
+            # Dùng chỉ báo đã lưu trong cache nếu phủ đủ các phiên (tính trên lịch sử dài hơn)
+            dates = pd.DatetimeIndex(stock_data.index).normalize()
+            cached_indicators = st.session_state.data_cache.get_indicators(
+                symbol, start_date=dates[0].strftime('%Y-%m-%d')
+            )
+            indicators_ready = not cached_indicators.empty and dates.isin(cached_indicators.index).all()
+            if indicators_ready:
+                stock_data = stock_data.copy()
+                for column in cached_indicators.columns:
+                    stock_data[column] = cached_indicators[column].reindex(dates).to_numpy()
+            
             # Phân tích
-            signal_gen = TradingSignalGenerator(stock_data, financial_data, ratios_data)
+            signal_gen = TradingSignalGenerator(stock_data, financial_data, ratios_data,
+                                                indicators_ready=indicators_ready)
             recommendation = signal_gen.get_recommendation()
             
             # Hiển thị thông tin công ty
@@ -544,7 +569,7 @@ def show_analysis_page():
             
             # Lấy và hiển thị biểu đồ
             analyzer = TechnicalAnalyzer(stock_data)
-            df_with_indicators = analyzer.add_all_indicators()
+            df_with_indicators = stock_data if indicators_ready else analyzer.add_all_indicators()
             
             fig = plot_candlestick_chart(df_with_indicators, symbol, indicators=True)
             
@@ -640,7 +665,8 @@ def show_screener_page():
                 results = st.session_state.stock_screener.scan_market(
                     investment_type=investment_type,
                     top_n=top_n,
-                    progress_callback=update_progress
+                    progress_callback=update_progress,
+                    max_symbols=SCREENER_SETTINGS['APP_MAX_SYMBOLS']
                 )
             
             progress_bar.empty()
@@ -703,7 +729,9 @@ def show_screener_page():
                 criteria['trend'] = trend
             
             with st.spinner("Đang lọc cổ phiếu..."):
-                results = st.session_state.stock_screener.filter_by_technical_criteria(criteria)
+                results = st.session_state.stock_screener.filter_by_technical_criteria(
+                    criteria, max_symbols=SCREENER_SETTINGS['APP_MAX_SYMBOLS']
+                )
             
             if results:
                 st.success(f"✅ Tìm thấy {len(results)} cổ phiếu!")
@@ -717,10 +745,23 @@ def show_screener_page():
         
         col1, col2 = st.columns(2)
         
+        def get_special_signals():
+            # Breakout và quá bán được đánh giá trong cùng một lượt quét, dùng lại kết quả cho nút còn lại
+            # (giữ trong 1 giờ, bằng thời gian cache dữ liệu giá của DataFetcher). Quét chạy đồng bộ trong
+            # phiên nên chỉ lấy APP_MAX_SYMBOLS mã; quét toàn thị trường dùng bảng snapshot (Market Scanner)
+            cached = st.session_state.get('special_signals')
+            if cached is None or time.time() - cached[0] > 3600:
+                with st.spinner("Đang tìm kiếm..."):
+                    results = st.session_state.stock_screener.screen(
+                        ['breakout', 'oversold'], max_symbols=SCREENER_SETTINGS['APP_MAX_SYMBOLS']
+                    )
+                cached = (time.time(), results)
+                st.session_state['special_signals'] = cached
+            return cached[1]
+        
         with col1:
             if st.button("🚀 Tìm cổ phiếu đang Breakout", width='stretch'):
-                with st.spinner("Đang tìm kiếm..."):
-                    results = st.session_state.stock_screener.find_breakout_stocks()
+                results = get_special_signals()['breakout']
                 
                 if results:
                     st.success(f"✅ Tìm thấy {len(results)} cổ phiếu breakout!")
@@ -731,8 +772,7 @@ def show_screener_page():
         
         with col2:
             if st.button("📉 Tìm cổ phiếu quá bán", width='stretch'):
-                with st.spinner("Đang tìm kiếm..."):
-                    results = st.session_state.stock_screener.find_oversold_stocks()
+                results = get_special_signals()['oversold']
                 
                 if results:
                     st.success(f"✅ Tìm thấy {len(results)} cổ phiếu quá bán!")
@@ -793,7 +833,15 @@ def show_market_overview_page():
         
         col1, col2, col3 = st.columns(3)
         with col1:
-            max_symbols = st.slider("Số lượng mã quét", 10, 500, 50, 10)
+            # Snapshot được tính sẵn nên có thể quét toàn bộ mã trong cache
+            total_cached = stats['total_symbols']
+            if total_cached > 10:
+                max_symbols = st.slider("Số lượng mã quét", 10, total_cached, total_cached)
+            else:
+                # Cache ít mã (slider cần min < max): quét tất cả; cache trống thì cập nhật trước 10 mã
+                # (0 sẽ bị hiểu là toàn thị trường)
+                max_symbols = total_cached or 10
+                st.caption(f"Quét toàn bộ {total_cached} mã trong cache")
         with col2:
             update_cache = st.checkbox("🔄 Cập nhật cache trước khi quét")
         with col3:
@@ -814,7 +862,8 @@ def show_market_overview_page():
                     # Quét thị trường
                     market_df = st.session_state.cached_screener.get_market_comparison_table(
                         update_cache=update_cache,
-                        max_symbols=max_symbols
+                        max_symbols=max_symbols,
+                        progress_callback=progress_callback
                     )
                     
                     progress_bar.empty()
@@ -981,6 +1030,39 @@ def show_market_overview_page():
             
             filtered_df = st.session_state.cached_screener.filter_by_criteria(market_df, criteria)
             
+            # Bộ lọc bằng biểu thức (có thể lưu lại và dùng lại từ CLI: cache_manager.py --action screen)
+            with st.expander("🧮 Lọc bằng biểu thức"):
+                saved_screens = st.session_state.data_cache.get_saved_screens()
+                saved_names = ['(Không dùng)'] + saved_screens['name'].tolist()
+                selected_screen = st.selectbox("Bộ lọc đã lưu", saved_names)
+                
+                default_expression = ''
+                if selected_screen != '(Không dùng)':
+                    default_expression = saved_screens.set_index('name').loc[selected_screen, 'expression']
+                
+                expression = st.text_input(
+                    "Biểu thức (áp dụng thêm vào bộ lọc trên)",
+                    value=default_expression,
+                    placeholder="rsi < 30 and close > sma_200 and volume_ratio > 1.5"
+                )
+                
+                col1, col2 = st.columns([3, 1])
+                with col1:
+                    screen_name = st.text_input("Tên bộ lọc để lưu", value='' if selected_screen == '(Không dùng)' else selected_screen)
+                with col2:
+                    if st.button("💾 Lưu bộ lọc", width='stretch') and screen_name and expression:
+                        try:
+                            st.session_state.data_cache.save_screen(screen_name, expression)
+                            st.success(f"✅ Đã lưu '{screen_name}'")
+                        except ValueError as e:
+                            st.error(f"❌ {e}")
+                
+                if expression.strip():
+                    try:
+                        filtered_df = st.session_state.cached_screener.filter_by_expression(filtered_df, expression)
+                    except ValueError as e:
+                        st.error(f"❌ {e}")
+            
             st.markdown(f"#### 📋 Kết quả lọc: {len(filtered_df)} mã")
             
             if not filtered_df.empty:
@@ -1041,7 +1123,8 @@ def show_market_overview_page():
                     else:
                         st.error("❌ Cập nhật thất bại")
             
-            # Full Market Scan Section
+            # Full Market Scan Section: việc quét chạy ở daemon (python cache_manager.py --action daemon),
+            # app chỉ gửi yêu cầu và đọc tiến độ từ SQLite
             st.markdown("#### 🌍 Quét Toàn Bộ Thị Trường")
             
             # Settings
@@ -1056,7 +1139,7 @@ def show_market_overview_page():
                 "Thời gian nghỉ giữa batch (giây):",
                 options=[5, 10, 15, 30],
                 index=1,  # Default 10
-                help="Thời gian nghỉ để tránh rate limit"
+                help="Thời gian nghỉ để tránh rate limit (daemon tự điều chỉnh theo sức khỏe nhà cung cấp)"
             )
             
             max_batches = st.number_input(
@@ -1073,146 +1156,62 @@ def show_market_overview_page():
             
             st.info(f"📊 Ước tính: {estimated_symbols} mã, ~{estimated_time:.1f} phút" if max_batches > 0 else f"📊 Ước tính: Tất cả mã, thời gian rất lâu")
             
-            # Start Full Market Scan Button
+            data_cache = st.session_state.data_cache
+            
+            # Gửi yêu cầu vào hàng đợi; đóng tab trình duyệt không làm dừng việc quét
             if st.button("🚀 Bắt đầu quét toàn bộ thị trường", 
                         type="primary", 
                         width='stretch',
                         key="start_full_scan"):
-                
-                # Initialize session state for scanning
-                st.session_state.scanning_active = True
-                st.session_state.scan_progress = 0
-                st.session_state.scan_total = 0
-                st.session_state.scan_success = 0
-                st.session_state.scan_failed = 0
-                st.session_state.current_batch = 0
-                st.session_state.scan_logs = []
-                st.session_state.scan_settings = {
+                request_id = data_cache.enqueue_update('market', {
                     'batch_size': batch_size,
-                    'delay_seconds': delay_seconds,
-                    'max_batches': max_batches
-                }
-                st.rerun()
-            
-            # Display scanning progress if active
-            if st.session_state.get('scanning_active', False):
-                st.markdown("#### 📊 Tiến độ quét thị trường")
+                    'delay_between_batches': delay_seconds,
+                    'max_symbols': max_batches * batch_size if max_batches > 0 else None
+                })
+                st.success(f"📥 Đã gửi yêu cầu quét #{request_id}")
+            
+            # Trạng thái daemon và tiến độ yêu cầu gần nhất (chỉ đọc, mọi session đều thấy như nhau)
+            daemon_status = data_cache.get_daemon_status()
+            if daemon_status is None or not daemon_status['alive']:
+                st.warning("🛰️ Daemon cập nhật chưa chạy. Khởi động: `python cache_manager.py --action daemon`")
+            
+            queue = data_cache.get_update_queue(limit=5)
+            if not queue.empty:
+                request = queue.iloc[0]
+                st.markdown(f"#### 📊 Tiến độ quét thị trường (yêu cầu #{request['request_id']}: {request['status']})")
                 
-                # Stop button
-                if st.button("⏹️ Dừng quét", key="stop_scan", type="secondary"):
-                    st.session_state.scanning_active = False
-                    st.warning("Đã dừng quét thị trường!")
-                    st.rerun()
-                
-                # Progress display
-                if st.session_state.scan_total > 0:
-                    progress = st.session_state.scan_progress / st.session_state.scan_total
-                    st.progress(progress, 
-                              text=f"Batch {st.session_state.current_batch}: {st.session_state.scan_progress}/{st.session_state.scan_total} mã")
-                else:
-                    st.progress(0, text="Đang khởi tạo...")
-                
-                # Stats during scanning
-                scan_col1, scan_col2, scan_col3 = st.columns(3)
-                
-                with scan_col1:
-                    st.metric("Thành công", st.session_state.scan_success)
-                with scan_col2:
-                    st.metric("Thất bại", st.session_state.scan_failed)
-                with scan_col3:
-                    if st.session_state.scan_progress > 0:
-                        success_rate = (st.session_state.scan_success / st.session_state.scan_progress) * 100
-                        st.metric("Tỷ lệ thành công", f"{success_rate:.1f}%")
-                    else:
-                        st.metric("Tỷ lệ thành công", "0%")
-                
-                # Logs
-                if st.session_state.scan_logs:
-                    st.markdown("**Log quét gần nhất:**")
-                    for log in st.session_state.scan_logs[-3:]:  # Show last 3 logs
-                        st.text(log)
-                
-                # Perform actual scanning work
-                try:
-                    # Get remaining symbols to scan
-                    all_stocks = st.session_state.data_cache.get_all_symbols()
-                    if all_stocks.empty:
-                        st.error("Không thể lấy danh sách mã chứng khoán!")
-                        st.session_state.scanning_active = False
-                        st.rerun()
-                    
-                    # Get cached symbols
-                    try:
-                        cached_overview = st.session_state.data_cache.get_market_overview()
-                        cached_symbols = set(cached_overview['symbol'].tolist()) if not cached_overview.empty else set()
-                    except:
-                        cached_symbols = set()
-                    
-                    # Get remaining symbols
-                    all_symbols = set(all_stocks['symbol'].tolist())
-                    remaining_symbols = list(all_symbols - cached_symbols)
-                    
-                    if not remaining_symbols:
-                        st.success("🎉 Đã hoàn thành quét toàn bộ thị trường!")
-                        st.session_state.scanning_active = False
-                        st.rerun()
+                job = data_cache.get_update_job(request['job_id']) if request['job_id'] else None
+                if job is not None and job['total'] > 0:
+                    finished = job['done'] + job['failed']
+                    st.progress(finished / job['total'], text=f"{finished}/{job['total']} mã")
                     
-                    # Initialize if first run
-                    if st.session_state.scan_total == 0:
-                        settings = st.session_state.scan_settings
-                        max_symbols_to_scan = min(len(remaining_symbols), 
-                                                settings['max_batches'] * settings['batch_size'] if settings['max_batches'] > 0 else len(remaining_symbols))
-                        st.session_state.scan_total = max_symbols_to_scan
-                        st.session_state.remaining_symbols = remaining_symbols[:max_symbols_to_scan]
-                        
-                        log_msg = f"🚀 Bắt đầu quét {max_symbols_to_scan} mã với batch size {settings['batch_size']}"
-                        st.session_state.scan_logs.append(log_msg)
+                    # Stats during scanning
+                    scan_col1, scan_col2, scan_col3 = st.columns(3)
                     
-                    # Process one batch
-                    if st.session_state.scan_progress < st.session_state.scan_total:
-                        settings = st.session_state.scan_settings
-                        start_idx = st.session_state.scan_progress
-                        end_idx = min(start_idx + settings['batch_size'], st.session_state.scan_total)
-                        batch_symbols = st.session_state.remaining_symbols[start_idx:end_idx]
-                        
-                        st.session_state.current_batch += 1
-                        
-                        # Add log
-                        log_msg = f"Batch {st.session_state.current_batch}: Đang xử lý {len(batch_symbols)} mã..."
-                        st.session_state.scan_logs.append(log_msg)
-                        
-                        # Perform batch update
-                        success_count = st.session_state.data_cache.bulk_cache_update(
-                            symbols_list=batch_symbols,
-                            max_symbols=None
-                        )
-                        
-                        # Update progress
-                        st.session_state.scan_progress = end_idx
-                        st.session_state.scan_success += success_count
-                        st.session_state.scan_failed += len(batch_symbols) - success_count
-                        
-                        # Add success log
-                        success_log = f"✅ Batch {st.session_state.current_batch}: {success_count}/{len(batch_symbols)} thành công"
-                        st.session_state.scan_logs.append(success_log)
-                        
-                        # Check if completed
-                        if st.session_state.scan_progress >= st.session_state.scan_total:
-                            st.session_state.scanning_active = False
-                            final_log = f"🎉 Hoàn thành! {st.session_state.scan_success}/{st.session_state.scan_total} mã thành công ({(st.session_state.scan_success/st.session_state.scan_total*100):.1f}%)"
-                            st.session_state.scan_logs.append(final_log)
-                            st.success(final_log)
+                    with scan_col1:
+                        st.metric("Thành công", job['done'])
+                    with scan_col2:
+                        st.metric("Thất bại", job['failed'])
+                    with scan_col3:
+                        if finished > 0:
+                            st.metric("Tỷ lệ thành công", f"{job['done'] / finished * 100:.1f}%")
                         else:
-                            # Auto refresh after delay
-                            time.sleep(settings['delay_seconds'])
-                        
-                        st.rerun()
-                    
-                except Exception as e:
-                    error_log = f"❌ Lỗi: {str(e)}"
-                    st.session_state.scan_logs.append(error_log)
-                    st.session_state.scanning_active = False
-                    st.error(f"Lỗi trong quá trình quét: {e}")
+                            st.metric("Tỷ lệ thành công", "0%")
+                elif request['status'] == 'queued':
+                    st.progress(0, text="Đang chờ daemon...")
+                
+                if daemon_status is not None and daemon_status['message']:
+                    st.caption(f"🛰️ {daemon_status['heartbeat_at'][11:19]} - {daemon_status['message']}")
+                if request['error']:
+                    st.error(f"Lỗi trong quá trình quét: {request['error']}")
+                
+                # Stop button
+                if request['status'] in ('queued', 'running'):
+                    if st.button("⏹️ Dừng quét", key="stop_scan", type="secondary"):
+                        data_cache.cancel_update_request(int(request['request_id']))
+                        st.warning("Đã gửi yêu cầu dừng quét (daemon dừng sau batch hiện tại)")
+                
+                if st.button("🔄 Làm mới tiến độ", key="refresh_scan"):
                     st.rerun()
         
         with col2:
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+So sánh tốc độ đọc/ghi lịch sử giá giữa backend SQLite và kho dạng cột (memory-mapped)
+
+Chạy: python benchmark_price_store.py --symbols 1700 --bars 1250
+"""
+
+import argparse
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+from data_cache import DataCache
+
+def _make_frames(symbols, bars, seed=0):
+    """Dữ liệu OHLCV ngẫu nhiên cho `symbols` mã, mỗi mã `bars` phiên"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=pd.Timestamp.now().normalize(), periods=bars + 1)
+    frames = {}
+    for i in range(symbols):
+        close = 50 * np.exp(np.cumsum(rng.normal(0, 0.02, bars + 1)))
+        frames[f"S{i:04d}"] = pd.DataFrame({
+            'open': close, 'high': close * 1.01, 'low': close * 0.99, 'close': close,
+            'volume': rng.integers(1000, 100000, bars + 1)
+        }, index=dates)
+    return frames
+
+def _timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+def run_benchmark(symbols=1700, bars=1250):
+    """
+    Đo thời gian các thao tác chính trên cả hai backend
+    
+    Returns:
+        DataFrame thời gian (giây), dòng = thao tác, cột = backend
+    """
+    frames = _make_frames(symbols, bars)
+    history = {symbol: df.iloc[:-1] for symbol, df in frames.items()}
+    last_day = {symbol: df.iloc[-1:] for symbol, df in frames.items()}
+    one_year = (pd.Timestamp.now() - pd.Timedelta(days=365)).strftime('%Y-%m-%d')
+    names = list(frames)
+    
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for backend in ['sqlite', 'columnar']:
+            cache = DataCache(cache_dir=f"{tmp_dir}/{backend}", price_backend=backend)
+            timings = {}
+            timings['Ghi lịch sử'] = _timed(lambda: cache.upsert_stock_data(history))
+            timings['Ghi thêm 1 phiên (mọi mã)'] = _timed(lambda: cache.upsert_stock_data(last_day))
+            timings['Đọc từng mã (toàn bộ)'] = _timed(lambda: [cache.get_cached_data(s) for s in names])
+            timings['Đọc từng mã (1 năm)'] = _timed(
+                lambda: [cache.get_cached_data(s, start_date=one_year) for s in names]
+            )
+            timings['Đọc gộp thành panel'] = _timed(lambda: cache.get_cached_data_many(as_panel=True))
+            results[backend] = timings
+    
+    df = pd.DataFrame(results)
+    df['nhanh hơn (lần)'] = (df['sqlite'] / df['columnar']).round(1)
+    return df
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark backend lưu giá')
+    parser.add_argument('--symbols', type=int, default=1700, help='Số mã')
+    parser.add_argument('--bars', type=int, default=1250, help='Số phiên mỗi mã')
+    args = parser.parse_args()
+    
+    print(f"🚀 Benchmark {args.symbols} mã x {args.bars} phiên")
+    print("=" * 60)
+    print(run_benchmark(args.symbols, args.bars).round(3).to_string())
+
+if __name__ == "__main__":
+    main()
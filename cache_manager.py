@@ -4,15 +4,31 @@ Script quản lý cache dữ liệu chứng khoán
 
 import argparse
 from data_cache import DataCache
+from update_scheduler import UpdateScheduler
+from update_daemon import UpdateDaemon
+from cached_stock_screener import CachedStockScreener
 import time
 
 def main():
     parser = argparse.ArgumentParser(description='Quản lý cache dữ liệu chứng khoán')
-    parser.add_argument('--action', choices=['update', 'full-update', 'stats', 'cleanup'], 
+    parser.add_argument('--action', choices=['update', 'full-update', 'stats', 'cleanup', 'indicators', 'snapshot', 'screen',
+                                             'watchlist', 'priority', 'daemon', 'enqueue', 'queue'], 
                        default='update', help='Hành động cần thực hiện')
     parser.add_argument('--symbols', nargs='+', help='Danh sách mã cổ phiếu cụ thể')
     parser.add_argument('--max', type=int, help='Giới hạn số lượng mã cập nhật')
     parser.add_argument('--force', action='store_true', help='Cập nhật toàn bộ dữ liệu')
+    parser.add_argument('--workers', type=int, help='Số request chạy song song')
+    parser.add_argument('--rps', type=float, help='Giới hạn số request mỗi giây')
+    parser.add_argument('--burst', type=int, help='Số request tối đa được bắn dồn')
+    parser.add_argument('--retry-failed', action='store_true',
+                       help='Thử lại cả các mã hủy niêm yết/không có dữ liệu chưa đến hạn kiểm tra lại')
+    parser.add_argument('--expr', help='Biểu thức lọc, ví dụ "rsi < 30 and close > sma_200"')
+    parser.add_argument('--screen', help='Tên bộ lọc đã lưu cần chạy')
+    parser.add_argument('--save', help='Lưu biểu thức --expr với tên này')
+    parser.add_argument('--remove', action='store_true', help='Bỏ các mã --symbols khỏi danh sách theo dõi')
+    parser.add_argument('--batch-size', type=int, help='Số mã mỗi batch khi daemon chạy yêu cầu --action enqueue')
+    parser.add_argument('--once', action='store_true', help='Daemon chạy hết hàng đợi rồi thoát (dùng với cron)')
+    parser.add_argument('--cancel', type=int, help='Hủy yêu cầu cập nhật có id này (--action queue)')
     
     args = parser.parse_args()
     
@@ -25,7 +41,23 @@ def main():
         print(f"Tổng số mã: {stats['total_symbols']}")
         print(f"Tổng số records: {stats['total_records']:,}")
         print(f"Khoảng thời gian: {stats['date_range']}")
-        print(f"Kích thước DB: {stats['db_size_mb']} MB")
+        print(f"Kích thước DB: {stats['db_size_mb']} MB"
+              + (f" ({stats['bytes_per_record']} bytes/record, schema v{stats['schema_version']})"
+                 if 'bytes_per_record' in stats else ""))
+        
+        migration = stats.get('schema_migration')
+        if migration:
+            print(f"Chuyển schema ({migration['migrated_at'][:10]}): {migration['size_before_mb']} MB -> "
+                  f"{migration.get('size_after_mb')} MB, MAX(date) {migration.get('max_date_ms_v1')} -> "
+                  f"{migration.get('max_date_ms_v2')} ms, đọc 1 năm {migration.get('range_scan_ms_v1')} -> "
+                  f"{migration.get('range_scan_ms_v2')} ms")
+        
+        # Mã trong negative cache
+        failures = cache.get_symbol_failures()
+        if not failures.empty:
+            print(f"\n=== MÃ LỖI ({stats['known_failures']} đang bị bỏ qua / {len(failures)}) ===")
+            columns = ['symbol', 'failures', 'last_error', 'last_failed_at', 'next_check_at']
+            print(failures[columns].head(10).to_string(index=False))
         
         # Hiển thị tổng quan thị trường
         overview = cache.get_market_overview()
@@ -38,6 +70,115 @@ def main():
         deleted = cache.cleanup_old_data()
         print(f"Đã xóa {deleted} records cũ")
     
+    elif args.action == 'indicators':
+        # Tính chỉ báo kỹ thuật cho các phiên mới (hoặc toàn bộ nếu tham số đổi)
+        print("📐 Đang tính chỉ báo kỹ thuật...")
+        start_time = time.time()
+        updated = cache.update_indicator_states(args.symbols)
+        print(f"✅ Đã cập nhật chỉ báo cho {len(updated)} mã trong {time.time() - start_time:.1f}s")
+    
+    elif args.action == 'snapshot':
+        # Tính lại bảng so sánh thị trường cho các mã có phiên mới
+        print("📊 Đang cập nhật market snapshot...")
+        refreshed = CachedStockScreener(cache).refresh_market_snapshot()
+        print(f"✅ Đã tính lại snapshot cho {refreshed} mã")
+    
+    elif args.action == 'screen':
+        # Lọc toàn thị trường bằng biểu thức hoặc bộ lọc đã lưu
+        if args.save and args.expr:
+            try:
+                cache.save_screen(args.save, args.expr)
+            except ValueError as e:
+                print(f"❌ {e}")
+                return
+            print(f"💾 Đã lưu bộ lọc '{args.save}'")
+        
+        expression = args.expr or (cache.get_saved_screen(args.screen) if args.screen else None)
+        if expression is None:
+            screens = cache.get_saved_screens()
+            if args.screen:
+                print(f"❌ Không có bộ lọc '{args.screen}'")
+            print("\n=== BỘ LỌC ĐÃ LƯU ===")
+            print(screens[['name', 'expression']].to_string(index=False) if not screens.empty else "(chưa có)")
+            return
+        
+        screener = CachedStockScreener(cache)
+        market_df = screener.get_market_comparison_table(max_symbols=args.max)
+        if market_df.empty:
+            return
+        
+        start_time = time.time()
+        try:
+            result = screener.filter_by_expression(market_df, expression)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return
+        print(f"\n🔍 {expression}")
+        print(f"✅ {len(result)}/{len(market_df)} mã thỏa điều kiện ({(time.time() - start_time) * 1000:.1f} ms)")
+        if not result.empty:
+            columns = ['symbol', 'name', 'current_price', 'rsi', 'volume_ratio', 'overall_score', 'signal']
+            print(result[columns].to_string(index=False))
+    
+    elif args.action == 'watchlist':
+        # Danh sách theo dõi: được ưu tiên khi cập nhật có giới hạn (--max)
+        if args.symbols and args.remove:
+            cache.remove_from_watchlist(args.symbols)
+        elif args.symbols:
+            cache.add_to_watchlist(args.symbols)
+        watchlist = cache.get_watchlist()
+        print(f"⭐ Đang theo dõi {len(watchlist)} mã: {', '.join(watchlist)}")
+    
+    elif args.action == 'priority':
+        # Thứ tự cập nhật: mã cần gọi API trước, điểm cao trước
+        symbols = args.symbols or cache.get_all_symbols()['symbol'].tolist()
+        queue = UpdateScheduler(cache).prioritize(symbols, force_full_update=args.force, retry_failed=args.retry_failed)
+        pending = int(queue['needs_update'].sum())
+        print(f"📋 {pending}/{len(queue)} mã cần cập nhật, {args.max or 20} mã ưu tiên nhất:")
+        columns = ['symbol', 'score', 'mode', 'missing_sessions', 'traded_value', 'watchlist', 'last_viewed_at']
+        print(queue[columns].head(args.max or 20).to_string(index=False))
+    
+    elif args.action == 'daemon':
+        # Process cập nhật chạy nền: lấy yêu cầu từ hàng đợi, tự cập nhật sau giờ đóng cửa
+        daemon = UpdateDaemon(cache)
+        if args.once:
+            cache.requeue_running_updates()
+            while daemon.run_once() is not None:
+                pass
+            cache.set_daemon_status('stopped', "Đã chạy hết hàng đợi")
+        else:
+            daemon.run_forever()
+    
+    elif args.action == 'enqueue':
+        # Thêm yêu cầu cập nhật cho daemon (không tự chạy cập nhật)
+        params = {
+            'symbols': args.symbols,
+            'max_symbols': args.max,
+            'batch_size': args.batch_size,
+            'force_full_update': args.force,
+            'retry_failed': args.retry_failed
+        }
+        request_id = cache.enqueue_update('market', {key: value for key, value in params.items() if value})
+        print(f"📥 Yêu cầu cập nhật #{request_id} đang chờ daemon (python cache_manager.py --action daemon)")
+    
+    elif args.action == 'queue':
+        # Hàng đợi cập nhật và trạng thái daemon
+        if args.cancel:
+            status = cache.cancel_update_request(args.cancel)
+            print(f"⏹️ Yêu cầu #{args.cancel}: {status}" if status else f"❌ Yêu cầu #{args.cancel} không còn chạy")
+        
+        daemon_status = cache.get_daemon_status()
+        if daemon_status is None:
+            print("🛰️ Daemon chưa từng chạy")
+        else:
+            print(f"🛰️ Daemon (pid {daemon_status['pid']}): {daemon_status['state']}"
+                  f"{'' if daemon_status['alive'] else ' - không có heartbeat'}, "
+                  f"lúc {daemon_status['heartbeat_at'][:19]}: {daemon_status['message']}")
+        
+        queue = cache.get_update_queue()
+        print("\n=== HÀNG ĐỢI CẬP NHẬT ===")
+        columns = ['request_id', 'kind', 'status', 'scheduled_for', 'requested_at', 'job_id', 'error']
+        print(queue[columns].to_string(index=False) if not queue.empty else "(trống)")
+    
     elif args.action in ['update', 'full-update']:
         # Cập nhật cache
         def progress_callback(current, total, message):
@@ -52,7 +193,11 @@ def main():
             success = cache.bulk_cache_update(
                 symbols_list=args.symbols,
                 max_symbols=args.max or 50,  # Mặc định 50 mã
-                progress_callback=progress_callback
+                progress_callback=progress_callback,
+                max_workers=args.workers,
+                requests_per_second=args.rps,
+                burst=args.burst,
+                retry_failed=args.retry_failed
             )
         else:
             print("📈 Bắt đầu cập nhật dữ liệu mới...")
@@ -60,12 +205,35 @@ def main():
             success = cache.bulk_cache_update(
                 symbols_list=args.symbols,
                 max_symbols=args.max or 100,  # Mặc định 100 mã
-                progress_callback=progress_callback
+                progress_callback=progress_callback,
+                max_workers=args.workers,
+                requests_per_second=args.rps,
+                burst=args.burst,
+                retry_failed=args.retry_failed
             )
         
         elapsed = time.time() - start_time
         print(f"\n✅ Hoàn thành trong {elapsed:.1f}s - {success} mã thành công")
         
+        update_stats = cache.last_update_stats
+        if update_stats:
+            print(f"⚡ Tốc độ: {update_stats['symbols_per_second']} mã/s, "
+                  f"{update_stats['provider_requests']} request ({update_stats['requests_per_second']} req/s)")
+            for name, provider in update_stats['providers'].items():
+                print(f"🌐 {name}: {provider['state']}, {provider['successes']}/{provider['requests']} OK, "
+                      f"{provider['failures']} lỗi, {provider['rate_limited']} lần 429, "
+                      f"{provider['short_circuited']} lần bỏ qua (breaker), "
+                      f"trễ TB {provider['avg_latency_ms']} ms / p95 {provider['p95_latency_ms']} ms")
+            coalesced = update_stats['single_flight']['coalesced_calls']
+            if coalesced:
+                print(f"🔗 Gộp {coalesced} request trùng đang chạy đồng thời (single-flight)")
+            if update_stats['skipped_known_failures']:
+                print(f"🚫 Bỏ qua {update_stats['skipped_known_failures']} mã lỗi gần đây "
+                      f"(tiết kiệm ~{update_stats['estimated_seconds_saved']:.0f}s)")
+        
+        # Tính sẵn bảng so sánh thị trường cho các mã vừa có phiên mới
+        CachedStockScreener(cache).refresh_market_snapshot()
+        
         # Hiển thị stats sau khi cập nhật
         stats = cache.get_cache_stats()
         print(f"📊 Cache hiện có: {stats['total_symbols']} mã, {stats['total_records']:,} records")
@@ -7,19 +7,24 @@ import numpy as np
 from data_cache import DataCache
 from technical_analysis import TechnicalAnalyzer
 from trading_signals import TradingSignalGenerator
+from indicator_panel import PanelIndicatorEngine, build_price_panel
+from screen_expressions import ScreenExpression
 import time
+from datetime import datetime, timedelta
 
 class CachedStockScreener:
-    def __init__(self):
-        self.cache = DataCache()
+    def __init__(self, cache=None):
+        self.cache = cache or DataCache()
+        self.indicator_engine = PanelIndicatorEngine()
     
-    def get_market_comparison_table(self, update_cache=False, max_symbols=100):
+    def get_market_comparison_table(self, update_cache=False, max_symbols=None, progress_callback=None):
         """
-        Tạo bảng so sánh toàn diện thị trường
+        Tạo bảng so sánh toàn diện thị trường (đọc từ bảng market_snapshot)
         
         Args:
             update_cache: Có cập nhật cache trước không
-            max_symbols: Giới hạn số lượng mã
+            max_symbols: Giới hạn số lượng mã (None = toàn thị trường)
+            progress_callback: Callback báo tiến trình khi phải tính lại snapshot
         """
         if update_cache:
             print("🔄 Updating cache...")
@@ -27,133 +32,157 @@ class CachedStockScreener:
         
         print("📊 Generating market comparison table...")
         
-        # Lấy tổng quan thị trường từ cache
-        overview = self.cache.get_market_overview()
+        # Chỉ tính lại các mã có phiên mới kể từ lần tính snapshot trước
+        self.refresh_market_snapshot(progress_callback)
         
-        if overview.empty:
+        df = self.cache.get_market_snapshot()
+        
+        if df.empty:
             print("❌ No cached data found. Please update cache first.")
             return pd.DataFrame()
         
-        # Giới hạn số lượng để tránh quá tải
-        if len(overview) > max_symbols:
-            overview = overview.head(max_symbols)
+        # Sắp xếp theo overall_score rồi mới giới hạn: max_symbols lấy các mã điểm cao nhất
+        df = df.sort_values('overall_score', ascending=False)
         
-        results = []
-        total = len(overview)
+        if max_symbols and len(df) > max_symbols:
+            df = df.head(max_symbols)
         
-        for idx, row in overview.iterrows():
-            try:
-                symbol = row['symbol']
-                print(f"[{idx+1}/{total}] Processing {symbol}...")
-                
-                # Lấy dữ liệu từ cache (1 năm)
-                stock_data = self.cache.get_stock_with_indicators(symbol, period_days=365)
-                
-                if stock_data is None or len(stock_data) < 50:
-                    continue
-                
-                # Phân tích kỹ thuật
-                analyzer = TechnicalAnalyzer(stock_data)
-                df_with_indicators = analyzer.add_all_indicators()
-                
-                # Tạo trading signals
-                signal_gen = TradingSignalGenerator(df_with_indicators)
-                overall_signal = signal_gen.get_overall_signal()
-                entry_points = signal_gen.get_entry_points()
-                exit_points = signal_gen.get_exit_points()
-                risk_reward = signal_gen.get_risk_reward_ratio()
-                
-                # Tính toán các metrics bổ sung
-                latest = df_with_indicators.iloc[-1]
-                prev_month = df_with_indicators.iloc[-21] if len(df_with_indicators) >= 21 else df_with_indicators.iloc[0]
-                prev_quarter = df_with_indicators.iloc[-63] if len(df_with_indicators) >= 63 else df_with_indicators.iloc[0]
-                
-                # Performance
-                monthly_return = ((latest['close'] - prev_month['close']) / prev_month['close']) * 100
-                quarterly_return = ((latest['close'] - prev_quarter['close']) / prev_quarter['close']) * 100
-                
-                # Volatility (20-day)
-                returns = df_with_indicators['close'].pct_change().dropna()
-                volatility = returns.tail(20).std() * np.sqrt(252) * 100  # Annualized
-                
-                # Volume trend
-                avg_volume_20 = df_with_indicators['volume'].tail(20).mean()
-                current_volume = latest['volume']
-                volume_ratio = current_volume / avg_volume_20 if avg_volume_20 > 0 else 1
-                
-                # Support/Resistance levels
-                high_52w = df_with_indicators['high'].tail(252).max() if len(df_with_indicators) >= 252 else df_with_indicators['high'].max()
-                low_52w = df_with_indicators['low'].tail(252).min() if len(df_with_indicators) >= 252 else df_with_indicators['low'].min()
-                
-                # Distance from 52w high/low
-                dist_from_high = ((latest['close'] - high_52w) / high_52w) * 100
-                dist_from_low = ((latest['close'] - low_52w) / low_52w) * 100
-                
-                result = {
-                    # Basic info
-                    'symbol': symbol,
-                    'name': row['name'],
-                    'exchange': row['exchange'],
-                    'current_price': latest['close'],
-                    'volume': current_volume,
-                    
-                    # Performance
-                    'monthly_return': monthly_return,
-                    'quarterly_return': quarterly_return,
-                    'ytd_return': quarterly_return,  # Approximation
-                    
-                    # Technical indicators
-                    'rsi': latest.get('rsi', np.nan),
-                    'macd': latest.get('macd', np.nan),
-                    'sma_20': latest.get('sma_20', np.nan),
-                    'sma_50': latest.get('sma_50', np.nan),
-                    'sma_200': latest.get('sma_200', np.nan),
-                    'bb_position': self._calculate_bb_position(latest),
-                    
-                    # Price levels
-                    'high_52w': high_52w,
-                    'low_52w': low_52w,
-                    'dist_from_high': dist_from_high,
-                    'dist_from_low': dist_from_low,
-                    
-                    # Risk metrics
-                    'volatility': volatility,
-                    'volume_ratio': volume_ratio,
-                    
-                    # Trading signals
-                    'overall_score': overall_signal['overall_score'],
-                    'technical_score': overall_signal['technical_score'],
-                    'signal': overall_signal['signal'],
-                    'entry_points_count': len(entry_points),
-                    'exit_points_count': len(exit_points),
-                    'risk_reward_ratio': risk_reward['ratio'] if risk_reward else np.nan,
-                    
-                    # Trend analysis
-                    'trend': analyzer.get_trend(),
-                    'price_vs_sma20': ((latest['close'] - latest.get('sma_20', latest['close'])) / latest.get('sma_20', latest['close'])) * 100 if pd.notna(latest.get('sma_20')) else 0,
-                    'price_vs_sma50': ((latest['close'] - latest.get('sma_50', latest['close'])) / latest.get('sma_50', latest['close'])) * 100 if pd.notna(latest.get('sma_50')) else 0,
-                    
-                    # Last update
-                    'last_update': row['last_update']
-                }
-                
-                results.append(result)
-                
-            except Exception as e:
-                print(f"Error processing {symbol}: {str(e)[:50]}")
-                continue
+        print(f"✅ Generated comparison table with {len(df)} stocks")
+        return df
+    
+    def refresh_market_snapshot(self, progress_callback=None):
+        """
+        Tính lại snapshot cho các mã có phiên mới (hoặc chưa có snapshot)
         
-        if not results:
-            print("❌ No results generated")
-            return pd.DataFrame()
+        Args:
+            progress_callback: Callback báo tiến trình (current, total, message)
         
-        df = pd.DataFrame(results)
+        Returns:
+            Số mã đã tính lại
+        """
+        stale = self.cache.get_stale_snapshot_symbols()
+        if not stale:
+            return 0
         
-        # Sắp xếp theo overall_score
-        df = df.sort_values('overall_score', ascending=False)
+        print(f"Refreshing market snapshot for {len(stale)} symbols...")
+        start_time = time.time()
         
-        print(f"✅ Generated comparison table with {len(df)} stocks")
-        return df
+        # Lấy dữ liệu 1 năm kèm chỉ báo đã lưu của mọi mã cần tính lại trong một lượt đọc
+        start_date = (datetime.now() - timedelta(days=365)).strftime('%Y-%m-%d')
+        data = self.cache.get_cached_data_many(list(stale), start_date=start_date, with_indicators=True)
+        frames = {
+            symbol: df.drop(columns='symbol').set_index('date')
+            for symbol, df in data.groupby('symbol', sort=False)
+            if len(df) >= 50
+        }
+        
+        # Mã chưa có chỉ báo lưu sẵn trong cache: tính cho tất cả trong một lượt vector hóa
+        missing = {
+            symbol: df for symbol, df in frames.items()
+            if 'obv' not in df.columns or df['obv'].isna().any()
+        }
+        if missing:
+            print(f"Computing indicators for {len(missing)} symbols without cached indicators...")
+            panel = build_price_panel(missing)
+            indicators = self.indicator_engine.compute_panel(panel)
+            for symbol in missing:
+                frames[symbol] = self.indicator_engine.symbol_frame(panel, indicators, symbol)
+        
+        rows = []
+        for i, (symbol, data_date) in enumerate(stale.items()):
+            # Mã không đủ dữ liệu vẫn được ghi (không có chỉ số) để không tính lại mỗi lần
+            row = {'symbol': symbol, 'data_date': data_date}
+            if symbol in frames:
+                try:
+                    row.update(self._calculate_symbol_metrics(frames[symbol]))
+                except Exception as e:
+                    print(f"Error processing {symbol}: {str(e)[:50]}")
+            rows.append(row)
+            
+            if progress_callback:
+                progress_callback(i + 1, len(stale), f"Analyzed {symbol}")
+        
+        self.cache.save_market_snapshot(rows)
+        print(f"Market snapshot refreshed for {len(rows)} symbols in {time.time() - start_time:.1f}s")
+        return len(rows)
+    
+    def _calculate_symbol_metrics(self, df_with_indicators):
+        """Tính các chỉ số so sánh của một mã từ dữ liệu giá đã có chỉ báo"""
+        analyzer = TechnicalAnalyzer(df_with_indicators)
+        
+        # Tạo trading signals
+        signal_gen = TradingSignalGenerator(df_with_indicators, indicators_ready=True)
+        overall_signal = signal_gen.get_overall_signal()
+        entry_points = signal_gen.get_entry_points()
+        exit_points = signal_gen.get_exit_points()
+        risk_reward = signal_gen.get_risk_reward_ratio()
+        
+        # Tính toán các metrics bổ sung
+        latest = df_with_indicators.iloc[-1]
+        prev_month = df_with_indicators.iloc[-21] if len(df_with_indicators) >= 21 else df_with_indicators.iloc[0]
+        prev_quarter = df_with_indicators.iloc[-63] if len(df_with_indicators) >= 63 else df_with_indicators.iloc[0]
+        
+        # Performance
+        monthly_return = ((latest['close'] - prev_month['close']) / prev_month['close']) * 100
+        quarterly_return = ((latest['close'] - prev_quarter['close']) / prev_quarter['close']) * 100
+        
+        # Volatility (20-day)
+        returns = df_with_indicators['close'].pct_change().dropna()
+        volatility = returns.tail(20).std() * np.sqrt(252) * 100  # Annualized
+        
+        # Volume trend
+        avg_volume_20 = df_with_indicators['volume'].tail(20).mean()
+        current_volume = latest['volume']
+        volume_ratio = current_volume / avg_volume_20 if avg_volume_20 > 0 else 1
+        
+        # Support/Resistance levels
+        high_52w = df_with_indicators['high'].tail(252).max() if len(df_with_indicators) >= 252 else df_with_indicators['high'].max()
+        low_52w = df_with_indicators['low'].tail(252).min() if len(df_with_indicators) >= 252 else df_with_indicators['low'].min()
+        
+        # Distance from 52w high/low
+        dist_from_high = ((latest['close'] - high_52w) / high_52w) * 100
+        dist_from_low = ((latest['close'] - low_52w) / low_52w) * 100
+        
+        return {
+            'current_price': latest['close'],
+            'volume': current_volume,
+            
+            # Performance
+            'monthly_return': monthly_return,
+            'quarterly_return': quarterly_return,
+            'ytd_return': quarterly_return,  # Approximation
+            
+            # Technical indicators
+            'rsi': latest.get('rsi', np.nan),
+            'macd': latest.get('macd', np.nan),
+            'sma_20': latest.get('sma_20', np.nan),
+            'sma_50': latest.get('sma_50', np.nan),
+            'sma_200': latest.get('sma_200', np.nan),
+            'bb_position': self._calculate_bb_position(latest),
+            
+            # Price levels
+            'high_52w': high_52w,
+            'low_52w': low_52w,
+            'dist_from_high': dist_from_high,
+            'dist_from_low': dist_from_low,
+            
+            # Risk metrics
+            'volatility': volatility,
+            'volume_ratio': volume_ratio,
+            
+            # Trading signals
+            'overall_score': overall_signal['overall_score'],
+            'technical_score': overall_signal['technical_score'],
+            'signal': overall_signal['signal'],
+            'entry_points_count': len(entry_points),
+            'exit_points_count': len(exit_points),
+            'risk_reward_ratio': risk_reward['ratio'] if risk_reward else np.nan,
+            
+            # Trend analysis
+            'trend': analyzer.get_trend(),
+            'price_vs_sma20': ((latest['close'] - latest.get('sma_20', latest['close'])) / latest.get('sma_20', latest['close'])) * 100 if pd.notna(latest.get('sma_20')) else 0,
+            'price_vs_sma50': ((latest['close'] - latest.get('sma_50', latest['close'])) / latest.get('sma_50', latest['close'])) * 100 if pd.notna(latest.get('sma_50')) else 0
+        }
     
     def _calculate_bb_position(self, latest_data):
         """Tính vị trí giá so với Bollinger Bands"""
@@ -178,43 +207,78 @@ class CachedStockScreener:
             df: DataFrame từ get_market_comparison_table
             criteria: Dict chứa các tiêu chí lọc
         """
-        filtered_df = df.copy()
+        return self.filter_by_expression(df, self.criteria_to_expression(criteria))
+    
+    @staticmethod
+    def criteria_to_expression(criteria):
+        """Chuyển dict tiêu chí của filter_by_criteria thành biểu thức lọc"""
+        parts = []
         
         # Lọc theo điểm số
         if 'min_overall_score' in criteria:
-            filtered_df = filtered_df[filtered_df['overall_score'] >= criteria['min_overall_score']]
+            parts.append(f"overall_score >= {float(criteria['min_overall_score'])}")
         
         # Lọc theo RSI
         if 'rsi_range' in criteria:
             rsi_min, rsi_max = criteria['rsi_range']
-            filtered_df = filtered_df[
-                (filtered_df['rsi'] >= rsi_min) & 
-                (filtered_df['rsi'] <= rsi_max)
-            ]
+            parts.append(f"{float(rsi_min)} <= rsi <= {float(rsi_max)}")
         
         # Lọc theo performance
         if 'min_monthly_return' in criteria:
-            filtered_df = filtered_df[filtered_df['monthly_return'] >= criteria['min_monthly_return']]
+            parts.append(f"monthly_return >= {float(criteria['min_monthly_return'])}")
         
         # Lọc theo volume
         if 'min_volume_ratio' in criteria:
-            filtered_df = filtered_df[filtered_df['volume_ratio'] >= criteria['min_volume_ratio']]
+            parts.append(f"volume_ratio >= {float(criteria['min_volume_ratio'])}")
         
-        # Lọc theo trend
+        # Lọc theo trend (nhãn chứa một trong các xu hướng)
         if 'trend_filter' in criteria:
             trends = criteria['trend_filter']
             if isinstance(trends, str):
                 trends = [trends]
-            filtered_df = filtered_df[filtered_df['trend'].str.contains('|'.join(trends), na=False)]
+            if trends:
+                parts.append('(' + ' or '.join(f"contains(trend, {t!r})" for t in trends) + ')')
+            else:
+                parts.append('notnull(trend)')
         
         # Lọc theo signal
         if 'signal_filter' in criteria:
             signals = criteria['signal_filter']
             if isinstance(signals, str):
                 signals = [signals]
-            filtered_df = filtered_df[filtered_df['signal'].isin(signals)]
+            parts.append(f"signal in {list(signals)!r}")
+        
+        return ' and '.join(parts) or 'True'
+    
+    def filter_by_expression(self, df, expression):
+        """
+        Lọc cổ phiếu theo biểu thức, ví dụ "rsi < 30 and close > sma_200 and volume_ratio > 1.5"
+        
+        Args:
+            df: DataFrame từ get_market_comparison_table
+            expression: Chuỗi biểu thức hoặc ScreenExpression đã biên dịch
+        """
+        if not isinstance(expression, ScreenExpression):
+            expression = ScreenExpression(expression)
+        return expression.filter(df)
+    
+    def run_saved_screen(self, name, df=None):
+        """
+        Chạy bộ lọc đã lưu trên toàn thị trường
+        
+        Args:
+            name: Tên bộ lọc trong bảng saved_screens
+            df: Bảng so sánh (None = đọc từ market snapshot)
+        """
+        expression = self.cache.get_saved_screen(name)
+        if expression is None:
+            raise ValueError(f"Không có bộ lọc '{name}'")
         
-        return filtered_df
+        if df is None:
+            df = self.get_market_comparison_table()
+        if df.empty:
+            return df
+        return self.filter_by_expression(df, expression)
     
     def get_top_performers(self, df, category='overall', top_n=10):
         """
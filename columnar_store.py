@@ -0,0 +1,343 @@
+"""
+Module lưu giá OHLCV dạng cột, memory-mapped
+
+Mỗi trường là một file mảng liên tục: date (int32, số ngày từ 1970-01-01), open/high/low/close
+(float64 hoặc float32) và volume (int64). Dữ liệu của một mã nằm liền nhau trong một khối có
+chừa chỗ trống, nhờ vậy phiên mới được ghi thêm tại chỗ. Khối đầy hoặc dữ liệu cũ bị sửa thì
+mã được ghi sang khối mới ở cuối file (không ghi đè dữ liệu đang có, nên index cũ mà process
+khác đang đọc vẫn đúng). index.json lưu (offset, số phiên, dung lượng) của từng mã và chỉ
+được ghi sau dữ liệu, kèm phiên bản dữ liệu nguồn (version) mà kho đang phản ánh.
+"""
+
+import os
+import json
+import threading
+import numpy as np
+import pandas as pd
+
+PRICE_FIELDS = ['open', 'high', 'low', 'close', 'volume']
+
+# Số phiên trống tối thiểu chừa sau dữ liệu của mỗi mã
+MIN_SLACK = 64
+
+class ColumnarPriceStore:
+    def __init__(self, directory, price_dtype='float64'):
+        """
+        Mở (hoặc tạo) kho dữ liệu dạng cột
+        
+        Args:
+            directory: Thư mục chứa các file mảng và index.json
+            price_dtype: Kiểu dữ liệu giá ('float64' hoặc 'float32')
+        """
+        self.directory = directory
+        self.dtypes = {
+            'date': np.dtype(np.int32),
+            'open': np.dtype(price_dtype), 'high': np.dtype(price_dtype),
+            'low': np.dtype(price_dtype), 'close': np.dtype(price_dtype),
+            'volume': np.dtype(np.int64)
+        }
+        self._lock = threading.RLock()
+        self._index_path = os.path.join(directory, 'index.json')
+        self._index_mtime = None
+        self._generation = None
+        self._maps = {}
+        self._mapped_rows = 0
+        
+        # symbol -> [offset, số phiên, dung lượng]
+        self.index = {}
+        self.allocated = 0
+        
+        # Phiên bản dữ liệu nguồn đã ghi vào kho (DataCache so sánh với bộ đếm ghi của SQLite)
+        self.version = None
+        
+        os.makedirs(directory, exist_ok=True)
+        self._reload()
+        
+        # Đổi kiểu dữ liệu giá thì dữ liệu cũ không đọc được nữa
+        if self.index and self._stored_dtype != price_dtype:
+            self.clear()
+    
+    def _path(self, field):
+        return os.path.join(self.directory, f"{field}.bin")
+    
+    def _reload(self):
+        """Đọc lại index.json nếu process khác đã ghi (so sánh mtime/inode)"""
+        try:
+            stat = os.stat(self._index_path)
+        except FileNotFoundError:
+            self._stored_dtype = str(self.dtypes['close'])
+            self._generation = None
+            self.version = None
+            return
+        
+        version = (stat.st_mtime_ns, stat.st_ino)
+        if version == self._index_mtime:
+            return
+        
+        with self._lock:
+            with open(self._index_path) as f:
+                data = json.load(f)
+            self.index = data['symbols']
+            self.allocated = data['allocated']
+            self._stored_dtype = data.get('price_dtype', 'float64')
+            self.version = data.get('version')
+            self._index_mtime = version
+            
+            # File bị tạo lại (clear) hoặc lớn hơn phần đang map: map lại
+            if data.get('generation') != self._generation or self.allocated > self._mapped_rows:
+                self._generation = data.get('generation')
+                self._remap(self.allocated)
+    
+    def _remap(self, rows):
+        """Mở lại memory map của mọi trường với ít nhất `rows` phiên (file được nới nếu cần)"""
+        self._maps = {}
+        for field, dtype in self.dtypes.items():
+            path = self._path(field)
+            size = rows * dtype.itemsize
+            if not os.path.exists(path) or os.path.getsize(path) < size:
+                with open(path, 'ab') as f:
+                    f.truncate(size)
+            self._maps[field] = np.memmap(path, dtype=dtype, mode='r+', shape=(rows,)) if rows else np.empty(0, dtype)
+        self._mapped_rows = rows
+    
+    def _save_index(self):
+        """Ghi index.json (ghi file tạm rồi đổi tên để process khác không đọc phải file dở)"""
+        if self._generation is None:
+            self._generation = os.urandom(8).hex()
+        for array in self._maps.values():
+            if isinstance(array, np.memmap):
+                array.flush()
+        
+        tmp_path = self._index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'generation': self._generation,
+                'allocated': self.allocated,
+                'price_dtype': str(self.dtypes['close']),
+                'version': self.version,
+                'symbols': self.index
+            }, f)
+        os.replace(tmp_path, self._index_path)
+        stat = os.stat(self._index_path)
+        self._index_mtime = (stat.st_mtime_ns, stat.st_ino)
+    
+    def _allocate(self, rows):
+        """Cấp một khối `rows` phiên ở cuối file, nới file theo cấp số nhân"""
+        offset = self.allocated
+        self.allocated += rows
+        if self.allocated > self._mapped_rows:
+            self._remap(max(self.allocated, 2 * self._mapped_rows, 1024))
+        return offset
+    
+    @staticmethod
+    def _to_days(index):
+        """DatetimeIndex -> số ngày từ 1970-01-01 (int32)"""
+        return pd.DatetimeIndex(index).values.astype('datetime64[D]').astype(np.int32)
+    
+    def write(self, frames, version=None):
+        """
+        Ghi (insert hoặc update) dữ liệu giá của nhiều mã
+        
+        Phiên mới hơn phiên cuối đã lưu được ghi thêm tại chỗ vào phần trống của khối;
+        trường hợp còn lại (khối đầy, sửa phiên cũ) gộp với dữ liệu cũ và ghi sang khối mới.
+        
+        Args:
+            frames: Dict {symbol: DataFrame} hoặc list tuple (symbol, DataFrame)
+            version: Phiên bản dữ liệu nguồn sau lần ghi này (None = giữ nguyên)
+        
+        Returns:
+            Số phiên đã ghi
+        """
+        items = frames.items() if isinstance(frames, dict) else frames
+        written = 0
+        
+        with self._lock:
+            self._reload()
+            
+            for symbol, df in items:
+                if df is None or df.empty:
+                    continue
+                
+                df = df[~df.index.duplicated(keep='last')].sort_index()
+                new = {'date': self._to_days(df.index)}
+                for field in PRICE_FIELDS:
+                    values = df[field].to_numpy(dtype=float)
+                    if field == 'volume':
+                        values = np.nan_to_num(values, nan=0.0)
+                    new[field] = values.astype(self.dtypes[field])
+                
+                self._write_symbol(symbol, new)
+                written += len(df)
+            
+            if version is not None:
+                self.version = version
+            if written or version is not None:
+                self._save_index()
+        
+        return written
+    
+    def _write_symbol(self, symbol, new):
+        """Ghi dữ liệu một mã (đã chuyển sang mảng theo trường)"""
+        count = len(new['date'])
+        entry = self.index.get(symbol)
+        
+        if entry is not None:
+            offset, length, capacity = entry
+            old_dates = self._maps['date'][offset:offset + length]
+            
+            # Chỉ có phiên mới và còn chỗ: ghi thêm tại chỗ
+            if length and new['date'][0] > old_dates[-1] and length + count <= capacity:
+                start = offset + length
+                for field, values in new.items():
+                    self._maps[field][start:start + count] = values
+                entry[1] = length + count
+                return
+            
+            # Gộp với dữ liệu cũ; phiên trùng ngày lấy giá trị mới
+            dates = np.concatenate([old_dates, new['date']])
+            order = np.argsort(dates, kind='stable')
+            keep = np.r_[dates[order][1:] != dates[order][:-1], True]
+            order = order[keep]
+            new = {
+                field: np.concatenate([self._maps[field][offset:offset + length], values])[order]
+                for field, values in new.items()
+            }
+            count = len(order)
+        
+        capacity = count + max(MIN_SLACK, count // 4)
+        offset = self._allocate(capacity)
+        for field, values in new.items():
+            self._maps[field][offset:offset + count] = values
+        self.index[symbol] = [offset, count, capacity]
+    
+    def read(self, symbol, start_date=None, end_date=None):
+        """
+        Đọc dữ liệu một mã dưới dạng view NumPy (không sao chép, chỉ đọc)
+        
+        Args:
+            symbol: Mã chứng khoán
+            start_date: Ngày bắt đầu (YYYY-MM-DD)
+            end_date: Ngày kết thúc (YYYY-MM-DD)
+        
+        Returns:
+            Dict {trường: mảng} với 'date' là số ngày từ 1970-01-01 (None nếu không có mã)
+        """
+        self._reload()
+        entry = self.index.get(symbol)
+        if entry is None:
+            return None
+        
+        offset, length, _ = entry
+        dates = self._maps['date'][offset:offset + length]
+        lo = np.searchsorted(dates, _day(start_date), 'left') if start_date else 0
+        hi = np.searchsorted(dates, _day(end_date), 'right') if end_date else length
+        
+        views = {}
+        for field in self.dtypes:
+            view = self._maps[field][offset + lo:offset + hi].view(np.ndarray)
+            view.flags.writeable = False
+            views[field] = view
+        return views
+    
+    def read_frame(self, symbol, start_date=None, end_date=None):
+        """Đọc dữ liệu một mã thành DataFrame giống DataCache.get_cached_data"""
+        views = self.read(symbol, start_date, end_date)
+        if views is None or len(views['date']) == 0:
+            return pd.DataFrame(columns=['symbol', 'date'] + PRICE_FIELDS)
+        
+        df = pd.DataFrame({'symbol': symbol, **{field: views[field] for field in PRICE_FIELDS}},
+                          index=pd.DatetimeIndex(views['date'].astype('datetime64[D]'), name='date'))
+        return df
+    
+    def read_many(self, symbols=None, start_date=None, end_date=None):
+        """
+        Đọc nhiều mã thành DataFrame dạng dài sắp xếp theo (symbol, date)
+        
+        Args:
+            symbols: Danh sách mã (None = tất cả)
+            start_date, end_date: Khoảng ngày (YYYY-MM-DD)
+        """
+        self._reload()
+        symbols = sorted(self.index if symbols is None else set(symbols) & set(self.index))
+        
+        views = [self.read(symbol, start_date, end_date) for symbol in symbols]
+        lengths = [len(v['date']) for v in views]
+        
+        def concat(field, dtype):
+            return np.concatenate([v[field] for v in views]).astype(dtype) if views else np.empty(0, dtype)
+        
+        columns = {'symbol': np.repeat(np.array(symbols, dtype=object), lengths)}
+        columns['date'] = concat('date', np.int64).astype('datetime64[D]')
+        for field in PRICE_FIELDS:
+            columns[field] = concat(field, float)
+        
+        df = pd.DataFrame(columns)
+        df['date'] = df['date'].astype('datetime64[ns]')
+        return df
+    
+    def read_panel(self, symbols=None, start_date=None, end_date=None, lookback=None):
+        """
+        Đọc nhiều mã thẳng vào panel căn phải theo phiên (cùng dạng build_price_panel)
+        
+        Args:
+            symbols: Danh sách mã (None = tất cả)
+            start_date, end_date: Khoảng ngày (YYYY-MM-DD)
+            lookback: Chỉ lấy N phiên gần nhất của mỗi mã (None = toàn bộ)
+        """
+        self._reload()
+        symbols = sorted(self.index if symbols is None else set(symbols) & set(self.index))
+        
+        views = [self.read(symbol, start_date, end_date) for symbol in symbols]
+        keep = [(s, v) for s, v in zip(symbols, views) if len(v['date'])]
+        lengths = [len(v['date']) if lookback is None else min(len(v['date']), lookback) for _, v in keep]
+        rows = max(lengths) if lengths else 0
+        
+        panel = {'symbols': [s for s, _ in keep]}
+        dates = np.full((rows, len(keep)), np.iinfo(np.int64).min, dtype=np.int64)
+        for field in PRICE_FIELDS:
+            panel[field] = np.full((rows, len(keep)), np.nan)
+        
+        for j, ((_, view), length) in enumerate(zip(keep, lengths)):
+            dates[rows - length:, j] = view['date'][-length:]
+            for field in PRICE_FIELDS:
+                panel[field][rows - length:, j] = view[field][-length:]
+        
+        # int64 nhỏ nhất là NaT; số ngày -> datetime64[ns]
+        valid = dates != np.iinfo(np.int64).min
+        dates[valid] *= 86400 * 10**9
+        panel['dates'] = dates.view('datetime64[ns]')
+        return panel
+    
+    def last_date(self, symbol):
+        """Ngày cuối cùng đã lưu của mã (datetime.date hoặc None)"""
+        self._reload()
+        entry = self.index.get(symbol)
+        if entry is None or entry[1] == 0:
+            return None
+        day = self._maps['date'][entry[0] + entry[1] - 1]
+        return np.datetime64(int(day), 'D').astype(object)
+    
+    def row_count(self):
+        """Tổng số phiên đang lưu"""
+        self._reload()
+        return sum(entry[1] for entry in self.index.values())
+    
+    def clear(self):
+        """Xóa toàn bộ dữ liệu (dùng trước khi dựng lại từ SQLite)"""
+        with self._lock:
+            self._maps = {}
+            self._mapped_rows = 0
+            for field in self.dtypes:
+                if os.path.exists(self._path(field)):
+                    os.remove(self._path(field))
+            self.index = {}
+            self.allocated = 0
+            self._stored_dtype = str(self.dtypes['close'])
+            self.version = None
+            self._generation = os.urandom(8).hex()
+            self._remap(0)
+            self._save_index()
+
+def _day(date):
+    """YYYY-MM-DD -> số ngày từ 1970-01-01"""
+    return np.datetime64(pd.Timestamp(date).date(), 'D').astype(np.int64)
@@ -16,7 +16,9 @@ TECHNICAL_INDICATORS = {
     'EMA_SHORT': 12,
     'EMA_LONG': 26,
     'ADX_PERIOD': 14,
-    'VOLUME_SMA': 20
+    'VOLUME_SMA': 20,
+    'STOCH_PERIOD': 14,
+    'STOCH_SMOOTH': 3
 }
 
 # Ngưỡng tín hiệu
@@ -27,6 +29,127 @@ SIGNAL_THRESHOLDS = {
     'VOLUME_SPIKE': 1.5
 }
 
+# Cấu hình cập nhật dữ liệu từ nhà cung cấp
+UPDATE_SETTINGS = {
+    'MAX_WORKERS': 4,            # Số request chạy song song
+    'REQUESTS_PER_SECOND': 2.0,  # Tốc độ nạp token (request/giây)
+    'BURST': 4,                  # Số request tối đa được bắn dồn
+    'WRITE_BATCH_SIZE': 50       # Số mã gom lại ghi trong một transaction
+}
+
+# Cập nhật bằng nhiều process (process_pool.py, full_market_update.py --processes N): các process con lấy
+# và chuẩn hóa dữ liệu, dùng chung ngân sách REQUESTS_PER_SECOND qua token bucket trong file SQLite
+# LIMITER_DB (trong thư mục cache); chỉ process gọi bulk_cache_update ghi database
+PROCESS_POOL_SETTINGS = {
+    'PROCESSES': None,            # None = số CPU
+    'START_METHOD': None,         # 'fork', 'spawn', 'forkserver' (None = mặc định của hệ điều hành)
+    'LIMITER_DB': 'rate_limit.db'
+}
+
+# Nhà cung cấp dữ liệu giá (providers.py): thử lại với backoff mũ có jitter, circuit breaker mỗi nhà cung cấp
+PROVIDER_SETTINGS = {
+    'MAX_ATTEMPTS': 3,                  # Số lần thử mỗi nhà cung cấp cho một request
+    'BACKOFF_BASE_SECONDS': 0.5,        # Chờ ngẫu nhiên trong [0, base * 2^lần thử]
+    'BACKOFF_MAX_SECONDS': 8.0,
+    'RATE_LIMIT_BACKOFF_SECONDS': 1.0,  # Base backoff khi bị 429
+    'FAILURE_THRESHOLD': 5,             # Số lỗi liên tiếp để mở breaker (chuyển thẳng sang dự phòng)
+    'RECOVERY_SECONDS': 30,             # Thời gian mở breaker trước khi cho một request thử
+    'FALLBACKS': ['yfinance']           # Nhà cung cấp dự phòng theo thứ tự
+}
+
+# Điều chỉnh tự động (AIMD) của full_market_update / gradual_update: sau mỗi batch khỏe (ít lỗi, độ trễ
+# không tăng quá LATENCY_TOLERANCE lần mức tốt nhất) tăng dần số luồng / req/s và giảm thời gian nghỉ;
+# batch lỗi thì giảm theo hệ số DECREASE_FACTOR và tăng gấp đôi thời gian nghỉ
+AIMD_SETTINGS = {
+    'MIN_WORKERS': 1,
+    'MAX_WORKERS': 16,
+    'WORKERS_STEP': 1,
+    'MIN_RPS': 0.5,
+    'MAX_RPS': 10.0,
+    'RPS_STEP': 0.5,
+    'DECREASE_FACTOR': 0.5,
+    'DELAY_STEP_SECONDS': 5,        # Giảm thời gian nghỉ giữa batch mỗi lần khỏe
+    'MIN_DELAY_SECONDS': 0,
+    'MAX_DELAY_SECONDS': 600,
+    'BACKOFF_DELAY_SECONDS': 30,    # Thời gian nghỉ tối thiểu sau batch lỗi
+    'MAX_ERROR_RATE': 0.05,         # Tỷ lệ request lỗi (lỗi, 429, breaker mở) tối đa của batch khỏe
+    'LATENCY_TOLERANCE': 2.0
+}
+
+# Thứ tự ưu tiên khi cập nhật có giới hạn (update_scheduler.py): điểm = tổng có trọng số của giá trị giao dịch
+# (phân vị trong cache), độ cũ của dữ liệu (số phiên thiếu, thang log tới STALE_SESSIONS_CAP), danh sách theo dõi
+# và lượt xem gần đây trên app (giảm một nửa sau mỗi VIEW_HALF_LIFE_DAYS ngày)
+PRIORITY_SETTINGS = {
+    'WEIGHTS': {
+        'TRADED_VALUE': 0.4,
+        'STALENESS': 0.3,
+        'WATCHLIST': 0.2,
+        'RECENTLY_VIEWED': 0.1
+    },
+    'STALE_SESSIONS_CAP': 60,
+    'VIEW_HALF_LIFE_DAYS': 3
+}
+
+# Process cập nhật chạy nền (python cache_manager.py --action daemon): lấy yêu cầu từ hàng đợi update_queue,
+# tự xếp lịch cập nhật toàn thị trường sau giờ đóng cửa các ngày giao dịch và ghi tiến độ vào SQLite
+DAEMON_SETTINGS = {
+    'POLL_SECONDS': 10,              # Chu kỳ kiểm tra hàng đợi khi rảnh
+    'SCHEDULE_TIMES': ['15:30'],     # Giờ tự cập nhật trong ngày giao dịch (sau phiên đóng cửa 15:00)
+    'BATCH_SIZE': 50,
+    'DELAY_BETWEEN_BATCHES': 10,     # Điểm xuất phát cho AIMD (giây)
+    'HEARTBEAT_STALE_SECONDS': 120   # Quá thời gian này không có heartbeat thì coi như daemon đã dừng
+}
+
+# Negative cache cho mã hủy niêm yết / luôn "No data": sau lần lỗi thứ n, bulk update bỏ qua mã đó
+# BASE_RECHECK_HOURS * 2^(n-1) giờ (tối đa MAX_RECHECK_DAYS ngày) rồi mới thử lại
+NEGATIVE_CACHE_SETTINGS = {
+    'BASE_RECHECK_HOURS': 12,
+    'MAX_RECHECK_DAYS': 30
+}
+
+# Cache kết quả DataFetcher (fetch_cache.py): LRU trong bộ nhớ theo dung lượng, tầng đĩa dùng chung
+# giữa ứng dụng và các công cụ dòng lệnh, TTL (giây) theo từng phương thức
+FETCH_CACHE_SETTINGS = {
+    'MAX_MEMORY_MB': 256,
+    'DISK_ENABLED': True,
+    'DISK_DIR': 'data_cache/fetch_cache',
+    'MAX_DISK_MB': 512,
+    'TTL_SECONDS': {
+        'stock_data': 3600,
+        'company_overview': 3600,
+        'financial_report': 3600,
+        'financial_ratios': 3600,
+        'all_stocks': 86400
+    }
+}
+
+# Cấu hình SQLite cho cache dữ liệu
+SQLITE_SETTINGS = {
+    'BUSY_TIMEOUT_MS': 30000,          # Thời gian chờ khi database đang bị khóa
+    'MMAP_SIZE': 256 * 1024 * 1024,    # Memory-map tối đa 256 MB
+    'CACHE_SIZE_KB': 64 * 1024         # Page cache 64 MB mỗi kết nối
+}
+
+# Lịch giao dịch HOSE/HNX (trading_calendar.py). Lịch tự tính cuối tuần, lễ dương lịch, Tết và Giỗ Tổ
+# (âm lịch) kèm nghỉ bù; các ngày sở công bố thêm/bớt hằng năm khai báo ở đây (YYYY-MM-DD)
+TRADING_CALENDAR_SETTINGS = {
+    'SESSION_CLOSE': '15:00',   # Sau giờ này dữ liệu phiên trong ngày được coi là đã có
+    'TET_DAYS_BEFORE': 2,       # Nghỉ Tết từ 2 ngày trước mùng 1...
+    'TET_DAYS_AFTER': 4,        # ...đến hết mùng 5
+    'EXTRA_HOLIDAYS': [
+        '2021-09-03', '2022-09-01', '2023-09-01', '2024-04-29', '2024-09-03',
+        '2025-05-02', '2025-09-01'
+    ],
+    'EXTRA_TRADING_DAYS': []
+}
+
+# Nơi đọc lịch sử giá: 'sqlite' (bảng stock_price) hoặc 'columnar' (file mảng memory-mapped,
+# đọc nhanh hơn; SQLite vẫn được ghi song song cho các truy vấn khác)
+PRICE_STORE_SETTINGS = {
+    'BACKEND': 'sqlite',
+    'PRICE_DTYPE': 'float64'  # 'float32' giảm một nửa dung lượng nhưng chỉ giữ ~7 chữ số
+}
+
 # Cấu hình thời gian
 TIME_PERIODS = {
     'SHORT_TERM': '3M',  # 3 tháng
@@ -51,3 +174,8 @@ CHART_COLORS = {
     'SELL_SIGNAL': '#ff0000'
 }
 
+# Cấu hình quét thị trường (StockScreener)
+SCREENER_SETTINGS = {
+    'MAX_SYMBOLS': None,   # None = toàn bộ mã trên HOSE và HNX
+    'APP_MAX_SYMBOLS': 50  # Giới hạn khi quét trong app (quét chạy đồng bộ trong phiên Streamlit)
+}
@@ -3,49 +3,277 @@ Module quản lý cache dữ liệu chứng khoán
 """
 
 import os
+import json
+import hashlib
+import math
+import numpy as np
 import pandas as pd
-import sqlite3
 from datetime import datetime, timedelta
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from data_fetcher import DataFetcher
+from rate_limiter import get_shared_limiter
+from providers import ProviderUnavailable, TOTAL_COUNTERS, get_provider_stats, get_provider_totals
+from single_flight import get_single_flight
+from db_connection import get_connection_manager
+from indicator_state import IndicatorState
+from indicator_panel import INDICATOR_COLUMNS, PRICE_FIELDS, build_panel_from_long
+from screen_expressions import ScreenExpression
+from columnar_store import ColumnarPriceStore
+from update_planner import UpdatePlanner
+from update_scheduler import UpdateScheduler
+from config import UPDATE_SETTINGS, TECHNICAL_INDICATORS, PRICE_STORE_SETTINGS, NEGATIVE_CACHE_SETTINGS, DAEMON_SETTINGS
+
+# Lịch sử giá (schema v2): mã -> id số nguyên (bảng symbols), ngày -> số ngày từ 1970-01-01,
+# giá -> số nguyên đã nhân PRICE_SCALE (giá nghìn đồng có tối đa 2 chữ số thập phân, giữ 4)
+SCHEMA_VERSION = 2
+PRICE_SCALE = 10000
+SCALED_FIELDS = ['open', 'high', 'low', 'close']
+
+def _to_day(date):
+    """Ngày (YYYY-MM-DD/Timestamp) -> số ngày từ 1970-01-01"""
+    return int(np.datetime64(pd.Timestamp(date).date(), 'D').astype(np.int64))
+
+def _from_day(day):
+    """Số ngày từ 1970-01-01 -> chuỗi YYYY-MM-DD"""
+    return str(np.datetime64(int(day), 'D'))
+
+# Các cột của bảng market_snapshot (chỉ số so sánh thị trường của mỗi mã)
+MARKET_SNAPSHOT_COLUMNS = [
+    ('current_price', 'REAL'), ('volume', 'REAL'),
+    ('monthly_return', 'REAL'), ('quarterly_return', 'REAL'), ('ytd_return', 'REAL'),
+    ('rsi', 'REAL'), ('macd', 'REAL'), ('sma_20', 'REAL'), ('sma_50', 'REAL'), ('sma_200', 'REAL'),
+    ('bb_position', 'REAL'),
+    ('high_52w', 'REAL'), ('low_52w', 'REAL'), ('dist_from_high', 'REAL'), ('dist_from_low', 'REAL'),
+    ('volatility', 'REAL'), ('volume_ratio', 'REAL'),
+    ('overall_score', 'REAL'), ('technical_score', 'REAL'), ('signal', 'TEXT'),
+    ('entry_points_count', 'INTEGER'), ('exit_points_count', 'INTEGER'), ('risk_reward_ratio', 'REAL'),
+    ('trend', 'TEXT'), ('price_vs_sma20', 'REAL'), ('price_vs_sma50', 'REAL')
+]
+
+# Trạng thái của một mã trong job cập nhật (bảng update_job_items)
+JOB_STATES = ['pending', 'running', 'done', 'failed']
+
+# Hàng đợi yêu cầu cập nhật của daemon (bảng update_queue); 'cancelling' = đang chạy, chờ dừng sau batch hiện tại
+UPDATE_QUEUE_STATES = ['queued', 'running', 'cancelling', 'done', 'failed', 'cancelled']
+UPDATE_QUEUE_COLUMNS = ['request_id', 'kind', 'params', 'status', 'scheduled_for', 'requested_at',
+                        'started_at', 'finished_at', 'job_id', 'error']
 
 class DataCache:
-    def __init__(self, cache_dir="data_cache"):
+    def __init__(self, cache_dir="data_cache", price_backend=None):
         """
         Khởi tạo cache manager
         
         Args:
             cache_dir: Thư mục lưu cache
+            price_backend: Nơi đọc lịch sử giá, 'sqlite' hoặc 'columnar'
+                           (mặc định: PRICE_STORE_SETTINGS['BACKEND'])
         """
         self.cache_dir = cache_dir
         self.db_path = os.path.join(cache_dir, "stock_data.db")
         self.data_fetcher = DataFetcher()
+        self.last_update_stats = {}
         
         # Tạo thư mục cache nếu chưa có
         os.makedirs(cache_dir, exist_ok=True)
         
+        # Kết nối dùng chung trong process (WAL, reader theo thread, một writer)
+        self.db = get_connection_manager(self.db_path)
+        
+        # Kho dạng cột (memory-mapped) cho lịch sử giá, ghi song song với stock_price
+        self.price_backend = price_backend or PRICE_STORE_SETTINGS['BACKEND']
+        self.columnar = None
+        if self.price_backend == 'columnar':
+            self.columnar = ColumnarPriceStore(
+                os.path.join(cache_dir, "columnar"), PRICE_STORE_SETTINGS['PRICE_DTYPE']
+            )
+        
         # Khởi tạo database
         self._init_database()
     
     def _init_database(self):
         """Khởi tạo database SQLite"""
-        conn = sqlite3.connect(self.db_path)
+        with self.db.writer() as conn:
+            self._create_tables(conn)
+            migrated = self._migrate_price_table(conn)
+            
+            # Database cũ chưa có latest_bar: dựng lại từ lịch sử giá
+            has_latest = conn.execute("SELECT 1 FROM latest_bar LIMIT 1").fetchone()
+            has_prices = conn.execute("SELECT 1 FROM price_bar LIMIT 1").fetchone()
+            if has_prices and not has_latest:
+                self._refresh_latest_bars(conn)
+            
+            self._check_indicator_config(conn)
+            
+            # Kho dạng cột lệch với price_bar (mới bật, hoặc process khác chỉ ghi SQLite): dựng lại.
+            # Mỗi lần ghi price_bar tăng price_version; kho dạng cột lưu phiên bản nó đã ghi theo
+            if self.columnar is not None and self.columnar.version != self._price_version(conn):
+                self._rebuild_columnar(conn)
+        
+        if migrated:
+            # Thu hồi dung lượng của bảng cũ rồi ghi lại kích thước sau khi chuyển
+            self.db.vacuum()
+            with self.db.writer() as conn:
+                report = json.loads(conn.execute(
+                    "SELECT value FROM cache_meta WHERE key = 'schema_migration'"
+                ).fetchone()[0])
+                report['size_after_mb'] = self._db_size_mb()
+                conn.execute(
+                    "UPDATE cache_meta SET value = ? WHERE key = 'schema_migration'", (json.dumps(report),)
+                )
+            print(f"Migrated stock_price to schema v{SCHEMA_VERSION}: "
+                  f"{report['size_before_mb']} MB -> {report['size_after_mb']} MB")
+    
+    def _migrate_price_table(self, conn):
+        """
+        Chuyển bảng stock_price cũ (symbol/date TEXT, giá REAL) sang price_bar (schema v2)
+        ngay trong database, đo kích thước và tốc độ truy vấn trước/sau để báo cáo
+        
+        Returns:
+            True nếu đã chuyển dữ liệu
+        """
+        old_table = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stock_price'"
+        ).fetchone()
+        
+        if old_table:
+            start_time = time.time()
+            report = {'size_before_mb': self._db_size_mb()}
+            report.update(self._benchmark_price_queries(conn, v1=True))
+            
+            conn.execute("INSERT OR IGNORE INTO symbols (symbol) SELECT DISTINCT symbol FROM stock_price")
+            scaled = ', '.join(f"CAST(ROUND(p.{c} * {PRICE_SCALE}) AS INTEGER)" for c in SCALED_FIELDS)
+            conn.execute(f'''
+                INSERT OR REPLACE INTO price_bar (symbol_id, day, open, high, low, close, volume)
+                SELECT s.id, CAST(julianday(substr(p.date, 1, 10)) - 2440587.5 AS INTEGER), {scaled}, p.volume
+                FROM stock_price p JOIN symbols s ON s.symbol = p.symbol
+                ORDER BY s.id, p.date
+            ''')
+            conn.execute("DROP TABLE stock_price")
+            self._bump_price_version(conn)
+            
+            report['records'] = conn.execute("SELECT COUNT(*) FROM price_bar").fetchone()[0]
+            report.update(self._benchmark_price_queries(conn, v1=False))
+            report['seconds'] = round(time.time() - start_time, 2)
+            report['migrated_at'] = datetime.now().isoformat()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_meta (key, value) VALUES ('schema_migration', ?)",
+                (json.dumps(report),)
+            )
+        
+        # View tương thích cho truy vấn thủ công theo dạng cũ (chỉ đọc)
+        columns = ', '.join(f"b.{c} / {PRICE_SCALE}.0 AS {c}" for c in SCALED_FIELDS)
+        conn.execute(f'''
+            CREATE VIEW IF NOT EXISTS stock_price AS
+            SELECT s.symbol AS symbol, date(b.day * 86400, 'unixepoch') AS date, {columns}, b.volume AS volume
+            FROM price_bar b JOIN symbols s ON s.id = b.symbol_id
+        ''')
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_meta (key, value) VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),)
+        )
+        return bool(old_table)
+    
+    def _benchmark_price_queries(self, conn, v1, sample=100):
+        """
+        Đo thời gian trung bình (ms) của truy vấn MAX(date) và đọc 1 năm của một mã
+        
+        Args:
+            conn: Kết nối đang mở
+            v1: True = bảng stock_price cũ, False = price_bar
+            sample: Số mã dùng để đo
+        """
+        suffix = 'v1' if v1 else 'v2'
+        if v1:
+            symbols = [row[0] for row in conn.execute(
+                "SELECT DISTINCT symbol FROM stock_price ORDER BY symbol LIMIT ?", (sample,))]
+            max_query = "SELECT MAX(date) FROM stock_price WHERE symbol = ?"
+            range_query = ("SELECT date, open, high, low, close, volume FROM stock_price "
+                           "WHERE symbol = ? AND date >= ? ORDER BY date")
+            keys = [(symbol,) for symbol in symbols]
+        else:
+            symbols = conn.execute("SELECT id FROM symbols ORDER BY symbol LIMIT ?", (sample,)).fetchall()
+            max_query = "SELECT MAX(day) FROM price_bar WHERE symbol_id = ?"
+            range_query = ("SELECT day, open, high, low, close, volume FROM price_bar "
+                           "WHERE symbol_id = ? AND day >= ? ORDER BY day")
+            keys = [tuple(row) for row in symbols]
+        
+        if not keys:
+            return {}
+        
+        start = time.perf_counter()
+        last_dates = [conn.execute(max_query, key).fetchone()[0] for key in keys]
+        max_ms = (time.perf_counter() - start) * 1000 / len(keys)
+        
+        start = time.perf_counter()
+        for key, last in zip(keys, last_dates):
+            if last is None:
+                continue
+            since = (pd.Timestamp(last) - pd.Timedelta(days=365)).strftime('%Y-%m-%d') if v1 else last - 365
+            conn.execute(range_query, (*key, since)).fetchall()
+        range_ms = (time.perf_counter() - start) * 1000 / len(keys)
+        
+        return {f'max_date_ms_{suffix}': round(max_ms, 3), f'range_scan_ms_{suffix}': round(range_ms, 3)}
+    
+    def _db_size_mb(self):
+        """Kích thước database (gồm cả file WAL), MB"""
+        db_size = os.path.getsize(self.db_path)
+        wal_path = self.db_path + '-wal'
+        if os.path.exists(wal_path):
+            db_size += os.path.getsize(wal_path)
+        return round(db_size / (1024*1024), 2)
+    
+    def _rebuild_columnar(self, conn):
+        """Dựng lại kho dạng cột từ bảng price_bar (gọi trong transaction ghi)"""
+        self.columnar.clear()
+        symbols = [row[0] for row in conn.execute("SELECT symbol FROM symbols ORDER BY symbol")]
+        for i in range(0, len(symbols), 500):
+            df = self._read_prices(conn, symbols[i:i + 500])
+            self.columnar.write([
+                (symbol, frame.set_index('date')) for symbol, frame in df.groupby('symbol', sort=False)
+            ])
+        self.columnar.write([], version=self._price_version(conn))
+        print(f"Rebuilt columnar price store: {self.columnar.row_count()} records")
+    
+    def _price_version(self, conn):
+        """Số lần đã ghi bảng price_bar (cache_meta 'price_version', 0 nếu chưa ghi)"""
+        row = conn.execute("SELECT value FROM cache_meta WHERE key = 'price_version'").fetchone()
+        return int(row[0]) if row else 0
+    
+    def _bump_price_version(self, conn):
+        """Tăng price_version sau khi ghi price_bar (gọi trong transaction ghi), trả về giá trị mới"""
+        version = self._price_version(conn) + 1
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_meta (key, value) VALUES ('price_version', ?)", (str(version),)
+        )
+        return version
+    
+    def _create_tables(self, conn):
+        """Tạo các bảng nếu chưa có"""
         cursor = conn.cursor()
         
-        # Bảng lưu dữ liệu giá
+        # Bảng từ điển mã chứng khoán -> id số nguyên
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS stock_price (
-                symbol TEXT,
-                date TEXT,
-                open REAL,
-                high REAL,
-                low REAL,
-                close REAL,
-                volume INTEGER,
-                PRIMARY KEY (symbol, date)
+            CREATE TABLE IF NOT EXISTS symbols (
+                id INTEGER PRIMARY KEY,
+                symbol TEXT UNIQUE NOT NULL
             )
         ''')
         
+        # Bảng lưu dữ liệu giá: khóa (symbol_id, day) là clustered index (WITHOUT ROWID),
+        # day = số ngày từ 1970-01-01, giá = giá * PRICE_SCALE
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS price_bar (
+                symbol_id INTEGER NOT NULL,
+                day INTEGER NOT NULL,
+                open INTEGER,
+                high INTEGER,
+                low INTEGER,
+                close INTEGER,
+                volume INTEGER,
+                PRIMARY KEY (symbol_id, day)
+            ) WITHOUT ROWID
+        ''')
+        
         # Bảng lưu thông tin cổ phiếu
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS stock_info (
@@ -77,8 +305,172 @@ class DataCache:
             )
         ''')
         
-        conn.commit()
-        conn.close()
+        # Database cũ chỉ có một phần cột chỉ báo: bổ sung các cột còn thiếu
+        existing = {row[1] for row in cursor.execute("PRAGMA table_info(technical_indicators)")}
+        for column in INDICATOR_COLUMNS:
+            if column not in existing:
+                cursor.execute(f"ALTER TABLE technical_indicators ADD COLUMN {column} REAL")
+        
+        # Bảng snapshot chỉ số so sánh thị trường, data_date = phiên dùng để tính
+        snapshot_columns = ',\n'.join(f"                {name} {kind}" for name, kind in MARKET_SNAPSHOT_COLUMNS)
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS market_snapshot (
+                symbol TEXT PRIMARY KEY,
+                data_date TEXT,
+                computed_at TEXT,
+{snapshot_columns}
+            )
+        ''')
+        
+        # Bảng lưu các bộ lọc (biểu thức) người dùng đã đặt tên
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS saved_screens (
+                name TEXT PRIMARY KEY,
+                expression TEXT,
+                created_at TEXT
+            )
+        ''')
+        
+        # Bảng lưu thông tin phụ của cache (ví dụ hash tham số chỉ báo)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cache_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        ''')
+        
+        # Bảng lưu phiên mới nhất của mỗi mã (cập nhật mỗi lần ghi giá)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS latest_bar (
+                symbol TEXT PRIMARY KEY,
+                date TEXT,
+                close REAL,
+                volume INTEGER,
+                prev_close REAL,
+                avg_volume_20 REAL,
+                high_52w REAL,
+                low_52w REAL
+            )
+        ''')
+        
+        # Negative cache: mã lấy dữ liệu thất bại (hủy niêm yết, chứng quyền, luôn "No data"),
+        # bulk update bỏ qua đến next_check_at; avg_seconds = thời gian trung bình một lần thử hỏng
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS symbol_failures (
+                symbol TEXT PRIMARY KEY,
+                failures INTEGER,
+                last_error TEXT,
+                first_failed_at TEXT,
+                last_failed_at TEXT,
+                next_check_at TEXT,
+                avg_seconds REAL
+            )
+        ''')
+        
+        # Job cập nhật (full_market_update / gradual_update) và trạng thái từng mã trong job,
+        # để chạy lại bằng --resume tiếp tục đúng chỗ đã dừng
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS update_jobs (
+                job_id TEXT PRIMARY KEY,
+                kind TEXT,
+                status TEXT,
+                params TEXT,
+                total INTEGER,
+                created_at TEXT,
+                updated_at TEXT,
+                finished_at TEXT
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS update_job_items (
+                job_id TEXT,
+                symbol TEXT,
+                position INTEGER,
+                state TEXT,
+                attempts INTEGER DEFAULT 0,
+                started_at TEXT,
+                finished_at TEXT,
+                seconds REAL,
+                error TEXT,
+                PRIMARY KEY (job_id, symbol)
+            ) WITHOUT ROWID
+        ''')
+        
+        # Hàng đợi yêu cầu cập nhật cho daemon (cache_manager.py --action daemon) và trạng thái daemon:
+        # app chỉ thêm yêu cầu và đọc tiến độ, việc cập nhật chạy ở process riêng
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS update_queue (
+                request_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT,
+                params TEXT,
+                status TEXT,
+                scheduled_for TEXT UNIQUE,
+                requested_at TEXT,
+                started_at TEXT,
+                finished_at TEXT,
+                job_id TEXT,
+                error TEXT
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS daemon_status (
+                name TEXT PRIMARY KEY,
+                pid INTEGER,
+                state TEXT,
+                message TEXT,
+                request_id INTEGER,
+                job_id TEXT,
+                started_at TEXT,
+                heartbeat_at TEXT
+            )
+        ''')
+        
+        # Mã người dùng theo dõi và lượt xem gần đây trên app: được ưu tiên khi cập nhật có giới hạn
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS watchlist (
+                symbol TEXT PRIMARY KEY,
+                added_at TEXT
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS symbol_views (
+                symbol TEXT PRIMARY KEY,
+                views INTEGER,
+                last_viewed_at TEXT
+            )
+        ''')
+        
+        # Bảng lưu trạng thái chỉ báo tăng dần của mỗi mã (JSON của IndicatorState)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS indicator_state (
+                symbol TEXT PRIMARY KEY,
+                last_date TEXT,
+                state TEXT
+            )
+        ''')
+    
+    def _check_indicator_config(self, conn):
+        """
+        So sánh hash của TECHNICAL_INDICATORS với hash đã lưu; nếu tham số đổi thì
+        xóa chỉ báo và trạng thái cũ để lần cập nhật sau tính lại từ đầu
+        """
+        config_hash = hashlib.sha1(
+            json.dumps(TECHNICAL_INDICATORS, sort_keys=True).encode()
+        ).hexdigest()
+        
+        row = conn.execute("SELECT value FROM cache_meta WHERE key = 'indicator_config_hash'").fetchone()
+        if row and row[0] == config_hash:
+            return
+        
+        if row:
+            print("Indicator parameters changed, cached indicators will be recomputed")
+        conn.execute("DELETE FROM technical_indicators")
+        conn.execute("DELETE FROM indicator_state")
+        conn.execute("DELETE FROM market_snapshot")
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_meta (key, value) VALUES ('indicator_config_hash', ?)",
+            (config_hash,)
+        )
     
     def get_all_symbols(self):
         """Lấy danh sách tất cả mã chứng khoán"""
@@ -90,29 +482,25 @@ class DataCache:
             print(f"Error getting symbols: {e}")
         
         # Fallback: lấy từ database
-        conn = sqlite3.connect(self.db_path)
-        df = pd.read_sql_query("SELECT DISTINCT symbol FROM stock_info", conn)
-        conn.close()
-        return df
+        return pd.read_sql_query("SELECT DISTINCT symbol FROM stock_info", self.db.reader())
     
     def update_stock_info(self, symbols_df):
         """Cập nhật thông tin cơ bản các mã cổ phiếu"""
-        conn = sqlite3.connect(self.db_path)
-        
+        rows = []
         for _, row in symbols_df.iterrows():
             symbol = row['symbol']
             name = row.get('organName', row.get('organ_name', symbol))
             exchange = row.get('exchange', 'HOSE')
-            
-            # Insert hoặc update
-            conn.execute('''
+            rows.append((symbol, name, exchange, datetime.now().isoformat(), 'active'))
+        
+        # Insert hoặc update
+        with self.db.writer() as conn:
+            conn.executemany('''
                 INSERT OR REPLACE INTO stock_info 
                 (symbol, name, exchange, last_update, status)
                 VALUES (?, ?, ?, ?, ?)
-            ''', (symbol, name, exchange, datetime.now().isoformat(), 'active'))
+            ''', rows)
         
-        conn.commit()
-        conn.close()
         print(f"Updated info for {len(symbols_df)} stocks")
     
     def get_cached_data(self, symbol, start_date=None, end_date=None):
@@ -124,184 +512,1292 @@ class DataCache:
             start_date: Ngày bắt đầu (YYYY-MM-DD)
             end_date: Ngày kết thúc (YYYY-MM-DD)
         """
-        conn = sqlite3.connect(self.db_path)
+        if self.columnar is not None:
+            return self.columnar.read_frame(symbol, start_date, end_date)
         
-        query = "SELECT * FROM stock_price WHERE symbol = ?"
-        params = [symbol]
+        conn = self.db.reader()
+        row = conn.execute("SELECT id FROM symbols WHERE symbol = ?", (symbol,)).fetchone()
+        if row is None:
+            return pd.DataFrame(columns=['symbol', 'date'] + PRICE_FIELDS)
+        
+        query = "SELECT day, open, high, low, close, volume FROM price_bar WHERE symbol_id = ?"
+        params = [row[0]]
         
         if start_date:
-            query += " AND date >= ?"
-            params.append(start_date)
+            query += " AND day >= ?"
+            params.append(_to_day(start_date))
         
         if end_date:
-            query += " AND date <= ?"
-            params.append(end_date)
+            query += " AND day <= ?"
+            params.append(_to_day(end_date))
         
-        query += " ORDER BY date"
+        rows = conn.execute(query + " ORDER BY day", params).fetchall()
+        if not rows:
+            return pd.DataFrame(columns=['symbol', 'date'] + PRICE_FIELDS)
         
-        df = pd.read_sql_query(query, conn, params=params, parse_dates=['date'])
-        conn.close()
+        df = self._decode_prices(pd.DataFrame.from_records(rows, columns=['day'] + PRICE_FIELDS))
+        df.insert(0, 'symbol', symbol)
+        return df.set_index('date')
+    
+    def _decode_prices(self, df):
+        """Đổi cột day/giá số nguyên của price_bar về date (datetime64) và giá thực"""
+        dates = df.pop('day').to_numpy(dtype=np.int64).astype('datetime64[D]').astype('datetime64[ns]')
+        df.insert(1 if 'symbol' in df.columns else 0, 'date', dates)
+        for field in SCALED_FIELDS:
+            df[field] = df[field].astype(float) / PRICE_SCALE
+        return df
+    
+    def _read_prices(self, conn, symbols=None, start_date=None, end_date=None, with_indicators=False):
+        """
+        Đọc lịch sử giá của nhiều mã thành DataFrame dạng dài (chia nhỏ theo 500 mã)
         
-        if not df.empty:
-            df.set_index('date', inplace=True)
+        Args:
+            conn: Kết nối dùng để đọc (reader, hoặc writer khi đang trong transaction)
+            symbols: Danh sách mã (None = tất cả)
+            start_date, end_date: Khoảng ngày (YYYY-MM-DD)
+            with_indicators: Kèm các cột chỉ báo trong technical_indicators
+        """
+        fields = PRICE_FIELDS + (INDICATOR_COLUMNS if with_indicators else [])
+        columns = ', '.join(['s.symbol', 'b.day'] + [f"b.{c}" for c in PRICE_FIELDS] +
+                            [f"t.{c}" for c in INDICATOR_COLUMNS if with_indicators])
+        query = f"SELECT {columns} FROM price_bar b JOIN symbols s ON s.id = b.symbol_id"
+        if with_indicators:
+            query += (" LEFT JOIN technical_indicators t"
+                      " ON t.symbol = s.symbol AND t.date = date(b.day * 86400, 'unixepoch')")
+        
+        conditions, params = [], []
+        if start_date:
+            conditions.append("b.day >= ?")
+            params.append(_to_day(start_date))
+        if end_date:
+            conditions.append("b.day <= ?")
+            params.append(_to_day(end_date))
+        
+        if symbols is None:
+            chunks = [None]
+        else:
+            symbols = sorted(set(symbols))
+            # Chia nhỏ để không vượt giới hạn số tham số của SQLite
+            chunks = [symbols[i:i + 500] for i in range(0, len(symbols), 500)]
+        
+        rows = []
+        for chunk in chunks:
+            chunk_conditions = list(conditions)
+            chunk_params = list(params)
+            if chunk is not None:
+                chunk_conditions.insert(0, f"s.symbol IN ({','.join('?' * len(chunk))})")
+                chunk_params = chunk + chunk_params
+            chunk_query = query
+            if chunk_conditions:
+                chunk_query += " WHERE " + " AND ".join(chunk_conditions)
+            rows.extend(conn.execute(chunk_query + " ORDER BY s.symbol, b.day", chunk_params).fetchall())
+        
+        df = self._decode_prices(pd.DataFrame.from_records(rows, columns=['symbol', 'day'] + fields))
+        df[fields] = df[fields].astype(float)
+        return df
+    
+    def get_cached_data_many(self, symbols=None, start_date=None, end_date=None,
+                             with_indicators=False, as_panel=False, lookback=None):
+        """
+        Lấy dữ liệu của nhiều mã trong một truy vấn (chia nhỏ theo 500 mã)
+        
+        Args:
+            symbols: Danh sách mã (None = tất cả mã trong cache)
+            start_date: Ngày bắt đầu (YYYY-MM-DD)
+            end_date: Ngày kết thúc (YYYY-MM-DD)
+            with_indicators: Kèm các cột chỉ báo đã lưu trong technical_indicators
+            as_panel: Trả về panel NumPy thay vì DataFrame dạng dài
+            lookback: Với as_panel, chỉ lấy N phiên gần nhất của mỗi mã
+        
+        Returns:
+            DataFrame dạng dài (symbol, date, open, high, low, close, volume, ...) sắp xếp
+            theo (symbol, date), hoặc panel căn phải theo phiên như build_price_panel
+            (dict 'symbols', 'dates' và một mảng phiên × mã cho mỗi trường)
+        """
+        # Chỉ cần giá: đọc thẳng từ kho dạng cột
+        if self.columnar is not None and not with_indicators:
+            if as_panel:
+                return self.columnar.read_panel(symbols, start_date, end_date, lookback)
+            return self.columnar.read_many(symbols, start_date, end_date)
         
+        df = self._read_prices(self.db.reader(), symbols, start_date, end_date, with_indicators)
+        if as_panel:
+            fields = PRICE_FIELDS + (INDICATOR_COLUMNS if with_indicators else [])
+            return build_panel_from_long(df, fields, lookback)
         return df
     
     def get_last_date(self, symbol):
         """Lấy ngày dữ liệu cuối cùng của mã cổ phiếu"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        if self.columnar is not None:
+            return self.columnar.last_date(symbol)
         
-        cursor.execute(
-            "SELECT MAX(date) FROM stock_price WHERE symbol = ?", 
-            (symbol,)
-        )
+        cursor = self.db.reader().execute('''
+            SELECT MAX(b.day) FROM price_bar b
+            WHERE b.symbol_id = (SELECT id FROM symbols WHERE symbol = ?)
+        ''', (symbol,))
         result = cursor.fetchone()[0]
-        conn.close()
         
-        if result:
-            return datetime.fromisoformat(result).date()
+        if result is not None:
+            return np.datetime64(result, 'D').astype(object)
         return None
     
-    def cache_stock_data(self, symbol, force_full_update=False):
+    def get_coverage(self, symbols=None):
         """
-        Cache dữ liệu một mã cổ phiếu
+        Khoảng dữ liệu đã cache của nhiều mã trong một truy vấn
+        
+        Mỗi MIN/MAX là một lần seek trên primary key (symbol_id, day) nên đọc cả thị trường
+        chỉ mất vài mili giây, không quét lịch sử giá.
         
         Args:
-            symbol: Mã chứng khoán
-            force_full_update: Có cập nhật toàn bộ dữ liệu không
+            symbols: Danh sách mã (None = tất cả mã đã có dữ liệu)
+        
+        Returns:
+            DataFrame các cột symbol, first_date, last_date (date); mã chưa có dữ liệu không có dòng
         """
-        try:
-            # Xác định khoảng thời gian cần lấy
-            if force_full_update:
-                # Lấy từ 5 năm trước
-                start_date = (datetime.now() - timedelta(days=5*365)).strftime('%Y-%m-%d')
-                print(f"Full update {symbol} from {start_date}")
-            else:
-                # Lấy từ ngày cuối cùng có dữ liệu
-                last_date = self.get_last_date(symbol)
-                if last_date:
-                    start_date = (last_date + timedelta(days=1)).strftime('%Y-%m-%d')
-                    if start_date >= datetime.now().strftime('%Y-%m-%d'):
-                        print(f"{symbol} is up to date")
-                        return True
-                else:
-                    # Chưa có dữ liệu, lấy 2 năm
-                    start_date = (datetime.now() - timedelta(days=2*365)).strftime('%Y-%m-%d')
-                
-                print(f"Incremental update {symbol} from {start_date}")
-            
-            # Lấy dữ liệu từ API
-            end_date = datetime.now().strftime('%Y-%m-%d')
-            stock_data = self.data_fetcher.get_stock_data(
-                symbol, 
-                period='MAX',  # Lấy tối đa
-                start_date=start_date,
-                end_date=end_date
-            )
+        query = '''
+            SELECT symbol, first_day, last_day FROM (
+                SELECT s.symbol,
+                    (SELECT MIN(day) FROM price_bar WHERE symbol_id = s.id) AS first_day,
+                    (SELECT MAX(day) FROM price_bar WHERE symbol_id = s.id) AS last_day
+                FROM symbols s
+            ) WHERE last_day IS NOT NULL
+        '''
+        rows = self.db.reader().execute(query).fetchall()
+        if symbols is not None:
+            wanted = set(symbols)
+            rows = [row for row in rows if row[0] in wanted]
+        
+        symbol_col, first_days, last_days = zip(*rows) if rows else ((), (), ())
+        return pd.DataFrame({
+            'symbol': list(symbol_col),
+            'first_date': np.array(first_days, dtype='datetime64[D]').astype(object),
+            'last_date': np.array(last_days, dtype='datetime64[D]').astype(object)
+        })
+    
+    def _fetch_stock_data(self, task):
+        """
+        Lấy dữ liệu cần cache của một mã từ API theo kế hoạch (chưa ghi vào database)
+        
+        Args:
+            task: Một dòng của UpdatePlanner.plan (symbol, start_date, end_date, mode, skip)
+        
+        Returns:
+            Tuple (status, DataFrame) với status là 'ok', 'up_to_date' hoặc 'no_data'
+        """
+        return self.data_fetcher.fetch_planned(task)
+    
+    def _symbol_ids(self, conn, symbols, create=False):
+        """
+        Lấy id số nguyên của các mã
+        
+        Args:
+            conn: Kết nối đang mở (writer nếu create=True)
+            symbols: Danh sách mã
+            create: Thêm mã chưa có vào bảng symbols
+        
+        Returns:
+            Dict {symbol: id}
+        """
+        symbols = list(symbols)
+        if create:
+            conn.executemany("INSERT OR IGNORE INTO symbols (symbol) VALUES (?)", [(s,) for s in symbols])
+        
+        ids = {}
+        for i in range(0, len(symbols), 500):
+            chunk = symbols[i:i + 500]
+            ids.update(conn.execute(
+                f"SELECT symbol, id FROM symbols WHERE symbol IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall())
+        return ids
+    
+    def _price_rows(self, symbol_id, stock_data):
+        """Chuyển DataFrame giá thành list tuple (ngày và giá số nguyên) để ghi bằng executemany"""
+        days = stock_data.index.values.astype('datetime64[D]').astype(np.int64).tolist()
+        prices = [
+            [None if math.isnan(v) else int(v) for v in np.round(stock_data[col].to_numpy(dtype=float) * PRICE_SCALE)]
+            for col in SCALED_FIELDS
+        ]
+        volumes = [None if pd.isna(v) else int(v) for v in stock_data['volume'].tolist()]
+        
+        return [
+            (symbol_id, day, o, h, l, c, v)
+            for day, o, h, l, c, v in zip(days, *prices, volumes)
+        ]
+    
+    def upsert_stock_data(self, frames):
+        """
+        Ghi (insert hoặc update) dữ liệu giá của nhiều mã trong một transaction
+        
+        Args:
+            frames: Dict {symbol: DataFrame} hoặc list tuple (symbol, DataFrame)
+        
+        Returns:
+            Tổng số records đã ghi
+        """
+        items = frames.items() if isinstance(frames, dict) else frames
+        items = [(symbol, df) for symbol, df in items if df is not None and not df.empty]
+        if not items:
+            return 0
+        
+        with self.db.writer() as conn:
+            ids = self._symbol_ids(conn, {symbol for symbol, _ in items}, create=True)
             
-            if stock_data is None or stock_data.empty:
-                print(f"No data for {symbol}")
-                return False
+            rows = []
+            for symbol, stock_data in items:
+                rows.extend(self._price_rows(ids[symbol], stock_data))
             
-            # Lưu vào database
-            conn = sqlite3.connect(self.db_path)
+            conn.executemany('''
+                INSERT INTO price_bar (symbol_id, day, open, high, low, close, volume)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(symbol_id, day) DO UPDATE SET
+                    open = excluded.open,
+                    high = excluded.high,
+                    low = excluded.low,
+                    close = excluded.close,
+                    volume = excluded.volume
+            ''', rows)
             
-            # Chuẩn bị dữ liệu
-            stock_data_copy = stock_data.copy()
-            stock_data_copy['symbol'] = symbol
-            stock_data_copy['date'] = stock_data_copy.index.strftime('%Y-%m-%d')
+            self._refresh_latest_bars(conn, {symbol for symbol, _ in items})
+            version = self._bump_price_version(conn)
             
-            # Lưu dữ liệu giá
-            stock_data_copy[['symbol', 'date', 'open', 'high', 'low', 'close', 'volume']].to_sql(
-                'stock_price', conn, if_exists='append', index=False
+            # Ghi đè phiên cũ (ví dụ full update) làm trạng thái chỉ báo không còn đúng
+            first_dates = {}
+            for symbol, stock_data in items:
+                first = stock_data.index.min().strftime('%Y-%m-%d')
+                first_dates[symbol] = min(first_dates.get(symbol, first), first)
+            conn.executemany(
+                "DELETE FROM indicator_state WHERE symbol = ? AND last_date >= ?",
+                list(first_dates.items())
+            )
+            # ... và snapshot thị trường (lợi nhuận, vùng giá 52 tuần, điểm) dù không có phiên mới
+            conn.executemany(
+                "DELETE FROM market_snapshot WHERE symbol = ? AND data_date >= ?",
+                list(first_dates.items())
             )
             
-            conn.commit()
-            conn.close()
+            # Ghi kho dạng cột trong cùng khóa ghi của SQLite (một writer giữa các process),
+            # với giá đã làm tròn như trong price_bar
+            if self.columnar is not None:
+                self.columnar.write([
+                    (symbol, stock_data.assign(**{c: stock_data[c].astype(float).round(4) for c in SCALED_FIELDS}))
+                    for symbol, stock_data in items
+                ], version=version)
+        
+        return len(rows)
+    
+    def _refresh_latest_bars(self, conn, symbols=None):
+        """
+        Tính lại bảng latest_bar cho các mã (gọi trong transaction ghi)
+        
+        Args:
+            conn: Kết nối writer đang mở transaction
+            symbols: Danh sách mã cần tính lại (None = tất cả)
+        """
+        if symbols is None:
+            symbols = [row[0] for row in conn.execute(
+                "SELECT symbol FROM symbols s WHERE EXISTS (SELECT 1 FROM price_bar b WHERE b.symbol_id = s.id)"
+            )]
+            conn.execute("DELETE FROM latest_bar")
+        
+        ids = self._symbol_ids(conn, symbols)
+        rows = []
+        for symbol in symbols:
+            # 252 phiên gần nhất (~52 tuần), đọc theo primary key (symbol_id, day)
+            bars = conn.execute('''
+                SELECT day, high, low, close, volume FROM price_bar
+                WHERE symbol_id = ? ORDER BY day DESC LIMIT 252
+            ''', (ids.get(symbol, -1),)).fetchall()
             
-            print(f"Cached {len(stock_data)} records for {symbol}")
+            if not bars:
+                conn.execute("DELETE FROM latest_bar WHERE symbol = ?", (symbol,))
+                continue
+            
+            day, _, _, close, volume = bars[0]
+            prev_close = bars[1][3] if len(bars) > 1 else None
+            volumes_20 = [bar[4] for bar in bars[:20] if bar[4] is not None]
+            highs = [bar[1] for bar in bars if bar[1] is not None]
+            lows = [bar[2] for bar in bars if bar[2] is not None]
+            
+            rows.append((
+                symbol, _from_day(day),
+                close / PRICE_SCALE if close is not None else None,
+                volume,
+                prev_close / PRICE_SCALE if prev_close is not None else None,
+                sum(volumes_20) / len(volumes_20) if volumes_20 else None,
+                max(highs) / PRICE_SCALE if highs else None,
+                min(lows) / PRICE_SCALE if lows else None
+            ))
+        
+        conn.executemany('''
+            INSERT OR REPLACE INTO latest_bar
+            (symbol, date, close, volume, prev_close, avg_volume_20, high_52w, low_52w)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+    
+    def _save_stock_data(self, symbol, stock_data):
+        """Ghi dữ liệu giá của một mã vào database"""
+        self.upsert_stock_data({symbol: stock_data})
+        print(f"Cached {len(stock_data)} records for {symbol}")
+        self.update_indicator_states([symbol])
+    
+    def cache_stock_data(self, symbol, force_full_update=False):
+        """
+        Cache dữ liệu một mã cổ phiếu
+        
+        Args:
+            symbol: Mã chứng khoán
+            force_full_update: Có cập nhật toàn bộ dữ liệu không
+        """
+        try:
+            # Gọi trực tiếp cho một mã: thử lại cả khi mã đang trong negative cache
+            task = next(UpdatePlanner(self).plan([symbol], force_full_update, retry_failed=True).itertuples())
+            started = time.perf_counter()
+            status, stock_data = self._fetch_stock_data(task)
+            if status == 'up_to_date':
+                return True
+            if status == 'no_data':
+                error = self.data_fetcher.last_errors.pop(symbol, 'NoData')
+                self.record_fetch_failures({symbol: (error, time.perf_counter() - started)})
+                return False
+            
+            self._save_stock_data(symbol, stock_data)
+            self.clear_fetch_failures([symbol])
             return True
             
         except Exception as e:
             print(f"Error caching {symbol}: {str(e)[:100]}")
             return False
     
-    def bulk_cache_update(self, symbols_list=None, max_symbols=None, progress_callback=None):
+    def bulk_cache_update(self, symbols_list=None, max_symbols=None, progress_callback=None,
+                          max_workers=None, requests_per_second=None, burst=None, force_full_update=False,
+                          retry_failed=False, job_id=None, process_pool=None):
         """
-        Cập nhật cache hàng loạt
+        Cập nhật cache hàng loạt, lấy dữ liệu song song với rate limit token bucket
         
         Args:
             symbols_list: Danh sách mã cần cập nhật (None = tất cả)
-            max_symbols: Giới hạn số lượng mã
+            max_symbols: Giới hạn số lượng mã (lấy các mã ưu tiên nhất theo UpdateScheduler)
             progress_callback: Callback báo tiến trình
+            max_workers: Số request chạy song song (None = theo config)
+            requests_per_second: Tốc độ request tối đa (None = theo config)
+            burst: Số request tối đa bắn dồn (None = theo config)
+            force_full_update: Lấy lại toàn bộ lịch sử cho mọi mã
+            retry_failed: Thử lại cả các mã trong negative cache chưa đến hạn kiểm tra lại
+            job_id: Job cập nhật (create_update_job) cần ghi trạng thái từng mã; mã chỉ được đánh dấu
+                    'done' sau khi dữ liệu đã ghi vào database
+            process_pool: FetchProcessPool lấy dữ liệu bằng nhiều process thay cho luồng (max_workers bị bỏ qua,
+                          requests_per_second / burst áp dụng cho bucket chung của mọi process)
         """
-        if symbols_list is None:
+        whole_market = symbols_list is None
+        if whole_market:
             # Lấy tất cả mã từ thị trường
             all_stocks = self.get_all_symbols()
             if all_stocks.empty:
                 print("No symbols found")
-                return
+                return 0
             
             # Cập nhật thông tin cơ bản
             self.update_stock_info(all_stocks)
             
             symbols_list = all_stocks['symbol'].tolist()
         
-        if max_symbols:
-            symbols_list = symbols_list[:max_symbols]
-        
-        total = len(symbols_list)
-        success_count = 0
+        # Lập kế hoạch cho cả danh sách bằng một truy vấn; mã đã cập nhật không cần gọi API
+        plan_start = time.perf_counter()
+        if max_symbols or whole_market:
+            # Mã cần cập nhật có giá trị giao dịch cao, dữ liệu cũ, đang theo dõi hoặc vừa xem được làm trước;
+            # giới hạn max_symbols dành cho các mã ưu tiên nhất. Kế hoạch lập khi xếp thứ tự được dùng luôn.
+            plan = UpdateScheduler(self).top_plan(
+                symbols_list, max_symbols or len(symbols_list),
+                force_full_update=force_full_update, retry_failed=retry_failed
+            )
+        else:
+            plan = UpdatePlanner(self).plan(symbols_list, force_full_update, retry_failed=retry_failed)
+        plan_ms = (time.perf_counter() - plan_start) * 1000
         
-        print(f"Starting bulk cache update for {total} symbols...")
+        max_workers = max_workers or UPDATE_SETTINGS['MAX_WORKERS']
+        limiter = process_pool.limiter if process_pool else get_shared_limiter()
+        # Tốc độ / burst truyền vào chỉ áp dụng cho lần cập nhật này: bucket dùng chung của process
+        # (cả các lần lấy dữ liệu khác trên app) được trả lại như cũ khi xong
+        overridden = requests_per_second is not None or burst is not None
+        previous_rate, previous_burst = limiter.rate, limiter.burst
+        if overridden:
+            limiter.configure(rate=requests_per_second, burst=burst)
         
-        for idx, symbol in enumerate(symbols_list):
-            try:
-                if progress_callback:
-                    progress_callback(idx + 1, total, f"Caching {symbol}...")
-                
-                success = self.cache_stock_data(symbol)
-                if success:
-                    success_count += 1
+        try:
+            requests_before = limiter.total_acquired
+            totals_before = get_provider_totals()
+            start_time = time.time()
+            
+            tasks = [task for task in plan.itertuples() if not task.skip]
+            total = len(plan)
+            skipped = total - len(tasks)
+            known_failures = plan.loc[plan['mode'] == 'known_failure', 'symbol'].tolist()
+            success_count = skipped - len(known_failures)
+            completed = skipped
+            
+            # Thời gian tiết kiệm nhờ negative cache: mỗi mã bỏ qua tốn trung bình avg_seconds nếu thử lại
+            seconds_saved = 0.0
+            if known_failures:
+                failures = self.get_symbol_failures()
+                seconds_saved = float(failures.loc[failures['symbol'].isin(known_failures), 'avg_seconds'].sum())
+            
+            print(f"Starting bulk cache update for {total} symbols "
+                  f"({len(tasks)} to fetch, {success_count} up to date, {len(known_failures)} known failures "
+                  f"skipped (~{seconds_saved:.0f}s saved), planned in {plan_ms:.1f} ms; "
+                  f"{f'{process_pool.processes} processes' if process_pool else f'{max_workers} workers'}, "
+                  f"{limiter.rate:g} req/s, burst {limiter.burst})...")
+            
+            if job_id:
+                self.mark_job_symbols(job_id, plan.loc[plan['mode'] == 'up_to_date', 'symbol'], 'done')
+                self.mark_job_symbols(job_id, known_failures, 'failed',
+                                      errors={symbol: 'known_failure' for symbol in known_failures})
+                self.mark_job_symbols(job_id, [task.symbol for task in tasks], 'running')
+            
+            # Worker (luồng hoặc process con) chỉ gọi API; ghi database và báo tiến trình ở thread gọi hàm.
+            # Dữ liệu nhiều mã được gom lại và ghi trong một transaction.
+            write_batch_size = UPDATE_SETTINGS['WRITE_BATCH_SIZE']
+            pending_frames = {}
+            recovered = []  # Mã lấy được và đã ghi xong: xóa khỏi negative cache
+            timings = {}
+            
+            def flush_pending():
+                if not pending_frames:
+                    return 0
+                try:
+                    records = self.upsert_stock_data(pending_frames)
+                    print(f"Cached {records} records for {len(pending_frames)} symbols")
+                    flushed = len(pending_frames)
+                    if job_id:
+                        self.mark_job_symbols(job_id, pending_frames, 'done', timings=timings)
+                except Exception as e:
+                    print(f"Error writing batch of {len(pending_frames)} symbols: {str(e)[:100]}")
+                    flushed = 0
+                    if job_id:
+                        self.mark_job_symbols(job_id, pending_frames, 'failed',
+                                              errors={symbol: type(e).__name__ for symbol in pending_frames})
                 
-                # Delay để tránh rate limiting
-                time.sleep(0.5)
+                if flushed:
+                    recovered.extend(pending_frames)
+                    try:
+                        self.update_indicator_states(list(pending_frames))
+                    except Exception as e:
+                        print(f"Error updating indicator state: {str(e)[:100]}")
+                pending_frames.clear()
+                return flushed
+            
+            def mark_failed():
+                if job_id:
+                    self.mark_job_symbols(job_id, failed, 'failed',
+                                          errors={symbol: error for symbol, (error, _) in failed.items()},
+                                          timings={symbol: seconds for symbol, (_, seconds) in failed.items()})
+            
+            def timed_fetch(task):
+                started = time.perf_counter()
+                status, stock_data = self._fetch_stock_data(task)
+                error = self.data_fetcher.last_errors.pop(task.symbol, 'NoData') if status == 'no_data' else None
+                return status, stock_data, time.perf_counter() - started, error, None
+            
+            failed = {}
+            futures = {}
+            # Chế độ process: request chạy ở process con, bộ đếm nhà cung cấp của process này không đổi;
+            # mỗi kết quả mang theo chênh lệch bộ đếm của process con và được cộng lại ở đây
+            worker_totals = dict.fromkeys(TOTAL_COUNTERS, 0)
+            executor = None
+            if process_pool is None:
+                executor = ThreadPoolExecutor(max_workers=max_workers)
+            try:
+                for task in tasks:
+                    future = process_pool.submit(task) if process_pool else executor.submit(timed_fetch, task)
+                    futures[future] = task.symbol
                 
+                for future in as_completed(futures):
+                    symbol = futures[future]
+                    completed += 1
+                    try:
+                        status, stock_data, seconds, error, counters = future.result()
+                        for key, value in (counters or {}).items():
+                            worker_totals[key] += value
+                        timings[symbol] = round(seconds, 3)
+                        if status == 'ok':
+                            pending_frames[symbol] = stock_data
+                        elif status == 'no_data':
+                            failed[symbol] = (error, seconds)
+                    except Exception as e:
+                        print(f"Error processing {symbol}: {str(e)[:100]}")
+                        failed[symbol] = (type(e).__name__, None)
+                    
+                    if len(pending_frames) >= write_batch_size:
+                        success_count += flush_pending()
+                    
+                    if progress_callback:
+                        progress_callback(completed, total, f"Fetched {symbol}")
+            except KeyboardInterrupt:
+                # Ctrl-C: bỏ các request chưa chạy, ghi phần đã lấy được; mã còn lại giữ 'running'
+                # để lần --resume lấy lại
+                for future in futures:
+                    future.cancel()
+                if executor:
+                    executor.shutdown(wait=True, cancel_futures=True)
+                flush_pending()
+                mark_failed()
+                raise
+            finally:
+                if executor:
+                    executor.shutdown(wait=True)
+            
+            success_count += flush_pending()
+            mark_failed()
+            
+            # Cập nhật negative cache: mã lỗi chờ lâu hơn trước khi thử lại, mã lấy được thì xóa
+            try:
+                self.record_fetch_failures(failed)
+                self.clear_fetch_failures(recovered)
             except Exception as e:
-                print(f"Error processing {symbol}: {e}")
+                print(f"Error updating symbol failures: {str(e)[:100]}")
+            
+            elapsed = time.time() - start_time
+            requests_made = limiter.total_acquired - requests_before
+            if process_pool:
+                provider_totals = worker_totals
+            else:
+                totals_after = get_provider_totals()
+                provider_totals = {key: totals_after[key] - totals_before[key] for key in TOTAL_COUNTERS}
+            self.last_update_stats = {
+                'total': total,
+                'success': success_count,
+                'skipped_up_to_date': skipped - len(known_failures),
+                'skipped_known_failures': len(known_failures),
+                'failed': len(failed),
+                'estimated_seconds_saved': round(seconds_saved, 1),
+                # Thống kê chi tiết chỉ có cho nhà cung cấp của process này (rỗng khi lấy bằng process con);
+                # provider_totals là bộ đếm của riêng lần cập nhật này, gồm cả các process con
+                'providers': get_provider_stats() if process_pool is None else {},
+                'provider_totals': provider_totals,
+                'single_flight': get_single_flight().get_stats(),
+                'plan_ms': round(plan_ms, 2),
+                'elapsed_seconds': round(elapsed, 2),
+                'provider_requests': requests_made,
+                'symbols_per_second': round(total / elapsed, 2) if elapsed > 0 else 0.0,
+                'requests_per_second': round(requests_made / elapsed, 2) if elapsed > 0 else 0.0
+            }
+            
+            print(f"Bulk cache completed: {success_count}/{total} successful")
+            print(f"Throughput: {self.last_update_stats['symbols_per_second']} symbols/s, "
+                  f"{requests_made} provider requests ({self.last_update_stats['requests_per_second']} req/s) "
+                  f"in {elapsed:.1f}s")
+            return success_count
+        finally:
+            if overridden:
+                limiter.configure(rate=previous_rate, burst=previous_burst)
+    
+    def load_indicator_states(self, symbols=None):
+        """
+        Đọc trạng thái chỉ báo đã lưu
+        
+        Args:
+            symbols: Danh sách mã (None = tất cả)
+        
+        Returns:
+            Dict {symbol: IndicatorState}; bỏ qua trạng thái tính với tham số khác config hiện tại
+        """
+        conn = self.db.reader()
+        if symbols is None:
+            rows = conn.execute("SELECT symbol, state FROM indicator_state").fetchall()
+        else:
+            symbols = list(symbols)
+            rows = []
+            # Chia nhỏ để không vượt giới hạn số tham số của SQLite
+            for i in range(0, len(symbols), 500):
+                chunk = symbols[i:i + 500]
+                rows.extend(conn.execute(
+                    f"SELECT symbol, state FROM indicator_state WHERE symbol IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall())
+        
+        states = {}
+        for symbol, data in rows:
+            state = IndicatorState.from_dict(json.loads(data))
+            if state.params == TECHNICAL_INDICATORS:
+                states[symbol] = state
+        return states
+    
+    def save_indicator_states(self, states, indicator_frames=None):
+        """
+        Lưu trạng thái chỉ báo (và các dòng chỉ báo mới) của nhiều mã trong một transaction
+        
+        Args:
+            states: Dict {symbol: IndicatorState}
+            indicator_frames: Dict {symbol: DataFrame chỉ báo theo ngày} cần ghi vào technical_indicators
+        """
+        rows = [
+            (symbol, state.last_date, json.dumps(state.to_dict()))
+            for symbol, state in states.items()
+        ]
+        indicator_rows = []
+        for symbol, frame in (indicator_frames or {}).items():
+            indicator_rows.extend(self._indicator_rows(symbol, frame))
+        
+        if not rows and not indicator_rows:
+            return
+        
+        columns = ', '.join(INDICATOR_COLUMNS)
+        placeholders = ', '.join('?' * (len(INDICATOR_COLUMNS) + 2))
+        with self.db.writer() as conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO technical_indicators (symbol, date, {columns}) VALUES ({placeholders})",
+                indicator_rows
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO indicator_state (symbol, last_date, state) VALUES (?, ?, ?)",
+                rows
+            )
+    
+    def _indicator_rows(self, symbol, frame):
+        """Chuyển DataFrame chỉ báo thành list tuple (NaN/inf -> NULL)"""
+        dates = frame.index.strftime('%Y-%m-%d').tolist()
+        values = frame[INDICATOR_COLUMNS].astype(float).values.tolist()
+        return [
+            (symbol, date, *[v if math.isfinite(v) else None for v in row])
+            for date, row in zip(dates, values)
+        ]
+    
+    def update_indicator_states(self, symbols=None):
+        """
+        Tính chỉ báo cho các phiên mới trong cache và lưu vào technical_indicators
+        
+        Mã đã có trạng thái chỉ đọc các phiên sau last_date (O(1) mỗi phiên mới);
+        mã chưa có (hoặc tham số chỉ báo đã đổi) được dựng lại từ toàn bộ lịch sử.
+        
+        Args:
+            symbols: Danh sách mã cần cập nhật (None = tất cả mã trong cache)
+        
+        Returns:
+            Dict {symbol: IndicatorState} của các mã có phiên mới
+        """
+        conn = self.db.reader()
+        if symbols is None:
+            symbols = [row[0] for row in conn.execute("SELECT symbol FROM latest_bar")]
+        
+        states = self.load_indicator_states(symbols)
+        updated = {}
+        indicator_frames = {}
+        
+        # Đọc gộp nhiều mã: mã đã có trạng thái nhóm theo last_date (thường chỉ vài ngày khác nhau),
+        # mã chưa có đọc toàn bộ lịch sử
+        by_last_date = {}
+        for symbol in symbols:
+            key = states[symbol].last_date if symbol in states else None
+            by_last_date.setdefault(key, []).append(symbol)
+        
+        parts = [
+            self.get_cached_data_many(group, start_date=last_date)
+            for last_date, group in by_last_date.items()
+        ]
+        if not parts:
+            return updated
+        
+        for symbol, bars in pd.concat(parts).groupby('symbol', sort=False):
+            state = states.get(symbol) or IndicatorState()
+            new_bars = state.update_frame(bars.set_index('date'))
+            if new_bars.empty:
                 continue
+            
+            indicator_frames[symbol] = new_bars
+            updated[symbol] = state
+        
+        self.save_indicator_states(updated, indicator_frames)
+        return updated
+    
+    def get_indicators(self, symbol, start_date=None, end_date=None):
+        """
+        Lấy chỉ báo kỹ thuật đã tính sẵn từ cache
+        
+        Args:
+            symbol: Mã chứng khoán
+            start_date: Ngày bắt đầu (YYYY-MM-DD)
+            end_date: Ngày kết thúc (YYYY-MM-DD)
+        """
+        query = f"SELECT date, {', '.join(INDICATOR_COLUMNS)} FROM technical_indicators WHERE symbol = ?"
+        params = [symbol]
+        
+        if start_date:
+            query += " AND date >= ?"
+            params.append(start_date)
+        
+        if end_date:
+            query += " AND date <= ?"
+            params.append(end_date)
+        
+        query += " ORDER BY date"
+        
+        df = pd.read_sql_query(query, self.db.reader(), params=params, parse_dates=['date'])
+        return df.set_index('date')
+    
+    def get_stale_snapshot_symbols(self):
+        """
+        Các mã cần tính lại snapshot: chưa có snapshot hoặc có phiên mới hơn data_date
+        
+        Returns:
+            Dict {symbol: ngày phiên mới nhất}
+        """
+        rows = self.db.reader().execute('''
+            SELECT lb.symbol, lb.date
+            FROM latest_bar lb
+            JOIN stock_info si ON si.symbol = lb.symbol
+            LEFT JOIN market_snapshot ms ON ms.symbol = lb.symbol
+            WHERE ms.symbol IS NULL OR ms.data_date <> lb.date
+            ORDER BY lb.symbol
+        ''').fetchall()
+        return dict(rows)
+    
+    def save_market_snapshot(self, rows):
+        """
+        Ghi snapshot của nhiều mã trong một transaction
+        
+        Args:
+            rows: List dict gồm symbol, data_date và các cột trong MARKET_SNAPSHOT_COLUMNS
+        """
+        if not rows:
+            return
+        
+        names = [name for name, _ in MARKET_SNAPSHOT_COLUMNS]
+        computed_at = datetime.now().isoformat()
+        values = []
+        for row in rows:
+            record = [row['symbol'], row['data_date'], computed_at]
+            for name in names:
+                value = row.get(name)
+                if isinstance(value, float) and not math.isfinite(value):
+                    value = None
+                elif hasattr(value, 'item'):
+                    value = value.item()  # numpy scalar -> kiểu Python
+                record.append(value)
+            values.append(record)
+        
+        placeholders = ', '.join('?' * (len(names) + 3))
+        with self.db.writer() as conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO market_snapshot (symbol, data_date, computed_at, {', '.join(names)}) "
+                f"VALUES ({placeholders})",
+                values
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_meta (key, value) "
+                "SELECT 'market_snapshot_date', MAX(data_date) FROM market_snapshot"
+            )
+    
+    def get_market_snapshot(self):
+        """Đọc bảng snapshot thị trường (chỉ các mã đủ dữ liệu để tính)"""
+        names = ', '.join(f"ms.{name}" for name, _ in MARKET_SNAPSHOT_COLUMNS)
+        query = f'''
+            SELECT 
+                ms.symbol,
+                si.name,
+                si.exchange,
+                {names},
+                si.last_update,
+                ms.data_date
+            FROM market_snapshot ms
+            JOIN stock_info si ON si.symbol = ms.symbol
+            WHERE ms.overall_score IS NOT NULL
+            ORDER BY ms.symbol
+        '''
+        return pd.read_sql_query(query, self.db.reader())
+    
+    def save_screen(self, name, expression):
+        """
+        Lưu (hoặc ghi đè) bộ lọc theo tên
+        
+        Args:
+            name: Tên bộ lọc
+            expression: Biểu thức lọc, ví dụ "rsi < 30 and close > sma_200"
+        
+        Raises:
+            ValueError: Biểu thức không hợp lệ
+        """
+        expression = ScreenExpression(expression).text
+        with self.db.writer() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO saved_screens (name, expression, created_at) VALUES (?, ?, ?)",
+                (name, expression, datetime.now().isoformat())
+            )
+    
+    def get_saved_screens(self):
+        """Danh sách bộ lọc đã lưu (DataFrame name, expression, created_at)"""
+        return pd.read_sql_query("SELECT * FROM saved_screens ORDER BY name", self.db.reader())
+    
+    def get_saved_screen(self, name):
+        """Biểu thức của bộ lọc đã lưu (None nếu không có)"""
+        row = self.db.reader().execute(
+            "SELECT expression FROM saved_screens WHERE name = ?", (name,)
+        ).fetchone()
+        return row[0] if row else None
+    
+    def delete_screen(self, name):
+        """Xóa bộ lọc đã lưu"""
+        with self.db.writer() as conn:
+            conn.execute("DELETE FROM saved_screens WHERE name = ?", (name,))
+    
+    def record_fetch_failures(self, failures, now=None):
+        """
+        Ghi nhận các mã lấy dữ liệu thất bại; thời gian chờ thử lại tăng gấp đôi sau mỗi lần lỗi
+        
+        Args:
+            failures: Dict {symbol: (tên lớp lỗi, số giây của lần thử hoặc None)}
+            now: Thời điểm ghi nhận (mặc định bây giờ)
+        """
+        # Nhà cung cấp không trả lời (mạng lỗi, breaker mở) không nói gì về bản thân mã
+        failures = {s: f for s, f in failures.items() if f[0] != ProviderUnavailable.__name__}
+        if not failures:
+            return
+        
+        now = now or datetime.now()
+        base = timedelta(hours=NEGATIVE_CACHE_SETTINGS['BASE_RECHECK_HOURS'])
+        max_interval = timedelta(days=NEGATIVE_CACHE_SETTINGS['MAX_RECHECK_DAYS'])
+        
+        with self.db.writer() as conn:
+            symbols = list(failures)
+            existing = {}
+            for i in range(0, len(symbols), 500):
+                chunk = symbols[i:i + 500]
+                for row in conn.execute(f'''
+                    SELECT symbol, failures, first_failed_at, avg_seconds FROM symbol_failures
+                    WHERE symbol IN ({','.join('?' * len(chunk))})
+                ''', chunk):
+                    existing[row[0]] = row[1:]
+            
+            rows = []
+            for symbol, (error, seconds) in failures.items():
+                count, first_failed_at, avg_seconds = existing.get(symbol, (0, now.isoformat(), None))
+                count += 1
+                if seconds is not None:
+                    avg_seconds = seconds if avg_seconds is None else (avg_seconds * (count - 1) + seconds) / count
+                
+                interval = min(base * 2 ** (count - 1), max_interval)
+                rows.append((
+                    symbol, count, error, first_failed_at, now.isoformat(),
+                    (now + interval).isoformat(), avg_seconds
+                ))
+            
+            conn.executemany('''
+                INSERT OR REPLACE INTO symbol_failures
+                (symbol, failures, last_error, first_failed_at, last_failed_at, next_check_at, avg_seconds)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+    
+    def clear_fetch_failures(self, symbols):
+        """Xóa các mã đã lấy được dữ liệu khỏi negative cache"""
+        symbols = list(symbols)
+        if not symbols:
+            return
+        with self.db.writer() as conn:
+            conn.executemany("DELETE FROM symbol_failures WHERE symbol = ?", [(s,) for s in symbols])
+    
+    def get_symbol_failures(self, due_before=None):
+        """
+        Danh sách mã trong negative cache
+        
+        Args:
+            due_before: Chỉ lấy mã còn bị bỏ qua tại thời điểm này (datetime, None = tất cả)
+        
+        Returns:
+            DataFrame symbol, failures, last_error, first_failed_at, last_failed_at, next_check_at, avg_seconds
+        """
+        query = "SELECT * FROM symbol_failures"
+        params = ()
+        if due_before is not None:
+            query += " WHERE next_check_at > ?"
+            params = (due_before.isoformat(),)
+        return pd.read_sql_query(query + " ORDER BY failures DESC, symbol", self.db.reader(), params=params)
+    
+    def create_update_job(self, kind, symbols, params=None):
+        """
+        Tạo job cập nhật với mọi mã ở trạng thái 'pending'
+        
+        Args:
+            kind: Loại job ('full', 'gradual', ...), dùng làm tiền tố job id
+            symbols: Danh sách mã theo thứ tự sẽ cập nhật
+            params: Dict tham số chạy (lưu để tham khảo)
+        
+        Returns:
+            job id, ví dụ 'full-20240614-153000'
+        """
+        symbols = list(dict.fromkeys(symbols))
+        now = datetime.now()
+        base_id = f"{kind}-{now.strftime('%Y%m%d-%H%M%S')}"
+        
+        with self.db.writer() as conn:
+            job_id, suffix = base_id, 1
+            while conn.execute("SELECT 1 FROM update_jobs WHERE job_id = ?", (job_id,)).fetchone():
+                suffix += 1
+                job_id = f"{base_id}-{suffix}"
+            
+            conn.execute('''
+                INSERT INTO update_jobs (job_id, kind, status, params, total, created_at, updated_at)
+                VALUES (?, ?, 'running', ?, ?, ?, ?)
+            ''', (job_id, kind, json.dumps(params or {}), len(symbols), now.isoformat(), now.isoformat()))
+            conn.executemany(
+                "INSERT INTO update_job_items (job_id, symbol, position, state) VALUES (?, ?, ?, 'pending')",
+                [(job_id, symbol, i) for i, symbol in enumerate(symbols)]
+            )
+        return job_id
+    
+    def get_update_job(self, job_id):
+        """
+        Thông tin một job và số mã theo trạng thái
+        
+        Returns:
+            Dict job_id, kind, status, params, total, created_at, updated_at, finished_at,
+            pending, running, done, failed; None nếu không có job
+        """
+        conn = self.db.reader()
+        row = conn.execute("SELECT * FROM update_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        
+        columns = ['job_id', 'kind', 'status', 'params', 'total', 'created_at', 'updated_at', 'finished_at']
+        job = dict(zip(columns, row))
+        job['params'] = json.loads(job['params'] or '{}')
+        job.update({state: 0 for state in JOB_STATES})
+        job.update(conn.execute(
+            "SELECT state, COUNT(*) FROM update_job_items WHERE job_id = ? GROUP BY state", (job_id,)
+        ).fetchall())
+        return job
+    
+    def get_update_jobs(self, limit=20):
+        """Các job gần nhất (DataFrame job_id, kind, status, total, done, failed, remaining, created_at, updated_at)"""
+        return pd.read_sql_query('''
+            SELECT j.job_id, j.kind, j.status, j.total,
+                   SUM(i.state = 'done') AS done,
+                   SUM(i.state = 'failed') AS failed,
+                   SUM(i.state IN ('pending', 'running')) AS remaining,
+                   j.created_at, j.updated_at
+            FROM update_jobs j
+            LEFT JOIN update_job_items i ON i.job_id = j.job_id
+            GROUP BY j.job_id
+            ORDER BY j.created_at DESC
+            LIMIT ?
+        ''', self.db.reader(), params=(limit,))
+    
+    def get_job_symbols(self, job_id, states=('pending', 'running')):
+        """
+        Các mã của job đang ở một trong các trạng thái, theo thứ tự ban đầu
+        
+        Mặc định lấy các mã chưa xong: 'running' là mã đang lấy dở khi process dừng
+        (dữ liệu chưa được ghi), cần lấy lại.
+        """
+        states = list(states)
+        rows = self.db.reader().execute(f'''
+            SELECT symbol FROM update_job_items
+            WHERE job_id = ? AND state IN ({','.join('?' * len(states))})
+            ORDER BY position
+        ''', [job_id, *states]).fetchall()
+        return [row[0] for row in rows]
+    
+    def mark_job_symbols(self, job_id, symbols, state, errors=None, timings=None):
+        """
+        Chuyển trạng thái các mã trong job
+        
+        Args:
+            job_id: Job id
+            symbols: Danh sách mã
+            state: 'running' (tăng số lần thử), 'done', 'failed' hoặc 'pending'
+            errors: Dict {symbol: tên lớp lỗi} cho mã 'failed'
+            timings: Dict {symbol: số giây lấy dữ liệu}
+        """
+        symbols = list(symbols)
+        if not symbols:
+            return
+        if state not in JOB_STATES:
+            raise ValueError(f"Trạng thái không hợp lệ: {state}")
+        
+        errors = errors or {}
+        timings = timings or {}
+        now = datetime.now().isoformat()
+        with self.db.writer() as conn:
+            if state == 'running':
+                conn.executemany('''
+                    UPDATE update_job_items SET state = 'running', attempts = attempts + 1,
+                        started_at = ?, finished_at = NULL, error = NULL
+                    WHERE job_id = ? AND symbol = ?
+                ''', [(now, job_id, symbol) for symbol in symbols])
+            else:
+                finished_at = now if state in ('done', 'failed') else None
+                conn.executemany('''
+                    UPDATE update_job_items SET state = ?, finished_at = ?, seconds = ?, error = ?
+                    WHERE job_id = ? AND symbol = ?
+                ''', [(state, finished_at, timings.get(symbol), errors.get(symbol), job_id, symbol)
+                      for symbol in symbols])
+            conn.execute("UPDATE update_jobs SET updated_at = ? WHERE job_id = ?", (now, job_id))
+    
+    def finish_update_job(self, job_id, status=None):
+        """
+        Đóng job: 'done' nếu không còn mã chưa xong, ngược lại 'interrupted' (có thể --resume)
+        
+        Args:
+            status: Ghi đè trạng thái (ví dụ 'interrupted' khi người dùng dừng giữa chừng)
+        """
+        job = self.get_update_job(job_id)
+        if job is None:
+            return None
+        if status is None:
+            status = 'done' if job['pending'] + job['running'] == 0 else 'interrupted'
+        
+        now = datetime.now().isoformat()
+        with self.db.writer() as conn:
+            conn.execute(
+                "UPDATE update_jobs SET status = ?, updated_at = ?, finished_at = ? WHERE job_id = ?",
+                (status, now, now if status == 'done' else None, job_id)
+            )
+        return status
+    
+    def enqueue_update(self, kind='market', params=None, scheduled_for=None):
+        """
+        Thêm yêu cầu cập nhật vào hàng đợi của daemon
+        
+        Args:
+            kind: Loại yêu cầu ('market' từ app/CLI, 'scheduled' do daemon tự xếp lịch), dùng làm tiền tố job id
+            params: Dict tham số (symbols, max_symbols, batch_size, delay_between_batches, force_full_update, ...)
+            scheduled_for: Khung giờ của lần cập nhật theo lịch (ví dụ '2024-06-14 15:30'); mỗi khung chỉ thêm một lần
         
-        print(f"Bulk cache completed: {success_count}/{total} successful")
-        return success_count
+        Returns:
+            request id; nếu đã có yêu cầu cùng loại đang chờ/đang chạy (hoặc cùng khung giờ) thì trả về id đó
+        """
+        now = datetime.now().isoformat()
+        with self.db.writer() as conn:
+            if scheduled_for is not None:
+                row = conn.execute(
+                    "SELECT request_id FROM update_queue WHERE scheduled_for = ?", (scheduled_for,)
+                ).fetchone()
+            else:
+                row = conn.execute('''
+                    SELECT request_id FROM update_queue
+                    WHERE kind = ? AND status IN ('queued', 'running', 'cancelling')
+                    ORDER BY request_id LIMIT 1
+                ''', (kind,)).fetchone()
+            if row:
+                return row[0]
+            
+            cursor = conn.execute('''
+                INSERT INTO update_queue (kind, params, status, scheduled_for, requested_at)
+                VALUES (?, ?, 'queued', ?, ?)
+            ''', (kind, json.dumps(params or {}), scheduled_for, now))
+            return cursor.lastrowid
+    
+    def _update_request_row(self, row):
+        """Chuyển một dòng update_queue thành dict"""
+        if row is None:
+            return None
+        request = dict(zip(UPDATE_QUEUE_COLUMNS, row))
+        request['params'] = json.loads(request['params'] or '{}')
+        return request
+    
+    def claim_next_update(self):
+        """
+        Nhận yêu cầu đang chờ lâu nhất ('queued' -> 'running') trong một transaction ghi,
+        nên hai daemon chạy cùng lúc không nhận trùng một yêu cầu
+        
+        Returns:
+            Dict các cột UPDATE_QUEUE_COLUMNS (params đã giải mã JSON), None nếu hàng đợi trống
+        """
+        with self.db.writer() as conn:
+            row = conn.execute(f'''
+                SELECT {', '.join(UPDATE_QUEUE_COLUMNS)} FROM update_queue
+                WHERE status = 'queued' ORDER BY request_id LIMIT 1
+            ''').fetchone()
+            request = self._update_request_row(row)
+            if request is None:
+                return None
+            
+            request['status'] = 'running'
+            request['started_at'] = request['started_at'] or datetime.now().isoformat()
+            conn.execute(
+                "UPDATE update_queue SET status = 'running', started_at = ? WHERE request_id = ?",
+                (request['started_at'], request['request_id'])
+            )
+        return request
+    
+    def get_update_request(self, request_id):
+        """Một yêu cầu trong hàng đợi (dict, None nếu không có)"""
+        row = self.db.reader().execute(
+            f"SELECT {', '.join(UPDATE_QUEUE_COLUMNS)} FROM update_queue WHERE request_id = ?", (request_id,)
+        ).fetchone()
+        return self._update_request_row(row)
+    
+    def get_update_queue(self, limit=20):
+        """Các yêu cầu gần nhất (DataFrame các cột UPDATE_QUEUE_COLUMNS, mới nhất trước)"""
+        return pd.read_sql_query(
+            f"SELECT {', '.join(UPDATE_QUEUE_COLUMNS)} FROM update_queue ORDER BY request_id DESC LIMIT ?",
+            self.db.reader(), params=(limit,)
+        )
+    
+    def set_update_request_job(self, request_id, job_id):
+        """Gắn job cập nhật (tiến độ từng mã) vào yêu cầu đang chạy"""
+        with self.db.writer() as conn:
+            conn.execute("UPDATE update_queue SET job_id = ? WHERE request_id = ?", (job_id, request_id))
+    
+    def finish_update_request(self, request_id, status, error=None):
+        """
+        Đóng yêu cầu
+        
+        Args:
+            status: 'done', 'failed', 'cancelled' hoặc 'queued' (trả lại hàng đợi để chạy tiếp sau)
+            error: Thông báo lỗi khi 'failed'
+        """
+        if status not in UPDATE_QUEUE_STATES:
+            raise ValueError(f"Trạng thái không hợp lệ: {status}")
+        finished_at = datetime.now().isoformat() if status in ('done', 'failed', 'cancelled') else None
+        with self.db.writer() as conn:
+            conn.execute(
+                "UPDATE update_queue SET status = ?, finished_at = ?, error = ? WHERE request_id = ?",
+                (status, finished_at, error, request_id)
+            )
+    
+    def cancel_update_request(self, request_id):
+        """
+        Hủy yêu cầu: yêu cầu đang chờ bị hủy ngay, yêu cầu đang chạy chuyển 'cancelling'
+        để daemon dừng sau batch hiện tại
+        
+        Returns:
+            Trạng thái mới, None nếu yêu cầu đã kết thúc hoặc không tồn tại
+        """
+        with self.db.writer() as conn:
+            row = conn.execute("SELECT status FROM update_queue WHERE request_id = ?", (request_id,)).fetchone()
+            if row is None or row[0] not in ('queued', 'running'):
+                return None
+            
+            if row[0] == 'queued':
+                conn.execute(
+                    "UPDATE update_queue SET status = 'cancelled', finished_at = ? WHERE request_id = ?",
+                    (datetime.now().isoformat(), request_id)
+                )
+                return 'cancelled'
+            conn.execute("UPDATE update_queue SET status = 'cancelling' WHERE request_id = ?", (request_id,))
+            return 'cancelling'
+    
+    def requeue_running_updates(self):
+        """
+        Khi daemon khởi động: yêu cầu 'running' còn sót lại (process trước bị tắt) được trả lại hàng đợi
+        và sẽ tiếp tục job cũ; yêu cầu đang chờ hủy thì đóng luôn
+        
+        Returns:
+            Số yêu cầu được trả lại hàng đợi
+        """
+        with self.db.writer() as conn:
+            conn.execute(
+                "UPDATE update_queue SET status = 'cancelled', finished_at = ? WHERE status = 'cancelling'",
+                (datetime.now().isoformat(),)
+            )
+            return conn.execute("UPDATE update_queue SET status = 'queued' WHERE status = 'running'").rowcount
+    
+    def set_daemon_status(self, state, message=None, request_id=None, job_id=None, name='updater', started=False):
+        """
+        Ghi heartbeat và trạng thái hiện tại của daemon
+        
+        Args:
+            state: 'idle', 'running', 'sleeping' hoặc 'stopped'
+            message: Dòng tiến độ (batch, throughput, ETA...)
+            request_id, job_id: Yêu cầu và job đang chạy
+            started: True khi daemon vừa khởi động (ghi lại pid và started_at)
+        """
+        now = datetime.now().isoformat()
+        with self.db.writer() as conn:
+            conn.execute(
+                f"INSERT OR {'REPLACE' if started else 'IGNORE'} INTO daemon_status (name, pid, started_at) "
+                "VALUES (?, ?, ?)", (name, os.getpid(), now)
+            )
+            conn.execute('''
+                UPDATE daemon_status SET state = ?, message = ?, request_id = ?, job_id = ?, heartbeat_at = ?
+                WHERE name = ?
+            ''', (state, message, request_id, job_id, now, name))
+    
+    def get_daemon_status(self, name='updater', now=None, stale_seconds=None):
+        """
+        Trạng thái daemon đọc từ SQLite (mọi session app đều xem được)
+        
+        Returns:
+            Dict name, pid, state, message, request_id, job_id, started_at, heartbeat_at và alive
+            (heartbeat chưa quá stale_seconds, mặc định DAEMON_SETTINGS); None nếu daemon chưa từng chạy
+        """
+        row = self.db.reader().execute('''
+            SELECT name, pid, state, message, request_id, job_id, started_at, heartbeat_at
+            FROM daemon_status WHERE name = ?
+        ''', (name,)).fetchone()
+        if row is None:
+            return None
+        
+        status = dict(zip(['name', 'pid', 'state', 'message', 'request_id', 'job_id', 'started_at', 'heartbeat_at'], row))
+        stale_seconds = stale_seconds or DAEMON_SETTINGS['HEARTBEAT_STALE_SECONDS']
+        age = ((now or datetime.now()) - datetime.fromisoformat(status['heartbeat_at'])).total_seconds()
+        status['alive'] = status['state'] != 'stopped' and age <= stale_seconds
+        return status
+    
+    def add_to_watchlist(self, symbols):
+        """Thêm mã vào danh sách theo dõi"""
+        now = datetime.now().isoformat()
+        with self.db.writer() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO watchlist (symbol, added_at) VALUES (?, ?)",
+                [(symbol.upper(), now) for symbol in symbols]
+            )
+    
+    def remove_from_watchlist(self, symbols):
+        """Bỏ mã khỏi danh sách theo dõi"""
+        with self.db.writer() as conn:
+            conn.executemany("DELETE FROM watchlist WHERE symbol = ?", [(symbol.upper(),) for symbol in symbols])
+    
+    def get_watchlist(self):
+        """Danh sách mã đang theo dõi"""
+        return [row[0] for row in self.db.reader().execute("SELECT symbol FROM watchlist ORDER BY symbol")]
+    
+    def record_symbol_view(self, symbol, now=None):
+        """Ghi nhận một lượt xem mã trên app"""
+        now = (now or datetime.now()).isoformat()
+        with self.db.writer() as conn:
+            conn.execute('''
+                INSERT INTO symbol_views (symbol, views, last_viewed_at) VALUES (?, 1, ?)
+                ON CONFLICT(symbol) DO UPDATE SET views = views + 1, last_viewed_at = excluded.last_viewed_at
+            ''', (symbol.upper(), now))
+    
+    def get_symbol_views(self):
+        """Lượt xem theo mã (DataFrame symbol, views, last_viewed_at)"""
+        return pd.read_sql_query(
+            "SELECT * FROM symbol_views ORDER BY last_viewed_at DESC", self.db.reader()
+        )
+    
+    def get_traded_values(self):
+        """
+        Giá trị giao dịch trung bình của mỗi mã trong cache (giá đóng cửa gần nhất x khối lượng TB 20 phiên)
+        
+        Returns:
+            DataFrame symbol, traded_value
+        """
+        return pd.read_sql_query(
+            "SELECT symbol, close * avg_volume_20 AS traded_value FROM latest_bar", self.db.reader()
+        )
     
     def get_market_overview(self):
         """Tạo bảng tổng quan thị trường"""
-        conn = sqlite3.connect(self.db_path)
-        
-        # Lấy dữ liệu mới nhất của tất cả mã
+        # Lấy dữ liệu mới nhất của tất cả mã từ bảng latest_bar
         query = '''
             SELECT 
                 si.symbol,
                 si.name,
                 si.exchange,
-                sp.close as current_price,
-                sp.volume,
-                sp.date as last_update
-            FROM stock_info si
-            LEFT JOIN (
-                SELECT symbol, close, volume, date,
-                       ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY date DESC) as rn
-                FROM stock_price
-            ) sp ON si.symbol = sp.symbol AND sp.rn = 1
-            WHERE sp.close IS NOT NULL
+                lb.close as current_price,
+                lb.volume,
+                lb.date as last_update,
+                lb.prev_close,
+                lb.avg_volume_20,
+                lb.high_52w,
+                lb.low_52w
+            FROM latest_bar lb
+            JOIN stock_info si ON si.symbol = lb.symbol
+            WHERE lb.close IS NOT NULL
             ORDER BY si.exchange, si.symbol
         '''
         
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        
-        return df
+        return pd.read_sql_query(query, self.db.reader())
     
     def get_stock_with_indicators(self, symbol, period_days=365):
         """
@@ -313,16 +1809,15 @@ class DataCache:
         """
         start_date = (datetime.now() - timedelta(days=period_days)).strftime('%Y-%m-%d')
         
-        # Lấy dữ liệu từ cache
+        # Lấy dữ liệu từ cache, kèm chỉ báo đã tính sẵn (nếu có)
         df = self.get_cached_data(symbol, start_date=start_date)
+        if not df.empty:
+            df = df.join(self.get_indicators(symbol, start_date=start_date))
         
         if df.empty:
             print(f"No cached data for {symbol}, fetching from API...")
-            # Fallback: lấy từ API
-            df = self.data_fetcher.get_stock_data(symbol, f"{period_days}D")
-            if df is not None and not df.empty:
-                # Cache lại
-                self.cache_stock_data(symbol)
+            # Fallback: lấy từ API qua read-through (tự ghi lại vào cache)
+            df = DataFetcher(cache=self).get_stock_data(symbol, start_date=start_date)
         
         return df
     
@@ -330,43 +1825,61 @@ class DataCache:
         """Xóa dữ liệu cũ để tiết kiệm dung lượng"""
         cutoff_date = (datetime.now() - timedelta(days=days_to_keep)).strftime('%Y-%m-%d')
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("DELETE FROM stock_price WHERE date < ?", (cutoff_date,))
-        cursor.execute("DELETE FROM technical_indicators WHERE date < ?", (cutoff_date,))
-        
-        deleted_count = cursor.rowcount
-        conn.commit()
-        conn.close()
+        with self.db.writer() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM price_bar WHERE day < ?", (_to_day(cutoff_date),))
+            self._bump_price_version(conn)
+            cursor.execute("DELETE FROM technical_indicators WHERE date < ?", (cutoff_date,))
+            
+            deleted_count = cursor.rowcount
+            
+            # Lịch sử bị cắt nên trạng thái chỉ báo phải dựng lại từ dữ liệu còn lại
+            cursor.execute("DELETE FROM indicator_state")
+            
+            # Khoảng 52 tuần có thể bị cắt bớt
+            self._refresh_latest_bars(conn)
+            
+            if self.columnar is not None:
+                self._rebuild_columnar(conn)
         
         print(f"Cleaned up {deleted_count} old records before {cutoff_date}")
         return deleted_count
     
     def get_cache_stats(self):
         """Thống kê cache"""
-        conn = sqlite3.connect(self.db_path)
-        
         stats = {}
         
         # Số lượng mã cổ phiếu
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(DISTINCT symbol) FROM stock_price")
+        cursor = self.db.reader().cursor()
+        cursor.execute("SELECT COUNT(*) FROM latest_bar")
         stats['total_symbols'] = cursor.fetchone()[0]
         
         # Tổng số records
-        cursor.execute("SELECT COUNT(*) FROM stock_price")
+        cursor.execute("SELECT COUNT(*) FROM price_bar")
         stats['total_records'] = cursor.fetchone()[0]
         
         # Ngày cũ nhất và mới nhất
-        cursor.execute("SELECT MIN(date), MAX(date) FROM stock_price")
+        cursor.execute("SELECT MIN(day), MAX(day) FROM price_bar")
         result = cursor.fetchone()
-        stats['date_range'] = f"{result[0]} to {result[1]}"
+        if result[0] is not None:
+            stats['date_range'] = f"{_from_day(result[0])} to {_from_day(result[1])}"
+        else:
+            stats['date_range'] = "None to None"
+        
+        # Kích thước database (gồm cả file WAL)
+        stats['db_size_mb'] = self._db_size_mb()
+        stats['schema_version'] = SCHEMA_VERSION
+        if stats['total_records']:
+            stats['bytes_per_record'] = round(stats['db_size_mb'] * 1024 * 1024 / stats['total_records'], 1)
         
-        # Kích thước database
-        stats['db_size_mb'] = round(os.path.getsize(self.db_path) / (1024*1024), 2)
+        # Mã trong negative cache (đang bị bỏ qua khi bulk update)
+        stats['known_failures'] = cursor.execute(
+            "SELECT COUNT(*) FROM symbol_failures WHERE next_check_at > ?", (datetime.now().isoformat(),)
+        ).fetchone()[0]
         
-        conn.close()
+        # Kết quả so sánh kích thước/tốc độ khi chuyển từ schema cũ (nếu có)
+        row = cursor.execute("SELECT value FROM cache_meta WHERE key = 'schema_migration'").fetchone()
+        if row:
+            stats['schema_migration'] = json.loads(row[0])
         
         return stats
-
@@ -5,126 +5,234 @@ Module lấy dữ liệu từ vnstock
 from vnstock import Quote, Listing, Company
 import pandas as pd
 from datetime import datetime, timedelta
-import streamlit as st
+from providers import get_provider_chain, ProviderError, NoDataError
+from trading_calendar import get_trading_calendar
+from single_flight import get_single_flight
+from fetch_cache import cached
+
+# Số ngày tương ứng với từng khung thời gian
+PERIOD_DAYS = {'1M': 30, '3M': 90, '6M': 180, '1Y': 365, '3Y': 1095, '5Y': 1825}
+
+# Cache bắt đầu muộn hơn ngày yêu cầu quá số phiên giao dịch này thì coi như thiếu phần đầu
+# (bỏ qua vài phiên lệch do ngày niêm yết hoặc tạm ngừng giao dịch)
+HEAD_GAP_SESSIONS = 5
+
+def _vnstock_quote(symbol):
+    """Tạo vnstock Quote (tra cứu Quote lúc gọi để test có thể thay thế)"""
+    return Quote(symbol=symbol)
+
+def _to_datetime(value):
+    """Chuyển chuỗi YYYY-MM-DD/Timestamp/datetime thành datetime"""
+    return pd.Timestamp(value).to_pydatetime()
 
 class DataFetcher:
-    def __init__(self):
+    def __init__(self, cache=None):
+        """
+        Khởi tạo DataFetcher
+        
+        Args:
+            cache: DataCache dùng làm read-through cache cho dữ liệu ngày
+                   (None = luôn lấy toàn bộ khoảng từ API)
+        """
         # Không khởi tạo Company và Listing ở đây vì chúng cần symbol
-        pass
+        self.cache = cache
+        
+        # Tên lớp lỗi của lần lấy dữ liệu thất bại gần nhất theo mã (cho negative cache)
+        self.last_errors = {}
+        
+        # Chuỗi nhà cung cấp dùng chung trong process (circuit breaker, thống kê sức khỏe)
+        self.providers = get_provider_chain(_vnstock_quote)
     
-    @st.cache_data(ttl=3600)  # Cache trong 1 giờ
+    @cached('stock_data')
     def get_stock_data(_self, symbol, period='1Y', resolution='1D', start_date=None, end_date=None):
         """
         Lấy dữ liệu lịch sử giá cổ phiếu
         
         Args:
             symbol: Mã chứng khoán
-            period: Khoảng thời gian (1M, 3M, 6M, 1Y, 3Y, 5Y)
+            period: Khoảng thời gian (1M, 3M, 6M, 1Y, 3Y, 5Y hoặc số ngày dạng '365D')
             resolution: Độ phân giải (1D, 1W, 1M)
+            start_date: Ngày bắt đầu (YYYY-MM-DD, ưu tiên hơn period)
+            end_date: Ngày kết thúc (YYYY-MM-DD, mặc định hôm nay)
         """
+        _self.last_errors.pop(symbol, None)
         try:
             # Tính toán ngày bắt đầu và kết thúc
-            end_date = datetime.now()
+            end_date = _to_datetime(end_date) if end_date else datetime.now()
             
-            if period == '1M':
-                start_date = end_date - timedelta(days=30)
-            elif period == '3M':
-                start_date = end_date - timedelta(days=90)
-            elif period == '6M':
-                start_date = end_date - timedelta(days=180)
-            elif period == '1Y':
-                start_date = end_date - timedelta(days=365)
-            elif period == '3Y':
-                start_date = end_date - timedelta(days=1095)
-            elif period == '5Y':
-                start_date = end_date - timedelta(days=1825)
+            if start_date:
+                start_date = _to_datetime(start_date)
+            elif period in PERIOD_DAYS:
+                start_date = end_date - timedelta(days=PERIOD_DAYS[period])
+            elif str(period).endswith('D') and str(period)[:-1].isdigit():
+                start_date = end_date - timedelta(days=int(period[:-1]))
             else:
                 start_date = end_date - timedelta(days=365)
             
-            # Lấy dữ liệu bằng vnstock - Quote cần symbol khi khởi tạo
-            try:
-                import time
-                quote = Quote(symbol=symbol)
-                
-                # Thử với retry logic
-                max_retries = 3
-                for attempt in range(max_retries):
-                    try:
-                        df = quote.history(
-                            start=start_date.strftime('%Y-%m-%d'),
-                            end=end_date.strftime('%Y-%m-%d'),
-                            interval=resolution
-                        )
-                        break  # Thành công, thoát vòng lặp
-                    except Exception as retry_error:
-                        if attempt < max_retries - 1:
-                            time.sleep(1)  # Đợi 1 giây trước khi thử lại
-                            continue
-                        else:
-                            raise retry_error
-                
-                if df is not None and not df.empty:
-                    # Chuẩn hóa tên cột
-                    df.columns = df.columns.str.lower()
-                    
-                    # Đảm bảo có cột time hoặc dùng index
-                    if 'time' in df.columns:
-                        df['time'] = pd.to_datetime(df['time'])
-                        df = df.sort_values('time')
-                        df = df.set_index('time')
-                    elif isinstance(df.index, pd.DatetimeIndex):
-                        df = df.sort_index()
-                    elif df.index.name == 'time':
-                        df.index = pd.to_datetime(df.index)
-                        df = df.sort_index()
-                    
-                    # Đảm bảo có đủ cột cần thiết
-                    column_mapping = {
-                        'open_price': 'open',
-                        'high_price': 'high',
-                        'low_price': 'low',
-                        'close_price': 'close',
-                        'trading_volume': 'volume'
-                    }
-                    df.rename(columns=column_mapping, inplace=True)
-                    
-                    required_columns = ['open', 'high', 'low', 'close', 'volume']
-                    if all(col in df.columns for col in required_columns):
-                        return df
-                
-            except Exception as e1:
-                # Fallback: thử với yfinance
-                try:
-                    import yfinance as yf
-                    ticker = f"{symbol}.VN"
-                    df = yf.download(ticker, start=start_date, end=end_date, interval='1d', progress=False, auto_adjust=False)
-                    
-                    if df is not None and not df.empty:
-                        df.columns = df.columns.str.lower().str.replace(' ', '_')
-                        if 'adj_close' in df.columns:
-                            df['close'] = df['adj_close']
-                        df = df.sort_index()
-                        return df
-                except Exception as e2:
-                    pass
-                
-                # Chỉ hiển thị warning nếu không phải là lỗi thông thường
-                error_msg = str(e1)
-                if 'RetryError' not in error_msg and 'ValueError' not in error_msg:
-                    st.warning(f"Không thể lấy dữ liệu từ vnstock cho {symbol}: {error_msg[:100]}")
+            def fetch():
+                # Dữ liệu ngày: đọc qua cache SQLite, chỉ hỏi API phần còn thiếu
+                if _self.cache is not None and resolution == '1D':
+                    df = _self._read_through(symbol, start_date, end_date)
+                else:
+                    df = _self._download(symbol, start_date, end_date, resolution)
+                return df, _self.last_errors.get(symbol)
             
-            return None
+            # Nhiều phiên/luồng hỏi cùng mã và khoảng ngày cùng lúc: chỉ một request lên nhà cung cấp
+            key = ('stock_data', symbol, resolution, start_date.strftime('%Y-%m-%d'),
+                   end_date.strftime('%Y-%m-%d'), _self._cache_scope())
+            (df, error), shared = get_single_flight().do(key, fetch)
+            if shared and error is not None:
+                _self.last_errors[symbol] = error
+            return _self._own_copy(df, shared)
             
         except Exception as e:
-            st.error(f"Lỗi khi lấy dữ liệu cho {symbol}: {str(e)}")
+            _self.last_errors[symbol] = type(e).__name__
+            print(f"Lỗi khi lấy dữ liệu cho {symbol}: {str(e)}")
             return None
     
-    @st.cache_data(ttl=3600)
+    def fetch_planned(self, task):
+        """
+        Lấy dữ liệu của một mã theo kế hoạch cập nhật (chưa ghi vào database)
+        
+        Args:
+            task: Một dòng của UpdatePlanner.plan (symbol, start_date, end_date, mode, skip)
+        
+        Returns:
+            Tuple (status, DataFrame) với status là 'ok', 'up_to_date' hoặc 'no_data'
+        """
+        symbol = task.symbol
+        if task.skip:
+            print(f"{symbol} is up to date")
+            return 'up_to_date', None
+        
+        if task.mode == 'full':
+            print(f"Full update {symbol} from {task.start_date}")
+        else:
+            print(f"Incremental update {symbol} from {task.start_date}")
+        
+        # Lấy dữ liệu từ API
+        stock_data = self.get_stock_data(
+            symbol,
+            period='MAX',  # Lấy tối đa
+            start_date=task.start_date,
+            end_date=task.end_date
+        )
+        
+        if stock_data is None or stock_data.empty:
+            print(f"No data for {symbol}")
+            return 'no_data', None
+        
+        return 'ok', stock_data
+    
+    def _cache_scope(self):
+        """Phạm vi khóa cache kết quả: mỗi database cache có kết quả riêng"""
+        return self.cache.db_path if self.cache is not None else None
+    
+    def _coalesced(self, key, func):
+        """Gọi func() qua single-flight dùng chung của process"""
+        result, shared = get_single_flight().do(key, func)
+        return self._own_copy(result, shared)
+    
+    def _own_copy(self, result, shared):
+        """Kết quả dùng chung với lời gọi khác được sao chép để người gọi sửa tại chỗ không ảnh hưởng nhau"""
+        if shared and isinstance(result, pd.DataFrame):
+            return result.copy()
+        return result
+    
+    def _download(self, symbol, start_date, end_date, resolution='1D'):
+        """
+        Lấy dữ liệu giá từ nhà cung cấp (vnstock, dự phòng yfinance). Lỗi tạm thời được thử lại
+        với backoff; nhà cung cấp đang lỗi (circuit breaker mở) bị bỏ qua, chuyển thẳng sang dự phòng.
+        
+        Args:
+            symbol: Mã chứng khoán
+            start_date, end_date: Khoảng thời gian (datetime)
+            resolution: Độ phân giải (1D, 1W, 1M)
+        
+        Returns:
+            DataFrame index theo ngày với các cột open, high, low, close, volume hoặc None
+        """
+        try:
+            df, _ = self.providers.history(symbol, start_date, end_date, resolution)
+            return df
+        except NoDataError as e:
+            self.last_errors[symbol] = e.cause
+        except ProviderError as e:
+            self.last_errors[symbol] = type(e).__name__
+            
+            # Chỉ hiển thị warning nếu không phải là lỗi thông thường
+            error_msg = str(e)
+            if 'RetryError' not in error_msg:
+                print(f"Không thể lấy dữ liệu cho {symbol}: {error_msg[:100]}")
+        
+        return None
+    
+    def _read_through(self, symbol, start_date, end_date):
+        """
+        Lấy dữ liệu ngày qua cache: phần đã lưu đọc từ SQLite, API chỉ được hỏi phần
+        còn thiếu (sau ngày cuối cùng đã lưu, hoặc phần đầu nếu cache bắt đầu muộn hơn).
+        Phần lấy mới được ghi lại vào cache.
+        
+        Args:
+            symbol: Mã chứng khoán
+            start_date, end_date: Khoảng thời gian (datetime)
+        
+        Returns:
+            DataFrame gộp (index = ngày) hoặc None nếu không có dữ liệu
+        """
+        columns = ['open', 'high', 'low', 'close', 'volume']
+        start, end = start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
+        cached = self.cache.get_cached_data(symbol, start, end)
+        
+        # Chưa có gì trong khoảng này: lấy toàn bộ một lần rồi lưu lại
+        if cached.empty:
+            df = self._download(symbol, start_date, end_date)
+            self._write_back(symbol, df)
+            return df
+        
+        # Chỉ hỏi API khi khoảng còn thiếu có phiên giao dịch (bỏ cuối tuần, lễ, Tết)
+        calendar = get_trading_calendar()
+        head, tail = None, None
+        first_cached = cached.index[0].to_pydatetime()
+        head_end = first_cached - timedelta(days=1)
+        if len(calendar.trading_days(start_date, head_end)) > HEAD_GAP_SESSIONS:
+            head = self._download(symbol, start_date, head_end)
+        
+        # Phần đuôi: các phiên đã đóng cửa sau ngày cuối cùng đã lưu
+        last_date = self.cache.get_last_date(symbol)
+        tail_start = datetime.combine(last_date + timedelta(days=1), datetime.min.time())
+        tail_end = min(end_date.date(), calendar.last_closed_session())
+        if calendar.trading_days(tail_start, tail_end):
+            tail = self._download(symbol, tail_start, end_date)
+        
+        fetched = [df for df in (head, tail) if df is not None and not df.empty]
+        if not fetched:
+            return cached[columns]
+        
+        self._write_back(symbol, pd.concat(fetched))
+        
+        merged = pd.concat([df[columns] for df in [head, cached, tail] if df is not None and not df.empty])
+        merged = merged[~merged.index.duplicated(keep='last')].sort_index()
+        merged.index.name = cached.index.name
+        
+        return merged
+    
+    def _write_back(self, symbol, df):
+        """Ghi dữ liệu mới lấy từ API vào cache (lỗi ghi không làm hỏng kết quả trả về)"""
+        if df is None or df.empty:
+            return
+        
+        try:
+            self.cache.upsert_stock_data({symbol: df})
+            self.cache.update_indicator_states([symbol])
+        except Exception as e:
+            print(f"Không ghi được cache cho {symbol}: {str(e)[:100]}")
+    
+    @cached('company_overview')
     def get_company_overview(_self, symbol):
         """Lấy thông tin tổng quan công ty"""
         try:
-            company = Company(symbol=symbol)
-            profile = company.profile()
+            profile = _self._coalesced(('company_profile', symbol), lambda: Company(symbol=symbol).profile())
             if profile is not None and not profile.empty:
                 return profile
             return None
@@ -135,7 +243,7 @@ class DataFetcher:
                 'exchange': ['HOSE']
             }, index=[0])
     
-    @st.cache_data(ttl=3600)
+    @cached('financial_report')
     def get_financial_report(_self, symbol, period='year', limit=4):
         """Lấy báo cáo tài chính"""
         try:
@@ -145,25 +253,23 @@ class DataFetcher:
         except Exception as e:
             return None
     
-    @st.cache_data(ttl=3600)
+    @cached('financial_ratios')
     def get_financial_ratios(_self, symbol):
         """Lấy các chỉ số tài chính"""
         try:
             from vnstock import Finance
-            finance = Finance(symbol=symbol)
-            ratios = finance.ratio()
+            ratios = _self._coalesced(('financial_ratios', symbol), lambda: Finance(symbol=symbol).ratio())
             if ratios is not None and not ratios.empty:
                 return ratios
             return None
         except Exception as e:
             return None
     
-    @st.cache_data(ttl=86400)  # Cache 24 giờ
+    @cached('all_stocks')
     def get_all_stocks(_self):
         """Lấy danh sách tất cả mã chứng khoán"""
         try:
-            listing = Listing()
-            companies = listing.all_symbols()
+            companies = _self._coalesced(('all_symbols',), lambda: Listing().all_symbols())
             if companies is not None and not companies.empty:
                 return companies
             return None
@@ -0,0 +1,133 @@
+"""
+Module quản lý kết nối SQLite dùng chung (WAL, reader theo thread, một writer)
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from config import SQLITE_SETTINGS
+
+class ConnectionManager:
+    def __init__(self, db_path):
+        """
+        Khởi tạo connection manager cho một file database
+        
+        Args:
+            db_path: Đường dẫn file SQLite
+        """
+        self.db_path = db_path
+        self._pid = os.getpid()
+        self._local = threading.local()
+        self._writer = None
+        self._write_lock = threading.RLock()
+        self._write_depth = 0
+        
+        # Bật WAL một lần cho file database (thiết lập được lưu trong file)
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.close()
+    
+    def _connect(self, read_only=False):
+        """Mở kết nối mới và áp dụng các pragma hiệu năng"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=SQLITE_SETTINGS['BUSY_TIMEOUT_MS'] / 1000,
+            check_same_thread=False,
+            isolation_level=None  # Tự quản lý transaction
+        )
+        conn.execute(f"PRAGMA busy_timeout={int(SQLITE_SETTINGS['BUSY_TIMEOUT_MS'])}")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={int(SQLITE_SETTINGS['MMAP_SIZE'])}")
+        conn.execute(f"PRAGMA cache_size=-{int(SQLITE_SETTINGS['CACHE_SIZE_KB'])}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        if read_only:
+            conn.execute("PRAGMA query_only=ON")
+        return conn
+    
+    def _check_fork(self):
+        """Sau khi fork, không dùng lại kết nối của process cha"""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._local = threading.local()
+            self._writer = None
+            self._write_lock = threading.RLock()
+            self._write_depth = 0
+    
+    def reader(self):
+        """Lấy kết nối chỉ đọc của thread hiện tại (tạo mới nếu chưa có)"""
+        self._check_fork()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect(read_only=True)
+            self._local.conn = conn
+        return conn
+    
+    @contextmanager
+    def writer(self):
+        """
+        Lấy kết nối ghi duy nhất trong một transaction (BEGIN IMMEDIATE)
+        
+        Các lệnh ghi lồng nhau trong cùng thread dùng chung transaction ngoài cùng.
+        """
+        self._check_fork()
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self._connect()
+            conn = self._writer
+            
+            if self._write_depth > 0:
+                self._write_depth += 1
+                try:
+                    yield conn
+                finally:
+                    self._write_depth -= 1
+                return
+            
+            conn.execute("BEGIN IMMEDIATE")
+            self._write_depth = 1
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            finally:
+                self._write_depth = 0
+    
+    def vacuum(self):
+        """Checkpoint WAL và VACUUM để thu hồi dung lượng (chạy ngoài transaction)"""
+        self._check_fork()
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self._connect()
+            self._writer.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._writer.execute("VACUUM")
+            self._writer.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    
+    def close_all(self):
+        """Đóng kết nối writer và reader của thread hiện tại"""
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+def get_connection_manager(db_path):
+    """Lấy connection manager dùng chung trong process cho một file database"""
+    key = os.path.abspath(db_path)
+    
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = ConnectionManager(key)
+            _managers[key] = manager
+        return manager
@@ -0,0 +1,261 @@
+"""
+Module cache kết quả của DataFetcher, không phụ thuộc Streamlit: bộ nhớ (LRU giới hạn theo dung lượng)
+kèm tầng đĩa tùy chọn (file pickle, dùng chung giữa các process), TTL riêng cho từng phương thức
+"""
+
+import os
+import sys
+import time
+import pickle
+import hashlib
+import inspect
+import tempfile
+import threading
+import functools
+from collections import OrderedDict
+import pandas as pd
+from config import FETCH_CACHE_SETTINGS
+
+def _estimate_size(value):
+    """Ước lượng dung lượng (byte) của một kết quả"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+def _own_copy(value):
+    """Người gọi sửa DataFrame tại chỗ không được làm hỏng bản trong cache"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy()
+    return value
+
+class FetchCache:
+    def __init__(self, max_memory_mb=None, disk_dir=None, disk_enabled=None, max_disk_mb=None):
+        """
+        Khởi tạo cache (thread-safe; tầng đĩa an toàn khi nhiều process cùng dùng)
+        
+        Args:
+            max_memory_mb: Dung lượng tối đa trong bộ nhớ (MB), vượt thì bỏ mục ít dùng nhất
+            disk_dir: Thư mục tầng đĩa
+            disk_enabled: Bật tầng đĩa
+            max_disk_mb: Dung lượng tối đa tầng đĩa (MB)
+            (mặc định theo FETCH_CACHE_SETTINGS)
+        """
+        settings = FETCH_CACHE_SETTINGS
+        self.max_memory_bytes = int((max_memory_mb or settings['MAX_MEMORY_MB']) * 1024 * 1024)
+        self.disk_dir = disk_dir or settings['DISK_DIR']
+        self.disk_enabled = settings['DISK_ENABLED'] if disk_enabled is None else disk_enabled
+        self.max_disk_bytes = int((max_disk_mb or settings['MAX_DISK_MB']) * 1024 * 1024)
+        
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (hết hạn lúc, dung lượng, giá trị)
+        self._memory_bytes = 0
+        self._disk_writes = 0
+        
+        # Thống kê
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key):
+        """
+        Lấy kết quả còn hạn
+        
+        Returns:
+            Tuple (found, giá trị)
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, _own_copy(entry[2])
+                self._drop(key)
+        
+        if self.disk_enabled:
+            entry = self._read_disk(key, now)
+            if entry is not None:
+                expires_at, value = entry
+                self._store_memory(key, expires_at, value)
+                with self._lock:
+                    self.disk_hits += 1
+                return True, _own_copy(value)
+        
+        with self._lock:
+            self.misses += 1
+        return False, None
+    
+    def set(self, key, value, ttl):
+        """Lưu kết quả trong ttl giây (bộ nhớ và đĩa nếu bật)"""
+        expires_at = time.time() + ttl
+        self._store_memory(key, expires_at, _own_copy(value))
+        if self.disk_enabled:
+            self._write_disk(key, expires_at, value)
+    
+    def clear(self, method=None):
+        """Xóa toàn bộ cache hoặc chỉ các kết quả của một phương thức"""
+        with self._lock:
+            for key in [k for k in self._entries if method is None or k[0] == method]:
+                self._drop(key)
+        
+        if self.disk_enabled and os.path.isdir(self.disk_dir):
+            prefix = f"{method}-" if method else ''
+            for name in os.listdir(self.disk_dir):
+                if name.startswith(prefix) and name.endswith('.pkl'):
+                    self._remove(os.path.join(self.disk_dir, name))
+    
+    def get_stats(self):
+        """Thống kê: số lần trúng (bộ nhớ/đĩa), trượt, số mục bị loại, dung lượng đang dùng"""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'memory_mb': round(self._memory_bytes / 1024 / 1024, 2),
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0
+            }
+    
+    def _store_memory(self, key, expires_at, value):
+        size = _estimate_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if size > self.max_memory_bytes:
+                return
+            
+            self._entries[key] = (expires_at, size, value)
+            self._memory_bytes += size
+            while self._memory_bytes > self.max_memory_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+    
+    def _drop(self, key):
+        """Bỏ một mục khỏi bộ nhớ (gọi khi đang giữ lock)"""
+        _, size, _ = self._entries.pop(key)
+        self._memory_bytes -= size
+    
+    def _disk_path(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.disk_dir, f"{key[0]}-{digest}.pkl")
+    
+    def _read_disk(self, key, now):
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                stored_key, expires_at, value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # File hỏng hoặc ghi dở từ phiên bản cũ: bỏ đi
+            self._remove(path)
+            return None
+        
+        if stored_key != key:
+            return None
+        if expires_at <= now:
+            self._remove(path)
+            return None
+        return expires_at, value
+    
+    def _write_disk(self, key, expires_at, value):
+        """Ghi file tạm rồi đổi tên để process khác không đọc phải file ghi dở"""
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump((key, expires_at, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, self._disk_path(key))
+            except BaseException:
+                self._remove(tmp_path)
+                raise
+        except Exception:
+            # Kết quả không pickle được (ví dụ đối tượng Finance của vnstock) chỉ được giữ trong bộ nhớ
+            return
+        
+        with self._lock:
+            self._disk_writes += 1
+            check_size = self._disk_writes % 100 == 0
+        if check_size:
+            self._trim_disk()
+    
+    def _trim_disk(self):
+        """Xóa các file ghi cũ nhất cho đến khi tầng đĩa dưới giới hạn dung lượng"""
+        try:
+            files = []
+            for entry in os.scandir(self.disk_dir):
+                if entry.name.endswith('.pkl'):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError:
+            return
+        
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            self._remove(path)
+            total -= size
+    
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+def get_fetch_cache():
+    """Cache kết quả dùng chung cho toàn bộ process (ứng dụng Streamlit và các công cụ dòng lệnh)"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = FetchCache()
+        return _shared_cache
+
+def cached(method):
+    """
+    Decorator cache kết quả một phương thức của DataFetcher theo tham số gọi
+    
+    Khóa gồm tên phương thức, phạm vi của đối tượng (`_cache_scope()`, ví dụ database đang dùng)
+    và các tham số đã chuẩn hóa (vị trí hay từ khóa, giá trị mặc định). TTL lấy theo
+    FETCH_CACHE_SETTINGS['TTL_SECONDS'][method]. Kết quả None (lỗi, không có dữ liệu) không được cache.
+    Xóa cache của phương thức: `DataFetcher.<phương thức>.clear()`.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            params = tuple(sorted((name, value) for name, value in bound.arguments.items()
+                                  if name not in ('self', '_self')))
+            scope = self._cache_scope() if hasattr(self, '_cache_scope') else None
+            key = (method, scope, params)
+            
+            cache = get_fetch_cache()
+            found, value = cache.get(key)
+            if found:
+                return value
+            
+            value = func(self, *args, **kwargs)
+            if value is not None:
+                cache.set(key, value, FETCH_CACHE_SETTINGS['TTL_SECONDS'][method])
+            return value
+        
+        wrapper.clear = lambda: get_fetch_cache().clear(method)
+        return wrapper
+    
+    return decorator
@@ -8,77 +8,132 @@ import time
 import sys
 from datetime import datetime
 from data_cache import DataCache
+from aimd_controller import AIMDController, batch_counters
+from update_scheduler import UpdateScheduler
+from process_pool import FetchProcessPool
 
-def full_market_update(batch_size=50, delay_between_batches=30):
+def full_market_update(batch_size=50, delay_between_batches=30, resume=None, adaptive=True, processes=None):
     """
     Cập nhật toàn bộ thị trường với batch processing
     
     Args:
         batch_size: Số lượng mã trong mỗi batch
-        delay_between_batches: Thời gian nghỉ giữa các batch (giây)
+        delay_between_batches: Thời gian nghỉ giữa các batch (giây), điểm xuất phát khi adaptive
+        resume: Job id của lần chạy trước cần tiếp tục (chỉ cập nhật các mã chưa xong)
+        adaptive: Tự điều chỉnh số luồng, req/s và thời gian nghỉ theo sức khỏe nhà cung cấp (AIMD)
+        processes: Số process con lấy dữ liệu (None = dùng luồng); các process chung một ngân sách req/s,
+                   AIMD điều chỉnh req/s và thời gian nghỉ, số process giữ nguyên
     """
     print("🚀 Bắt đầu cập nhật toàn bộ thị trường...")
     print("=" * 60)
     
     cache = DataCache()
     
-    # Lấy danh sách tất cả mã
-    print("📋 Lấy danh sách tất cả mã chứng khoán...")
-    all_stocks = cache.get_all_symbols()
-    
-    if all_stocks.empty:
-        print("❌ Không thể lấy danh sách mã chứng khoán!")
-        return False
+    if resume:
+        job = cache.get_update_job(resume)
+        if job is None:
+            print(f"❌ Không tìm thấy job {resume}!")
+            return False
+        
+        job_id = resume
+        symbols_list = cache.get_job_symbols(job_id)
+        print(f"🔁 Tiếp tục job {job_id}: đã xong {job['done']}, lỗi {job['failed']}, "
+              f"còn {len(symbols_list)}/{job['total']} mã")
+        if not symbols_list:
+            cache.finish_update_job(job_id)
+            print("✅ Job đã hoàn thành!")
+            return True
+    else:
+        # Lấy danh sách tất cả mã
+        print("📋 Lấy danh sách tất cả mã chứng khoán...")
+        all_stocks = cache.get_all_symbols()
+        
+        if all_stocks.empty:
+            print("❌ Không thể lấy danh sách mã chứng khoán!")
+            return False
+        
+        # Mã ưu tiên (cần cập nhật, giá trị giao dịch cao, đang theo dõi...) chạy trước
+        symbols_list = UpdateScheduler(cache).prioritize(all_stocks['symbol'].tolist())['symbol'].tolist()
     
-    total_symbols = len(all_stocks)
+    total_symbols = len(symbols_list)
     print(f"📊 Tổng số mã cần cập nhật: {total_symbols:,}")
     
     # Chia thành các batch
-    symbols_list = all_stocks['symbol'].tolist()
     batches = [symbols_list[i:i + batch_size] for i in range(0, len(symbols_list), batch_size)]
     total_batches = len(batches)
     
     print(f"📦 Chia thành {total_batches} batch, mỗi batch {batch_size} mã")
     print(f"⏱️ Thời gian ước tính: {total_batches * (batch_size * 2 + delay_between_batches) / 60:.1f} phút")
     
-    # Xác nhận từ người dùng
-    response = input(f"\n🤔 Bạn có chắc muốn cập nhật {total_symbols:,} mã? (y/N): ")
-    if response.lower() != 'y':
-        print("❌ Hủy bỏ cập nhật.")
-        return False
+    if not resume:
+        # Xác nhận từ người dùng
+        response = input(f"\n🤔 Bạn có chắc muốn cập nhật {total_symbols:,} mã? (y/N): ")
+        if response.lower() != 'y':
+            print("❌ Hủy bỏ cập nhật.")
+            return False
+        
+        # Tiến độ từng mã được lưu trong database để có thể tiếp tục nếu process bị dừng
+        job_id = cache.create_update_job('full', symbols_list, {
+            'batch_size': batch_size, 'delay_between_batches': delay_between_batches
+        })
     
+    print(f"🆔 Job: {job_id} (dừng giữa chừng thì chạy lại với --resume {job_id})")
     print(f"\n🎯 Bắt đầu cập nhật lúc {datetime.now().strftime('%H:%M:%S')}")
     print("=" * 60)
     
     total_success = 0
     total_failed = 0
     start_time = time.time()
+    process_pool = FetchProcessPool(cache.cache_dir, processes) if processes else None
+    # Số process cố định: AIMD chỉ điều chỉnh req/s và thời gian nghỉ
+    controller = AIMDController(delay=delay_between_batches, adaptive=adaptive, tune_workers=process_pool is None)
+    if process_pool:
+        print(f"🧩 Lấy dữ liệu bằng {process_pool.processes} process, chung ngân sách {process_pool.limiter.rate:g} req/s")
     
-    for batch_idx, batch_symbols in enumerate(batches, 1):
-        print(f"\n📦 Batch {batch_idx}/{total_batches} - {len(batch_symbols)} mã")
-        print(f"   Mã đầu tiên: {batch_symbols[0]}, Mã cuối: {batch_symbols[-1]}")
-        
-        batch_start_time = time.time()
-        
-        # Cập nhật batch
-        success_count = cache.bulk_cache_update(
-            symbols_list=batch_symbols,
-            max_symbols=None
-        )
-        
-        batch_time = time.time() - batch_start_time
-        total_success += success_count
-        total_failed += len(batch_symbols) - success_count
-        
-        # Thống kê batch
-        print(f"   ✅ Thành công: {success_count}/{len(batch_symbols)}")
-        print(f"   ⏱️ Thời gian: {batch_time:.1f}s")
-        print(f"   📊 Tổng cộng: {total_success}/{total_success + total_failed} ({total_success/(total_success + total_failed)*100:.1f}%)")
-        
-        # Nghỉ giữa các batch (trừ batch cuối)
-        if batch_idx < total_batches:
-            print(f"   😴 Nghỉ {delay_between_batches}s để tránh rate limit...")
-            time.sleep(delay_between_batches)
+    try:
+        for batch_idx, batch_symbols in enumerate(batches, 1):
+            print(f"\n📦 Batch {batch_idx}/{total_batches} - {len(batch_symbols)} mã")
+            print(f"   Mã đầu tiên: {batch_symbols[0]}, Mã cuối: {batch_symbols[-1]}")
+            
+            batch_start_time = time.time()
+            
+            # Cập nhật batch
+            # Đo batch bằng bộ đếm nhà cung cấp của riêng lần cập nhật (gồm cả request ở process con)
+            controller.begin_batch(provider_totals=batch_counters({}))
+            success_count = cache.bulk_cache_update(
+                symbols_list=batch_symbols,
+                max_symbols=None,
+                max_workers=None if process_pool else controller.workers,
+                requests_per_second=controller.rate,
+                job_id=job_id,
+                process_pool=process_pool
+            )
+            controller.record_batch(len(batch_symbols),
+                                    provider_totals=batch_counters(cache.last_update_stats['provider_totals']))
+            
+            batch_time = time.time() - batch_start_time
+            total_success += success_count
+            total_failed += len(batch_symbols) - success_count
+            
+            # Thống kê batch
+            print(f"   ✅ Thành công: {success_count}/{len(batch_symbols)}")
+            print(f"   ⏱️ Thời gian: {batch_time:.1f}s")
+            print(f"   📊 Tổng cộng: {total_success}/{total_success + total_failed} ({total_success/(total_success + total_failed)*100:.1f}%)")
+            print(f"   {controller.describe(total_symbols - total_success - total_failed)}")
+            
+            # Nghỉ giữa các batch (trừ batch cuối)
+            if batch_idx < total_batches and controller.delay > 0:
+                print(f"   😴 Nghỉ {controller.delay:.0f}s để tránh rate limit...")
+                time.sleep(controller.delay)
+    except KeyboardInterrupt:
+        cache.finish_update_job(job_id, 'interrupted')
+        print(f"\n⏸️ Đã dừng. Tiếp tục: python full_market_update.py full --resume {job_id}")
+        return False
+    finally:
+        if process_pool:
+            process_pool.shutdown(cancel_futures=True)
+    
+    cache.finish_update_job(job_id)
     
     # Thống kê cuối
     total_time = time.time() - start_time
@@ -116,18 +171,54 @@ def quick_update(max_symbols=100):
         print("❌ Cập nhật thất bại!")
         return False
 
+def list_jobs():
+    """In các job cập nhật gần nhất"""
+    jobs = DataCache().get_update_jobs()
+    if jobs.empty:
+        print("Chưa có job cập nhật nào.")
+    else:
+        print(jobs.to_string(index=False))
+
 def main():
     """Main function"""
-    if len(sys.argv) > 1:
-        if sys.argv[1] == "quick":
+    # --fixed: giữ nguyên batch size / delay / số luồng, không tự điều chỉnh
+    adaptive = '--fixed' not in sys.argv
+    if not adaptive:
+        sys.argv.remove('--fixed')
+    
+    # --processes N: lấy dữ liệu bằng N process con (chung một ngân sách request)
+    processes = None
+    if '--processes' in sys.argv:
+        index = sys.argv.index('--processes')
+        if index + 1 >= len(sys.argv) or not sys.argv[index + 1].isdigit():
+            print("Usage: python full_market_update.py full [batch_size] [delay] --processes <N>")
+            return
+        processes = int(sys.argv[index + 1])
+        del sys.argv[index:index + 2]
+    
+    if '--resume' in sys.argv:
+        # python full_market_update.py [full [batch_size] [delay]] --resume <job>
+        index = sys.argv.index('--resume')
+        if index + 1 >= len(sys.argv):
+            print("Usage: python full_market_update.py full [batch_size] [delay] --resume <job>")
+            return
+        job_id = sys.argv[index + 1]
+        args = [arg for arg in sys.argv[1:index] if arg != 'full']
+        batch_size = int(args[0]) if len(args) > 0 else 50
+        delay = int(args[1]) if len(args) > 1 else 30
+        full_market_update(batch_size, delay, resume=job_id, adaptive=adaptive, processes=processes)
+    elif len(sys.argv) > 1:
+        if sys.argv[1] == "jobs":
+            list_jobs()
+        elif sys.argv[1] == "quick":
             max_symbols = int(sys.argv[2]) if len(sys.argv) > 2 else 100
             quick_update(max_symbols)
         elif sys.argv[1] == "full":
             batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 50
             delay = int(sys.argv[3]) if len(sys.argv) > 3 else 30
-            full_market_update(batch_size, delay)
+            full_market_update(batch_size, delay, adaptive=adaptive, processes=processes)
         else:
-            print("Usage: python full_market_update.py [quick|full] [params...]")
+            print("Usage: python full_market_update.py [quick|full|jobs] [params...] [--resume <job>] [--fixed] [--processes N]")
     else:
         # Interactive mode
         print("🎯 CHỌN CHẾ ĐỘ CẬP NHẬT:")
@@ -8,8 +8,10 @@ import time
 import sys
 from datetime import datetime
 from data_cache import DataCache
+from update_scheduler import UpdateScheduler
+from aimd_controller import AIMDController
 
-def gradual_market_update(batch_size=20, delay_minutes=2, max_batches=None):
+def gradual_market_update(batch_size=20, delay_minutes=2, max_batches=None, resume=None, adaptive=True):
     """
     Cập nhật dần dần thị trường với batch nhỏ và delay lớn
     
@@ -17,41 +19,63 @@ def gradual_market_update(batch_size=20, delay_minutes=2, max_batches=None):
         batch_size: Số lượng mã trong mỗi batch (khuyến nghị 10-30)
         delay_minutes: Thời gian nghỉ giữa các batch (phút)
         max_batches: Giới hạn số batch (None = không giới hạn)
+        resume: Job id của lần chạy trước cần tiếp tục (chỉ cập nhật các mã chưa xong)
+        adaptive: Tự điều chỉnh số luồng, req/s và thời gian nghỉ theo sức khỏe nhà cung cấp (AIMD)
     """
     print("🐌 Bắt đầu cập nhật dần dần thị trường...")
     print("=" * 60)
     
     cache = DataCache()
     
-    # Lấy danh sách tất cả mã
-    print("📋 Lấy danh sách tất cả mã chứng khoán...")
-    all_stocks = cache.get_all_symbols()
-    
-    if all_stocks.empty:
-        print("❌ Không thể lấy danh sách mã chứng khoán!")
-        return False
-    
-    # Lấy danh sách mã đã có trong cache
-    try:
-        cached_overview = cache.get_market_overview()
-        cached_symbols = set(cached_overview['symbol'].tolist()) if not cached_overview.empty else set()
-        print(f"📊 Đã có {len(cached_symbols)} mã trong cache")
-    except:
-        cached_symbols = set()
-        print("📊 Cache trống, bắt đầu từ đầu")
-    
-    # Lọc ra các mã chưa có trong cache
-    all_symbols = set(all_stocks['symbol'].tolist())
-    remaining_symbols = list(all_symbols - cached_symbols)
+    if resume:
+        job = cache.get_update_job(resume)
+        if job is None:
+            print(f"❌ Không tìm thấy job {resume}!")
+            return False
+        
+        job_id = resume
+        remaining_symbols = cache.get_job_symbols(job_id)
+        cached_count = None
+        print(f"🔁 Tiếp tục job {job_id}: đã xong {job['done']}, lỗi {job['failed']}, "
+              f"còn {len(remaining_symbols)}/{job['total']} mã")
+    else:
+        # Lấy danh sách tất cả mã
+        print("📋 Lấy danh sách tất cả mã chứng khoán...")
+        all_stocks = cache.get_all_symbols()
+        
+        if all_stocks.empty:
+            print("❌ Không thể lấy danh sách mã chứng khoán!")
+            return False
+        
+        # Kế hoạch cập nhật: một truy vấn lấy ngày cuối cùng của mọi mã, bỏ các mã đã cập nhật
+        all_symbols = all_stocks['symbol'].tolist()
+        queue = UpdateScheduler(cache).prioritize(all_symbols)
+        cached_count = int(queue['last_date'].notna().sum())
+        print(f"📊 Đã có {cached_count} mã trong cache")
+        
+        # Mã chưa có hoặc còn thiếu dữ liệu theo thứ tự ưu tiên (giá trị giao dịch, độ cũ, theo dõi, vừa xem):
+        # giới hạn max_batches luôn dành cho các mã giá trị nhất
+        remaining_symbols = queue.loc[queue['needs_update'], 'symbol'].tolist()
+        
+        # Toàn bộ mã còn thiếu vào một job (kể cả phần vượt max_batches) để lần sau --resume tiếp
+        job_id = None
+        if remaining_symbols:
+            job_id = cache.create_update_job('gradual', remaining_symbols, {
+                'batch_size': batch_size, 'delay_minutes': delay_minutes
+            })
     
     print(f"🎯 Cần cập nhật thêm: {len(remaining_symbols)} mã")
     print(f"📦 Batch size: {batch_size} mã")
     print(f"⏱️ Delay giữa batch: {delay_minutes} phút")
     
     if not remaining_symbols:
+        if job_id:
+            cache.finish_update_job(job_id)
         print("✅ Tất cả mã đã được cache!")
         return True
     
+    print(f"🆔 Job: {job_id} (chạy tiếp với --resume {job_id})")
+    
     # Chia thành các batch
     batches = [remaining_symbols[i:i + batch_size] for i in range(0, len(remaining_symbols), batch_size)]
     total_batches = len(batches)
@@ -70,52 +94,69 @@ def gradual_market_update(batch_size=20, delay_minutes=2, max_batches=None):
     total_success = 0
     total_failed = 0
     start_time = time.time()
+    controller = AIMDController(delay=delay_minutes * 60, adaptive=adaptive)
+    batch_symbol_count = sum(len(batch) for batch in batches)
     
-    for batch_idx, batch_symbols in enumerate(batches, 1):
-        print(f"\n📦 Batch {batch_idx}/{total_batches} - {len(batch_symbols)} mã")
-        print(f"   Thời gian: {datetime.now().strftime('%H:%M:%S')}")
-        print(f"   Mã đầu tiên: {batch_symbols[0]}")
-        print(f"   Mã cuối: {batch_symbols[-1]}")
-        
-        batch_start_time = time.time()
-        
-        # Cập nhật batch
-        success_count = cache.bulk_cache_update(
-            symbols_list=batch_symbols,
-            max_symbols=None
-        )
-        
-        batch_time = time.time() - batch_start_time
-        total_success += success_count
-        total_failed += len(batch_symbols) - success_count
-        
-        # Thống kê batch
-        print(f"   ✅ Thành công: {success_count}/{len(batch_symbols)}")
-        print(f"   ⏱️ Thời gian batch: {batch_time:.1f}s")
-        print(f"   📊 Tổng tiến độ: {total_success}/{total_success + total_failed}")
-        
-        # Kiểm tra cache hiện tại
-        try:
-            current_stats = cache.get_cache_stats()
-            print(f"   💾 Cache hiện tại: {current_stats['total_symbols']} mã, {current_stats['total_records']} records")
-        except:
-            print(f"   💾 Cache hiện tại: {total_success + len(cached_symbols)} mã (ước tính)")
-        
-        # Nghỉ giữa các batch (trừ batch cuối)
-        if batch_idx < total_batches:
-            delay_seconds = delay_minutes * 60
-            print(f"   😴 Nghỉ {delay_minutes} phút để tránh rate limit...")
-            print(f"   ⏰ Batch tiếp theo lúc: {datetime.fromtimestamp(time.time() + delay_seconds).strftime('%H:%M:%S')}")
+    try:
+        for batch_idx, batch_symbols in enumerate(batches, 1):
+            print(f"\n📦 Batch {batch_idx}/{total_batches} - {len(batch_symbols)} mã")
+            print(f"   Thời gian: {datetime.now().strftime('%H:%M:%S')}")
+            print(f"   Mã đầu tiên: {batch_symbols[0]}")
+            print(f"   Mã cuối: {batch_symbols[-1]}")
+            
+            batch_start_time = time.time()
+            
+            # Cập nhật batch
+            controller.begin_batch()
+            success_count = cache.bulk_cache_update(
+                symbols_list=batch_symbols,
+                max_symbols=None,
+                max_workers=controller.workers,
+                requests_per_second=controller.rate,
+                job_id=job_id
+            )
+            controller.record_batch(len(batch_symbols))
+            
+            batch_time = time.time() - batch_start_time
+            total_success += success_count
+            total_failed += len(batch_symbols) - success_count
+            
+            # Thống kê batch
+            print(f"   ✅ Thành công: {success_count}/{len(batch_symbols)}")
+            print(f"   ⏱️ Thời gian batch: {batch_time:.1f}s")
+            print(f"   📊 Tổng tiến độ: {total_success}/{total_success + total_failed}")
+            print(f"   {controller.describe(batch_symbol_count - total_success - total_failed)}")
             
-            # Countdown
-            for remaining in range(delay_seconds, 0, -30):
-                if remaining > 30:
-                    print(f"      Còn {remaining//60}:{remaining%60:02d} phút...")
-                    time.sleep(30)
-                else:
-                    print(f"      Còn {remaining} giây...")
-                    time.sleep(remaining)
-                    break
+            # Kiểm tra cache hiện tại
+            try:
+                current_stats = cache.get_cache_stats()
+                print(f"   💾 Cache hiện tại: {current_stats['total_symbols']} mã, {current_stats['total_records']} records")
+            except:
+                print(f"   💾 Cache hiện tại: {total_success + (cached_count or 0)} mã (ước tính)")
+            
+            # Nghỉ giữa các batch (trừ batch cuối)
+            delay_seconds = int(round(controller.delay))
+            if batch_idx < total_batches and delay_seconds > 0:
+                print(f"   😴 Nghỉ {delay_seconds // 60}:{delay_seconds % 60:02d} phút để tránh rate limit...")
+                print(f"   ⏰ Batch tiếp theo lúc: {datetime.fromtimestamp(time.time() + delay_seconds).strftime('%H:%M:%S')}")
+                
+                # Countdown
+                for remaining in range(delay_seconds, 0, -30):
+                    if remaining > 30:
+                        print(f"      Còn {remaining//60}:{remaining%60:02d} phút...")
+                        time.sleep(30)
+                    else:
+                        print(f"      Còn {remaining} giây...")
+                        time.sleep(remaining)
+                        break
+    except KeyboardInterrupt:
+        cache.finish_update_job(job_id, 'interrupted')
+        print(f"\n⏸️ Đã dừng. Tiếp tục: python gradual_update.py continue --resume {job_id}")
+        return False
+    
+    status = cache.finish_update_job(job_id)
+    if status != 'done':
+        print(f"\n⏭️ Còn mã chưa cập nhật. Chạy tiếp: python gradual_update.py continue --resume {job_id}")
     
     # Thống kê cuối
     total_time = time.time() - start_time
@@ -139,7 +180,7 @@ def gradual_market_update(batch_size=20, delay_minutes=2, max_batches=None):
     
     return total_success > 0
 
-def continue_update():
+def continue_update(resume=None, adaptive=True):
     """Tiếp tục cập nhật với cài đặt an toàn"""
     print("🔄 TIẾP TỤC CẬP NHẬT TOÀN BỘ THỊ TRƯỜNG")
     print("Cài đặt an toàn để tránh rate limit:")
@@ -151,10 +192,12 @@ def continue_update():
     return gradual_market_update(
         batch_size=20,
         delay_minutes=2,
-        max_batches=5
+        max_batches=5,
+        resume=resume,
+        adaptive=adaptive
     )
 
-def aggressive_update():
+def aggressive_update(resume=None, adaptive=True):
     """Cập nhật tích cực hơn (có thể bị rate limit)"""
     print("⚡ CẬP NHẬT TÍCH CỰC")
     print("Cài đặt nhanh hơn (có thể bị rate limit):")
@@ -166,18 +209,36 @@ def aggressive_update():
     return gradual_market_update(
         batch_size=50,
         delay_minutes=1,
-        max_batches=10
+        max_batches=10,
+        resume=resume,
+        adaptive=adaptive
     )
 
 def main():
     """Main function"""
+    # python gradual_update.py [continue|aggressive] [--resume <job>] [--fixed]
+    adaptive = '--fixed' not in sys.argv
+    if not adaptive:
+        sys.argv.remove('--fixed')
+    
+    resume = None
+    if '--resume' in sys.argv:
+        index = sys.argv.index('--resume')
+        if index + 1 >= len(sys.argv):
+            print("Usage: python gradual_update.py [continue|aggressive] --resume <job>")
+            return
+        resume = sys.argv[index + 1]
+        del sys.argv[index:index + 2]
+        if len(sys.argv) == 1:
+            sys.argv.append('continue')
+    
     if len(sys.argv) > 1:
         if sys.argv[1] == "continue":
-            continue_update()
+            continue_update(resume, adaptive)
         elif sys.argv[1] == "aggressive":
-            aggressive_update()
+            aggressive_update(resume, adaptive)
         else:
-            print("Usage: python gradual_update.py [continue|aggressive]")
+            print("Usage: python gradual_update.py [continue|aggressive] [--resume <job>] [--fixed]")
     else:
         # Interactive mode
         print("🎯 CHỌN CHIẾN LƯỢC CẬP NHẬT:")
@@ -0,0 +1,370 @@
+"""
+Module tính chỉ báo kỹ thuật vector hóa cho nhiều mã cùng lúc (panel ngày × mã)
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+from config import TECHNICAL_INDICATORS
+
+PRICE_FIELDS = ['open', 'high', 'low', 'close', 'volume']
+
+INDICATOR_COLUMNS = [
+    'sma_20', 'sma_50', 'sma_200', 'ema_12', 'ema_26',
+    'rsi', 'macd', 'macd_signal', 'macd_diff',
+    'bb_high', 'bb_mid', 'bb_low', 'bb_width',
+    'adx', 'adx_pos', 'adx_neg',
+    'volume_sma', 'volume_ratio', 'obv',
+    'stoch_k', 'stoch_d'
+]
+
+def build_price_panel(frames, lookback=None):
+    """
+    Ghép dữ liệu nhiều mã thành panel (số phiên × số mã), căn phải theo phiên
+    
+    Phiên cuối của mọi mã nằm ở dòng cuối; mã có ít dữ liệu hơn được đệm NaN ở đầu,
+    nhờ vậy kết quả từng cột giống hệt khi tính riêng cho từng mã.
+    
+    Args:
+        frames: Dict {symbol: DataFrame} có các cột open, high, low, close, volume
+        lookback: Chỉ lấy N phiên gần nhất của mỗi mã (None = toàn bộ)
+    
+    Returns:
+        Dict gồm 'symbols', 'dates' và một mảng 2-D cho mỗi trường giá
+    """
+    symbols = [s for s, df in frames.items() if df is not None and not df.empty]
+    lengths = [len(frames[s]) if lookback is None else min(len(frames[s]), lookback) for s in symbols]
+    rows = max(lengths) if lengths else 0
+    
+    panel = {'symbols': symbols}
+    panel['dates'] = np.full((rows, len(symbols)), np.datetime64('NaT'), dtype='datetime64[ns]')
+    for field in PRICE_FIELDS:
+        panel[field] = np.full((rows, len(symbols)), np.nan)
+    
+    for j, (symbol, length) in enumerate(zip(symbols, lengths)):
+        df = frames[symbol].iloc[-length:]
+        panel['dates'][rows - length:, j] = df.index.values
+        for field in PRICE_FIELDS:
+            panel[field][rows - length:, j] = df[field].to_numpy(dtype=float)
+    
+    return panel
+
+def build_panel_from_long(long_df, fields=None, lookback=None):
+    """
+    Dựng panel (số phiên × số mã) căn phải như build_price_panel từ DataFrame dạng dài
+    
+    Không tách DataFrame theo từng mã: vị trí của mỗi dòng trong panel được tính vector hóa.
+    
+    Args:
+        long_df: DataFrame có cột symbol, date và các trường giá, đã sắp xếp theo (symbol, date)
+        fields: Các cột đưa vào panel (None = mọi cột trừ symbol, date)
+        lookback: Chỉ lấy N phiên gần nhất của mỗi mã (None = toàn bộ)
+    
+    Returns:
+        Dict gồm 'symbols', 'dates' và một mảng 2-D cho mỗi trường
+    """
+    if fields is None:
+        fields = [c for c in long_df.columns if c not in ('symbol', 'date')]
+    
+    symbol_values = long_df['symbol'].to_numpy()
+    if len(symbol_values) == 0:
+        panel = {'symbols': [], 'dates': np.empty((0, 0), dtype='datetime64[ns]')}
+        panel.update({field: np.empty((0, 0)) for field in fields})
+        return panel
+    
+    # Mã thứ j của mỗi dòng và vị trí của dòng trong dữ liệu của mã đó
+    change = np.r_[True, symbol_values[1:] != symbol_values[:-1]]
+    codes = np.cumsum(change) - 1
+    starts = np.flatnonzero(change)
+    counts = np.diff(np.r_[starts, len(symbol_values)])
+    position = np.arange(len(symbol_values)) - starts[codes]
+    
+    lengths = counts if lookback is None else np.minimum(counts, lookback)
+    keep = position >= (counts - lengths)[codes]
+    rows = int(lengths.max())
+    row_idx = (rows - counts[codes] + position)[keep]
+    col_idx = codes[keep]
+    
+    panel = {'symbols': symbol_values[starts].tolist()}
+    panel['dates'] = np.full((rows, len(starts)), np.datetime64('NaT'), dtype='datetime64[ns]')
+    panel['dates'][row_idx, col_idx] = long_df['date'].to_numpy(dtype='datetime64[ns]')[keep]
+    for field in fields:
+        panel[field] = np.full((rows, len(starts)), np.nan)
+        panel[field][row_idx, col_idx] = long_df[field].to_numpy(dtype=float)[keep]
+    
+    return panel
+
+def _first_valid(values):
+    """Vị trí dòng đầu tiên không phải NaN của từng cột (số dòng nếu cột rỗng)"""
+    valid = ~np.isnan(values)
+    return np.where(valid.any(axis=0), valid.argmax(axis=0), values.shape[0])
+
+def _before(rows, starts):
+    """Mask True ở các dòng nằm trước vị trí `starts` của từng cột"""
+    return np.arange(rows)[:, None] < np.asarray(starts)[None, :]
+
+def _at(values, rows_idx):
+    """Lấy values[rows_idx[j], j] cho các cột có rows_idx hợp lệ (NaN nếu vượt quá)"""
+    out = np.full(values.shape[1], np.nan)
+    cols = np.nonzero(rows_idx < values.shape[0])[0]
+    out[cols] = values[rows_idx[cols], cols]
+    return out
+
+def _set_at(values, rows_idx, new_values):
+    """Gán values[rows_idx[j], j] = new_values[j] cho các cột hợp lệ"""
+    cols = np.nonzero(rows_idx < values.shape[0])[0]
+    values[rows_idx[cols], cols] = new_values[cols]
+
+def _shift(values, periods=1):
+    """Dịch mảng xuống `periods` dòng theo trục thời gian"""
+    shifted = np.empty_like(values)
+    shifted[:periods] = np.nan
+    shifted[periods:] = values[:-periods]
+    return shifted
+
+def _rolling_sum(values, window, starts=None):
+    """Tổng trượt; NaN nếu cửa sổ chưa đủ `window` giá trị (như pandas min_periods=window)"""
+    if starts is None:
+        starts = _first_valid(values)
+    missing = np.isnan(values)
+    sums = np.cumsum(np.where(missing, 0.0, values), axis=0)
+    sums[window:] -= sums[:-window].copy()
+    
+    if missing.sum() != starts.sum():
+        # Có NaN xen giữa chuỗi: đếm số giá trị hợp lệ trong từng cửa sổ
+        counts = np.cumsum(~missing, axis=0)
+        counts[window:] -= counts[:-window].copy()
+        sums[counts < window] = np.nan
+    else:
+        sums[_before(values.shape[0], starts + window - 1)] = np.nan
+    return sums
+
+def _rolling_mean(values, window, starts=None):
+    if starts is None:
+        starts = _first_valid(values)
+    # Trừ giá trị đầu tiên của từng cột để giảm sai số cộng dồn
+    base = np.nan_to_num(_at(values, starts))
+    return _rolling_sum(values - base, window, starts) / window + base
+
+def _rolling_std(values, window, starts=None):
+    """Độ lệch chuẩn trượt với ddof=0"""
+    if starts is None:
+        starts = _first_valid(values)
+    centered = values - np.nan_to_num(_at(values, starts))
+    mean = _rolling_sum(centered, window, starts) / window
+    mean_sq = _rolling_sum(centered * centered, window, starts) / window
+    return np.sqrt(np.maximum(mean_sq - mean * mean, 0.0))
+
+def _rolling_extreme(values, window, func):
+    """Min/max trượt qua view cửa sổ (không sao chép dữ liệu)"""
+    out = np.full_like(values, np.nan)
+    if values.shape[0] >= window:
+        windows = np.lib.stride_tricks.sliding_window_view(values, window, axis=0)
+        out[window - 1:] = func(windows, axis=-1)
+    return out
+
+def _ewm(values, alpha, min_periods=0, starts=None):
+    """
+    Trung bình trượt hàm mũ (adjust=False) cho từng cột, bắt đầu từ vị trí `starts`
+    (mặc định: giá trị đầu tiên không phải NaN), tương đương pandas ewm(adjust=False)
+    """
+    if starts is None:
+        starts = _first_valid(values)
+    # y[start] = x[start]; y[t] = (1 - alpha) * y[t-1] + alpha * x[t]
+    x = values * alpha
+    _set_at(x, starts, _at(values, starts))
+    x[_before(values.shape[0], starts)] = 0.0
+    
+    smoothed = lfilter([1.0], [1.0, -(1 - alpha)], x, axis=0)
+    smoothed[_before(values.shape[0], starts + max(min_periods - 1, 0))] = np.nan
+    return smoothed
+
+def _span_alpha(span):
+    return 2.0 / (span + 1.0)
+
+class PanelIndicatorEngine:
+    def __init__(self, params=None):
+        """
+        Khởi tạo engine với tham số chỉ báo
+        
+        Args:
+            params: Dict tham số (None = config.TECHNICAL_INDICATORS)
+        """
+        self.params = params or TECHNICAL_INDICATORS
+    
+    def compute(self, open_, high, low, close, volume):
+        """
+        Tính toàn bộ chỉ báo cho tất cả các mã trong một lượt
+        
+        Các mảng đầu vào có dạng (số phiên × số mã), NaN ở đầu cột nghĩa là mã
+        chưa có dữ liệu. Kết quả khớp với TechnicalAnalyzer.add_all_indicators().
+        
+        Returns:
+            Dict {tên chỉ báo: mảng 2-D cùng kích thước}
+        """
+        p = self.params
+        high = np.asarray(high, dtype=float)
+        low = np.asarray(low, dtype=float)
+        close = np.asarray(close, dtype=float)
+        volume = np.asarray(volume, dtype=float)
+        starts = _first_valid(close)
+        
+        out = {}
+        
+        # Moving averages
+        out['sma_20'] = _rolling_mean(close, p['SMA_SHORT'], starts)
+        out['sma_50'] = _rolling_mean(close, p['SMA_MEDIUM'], starts)
+        out['sma_200'] = _rolling_mean(close, p['SMA_LONG'], starts)
+        out['ema_12'] = _ewm(close, _span_alpha(p['EMA_SHORT']), starts=starts)
+        out['ema_26'] = _ewm(close, _span_alpha(p['EMA_LONG']), starts=starts)
+        
+        # RSI (trung bình Wilder)
+        out['rsi'] = self._rsi(close, starts, p['RSI_PERIOD'])
+        
+        # MACD
+        ema_fast = _ewm(close, _span_alpha(p['MACD_FAST']), p['MACD_FAST'], starts)
+        ema_slow = _ewm(close, _span_alpha(p['MACD_SLOW']), p['MACD_SLOW'], starts)
+        out['macd'] = ema_fast - ema_slow
+        out['macd_signal'] = _ewm(
+            out['macd'], _span_alpha(p['MACD_SIGNAL']), p['MACD_SIGNAL'],
+            starts + max(p['MACD_FAST'], p['MACD_SLOW']) - 1
+        )
+        out['macd_diff'] = out['macd'] - out['macd_signal']
+        
+        # Bollinger Bands
+        bb_mid = _rolling_mean(close, p['BB_PERIOD'], starts)
+        bb_std = _rolling_std(close, p['BB_PERIOD'], starts)
+        out['bb_mid'] = bb_mid
+        out['bb_high'] = bb_mid + p['BB_STD'] * bb_std
+        out['bb_low'] = bb_mid - p['BB_STD'] * bb_std
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out['bb_width'] = (out['bb_high'] - out['bb_low']) / bb_mid * 100
+        
+        # ADX
+        out['adx'], out['adx_pos'], out['adx_neg'] = self._adx(high, low, close, starts, p['ADX_PERIOD'])
+        
+        # Volume
+        out['volume_sma'] = _rolling_mean(volume, p['VOLUME_SMA'], starts)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out['volume_ratio'] = volume / out['volume_sma']
+        out['obv'] = self._obv(close, volume, starts)
+        
+        # Stochastic
+        out['stoch_k'], out['stoch_d'] = self._stochastic(
+            high, low, close, p['STOCH_PERIOD'], p['STOCH_SMOOTH']
+        )
+        
+        return out
+    
+    def compute_panel(self, panel):
+        """Tính chỉ báo cho panel tạo bởi build_price_panel"""
+        return self.compute(panel['open'], panel['high'], panel['low'], panel['close'], panel['volume'])
+    
+    @staticmethod
+    def _rsi(close, starts, window):
+        diff = close - _shift(close)
+        up = np.where(diff > 0, diff, 0.0)
+        down = np.where(diff < 0, -diff, 0.0)
+        
+        ema_up = _ewm(up, 1 / window, window, starts)
+        ema_down = _ewm(down, 1 / window, window, starts)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(ema_down == 0, 100, 100 - (100 / (1 + ema_up / ema_down)))
+    
+    @staticmethod
+    def _adx(high, low, close, starts, window):
+        """ADX, +DI, -DI theo đúng cách khởi tạo của thư viện ta"""
+        rows = close.shape[0]
+        decay = 1 - 1 / window
+        prev_close = _shift(close)
+        
+        true_range = np.maximum(high, prev_close) - np.minimum(low, prev_close)
+        diff_up = high - _shift(high)
+        diff_down = _shift(low) - low
+        pos = np.where((diff_up > diff_down) & (diff_up > 0), diff_up, 0.0)
+        neg = np.where((diff_down > diff_up) & (diff_down > 0), diff_down, 0.0)
+        
+        def wilder_sum(values):
+            # Phiên thứ n: tổng của phiên 1..n; sau đó s = s - s/n + x
+            values = np.where(np.isnan(values), 0.0, values)
+            cumulative = np.cumsum(values, axis=0)
+            first_sum = _at(cumulative, starts + window) - _at(cumulative, starts)
+            
+            values[_before(rows, starts + window + 1)] = 0.0
+            _set_at(values, starts + window, first_sum)
+            smoothed = lfilter([1.0], [1.0, -decay], values, axis=0)
+            smoothed[_before(rows, starts + window)] = np.nan
+            return smoothed
+        
+        trs = wilder_sum(true_range)
+        dip = wilder_sum(pos)
+        din = wilder_sum(neg)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            di_pos = np.where(trs != 0, 100 * dip / trs, 0.0)
+            di_neg = np.where(trs != 0, 100 * din / trs, 0.0)
+            di_sum = di_pos + di_neg
+            dx = np.where(di_sum != 0, 100 * np.abs((di_pos - di_neg) / di_sum), 0.0)
+        
+        # ADX: phiên 2n-1 là trung bình DX của n phiên đầu, sau đó làm mượt Wilder
+        first = starts + 2 * window - 1
+        dx_filled = np.where(np.isnan(dx), 0.0, dx)
+        cumulative = np.cumsum(dx_filled, axis=0)
+        first_adx = (_at(cumulative, first) - _at(cumulative, starts + window - 1)) / window
+        
+        x = dx_filled / window
+        x[_before(rows, first + 1)] = 0.0
+        _set_at(x, first, first_adx)
+        adx = lfilter([1.0], [1.0, -decay], x, axis=0)
+        
+        adx[_before(rows, first)] = 0.0
+        di_pos[_before(rows, starts + window + 1)] = 0.0
+        di_neg[_before(rows, starts + window + 1)] = 0.0
+        
+        # Dòng trước khi mã có dữ liệu
+        not_listed = _before(rows, starts)
+        adx[not_listed] = np.nan
+        di_pos[not_listed] = np.nan
+        di_neg[not_listed] = np.nan
+        return adx, di_pos, di_neg
+    
+    @staticmethod
+    def _obv(close, volume, starts):
+        signed = np.where(close < _shift(close), -volume, volume)
+        not_listed = _before(close.shape[0], starts)
+        signed[not_listed | np.isnan(signed)] = 0.0
+        obv = np.cumsum(signed, axis=0)
+        obv[not_listed] = np.nan
+        return obv
+    
+    @staticmethod
+    def _stochastic(high, low, close, window, smooth_window):
+        lowest = _rolling_extreme(low, window, np.min)
+        highest = _rolling_extreme(high, window, np.max)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            stoch_k = 100 * (close - lowest) / (highest - lowest)
+        stoch_d = _rolling_mean(stoch_k, smooth_window)
+        return stoch_k, stoch_d
+    
+    @staticmethod
+    def latest(panel, indicators):
+        """
+        Lấy giá trị phiên cuối của mỗi mã thành DataFrame (index = symbol)
+        
+        Args:
+            panel: Panel tạo bởi build_price_panel
+            indicators: Kết quả của compute()
+        """
+        data = {field: panel[field][-1] for field in PRICE_FIELDS}
+        data.update({name: values[-1] for name, values in indicators.items()})
+        return pd.DataFrame(data, index=pd.Index(panel['symbols'], name='symbol'))
+    
+    @staticmethod
+    def symbol_frame(panel, indicators, symbol):
+        """Tách DataFrame giá + chỉ báo của một mã từ panel"""
+        j = panel['symbols'].index(symbol)
+        mask = ~np.isnat(panel['dates'][:, j])
+        
+        data = {field: panel[field][mask, j] for field in PRICE_FIELDS}
+        data.update({name: values[mask, j] for name, values in indicators.items()})
+        return pd.DataFrame(data, index=pd.DatetimeIndex(panel['dates'][mask, j]))
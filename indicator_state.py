@@ -0,0 +1,286 @@
+"""
+Module trạng thái chỉ báo kỹ thuật cập nhật tăng dần (O(1) mỗi phiên)
+
+Mỗi mã giữ một IndicatorState gồm các tổng trượt, giá trị EMA, trung bình Wilder...
+Khi có phiên mới chỉ cần cập nhật từ phiên đó thay vì tính lại toàn bộ lịch sử.
+Kết quả giống TechnicalAnalyzer (thư viện ta) khi tính trên cùng chuỗi dữ liệu.
+"""
+
+import math
+from collections import deque
+import pandas as pd
+from config import TECHNICAL_INDICATORS
+
+NAN = float('nan')
+
+class IndicatorState:
+    def __init__(self, params=None):
+        """
+        Khởi tạo trạng thái rỗng (chưa có phiên nào)
+        
+        Args:
+            params: Tham số chỉ báo (mặc định: config.TECHNICAL_INDICATORS)
+        """
+        self.params = dict(params or TECHNICAL_INDICATORS)
+        p = self.params
+        
+        self.bars = 0
+        self.last_date = None
+        self.prev_close = None
+        self.prev_high = None
+        self.prev_low = None
+        
+        # Cửa sổ giá/khối lượng gần nhất cho các chỉ báo dạng rolling
+        window = max(p['SMA_SHORT'], p['SMA_MEDIUM'], p['SMA_LONG'], p['BB_PERIOD'])
+        self.closes = deque(maxlen=window)
+        self.volumes = deque(maxlen=p['VOLUME_SMA'])
+        self.highs = deque(maxlen=p['STOCH_PERIOD'])
+        self.lows = deque(maxlen=p['STOCH_PERIOD'])
+        self.stoch_ks = deque(maxlen=p['STOCH_SMOOTH'])
+        
+        # Tổng trượt cho SMA và volume SMA
+        self.sums = {'sma_20': 0.0, 'sma_50': 0.0, 'sma_200': 0.0, 'volume': 0.0}
+        
+        # Trung bình và tổng bình phương độ lệch (Welford) cho Bollinger Bands
+        self.bb_mean = 0.0
+        self.bb_m2 = 0.0
+        
+        # Giá trị EMA hiện tại (None = chưa khởi tạo)
+        self.ema = {
+            'ema_12': None, 'ema_26': None,
+            'macd_fast': None, 'macd_slow': None, 'macd_signal': None,
+            'rsi_up': None, 'rsi_down': None
+        }
+        
+        # Tổng Wilder cho ADX
+        self.adx = {'trs': 0.0, 'dip': 0.0, 'din': 0.0, 'dx_sum': 0.0, 'adx': 0.0}
+        self.obv = 0.0
+        
+        # Giá trị chỉ báo của phiên cuối
+        self.values = {}
+    
+    def _ewm(self, key, value, alpha):
+        """Cập nhật EMA (adjust=False): y = (1 - alpha) * y + alpha * x"""
+        prev = self.ema[key]
+        self.ema[key] = value if prev is None else (1 - alpha) * prev + alpha * value
+        return self.ema[key]
+    
+    def update(self, date, high, low, close, volume):
+        """
+        Cập nhật trạng thái với một phiên mới
+        
+        Args:
+            date: Ngày của phiên (phải sau last_date)
+            high, low, close, volume: Dữ liệu của phiên
+        
+        Returns:
+            Dict giá trị các chỉ báo tại phiên này
+        """
+        p = self.params
+        i = self.bars
+        prev_close = self.prev_close
+        out = {}
+        
+        # Moving averages
+        for name, key in (('sma_20', 'SMA_SHORT'), ('sma_50', 'SMA_MEDIUM'), ('sma_200', 'SMA_LONG')):
+            window = p[key]
+            self.sums[name] += close - (self.closes[-window] if len(self.closes) >= window else 0.0)
+            out[name] = self.sums[name] / window if i >= window - 1 else NAN
+        out['ema_12'] = self._ewm('ema_12', close, 2.0 / (p['EMA_SHORT'] + 1.0))
+        out['ema_26'] = self._ewm('ema_26', close, 2.0 / (p['EMA_LONG'] + 1.0))
+        
+        # RSI (trung bình Wilder của phiên tăng/giảm; phiên đầu tiên tính là 0)
+        window = p['RSI_PERIOD']
+        diff = close - prev_close if prev_close is not None else 0.0
+        ema_up = self._ewm('rsi_up', diff if diff > 0 else 0.0, 1.0 / window)
+        ema_down = self._ewm('rsi_down', -diff if diff < 0 else 0.0, 1.0 / window)
+        if i < window - 1:
+            out['rsi'] = NAN
+        elif ema_down == 0:
+            out['rsi'] = 100.0
+        else:
+            out['rsi'] = 100 - (100 / (1 + ema_up / ema_down))
+        
+        # MACD
+        fast = self._ewm('macd_fast', close, 2.0 / (p['MACD_FAST'] + 1.0))
+        slow = self._ewm('macd_slow', close, 2.0 / (p['MACD_SLOW'] + 1.0))
+        first = max(p['MACD_FAST'], p['MACD_SLOW']) - 1
+        if i >= first:
+            out['macd'] = fast - slow
+            signal = self._ewm('macd_signal', out['macd'], 2.0 / (p['MACD_SIGNAL'] + 1.0))
+            out['macd_signal'] = signal if i >= first + p['MACD_SIGNAL'] - 1 else NAN
+        else:
+            out['macd'] = NAN
+            out['macd_signal'] = NAN
+        out['macd_diff'] = out['macd'] - out['macd_signal']
+        
+        # Bollinger Bands (ddof=0)
+        self._update_bollinger(close)
+        window = p['BB_PERIOD']
+        if i >= window - 1:
+            std = math.sqrt(max(self.bb_m2 / window, 0.0))
+            out['bb_mid'] = self.bb_mean
+            out['bb_high'] = self.bb_mean + p['BB_STD'] * std
+            out['bb_low'] = self.bb_mean - p['BB_STD'] * std
+            out['bb_width'] = (out['bb_high'] - out['bb_low']) / self.bb_mean * 100 if self.bb_mean else NAN
+        else:
+            out['bb_mid'] = out['bb_high'] = out['bb_low'] = out['bb_width'] = NAN
+        
+        # ADX
+        out['adx'], out['adx_pos'], out['adx_neg'] = self._update_adx(high, low, close)
+        
+        # Volume
+        window = p['VOLUME_SMA']
+        self.sums['volume'] += volume - (self.volumes[0] if len(self.volumes) >= window else 0.0)
+        if i >= window - 1:
+            out['volume_sma'] = self.sums['volume'] / window
+            if out['volume_sma'] != 0:
+                out['volume_ratio'] = volume / out['volume_sma']
+            else:
+                out['volume_ratio'] = math.inf if volume > 0 else NAN
+        else:
+            out['volume_sma'] = out['volume_ratio'] = NAN
+        self.obv += -volume if prev_close is not None and close < prev_close else volume
+        out['obv'] = self.obv
+        
+        # Stochastic
+        self.highs.append(high)
+        self.lows.append(low)
+        if i >= p['STOCH_PERIOD'] - 1:
+            lowest, highest = min(self.lows), max(self.highs)
+            stoch_k = 100 * (close - lowest) / (highest - lowest) if highest != lowest else NAN
+        else:
+            stoch_k = NAN
+        self.stoch_ks.append(stoch_k)
+        out['stoch_k'] = stoch_k
+        if len(self.stoch_ks) == p['STOCH_SMOOTH'] and not any(math.isnan(k) for k in self.stoch_ks):
+            out['stoch_d'] = sum(self.stoch_ks) / p['STOCH_SMOOTH']
+        else:
+            out['stoch_d'] = NAN
+        
+        self.closes.append(close)
+        self.volumes.append(volume)
+        self.prev_close, self.prev_high, self.prev_low = close, high, low
+        self.last_date = pd.Timestamp(date).strftime('%Y-%m-%d')
+        self.bars += 1
+        self.values = out
+        return out
+    
+    def _update_bollinger(self, close):
+        """Cập nhật trung bình/độ lệch trượt theo Welford (ổn định số học hơn tổng bình phương)"""
+        window = self.params['BB_PERIOD']
+        if len(self.closes) < window:
+            count = len(self.closes) + 1
+            delta = close - self.bb_mean
+            self.bb_mean += delta / count
+            self.bb_m2 += delta * (close - self.bb_mean)
+        else:
+            old = self.closes[-window]
+            new_mean = self.bb_mean + (close - old) / window
+            self.bb_m2 += (close - old) * (close - new_mean + old - self.bb_mean)
+            self.bb_mean = new_mean
+    
+    def _update_adx(self, high, low, close):
+        """ADX, +DI, -DI theo đúng cách khởi tạo của thư viện ta"""
+        window = self.params['ADX_PERIOD']
+        i = self.bars
+        state = self.adx
+        
+        if i == 0:
+            return 0.0, 0.0, 0.0
+        
+        true_range = max(high, self.prev_close) - min(low, self.prev_close)
+        diff_up = high - self.prev_high
+        diff_down = self.prev_low - low
+        pos = diff_up if diff_up > diff_down and diff_up > 0 else 0.0
+        neg = diff_down if diff_down > diff_up and diff_down > 0 else 0.0
+        
+        # Phiên 1..n: cộng dồn; sau đó làm mượt Wilder s = s - s/n + x
+        for key, value in (('trs', true_range), ('dip', pos), ('din', neg)):
+            if i <= window:
+                state[key] += value
+            else:
+                state[key] = state[key] - state[key] / window + value
+        
+        if i < window:
+            return 0.0, 0.0, 0.0
+        
+        di_pos = 100 * state['dip'] / state['trs'] if state['trs'] != 0 else 0.0
+        di_neg = 100 * state['din'] / state['trs'] if state['trs'] != 0 else 0.0
+        di_sum = di_pos + di_neg
+        dx = 100 * abs((di_pos - di_neg) / di_sum) if di_sum != 0 else 0.0
+        
+        # ADX: phiên 2n-1 là trung bình DX của n phiên đầu, sau đó làm mượt Wilder
+        if i < 2 * window - 1:
+            state['dx_sum'] += dx
+        elif i == 2 * window - 1:
+            state['adx'] = (state['dx_sum'] + dx) / window
+        else:
+            state['adx'] = (state['adx'] * (window - 1) + dx) / window
+        
+        adx = state['adx'] if i >= 2 * window - 1 else 0.0
+        if i == window:
+            return adx, 0.0, 0.0
+        return adx, di_pos, di_neg
+    
+    def update_frame(self, df):
+        """
+        Cập nhật với các phiên mới trong DataFrame (bỏ qua phiên không sau last_date)
+        
+        Args:
+            df: DataFrame có index ngày và các cột high, low, close, volume
+        
+        Returns:
+            DataFrame chỉ báo của các phiên mới (index = ngày)
+        """
+        if self.last_date is not None:
+            df = df[df.index > pd.Timestamp(self.last_date)]
+        
+        rows = []
+        for date, high, low, close, volume in zip(
+            df.index, df['high'].astype(float), df['low'].astype(float),
+            df['close'].astype(float), df['volume'].astype(float)
+        ):
+            rows.append(self.update(date, high, low, close, volume))
+        
+        return pd.DataFrame(rows, index=df.index)
+    
+    def to_dict(self):
+        """Chuyển trạng thái thành dict (lưu được dạng JSON)"""
+        return {
+            'params': self.params,
+            'bars': self.bars,
+            'last_date': self.last_date,
+            'prev': [self.prev_close, self.prev_high, self.prev_low],
+            'closes': list(self.closes),
+            'volumes': list(self.volumes),
+            'highs': list(self.highs),
+            'lows': list(self.lows),
+            'stoch_ks': list(self.stoch_ks),
+            'sums': self.sums,
+            'bb': [self.bb_mean, self.bb_m2],
+            'ema': self.ema,
+            'adx': self.adx,
+            'obv': self.obv,
+            'values': self.values
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Khôi phục trạng thái từ dict tạo bởi to_dict()"""
+        state = cls(data['params'])
+        state.bars = data['bars']
+        state.last_date = data['last_date']
+        state.prev_close, state.prev_high, state.prev_low = data['prev']
+        state.closes.extend(data['closes'])
+        state.volumes.extend(data['volumes'])
+        state.highs.extend(data['highs'])
+        state.lows.extend(data['lows'])
+        state.stoch_ks.extend(data['stoch_ks'])
+        state.sums.update(data['sums'])
+        state.bb_mean, state.bb_m2 = data['bb']
+        state.ema.update(data['ema'])
+        state.adx.update(data['adx'])
+        state.obv = data['obv']
+        state.values = data['values']
+        return state
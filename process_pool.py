@@ -0,0 +1,78 @@
+"""
+Module lấy dữ liệu bằng nhiều process: phần chuẩn hóa bằng pandas trong get_stock_data chạy song song thật sự
+thay vì chung GIL với các luồng; mọi process dùng chung một ngân sách request qua SQLiteTokenBucket, còn dữ liệu
+đã chuẩn hóa được gửi về process gọi bulk_cache_update, process duy nhất ghi database
+"""
+
+import os
+import signal
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+from data_fetcher import DataFetcher
+from providers import get_provider_totals
+from rate_limiter import SQLiteTokenBucket, set_shared_limiter
+from config import PROCESS_POOL_SETTINGS
+
+# DataFetcher của process con (tạo trong _init_worker)
+_worker_fetcher = None
+
+def _init_worker(limiter_path):
+    """Khởi tạo process con: dùng bucket chung thay cho bucket riêng của process"""
+    global _worker_fetcher
+    
+    # Ctrl-C do process chính xử lý (ghi phần đã lấy được, đánh dấu job), process con chạy nốt request đang dở
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    set_shared_limiter(SQLiteTokenBucket(limiter_path))
+    _worker_fetcher = DataFetcher()
+
+def _fetch_in_worker(task):
+    """
+    Lấy dữ liệu một mã trong process con
+    
+    Returns:
+        Tuple (status, DataFrame, số giây, tên lớp lỗi nếu 'no_data', chênh lệch get_provider_totals của
+        process con trong lúc lấy mã này; process chính cộng lại để đo sức khỏe nhà cung cấp)
+    """
+    started = time.perf_counter()
+    before = get_provider_totals()
+    status, stock_data = _worker_fetcher.fetch_planned(task)
+    error = _worker_fetcher.last_errors.pop(task.symbol, 'NoData') if status == 'no_data' else None
+    after = get_provider_totals()
+    counters = {key: after[key] - before[key] for key in after}
+    return status, stock_data, time.perf_counter() - started, error, counters
+
+class FetchProcessPool:
+    def __init__(self, cache_dir, processes=None, start_method=None):
+        """
+        Khởi tạo pool process lấy dữ liệu (dùng lại được cho nhiều lần bulk_cache_update)
+        
+        Args:
+            cache_dir: Thư mục cache (chứa file token bucket PROCESS_POOL_SETTINGS['LIMITER_DB'])
+            processes: Số process con (mặc định PROCESS_POOL_SETTINGS['PROCESSES'] hoặc số CPU)
+            start_method: Cách tạo process con (mặc định PROCESS_POOL_SETTINGS['START_METHOD'])
+        """
+        self.processes = processes or PROCESS_POOL_SETTINGS['PROCESSES'] or os.cpu_count() or 1
+        self.limiter = SQLiteTokenBucket(os.path.join(cache_dir, PROCESS_POOL_SETTINGS['LIMITER_DB']))
+        context = multiprocessing.get_context(start_method or PROCESS_POOL_SETTINGS['START_METHOD'])
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self.limiter.db_path,)
+        )
+    
+    def submit(self, task):
+        """Gửi một dòng của UpdatePlanner.plan cho process con (Future của _fetch_in_worker)"""
+        return self.executor.submit(_fetch_in_worker, SimpleNamespace(**task._asdict()))
+    
+    def shutdown(self, cancel_futures=False):
+        """Dừng các process con"""
+        self.executor.shutdown(wait=True, cancel_futures=cancel_futures)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown(cancel_futures=exc_type is not None)
@@ -0,0 +1,370 @@
+"""
+Module nhà cung cấp dữ liệu giá (vnstock, dự phòng yfinance) với circuit breaker,
+backoff mũ có jitter, nhận diện rate limit và thống kê sức khỏe từng nhà cung cấp
+"""
+
+import importlib.util
+import random
+import threading
+import time
+from collections import deque
+import pandas as pd
+from rate_limiter import get_shared_limiter
+from config import PROVIDER_SETTINGS
+
+# Trạng thái circuit breaker
+CLOSED = 'closed'        # Bình thường
+OPEN = 'open'            # Đang lỗi: bỏ qua, chuyển thẳng sang nhà cung cấp dự phòng
+HALF_OPEN = 'half_open'  # Hết thời gian chờ: cho một request thử
+
+# Lỗi do chính mã (không có dữ liệu, mã sai): nhà cung cấp vẫn trả lời, không thử lại
+SYMBOL_ERRORS = (ValueError, KeyError, IndexError)
+
+# Bộ đếm cộng dồn dùng để đo sức khỏe nhà cung cấp, cộng được qua các process (get_provider_totals)
+TOTAL_COUNTERS = ['requests', 'failures', 'rate_limited', 'short_circuited', 'latency_seconds']
+
+class ProviderError(Exception):
+    """Lỗi lớp nhà cung cấp"""
+
+class RateLimitError(ProviderError):
+    """Nhà cung cấp báo vượt giới hạn request (429)"""
+
+class ProviderUnavailable(ProviderError):
+    """Không nhà cung cấp nào trả lời được (lỗi mạng, circuit breaker đang mở)"""
+
+class NoDataError(ProviderError):
+    """Các nhà cung cấp đều trả lời nhưng không có dữ liệu cho mã"""
+    
+    def __init__(self, message, cause='NoData'):
+        super().__init__(message)
+        self.cause = cause
+
+def is_rate_limited(error):
+    """Lỗi có phải do bị giới hạn tốc độ (HTTP 429) không"""
+    if isinstance(error, RateLimitError):
+        return True
+    response = getattr(error, 'response', None)
+    if getattr(response, 'status_code', None) == 429:
+        return True
+    message = str(error).lower()
+    return '429' in message or 'too many requests' in message or 'rate limit' in message
+
+def backoff_delay(attempt, base, cap):
+    """Backoff mũ với full jitter: ngẫu nhiên trong [0, min(cap, base * 2^attempt)]"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold, recovery_seconds):
+        """
+        Khởi tạo circuit breaker (thread-safe)
+        
+        Args:
+            failure_threshold: Số lỗi liên tiếp để chuyển sang OPEN
+            recovery_seconds: Thời gian OPEN trước khi cho request thử (HALF_OPEN)
+        """
+        self._lock = threading.Lock()
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self._probe_in_flight = False
+    
+    def allow(self):
+        """Có được gửi request không (OPEN quá hạn thì cho đúng một request thử)"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.recovery_seconds:
+                self.state = HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+    
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+    
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._probe_in_flight = False
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.times_opened += 1
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+    
+    def reset(self):
+        with self._lock:
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self._probe_in_flight = False
+
+class Provider:
+    """Nhà cung cấp dữ liệu giá: lớp con cài đặt _history, trả về DataFrame chuẩn hóa hoặc None"""
+    
+    name = 'provider'
+    
+    def __init__(self, settings=None):
+        settings = settings or PROVIDER_SETTINGS
+        self.max_attempts = settings['MAX_ATTEMPTS']
+        self.backoff_base = settings['BACKOFF_BASE_SECONDS']
+        self.backoff_max = settings['BACKOFF_MAX_SECONDS']
+        self.rate_limit_backoff = settings['RATE_LIMIT_BACKOFF_SECONDS']
+        self.breaker = CircuitBreaker(settings['FAILURE_THRESHOLD'], settings['RECOVERY_SECONDS'])
+        
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=200)
+        self._counters = {}
+        self.last_error = None
+    
+    def _count(self, key, n=1):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + n
+    
+    def _history(self, symbol, start_date, end_date, resolution):
+        raise NotImplementedError
+    
+    def history(self, symbol, start_date, end_date, resolution='1D'):
+        """
+        Lấy lịch sử giá, thử lại lỗi tạm thời với backoff
+        
+        Returns:
+            DataFrame (có thể None/rỗng nếu không có dữ liệu)
+        
+        Raises:
+            ProviderUnavailable: Circuit breaker đang mở
+            SYMBOL_ERRORS: Lỗi do mã (không thử lại, không tính vào breaker)
+            Exception: Lỗi cuối cùng sau khi hết số lần thử
+        """
+        for attempt in range(self.max_attempts):
+            if not self.breaker.allow():
+                self._count('short_circuited')
+                raise ProviderUnavailable(f"{self.name} circuit open")
+            
+            self._count('requests')
+            started = time.perf_counter()
+            try:
+                df = self._history(symbol, start_date, end_date, resolution)
+            except SYMBOL_ERRORS:
+                self._record_latency(started)
+                self.breaker.record_success()
+                self._count('no_data')
+                raise
+            except Exception as e:
+                self._record_latency(started)
+                self.breaker.record_failure()
+                self.last_error = f"{type(e).__name__}: {str(e)[:100]}"
+                rate_limited = is_rate_limited(e)
+                self._count('rate_limited' if rate_limited else 'failures')
+                
+                if attempt == self.max_attempts - 1:
+                    if rate_limited:
+                        raise RateLimitError(str(e)) from e
+                    raise
+                
+                base = self.rate_limit_backoff if rate_limited else self.backoff_base
+                delay = backoff_delay(attempt, base, self.backoff_max)
+                self._count('backoff_ms', int(delay * 1000))
+                time.sleep(delay)
+                continue
+            
+            self._record_latency(started)
+            self.breaker.record_success()
+            self._count('successes' if df is not None and not df.empty else 'no_data')
+            return df
+    
+    def _record_latency(self, started):
+        latency = time.perf_counter() - started
+        with self._lock:
+            self._latencies.append(latency)
+            self._counters['latency_ms'] = self._counters.get('latency_ms', 0) + int(latency * 1000)
+    
+    def get_stats(self):
+        """Thống kê sức khỏe: trạng thái breaker, số request/lỗi, độ trễ trung bình và p95 (ms)"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            counters = dict(self._counters)
+        
+        stats = {
+            'state': self.breaker.state,
+            'times_opened': self.breaker.times_opened,
+            'consecutive_failures': self.breaker.consecutive_failures,
+            'requests': counters.get('requests', 0),
+            'successes': counters.get('successes', 0),
+            'no_data': counters.get('no_data', 0),
+            'failures': counters.get('failures', 0),
+            'rate_limited': counters.get('rate_limited', 0),
+            'short_circuited': counters.get('short_circuited', 0),
+            'backoff_seconds': round(counters.get('backoff_ms', 0) / 1000, 2),
+            'latency_seconds': round(counters.get('latency_ms', 0) / 1000, 3),
+            'avg_latency_ms': round(sum(latencies) / len(latencies) * 1000, 1) if latencies else None,
+            'p95_latency_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 1)
+                              if latencies else None,
+            'last_error': self.last_error
+        }
+        return stats
+
+class VnstockProvider(Provider):
+    name = 'vnstock'
+    
+    def __init__(self, quote_factory, settings=None):
+        """
+        Args:
+            quote_factory: Hàm symbol -> vnstock Quote (tra cứu lúc gọi để test thay được Quote)
+        """
+        super().__init__(settings)
+        self.quote_factory = quote_factory
+    
+    def _history(self, symbol, start_date, end_date, resolution):
+        # Chờ token từ bucket dùng chung để không vượt rate limit
+        get_shared_limiter().acquire()
+        df = self.quote_factory(symbol).history(
+            start=start_date.strftime('%Y-%m-%d'),
+            end=end_date.strftime('%Y-%m-%d'),
+            interval=resolution
+        )
+        if df is None or df.empty:
+            return None
+        
+        # Chuẩn hóa tên cột
+        df.columns = df.columns.str.lower()
+        
+        # Đảm bảo có cột time hoặc dùng index
+        if 'time' in df.columns:
+            df['time'] = pd.to_datetime(df['time'])
+            df = df.sort_values('time')
+            df = df.set_index('time')
+        elif isinstance(df.index, pd.DatetimeIndex):
+            df = df.sort_index()
+        elif df.index.name == 'time':
+            df.index = pd.to_datetime(df.index)
+            df = df.sort_index()
+        
+        # Đảm bảo có đủ cột cần thiết
+        column_mapping = {
+            'open_price': 'open',
+            'high_price': 'high',
+            'low_price': 'low',
+            'close_price': 'close',
+            'trading_volume': 'volume'
+        }
+        df.rename(columns=column_mapping, inplace=True)
+        
+        required_columns = ['open', 'high', 'low', 'close', 'volume']
+        if not all(col in df.columns for col in required_columns):
+            return None
+        return df
+
+class YFinanceProvider(Provider):
+    name = 'yfinance'
+    
+    INTERVALS = {'1D': '1d', '1W': '1wk', '1M': '1mo'}
+    
+    def _history(self, symbol, start_date, end_date, resolution):
+        import yfinance as yf
+        df = yf.download(
+            f"{symbol}.VN", start=start_date, end=end_date,
+            interval=self.INTERVALS.get(resolution, '1d'), progress=False, auto_adjust=False
+        )
+        if df is None or df.empty:
+            return None
+        
+        if isinstance(df.columns, pd.MultiIndex):
+            df.columns = df.columns.get_level_values(0)
+        df.columns = df.columns.str.lower().str.replace(' ', '_')
+        if 'adj_close' in df.columns:
+            df['close'] = df['adj_close']
+        return df.sort_index()
+
+class ProviderChain:
+    def __init__(self, providers):
+        """
+        Args:
+            providers: Danh sách Provider theo thứ tự ưu tiên (đầu tiên = chính)
+        """
+        self.providers = list(providers)
+    
+    def history(self, symbol, start_date, end_date, resolution='1D'):
+        """
+        Lấy lịch sử giá từ nhà cung cấp đầu tiên trả lời có dữ liệu
+        
+        Returns:
+            Tuple (DataFrame, tên nhà cung cấp)
+        
+        Raises:
+            NoDataError: Các nhà cung cấp trả lời nhưng không có dữ liệu (cause = lỗi của nhà cung cấp chính)
+            ProviderUnavailable: Không nhà cung cấp nào trả lời được
+        """
+        answered = False
+        primary_cause = None
+        last_error = None
+        
+        for provider in self.providers:
+            try:
+                df = provider.history(symbol, start_date, end_date, resolution)
+            except SYMBOL_ERRORS as e:
+                answered = True
+                primary_cause = primary_cause or type(e).__name__
+                continue
+            except Exception as e:
+                last_error = e
+                continue
+            
+            if df is not None and not df.empty:
+                return df, provider.name
+            answered = True
+            primary_cause = primary_cause or 'NoData'
+        
+        if answered:
+            raise NoDataError(f"No data for {symbol}", cause=primary_cause)
+        raise ProviderUnavailable(
+            f"All providers failed for {symbol}: {type(last_error).__name__}: {str(last_error)[:100]}"
+        ) from last_error
+    
+    def get_stats(self):
+        """Thống kê theo tên nhà cung cấp"""
+        return {provider.name: provider.get_stats() for provider in self.providers}
+    
+    def reset(self):
+        """Đóng lại mọi circuit breaker (ví dụ sau khi đổi mạng)"""
+        for provider in self.providers:
+            provider.breaker.reset()
+
+_shared_chain = None
+_shared_lock = threading.Lock()
+
+def get_provider_chain(quote_factory):
+    """
+    Chuỗi nhà cung cấp dùng chung cho toàn bộ process (breaker và thống kê chung giữa các DataFetcher)
+    
+    Args:
+        quote_factory: Hàm symbol -> vnstock Quote, dùng khi tạo chuỗi lần đầu
+    """
+    global _shared_chain
+    with _shared_lock:
+        if _shared_chain is None:
+            providers = [VnstockProvider(quote_factory)]
+            if 'yfinance' in PROVIDER_SETTINGS['FALLBACKS'] and importlib.util.find_spec('yfinance'):
+                providers.append(YFinanceProvider())
+            _shared_chain = ProviderChain(providers)
+        return _shared_chain
+
+def get_provider_stats():
+    """Thống kê sức khỏe các nhà cung cấp (rỗng nếu chưa có request nào)"""
+    return _shared_chain.get_stats() if _shared_chain is not None else {}
+
+def get_provider_totals():
+    """Tổng các bộ đếm TOTAL_COUNTERS của mọi nhà cung cấp trong process (process con gửi chênh lệch về process chính)"""
+    totals = dict.fromkeys(TOTAL_COUNTERS, 0)
+    for stats in get_provider_stats().values():
+        for key in TOTAL_COUNTERS:
+            totals[key] += stats[key]
+    return totals
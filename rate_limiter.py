@@ -0,0 +1,304 @@
+"""
+Module giới hạn tốc độ gọi API theo thuật toán token bucket
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from config import UPDATE_SETTINGS, SQLITE_SETTINGS
+
+class TokenBucket:
+    def __init__(self, rate, burst=1):
+        """
+        Khởi tạo token bucket (thread-safe)
+        
+        Args:
+            rate: Số request mỗi giây được nạp lại (<= 0 = không giới hạn)
+            burst: Số request tối đa được phép bắn dồn
+        """
+        self._lock = threading.Lock()
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._last_refill = time.monotonic()
+        
+        # Thống kê
+        self.total_acquired = 0
+        self.total_wait_seconds = 0.0
+    
+    def configure(self, rate=None, burst=None):
+        """Thay đổi tốc độ / burst khi đang chạy"""
+        with self._lock:
+            self._refill(time.monotonic())
+            if rate is not None:
+                self.rate = float(rate)
+            if burst is not None:
+                self.burst = max(1, int(burst))
+                self._tokens = min(self._tokens, float(self.burst))
+    
+    def _refill(self, now):
+        """Nạp token theo thời gian đã trôi qua (gọi khi đang giữ lock)"""
+        elapsed = now - self._last_refill
+        if elapsed > 0 and self.rate > 0:
+            self._tokens = min(float(self.burst), self._tokens + elapsed * self.rate)
+        self._last_refill = now
+    
+    def try_acquire(self, tokens=1):
+        """Lấy token nếu có sẵn, không chờ"""
+        with self._lock:
+            if self.rate <= 0:
+                self.total_acquired += tokens
+                return True
+            
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                self.total_acquired += tokens
+                return True
+            return False
+    
+    def acquire(self, tokens=1, timeout=None):
+        """
+        Chờ cho đến khi lấy được token
+        
+        Args:
+            tokens: Số token cần lấy
+            timeout: Thời gian chờ tối đa (giây, None = chờ mãi)
+        
+        Returns:
+            True nếu lấy được token, False nếu hết thời gian chờ
+        """
+        start = time.monotonic()
+        deadline = start + timeout if timeout is not None else None
+        
+        while True:
+            with self._lock:
+                if self.rate <= 0:
+                    self.total_acquired += tokens
+                    return True
+                
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    self.total_acquired += tokens
+                    self.total_wait_seconds += now - start
+                    return True
+                
+                wait = (tokens - self._tokens) / self.rate
+            
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            
+            time.sleep(wait)
+    
+    def get_stats(self):
+        """Thống kê sử dụng token"""
+        with self._lock:
+            return {
+                'rate': self.rate,
+                'burst': self.burst,
+                'total_acquired': self.total_acquired,
+                'total_wait_seconds': round(self.total_wait_seconds, 2)
+            }
+
+class SQLiteTokenBucket:
+    def __init__(self, db_path, rate=None, burst=None, name='provider'):
+        """
+        Token bucket dùng chung giữa nhiều process qua một file SQLite: mỗi lần lấy token là một
+        transaction BEGIN IMMEDIATE nên các process không lấy trùng token, tổng tốc độ của mọi
+        process không vượt `rate`
+        
+        Args:
+            db_path: File SQLite chứa bucket (tạo nếu chưa có)
+            rate, burst: Tốc độ / burst khi tạo bucket mới (mặc định theo UPDATE_SETTINGS);
+                         bucket đã có giữ nguyên, đổi bằng configure
+            name: Tên bucket (mỗi ngân sách request một tên)
+        """
+        self.db_path = db_path
+        self.name = name
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self.total_wait_seconds = 0.0
+        
+        rate = UPDATE_SETTINGS['REQUESTS_PER_SECOND'] if rate is None else rate
+        burst = max(1, int(UPDATE_SETTINGS['BURST'] if burst is None else burst))
+        with self._transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS token_buckets (
+                    name TEXT PRIMARY KEY,
+                    rate REAL,
+                    burst INTEGER,
+                    tokens REAL,
+                    refilled_at REAL,
+                    acquired INTEGER
+                )
+            ''')
+            conn.execute(
+                "INSERT OR IGNORE INTO token_buckets VALUES (?, ?, ?, ?, ?, 0)",
+                (name, float(rate), burst, float(burst), time.time())
+            )
+    
+    def _connection(self):
+        """Kết nối của process hiện tại (sau fork mở kết nối mới; gọi khi đang giữ lock)"""
+        if self._pid != os.getpid():
+            self._conn = sqlite3.connect(
+                self.db_path,
+                timeout=SQLITE_SETTINGS['BUSY_TIMEOUT_MS'] / 1000,
+                check_same_thread=False,
+                isolation_level=None
+            )
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=OFF")  # Mất trạng thái bucket khi mất điện không sao
+            self._pid = os.getpid()
+        return self._conn
+    
+    @contextmanager
+    def _transaction(self):
+        """Transaction ghi giữ khóa của bucket với mọi process"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+    
+    def _state(self, conn):
+        """(rate, burst, tokens, acquired) sau khi nạp token theo thời gian đã trôi qua"""
+        rate, burst, tokens, refilled_at, acquired = conn.execute(
+            "SELECT rate, burst, tokens, refilled_at, acquired FROM token_buckets WHERE name = ?", (self.name,)
+        ).fetchone()
+        now = time.time()
+        elapsed = now - refilled_at
+        if elapsed > 0 and rate > 0:
+            tokens = min(float(burst), tokens + elapsed * rate)
+        return rate, burst, tokens, acquired, now
+    
+    def _take(self, tokens):
+        """Lấy token nếu đủ; trả về số giây cần chờ (0 = đã lấy được)"""
+        with self._transaction() as conn:
+            rate, burst, available, acquired, now = self._state(conn)
+            if rate <= 0 or available >= tokens:
+                available = available - tokens if rate > 0 else available
+                conn.execute(
+                    "UPDATE token_buckets SET tokens = ?, refilled_at = ?, acquired = ? WHERE name = ?",
+                    (available, now, acquired + tokens, self.name)
+                )
+                return 0.0
+            conn.execute(
+                "UPDATE token_buckets SET tokens = ?, refilled_at = ? WHERE name = ?", (available, now, self.name)
+            )
+            return (tokens - available) / rate
+    
+    def _read(self, columns):
+        """Đọc các cột của bucket (không mở transaction ghi)"""
+        with self._lock:
+            return self._connection().execute(
+                f"SELECT {columns} FROM token_buckets WHERE name = ?", (self.name,)
+            ).fetchone()
+    
+    @property
+    def rate(self):
+        """Số request mỗi giây của toàn bộ các process"""
+        return self._read('rate')[0]
+    
+    @property
+    def burst(self):
+        """Số request tối đa được bắn dồn"""
+        return self._read('burst')[0]
+    
+    @property
+    def total_acquired(self):
+        """Tổng số token mọi process đã lấy"""
+        return self._read('acquired')[0]
+    
+    def configure(self, rate=None, burst=None):
+        """Thay đổi tốc độ / burst cho mọi process đang dùng bucket"""
+        with self._transaction() as conn:
+            current_rate, current_burst, tokens, _, now = self._state(conn)
+            rate = current_rate if rate is None else float(rate)
+            burst = current_burst if burst is None else max(1, int(burst))
+            conn.execute(
+                "UPDATE token_buckets SET rate = ?, burst = ?, tokens = ?, refilled_at = ? WHERE name = ?",
+                (rate, burst, min(tokens, float(burst)), now, self.name)
+            )
+    
+    def try_acquire(self, tokens=1):
+        """Lấy token nếu có sẵn, không chờ"""
+        return self._take(tokens) == 0
+    
+    def acquire(self, tokens=1, timeout=None):
+        """
+        Chờ cho đến khi lấy được token
+        
+        Args:
+            tokens: Số token cần lấy
+            timeout: Thời gian chờ tối đa (giây, None = chờ mãi)
+        
+        Returns:
+            True nếu lấy được token, False nếu hết thời gian chờ
+        """
+        start = time.monotonic()
+        deadline = start + timeout if timeout is not None else None
+        
+        while True:
+            wait = self._take(tokens)
+            if wait == 0:
+                self.total_wait_seconds += time.monotonic() - start
+                return True
+            
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            
+            time.sleep(wait)
+    
+    def get_stats(self):
+        """Thống kê sử dụng token (total_wait_seconds chỉ của process hiện tại)"""
+        rate, burst, acquired = self._read('rate, burst, acquired')
+        return {
+            'rate': rate,
+            'burst': burst,
+            'total_acquired': acquired,
+            'total_wait_seconds': round(self.total_wait_seconds, 2)
+        }
+
+_shared_limiter = None
+_shared_lock = threading.Lock()
+
+def get_shared_limiter():
+    """Lấy token bucket dùng chung cho toàn bộ process"""
+    global _shared_limiter
+    
+    with _shared_lock:
+        if _shared_limiter is None:
+            _shared_limiter = TokenBucket(
+                rate=UPDATE_SETTINGS['REQUESTS_PER_SECOND'],
+                burst=UPDATE_SETTINGS['BURST']
+            )
+        return _shared_limiter
+
+def set_shared_limiter(limiter):
+    """
+    Thay token bucket dùng chung của process (ví dụ SQLiteTokenBucket trong process con
+    để mọi process chung một ngân sách request)
+    
+    Returns:
+        Bucket trước đó
+    """
+    global _shared_limiter
+    
+    with _shared_lock:
+        previous, _shared_limiter = _shared_limiter, limiter
+        return previous
@@ -0,0 +1,211 @@
+"""
+Module biểu thức lọc cổ phiếu
+
+Ví dụ: rsi < 30 and close > sma_200 and volume_ratio > 1.5
+       signal in ('MUA', 'MUA MẠNH') and contains(trend, 'TĂNG')
+
+Biểu thức được phân tích một lần (cú pháp con của Python, chỉ cho phép phép so sánh,
+and/or/not, + - * /, hằng số, danh sách và một vài hàm) thành cây hàm, sau đó đánh giá
+vector hóa trên các cột NumPy của bảng snapshot/chỉ báo để ra mask boolean.
+"""
+
+import ast
+import operator
+import numpy as np
+
+# Tên viết tắt cho các cột của bảng market_snapshot
+COLUMN_ALIASES = {
+    'close': 'current_price',
+    'price': 'current_price',
+    'score': 'overall_score'
+}
+
+_COMPARISONS = {
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne
+}
+
+_ARITHMETIC = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.divide
+}
+
+def _contains(values, text):
+    """Chuỗi trong cột có chứa `text` (giá trị rỗng -> False)"""
+    return np.array([isinstance(v, str) and text in v for v in values], dtype=bool)
+
+def _isnull(values):
+    return np.array([v is None or (isinstance(v, float) and np.isnan(v)) for v in values], dtype=bool)
+
+_FUNCTIONS = {
+    'abs': np.abs,
+    'contains': _contains,
+    'isnull': _isnull,
+    'notnull': lambda values: ~_isnull(values)
+}
+
+class ScreenExpression:
+    def __init__(self, text):
+        """
+        Phân tích và biên dịch biểu thức lọc
+        
+        Args:
+            text: Biểu thức, ví dụ "rsi < 30 and close > sma_200"
+        
+        Raises:
+            ValueError: Biểu thức sai cú pháp hoặc dùng cấu trúc không được hỗ trợ
+        """
+        self.text = text.strip()
+        self.columns = set()
+        
+        try:
+            tree = ast.parse(self.text, mode='eval')
+        except SyntaxError as e:
+            raise ValueError(f"Biểu thức không hợp lệ: {e.msg}") from None
+        
+        self._evaluate = self._compile(tree.body)
+    
+    def __repr__(self):
+        return f"ScreenExpression({self.text!r})"
+    
+    def _compile(self, node):
+        """Chuyển một node AST thành hàm f(columns) -> mảng/giá trị"""
+        if isinstance(node, ast.BoolOp):
+            parts = [self._compile(value) for value in node.values]
+            combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            
+            def evaluate(columns):
+                result = _as_bool(parts[0](columns))
+                for part in parts[1:]:
+                    result = combine(result, _as_bool(part(columns)))
+                return result
+            return evaluate
+        
+        if isinstance(node, ast.UnaryOp):
+            operand = self._compile(node.operand)
+            if isinstance(node.op, ast.Not):
+                return lambda columns: np.logical_not(_as_bool(operand(columns)))
+            if isinstance(node.op, ast.USub):
+                return self._checked(node, lambda columns: np.negative(operand(columns)))
+            if isinstance(node.op, ast.UAdd):
+                return operand
+        
+        if isinstance(node, ast.Compare):
+            return self._checked(node, self._compile_compare(node))
+        
+        if isinstance(node, ast.BinOp) and type(node.op) in _ARITHMETIC:
+            func = _ARITHMETIC[type(node.op)]
+            left, right = self._compile(node.left), self._compile(node.right)
+            
+            def evaluate(columns):
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    return func(left(columns), right(columns))
+            return self._checked(node, evaluate)
+        
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in _FUNCTIONS:
+            if node.keywords:
+                raise ValueError(f"Hàm {node.func.id}() không nhận tham số dạng tên=giá trị")
+            func = _FUNCTIONS[node.func.id]
+            args = [self._compile(arg) for arg in node.args]
+            return self._checked(node, lambda columns: func(*[arg(columns) for arg in args]))
+        
+        if isinstance(node, ast.Name):
+            name = node.id
+            self.columns.add(name)
+            return lambda columns: columns(name)
+        
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, str, bool)):
+            value = node.value
+            return lambda columns: value
+        
+        if isinstance(node, (ast.Tuple, ast.List)):
+            if not all(isinstance(item, ast.Constant) for item in node.elts):
+                raise ValueError("Danh sách chỉ được chứa hằng số")
+            values = [item.value for item in node.elts]
+            return lambda columns: values
+        
+        raise ValueError(f"Cấu trúc không được hỗ trợ: {ast.unparse(node)}")
+    
+    def _checked(self, node, evaluate):
+        """Lỗi kiểu dữ liệu khi đánh giá (so sánh chuỗi với số...) báo ValueError kèm biểu thức con bị lỗi"""
+        text = ast.unparse(node)
+        
+        def checked(columns):
+            try:
+                return evaluate(columns)
+            except TypeError as e:
+                raise ValueError(f"Sai kiểu dữ liệu trong {text!r}: {e}") from None
+        return checked
+    
+    def _compile_compare(self, node):
+        """So sánh (hỗ trợ chuỗi a < b < c và `in`/`not in` danh sách)"""
+        operands = [self._compile(node.left)] + [self._compile(c) for c in node.comparators]
+        steps = []
+        for i, op in enumerate(node.ops):
+            if isinstance(op, (ast.In, ast.NotIn)):
+                negate = isinstance(op, ast.NotIn)
+                steps.append((i, lambda a, b, negate=negate: np.isin(a, b, invert=negate)))
+            elif type(op) in _COMPARISONS:
+                steps.append((i, _COMPARISONS[type(op)]))
+            else:
+                raise ValueError(f"Phép so sánh không được hỗ trợ: {ast.unparse(node)}")
+        
+        def evaluate(columns):
+            values = [operand(columns) for operand in operands]
+            result = None
+            with np.errstate(invalid='ignore'):
+                for i, func in steps:
+                    step = _as_bool(func(values[i], values[i + 1]))
+                    result = step if result is None else np.logical_and(result, step)
+            return result
+        return evaluate
+    
+    def mask(self, data):
+        """
+        Tính mask boolean trên bảng dữ liệu
+        
+        Args:
+            data: DataFrame hoặc dict {tên cột: mảng}
+        
+        Returns:
+            np.ndarray bool, True ở các dòng thỏa biểu thức
+        
+        Raises:
+            ValueError: Cột không tồn tại hoặc phép tính sai kiểu dữ liệu (ví dụ so sánh cột chuỗi với số)
+        """
+        length = len(data) if hasattr(data, 'columns') else len(next(iter(data.values())))
+        
+        def column(name):
+            key = name if name in data else COLUMN_ALIASES.get(name)
+            if key is None or key not in data:
+                raise ValueError(f"Không có cột '{name}'")
+            return _as_array(data[key])
+        
+        result = _as_bool(self._evaluate(column))
+        return np.broadcast_to(result, (length,)).copy()
+    
+    def filter(self, df):
+        """Lọc DataFrame theo biểu thức"""
+        return df[self.mask(df)]
+
+def _as_array(values):
+    """Mảng NumPy của một cột; cột số có giá trị NULL (dtype object) được đổi thành float/NaN"""
+    values = np.asarray(values)
+    if values.dtype == object and all(v is None or isinstance(v, (int, float)) for v in values):
+        return np.array([np.nan if v is None else v for v in values], dtype=float)
+    return values
+
+def _as_bool(values):
+    """Chuyển kết quả về mảng bool (NaN/None -> False)"""
+    values = np.asarray(values)
+    if values.dtype == bool:
+        return values
+    if values.dtype == object:
+        return np.array([bool(v) and v == v for v in values.ravel()], dtype=bool).reshape(values.shape)
+    return np.nan_to_num(values.astype(float), nan=0.0) != 0
@@ -0,0 +1,90 @@
+"""
+Module gộp các request giống nhau đang chạy đồng thời (single-flight): chỉ một lời gọi lên nhà cung cấp,
+các lời gọi cùng khóa chờ và dùng chung kết quả
+"""
+
+import threading
+
+class _Call:
+    """Một lời gọi đang chạy và kết quả/lỗi của nó"""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    def __init__(self):
+        """Khởi tạo nhóm single-flight (thread-safe)"""
+        self._lock = threading.Lock()
+        self._calls = {}
+        
+        # Thống kê
+        self.total_calls = 0
+        self.upstream_calls = 0
+        self.coalesced_calls = 0
+    
+    def do(self, key, func):
+        """
+        Chạy func() nếu chưa có lời gọi nào cùng khóa đang chạy, ngược lại chờ lời gọi đó
+        
+        Args:
+            key: Khóa (hashable) định danh request
+            func: Hàm không tham số thực hiện request
+        
+        Returns:
+            Tuple (kết quả, shared) với shared = True nếu dùng chung kết quả của lời gọi khác
+        
+        Raises:
+            Lỗi của func() (cả lời gọi chạy lẫn các lời gọi chờ đều nhận)
+        """
+        with self._lock:
+            self.total_calls += 1
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced_calls += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.upstream_calls += 1
+                leader = True
+        
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        
+        return call.result, False
+    
+    def get_stats(self):
+        """Thống kê: tổng số lời gọi, số request thực sự lên nhà cung cấp, số request tiết kiệm được"""
+        with self._lock:
+            return {
+                'total_calls': self.total_calls,
+                'upstream_calls': self.upstream_calls,
+                'coalesced_calls': self.coalesced_calls,
+                'in_flight': len(self._calls)
+            }
+
+_shared_group = None
+_shared_lock = threading.Lock()
+
+def get_single_flight():
+    """Nhóm single-flight dùng chung cho toàn bộ process (mọi phiên Streamlit, mọi DataFetcher)"""
+    global _shared_group
+    with _shared_lock:
+        if _shared_group is None:
+            _shared_group = SingleFlight()
+        return _shared_group
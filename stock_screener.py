@@ -5,13 +5,40 @@ Module tìm kiếm mã chứng khoán tiềm năng
 import pandas as pd
 import numpy as np
 import time
-from data_fetcher import DataFetcher
+from data_fetcher import DataFetcher, PERIOD_DAYS
+from technical_analysis import TechnicalAnalyzer
 from trading_signals import TradingSignalGenerator
-import streamlit as st
+from config import SCREENER_SETTINGS, TIME_PERIODS
+
+class ScreenContext:
+    """Dữ liệu của một mã dùng chung cho mọi chiến lược trong một lượt quét"""
+    
+    def __init__(self, symbol, info, analyzer):
+        self.symbol = symbol
+        self.info = info
+        self.analyzer = analyzer
+        self.data = analyzer.df
+        self.latest = self.data.iloc[-1]
+        self.prev = self.data.iloc[-2] if len(self.data) >= 2 else self.latest
+        self._signal_gen = None
+    
+    @property
+    def signal_gen(self):
+        """TradingSignalGenerator tạo một lần, dùng lại chỉ báo đã tính"""
+        if self._signal_gen is None:
+            self._signal_gen = TradingSignalGenerator(self.data, indicators_ready=True)
+        return self._signal_gen
 
 class StockScreener:
-    def __init__(self):
-        self.data_fetcher = DataFetcher()
+    # Chiến lược đã đăng ký: name -> {'func', 'period', 'min_bars'}
+    STRATEGIES = {}
+    
+    def __init__(self, cache=None):
+        """
+        Args:
+            cache: DataCache để đọc giá qua cache (chỉ lấy phần thiếu từ API)
+        """
+        self.data_fetcher = DataFetcher(cache=cache)
     
     def _normalize_stocks_dataframe(self, df):
         """Chuẩn hóa DataFrame từ all_stocks"""
@@ -28,303 +55,247 @@ class StockScreener:
         
         return df
     
-    def scan_market(self, investment_type='SHORT_TERM', top_n=20, progress_callback=None):
+    @classmethod
+    def register_strategy(cls, name, func, period='3M', min_bars=20):
         """
-        Quét thị trường tìm các cổ phiếu tiềm năng
+        Đăng ký chiến lược lọc
         
         Args:
-            investment_type: Loại đầu tư (SHORT_TERM, MEDIUM_TERM, LONG_TERM)
-            top_n: Số lượng cổ phiếu trả về
-            progress_callback: Callback để cập nhật tiến trình
+            name: Tên chiến lược (khóa trong kết quả của screen)
+            func: Hàm (context, params) -> dict kết quả hoặc None nếu không khớp
+            period: Khung thời gian dữ liệu cần (1M, 3M, 6M, 1Y, 3Y, 5Y)
+            min_bars: Số phiên tối thiểu để đánh giá
         """
-        # Lấy danh sách tất cả cổ phiếu
+        cls.STRATEGIES[name] = {'func': func, 'period': period, 'min_bars': min_bars}
+    
+    def _get_universe(self, max_symbols=None):
+        """Danh sách mã trên HOSE và HNX cần quét"""
         all_stocks = self.data_fetcher.get_all_stocks()
         
         if all_stocks is None or all_stocks.empty:
-            return []
+            return pd.DataFrame()
         
-        # Chuẩn hóa DataFrame
         all_stocks = self._normalize_stocks_dataframe(all_stocks)
         
         # Lọc chỉ lấy cổ phiếu trên HOSE và HNX (nếu có cột exchange)
         if 'exchange' in all_stocks.columns:
             all_stocks = all_stocks[all_stocks['exchange'].isin(['HOSE', 'HNX'])]
         
-        results = []
-        # Giới hạn số lượng để tránh timeout
-        total = min(len(all_stocks), 50)  # Giảm xuống 50 mã để tránh timeout
-        print(f"Scanning {total} stocks out of {len(all_stocks)} total stocks")
+        if max_symbols:
+            all_stocks = all_stocks.head(max_symbols)
         
-        for idx, row in all_stocks.head(total).iterrows():
+        return all_stocks
+    
+    def _load_stock_data(self, symbol, period):
+        """Lấy dữ liệu giá (thử lại một lần nếu lỗi hoặc thiếu dữ liệu)"""
+        stock_data = None
+        max_retries = 2
+        for retry in range(max_retries):
             try:
-                symbol = row['symbol']
-                
-                if progress_callback:
-                    progress_callback(idx + 1, total, symbol)
-                
-                # Xác định period dựa vào loại đầu tư
-                if investment_type == 'SHORT_TERM':
-                    period = '3M'
-                elif investment_type == 'MEDIUM_TERM':
-                    period = '1Y'
-                else:  # LONG_TERM
-                    period = '3Y'
-                
-                # Lấy dữ liệu với retry mechanism
-                stock_data = None
-                max_retries = 2
-                for retry in range(max_retries):
-                    try:
-                        stock_data = self.data_fetcher.get_stock_data(symbol, period=period)
-                        if stock_data is not None and len(stock_data) >= 20:
-                            break
-                        time.sleep(0.3)  # Đợi giữa các retry
-                    except Exception as e:
-                        if retry < max_retries - 1:
-                            time.sleep(0.5)  # Đợi lâu hơn trước retry
-                        continue
-                
-                # Delay để tránh rate limit
-                time.sleep(0.3)
-                
-                if stock_data is None or len(stock_data) < 20:
-                    continue
-                
-                # Lấy dữ liệu tài chính (chỉ cho trung và dài hạn)
-                financial_data = None
-                ratios_data = None
-                
-                if investment_type in ['MEDIUM_TERM', 'LONG_TERM']:
-                    ratios_data = self.data_fetcher.get_financial_ratios(symbol)
-                
-                # Phân tích
-                signal_gen = TradingSignalGenerator(stock_data, financial_data, ratios_data)
-                overall_signal = signal_gen.get_overall_signal()
-                timeframes = signal_gen.get_investment_timeframe()
-                
-                # Kiểm tra phù hợp với loại đầu tư
-                is_suitable = False
-                if investment_type == 'SHORT_TERM' and 'NGẮN HẠN' in ' '.join(timeframes):
-                    is_suitable = True
-                elif investment_type == 'MEDIUM_TERM' and 'TRUNG HẠN' in ' '.join(timeframes):
-                    is_suitable = True
-                elif investment_type == 'LONG_TERM' and 'DÀI HẠN' in ' '.join(timeframes):
-                    is_suitable = True
-                
-                if is_suitable and overall_signal['overall_score'] >= 55:
-                    latest_price = stock_data.iloc[-1]['close']
-                    
-                    results.append({
-                        'symbol': symbol,
-                        'name': row.get('organName', symbol),
-                        'exchange': row.get('exchange', ''),
-                        'price': latest_price,
-                        'overall_score': overall_signal['overall_score'],
-                        'technical_score': overall_signal['technical_score'],
-                        'fundamental_score': overall_signal['fundamental_score'],
-                        'signal': overall_signal['signal'],
-                        'timeframes': timeframes
-                    })
-                
-            except Exception as e:
-                continue
-        
-        # Sắp xếp theo điểm số
-        results = sorted(results, key=lambda x: x['overall_score'], reverse=True)
-        
-        return results[:top_n]
+                stock_data = self.data_fetcher.get_stock_data(symbol, period=period)
+                if stock_data is not None and len(stock_data) >= 20:
+                    break
+            except Exception:
+                pass
+            if retry < max_retries - 1:
+                time.sleep(0.5)
+        return stock_data
     
-    def filter_by_technical_criteria(self, criteria):
+    def screen(self, strategies=None, params=None, max_symbols=None, progress_callback=None):
         """
-        Lọc cổ phiếu theo tiêu chí kỹ thuật
+        Quét thị trường một lượt và đánh giá đồng thời nhiều chiến lược
         
-        criteria: dict chứa các tiêu chí
-        - rsi_range: tuple (min, max)
-        - trend: str ('TĂNG', 'GIẢM', 'SIDEWAY')
-        - volume_spike: bool
-        """
-        all_stocks = self.data_fetcher.get_all_stocks()
+        Mỗi mã chỉ lấy dữ liệu một lần (khung thời gian dài nhất trong các chiến lược)
+        và tính chỉ báo một lần.
         
-        if all_stocks is None or all_stocks.empty:
-            return []
+        Args:
+            strategies: Danh sách tên chiến lược (None = tất cả đã đăng ký)
+            params: Dict {tên chiến lược: tham số}
+            max_symbols: Giới hạn số lượng mã (None = theo SCREENER_SETTINGS)
+            progress_callback: Callback (current, total, symbol)
         
-        all_stocks = self._normalize_stocks_dataframe(all_stocks)
+        Returns:
+            Dict {tên chiến lược: list kết quả}
+        """
+        strategies = list(strategies or self.STRATEGIES)
+        params = params or {}
+        specs = {name: self.STRATEGIES[name] for name in strategies}
+        results = {name: [] for name in strategies}
         
-        # Lọc chỉ lấy cổ phiếu trên HOSE và HNX (nếu có cột exchange)
-        if 'exchange' in all_stocks.columns:
-            all_stocks = all_stocks[all_stocks['exchange'].isin(['HOSE', 'HNX'])]
+        if max_symbols is None:
+            max_symbols = SCREENER_SETTINGS['MAX_SYMBOLS']
+        all_stocks = self._get_universe(max_symbols)
+        if all_stocks.empty:
+            return results
         
-        results = []
+        period = max((spec['period'] for spec in specs.values()), key=PERIOD_DAYS.get)
+        min_bars = min(spec['min_bars'] for spec in specs.values())
+        total = len(all_stocks)
+        print(f"Screening {total} stocks with {len(specs)} strategies ({period} data)")
         
-        for idx, row in all_stocks.head(50).iterrows():
+        for i, (_, row) in enumerate(all_stocks.iterrows()):
+            symbol = row['symbol']
+            if progress_callback:
+                progress_callback(i + 1, total, symbol)
+            
             try:
-                symbol = row['symbol']
-                try:
-                    stock_data = self.data_fetcher.get_stock_data(symbol, period='3M')
-                except Exception:
+                stock_data = self._load_stock_data(symbol, period)
+                if stock_data is None or len(stock_data) < min_bars:
                     continue
                 
-                if stock_data is None or len(stock_data) < 20:
-                    continue
-                
-                from technical_analysis import TechnicalAnalyzer
                 analyzer = TechnicalAnalyzer(stock_data)
                 analyzer.add_all_indicators()
-                
-                latest = analyzer.df.iloc[-1]
-                
-                # Kiểm tra các tiêu chí
-                match = True
-                
-                # RSI
-                if 'rsi_range' in criteria and pd.notna(latest['rsi']):
-                    rsi_min, rsi_max = criteria['rsi_range']
-                    if not (rsi_min <= latest['rsi'] <= rsi_max):
-                        match = False
-                
-                # Trend
-                if 'trend' in criteria:
-                    trend = analyzer.get_trend()
-                    if criteria['trend'] not in trend:
-                        match = False
-                
-                # Volume spike
-                if 'volume_spike' in criteria and criteria['volume_spike']:
-                    if pd.notna(latest['volume_ratio']):
-                        if latest['volume_ratio'] < 1.5:
-                            match = False
-                
-                if match:
-                    results.append({
-                        'symbol': symbol,
-                        'name': row.get('organName', symbol),
-                        'price': latest['close'],
-                        'rsi': latest.get('rsi', None),
-                        'trend': analyzer.get_trend(),
-                        'volume_ratio': latest.get('volume_ratio', None)
-                    })
-                
-            except Exception as e:
+                context = ScreenContext(symbol, row, analyzer)
+            except Exception:
                 continue
-        
-        return results
-    
-    def find_breakout_stocks(self):
-        """Tìm cổ phiếu đang breakout"""
-        all_stocks = self.data_fetcher.get_all_stocks()
-        
-        if all_stocks is None or all_stocks.empty:
-            return []
-        
-        all_stocks = self._normalize_stocks_dataframe(all_stocks)
-        
-        # Lọc chỉ lấy cổ phiếu trên HOSE và HNX (nếu có cột exchange)
-        if 'exchange' in all_stocks.columns:
-            all_stocks = all_stocks[all_stocks['exchange'].isin(['HOSE', 'HNX'])]
-        
-        results = []
-        
-        for idx, row in all_stocks.head(50).iterrows():
-            try:
-                symbol = row['symbol']
+            
+            for name, spec in specs.items():
+                if len(stock_data) < spec['min_bars']:
+                    continue
                 try:
-                    stock_data = self.data_fetcher.get_stock_data(symbol, period='6M')
+                    result = spec['func'](context, params.get(name) or {})
                 except Exception:
                     continue
-                
-                if stock_data is None or len(stock_data) < 100:
-                    continue
-                
-                from technical_analysis import TechnicalAnalyzer
-                analyzer = TechnicalAnalyzer(stock_data)
-                analyzer.add_all_indicators()
-                
-                latest = analyzer.df.iloc[-1]
-                prev = analyzer.df.iloc[-2]
-                
-                # Điều kiện breakout:
-                # 1. Giá vượt qua SMA 50
-                # 2. Volume tăng mạnh
-                # 3. RSI > 50 nhưng chưa quá mua
-                
-                is_breakout = False
-                
-                if pd.notna(latest['sma_50']) and pd.notna(latest['volume_ratio']):
-                    price_breakout = prev['close'] < prev['sma_50'] and latest['close'] > latest['sma_50']
-                    volume_surge = latest['volume_ratio'] > 1.5
-                    rsi_ok = pd.notna(latest['rsi']) and 50 < latest['rsi'] < 70
-                    
-                    if price_breakout and volume_surge and rsi_ok:
-                        is_breakout = True
-                
-                if is_breakout:
-                    results.append({
-                        'symbol': symbol,
-                        'name': row.get('organName', symbol),
-                        'price': latest['close'],
-                        'sma_50': latest['sma_50'],
-                        'volume_ratio': latest['volume_ratio'],
-                        'rsi': latest['rsi']
-                    })
-                
-            except Exception as e:
-                continue
+                if result:
+                    results[name].append(result)
         
         return results
     
-    def find_oversold_stocks(self):
-        """Tìm cổ phiếu quá bán (cơ hội mua vào)"""
-        all_stocks = self.data_fetcher.get_all_stocks()
+    def scan_market(self, investment_type='SHORT_TERM', top_n=20, progress_callback=None, max_symbols=None):
+        """
+        Quét thị trường tìm các cổ phiếu tiềm năng
         
-        if all_stocks is None or all_stocks.empty:
-            return []
+        Args:
+            investment_type: Loại đầu tư (SHORT_TERM, MEDIUM_TERM, LONG_TERM)
+            top_n: Số lượng cổ phiếu trả về
+            progress_callback: Callback để cập nhật tiến trình
+            max_symbols: Giới hạn số lượng mã (None = theo SCREENER_SETTINGS)
+        """
+        name = investment_type.lower()
+        results = self.screen([name], max_symbols=max_symbols, progress_callback=progress_callback)[name]
         
-        all_stocks = self._normalize_stocks_dataframe(all_stocks)
+        # Sắp xếp theo điểm số
+        results = sorted(results, key=lambda x: x['overall_score'], reverse=True)
         
-        # Lọc chỉ lấy cổ phiếu trên HOSE và HNX (nếu có cột exchange)
-        if 'exchange' in all_stocks.columns:
-            all_stocks = all_stocks[all_stocks['exchange'].isin(['HOSE', 'HNX'])]
+        return results[:top_n]
+    
+    def filter_by_technical_criteria(self, criteria, max_symbols=None):
+        """
+        Lọc cổ phiếu theo tiêu chí kỹ thuật
         
-        results = []
+        criteria: dict chứa các tiêu chí
+        - rsi_range: tuple (min, max)
+        - trend: str ('TĂNG', 'GIẢM', 'SIDEWAY')
+        - volume_spike: bool
+        """
+        return self.screen(['technical'], {'technical': criteria}, max_symbols=max_symbols)['technical']
+    
+    def find_breakout_stocks(self, max_symbols=None):
+        """Tìm cổ phiếu đang breakout"""
+        return self.screen(['breakout'], max_symbols=max_symbols)['breakout']
+    
+    def find_oversold_stocks(self, max_symbols=None):
+        """Tìm cổ phiếu quá bán (cơ hội mua vào)"""
+        return self.screen(['oversold'], max_symbols=max_symbols)['oversold']
+
+def _investment_strategy(label):
+    """Tạo chiến lược quét theo loại đầu tư (dùng trong scan_market)"""
+    def evaluate(ctx, params):
+        overall_signal = ctx.signal_gen.get_overall_signal()
+        timeframes = ctx.signal_gen.get_investment_timeframe()
         
-        for idx, row in all_stocks.head(50).iterrows():
-            try:
-                symbol = row['symbol']
-                try:
-                    stock_data = self.data_fetcher.get_stock_data(symbol, period='3M')
-                except Exception:
-                    continue
-                
-                if stock_data is None or len(stock_data) < 20:
-                    continue
-                
-                from technical_analysis import TechnicalAnalyzer
-                analyzer = TechnicalAnalyzer(stock_data)
-                analyzer.add_all_indicators()
-                
-                latest = analyzer.df.iloc[-1]
-                
-                # Điều kiện quá bán:
-                # RSI < 30 hoặc giá chạm Bollinger Band dưới
-                is_oversold = False
-                
-                if pd.notna(latest['rsi']) and latest['rsi'] < 30:
-                    is_oversold = True
-                
-                if pd.notna(latest['bb_low']) and latest['close'] <= latest['bb_low']:
-                    is_oversold = True
-                
-                if is_oversold:
-                    results.append({
-                        'symbol': symbol,
-                        'name': row.get('organName', symbol),
-                        'price': latest['close'],
-                        'rsi': latest.get('rsi', None),
-                        'bb_position': 'Chạm dải dưới' if pd.notna(latest['bb_low']) and latest['close'] <= latest['bb_low'] else 'RSI quá bán'
-                    })
-                
-            except Exception as e:
-                continue
+        # Kiểm tra phù hợp với loại đầu tư
+        if label not in ' '.join(timeframes) or overall_signal['overall_score'] < params.get('min_score', 55):
+            return None
         
-        return results
+        return {
+            'symbol': ctx.symbol,
+            'name': ctx.info.get('organName', ctx.symbol),
+            'exchange': ctx.info.get('exchange', ''),
+            'price': ctx.latest['close'],
+            'overall_score': overall_signal['overall_score'],
+            'technical_score': overall_signal['technical_score'],
+            'fundamental_score': overall_signal['fundamental_score'],
+            'signal': overall_signal['signal'],
+            'timeframes': timeframes
+        }
+    return evaluate
+
+def _technical_strategy(ctx, criteria):
+    """Lọc theo RSI, xu hướng và khối lượng"""
+    latest = ctx.latest
+    
+    # RSI
+    if 'rsi_range' in criteria and pd.notna(latest['rsi']):
+        rsi_min, rsi_max = criteria['rsi_range']
+        if not (rsi_min <= latest['rsi'] <= rsi_max):
+            return None
+    
+    # Trend
+    trend = ctx.analyzer.get_trend()
+    if 'trend' in criteria and criteria['trend'] not in trend:
+        return None
+    
+    # Volume spike
+    if criteria.get('volume_spike') and pd.notna(latest['volume_ratio']) and latest['volume_ratio'] < 1.5:
+        return None
+    
+    return {
+        'symbol': ctx.symbol,
+        'name': ctx.info.get('organName', ctx.symbol),
+        'price': latest['close'],
+        'rsi': latest.get('rsi', None),
+        'trend': trend,
+        'volume_ratio': latest.get('volume_ratio', None)
+    }
+
+def _breakout_strategy(ctx, params):
+    """
+    Điều kiện breakout:
+    1. Giá vượt qua SMA 50
+    2. Volume tăng mạnh
+    3. RSI > 50 nhưng chưa quá mua
+    """
+    latest, prev = ctx.latest, ctx.prev
+    if pd.isna(latest['sma_50']) or pd.isna(latest['volume_ratio']):
+        return None
+    
+    price_breakout = prev['close'] < prev['sma_50'] and latest['close'] > latest['sma_50']
+    volume_surge = latest['volume_ratio'] > 1.5
+    rsi_ok = pd.notna(latest['rsi']) and 50 < latest['rsi'] < 70
+    
+    if not (price_breakout and volume_surge and rsi_ok):
+        return None
+    
+    return {
+        'symbol': ctx.symbol,
+        'name': ctx.info.get('organName', ctx.symbol),
+        'price': latest['close'],
+        'sma_50': latest['sma_50'],
+        'volume_ratio': latest['volume_ratio'],
+        'rsi': latest['rsi']
+    }
+
+def _oversold_strategy(ctx, params):
+    """Điều kiện quá bán: RSI < 30 hoặc giá chạm Bollinger Band dưới"""
+    latest = ctx.latest
+    rsi_oversold = pd.notna(latest['rsi']) and latest['rsi'] < 30
+    touch_bb_low = pd.notna(latest['bb_low']) and latest['close'] <= latest['bb_low']
+    
+    if not (rsi_oversold or touch_bb_low):
+        return None
+    
+    return {
+        'symbol': ctx.symbol,
+        'name': ctx.info.get('organName', ctx.symbol),
+        'price': latest['close'],
+        'rsi': latest.get('rsi', None),
+        'bb_position': 'Chạm dải dưới' if touch_bb_low else 'RSI quá bán'
+    }
 
+StockScreener.register_strategy('short_term', _investment_strategy('NGẮN HẠN'), period=TIME_PERIODS['SHORT_TERM'])
+StockScreener.register_strategy('medium_term', _investment_strategy('TRUNG HẠN'), period=TIME_PERIODS['MEDIUM_TERM'])
+StockScreener.register_strategy('long_term', _investment_strategy('DÀI HẠN'), period=TIME_PERIODS['LONG_TERM'])
+StockScreener.register_strategy('technical', _technical_strategy, period='3M')
+StockScreener.register_strategy('breakout', _breakout_strategy, period='6M', min_bars=100)
+StockScreener.register_strategy('oversold', _oversold_strategy, period='3M')
@@ -100,8 +100,8 @@ class TechnicalAnalyzer:
             high=self.df['high'],
             low=self.df['low'],
             close=self.df['close'],
-            window=14,
-            smooth_window=3
+            window=TECHNICAL_INDICATORS['STOCH_PERIOD'],
+            smooth_window=TECHNICAL_INDICATORS['STOCH_SMOOTH']
         )
         self.df['stoch_k'] = stoch.stoch()
         self.df['stoch_d'] = stoch.stoch_signal()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test script cho AIMDController (tự điều chỉnh số luồng, req/s và thời gian nghỉ giữa batch)
+"""
+
+from aimd_controller import AIMDController
+
+SETTINGS = {
+    'MIN_WORKERS': 1, 'MAX_WORKERS': 8, 'WORKERS_STEP': 1,
+    'MIN_RPS': 0.5, 'MAX_RPS': 4.0, 'RPS_STEP': 0.5,
+    'DECREASE_FACTOR': 0.5,
+    'DELAY_STEP_SECONDS': 5, 'MIN_DELAY_SECONDS': 0, 'MAX_DELAY_SECONDS': 120, 'BACKOFF_DELAY_SECONDS': 30,
+    'MAX_ERROR_RATE': 0.05, 'LATENCY_TOLERANCE': 2.0
+}
+
+class FakeProviders:
+    """Bộ đếm nhà cung cấp cộng dồn như get_provider_stats"""
+    
+    def __init__(self):
+        self.totals = {'requests': 0, 'errors': 0, 'latency_seconds': 0.0}
+    
+    def batch(self, requests, errors=0, latency=0.2):
+        self.totals = {
+            'requests': self.totals['requests'] + requests,
+            'errors': self.totals['errors'] + errors,
+            'latency_seconds': self.totals['latency_seconds'] + requests * latency
+        }
+        return dict(self.totals)
+
+def _run_batch(controller, providers, symbols, now, **batch):
+    controller.begin_batch(now=now, provider_totals=providers.totals)
+    return controller.record_batch(symbols, providers.batch(**batch))
+
+def test_additive_increase():
+    """Batch khỏe: thêm một luồng, thêm req/s, bớt thời gian nghỉ; không vượt giới hạn"""
+    controller = AIMDController(workers=2, rate=1.0, delay=12, settings=SETTINGS)
+    providers = FakeProviders()
+    
+    result = _run_batch(controller, providers, 50, now=0, requests=50, errors=1)
+    assert result['healthy'] and result['error_rate'] == 0.02
+    assert (controller.workers, controller.rate, controller.delay) == (3, 1.5, 7)
+    
+    for _ in range(10):
+        _run_batch(controller, providers, 50, now=0, requests=50)
+    assert (controller.workers, controller.rate, controller.delay) == (8, 4.0, 0)
+
+def test_multiplicative_decrease():
+    """Lỗi hoặc độ trễ tăng vọt: giảm một nửa và nghỉ lâu hơn"""
+    controller = AIMDController(workers=8, rate=4.0, delay=0, settings=SETTINGS)
+    providers = FakeProviders()
+    
+    result = _run_batch(controller, providers, 50, now=0, requests=60, errors=10)
+    assert not result['healthy']
+    assert (controller.workers, controller.rate, controller.delay) == (4, 2.0, 30)
+    
+    _run_batch(controller, providers, 50, now=0, requests=50, latency=0.2)
+    assert controller.workers == 5
+    result = _run_batch(controller, providers, 50, now=0, requests=50, latency=0.9)
+    assert not result['healthy'] and controller.workers == 2 and controller.delay == 50
+    
+    for _ in range(5):
+        _run_batch(controller, providers, 50, now=0, requests=50, errors=50)
+    assert (controller.workers, controller.rate, controller.delay) == (1, 0.5, 120)
+
+def test_no_requests_holds():
+    """Batch không có request nào (mã đã cập nhật hết) không được coi là khỏe để tăng tốc"""
+    controller = AIMDController(workers=2, rate=1.0, delay=12, settings=SETTINGS)
+    providers = FakeProviders()
+    
+    result = _run_batch(controller, providers, 50, now=0, requests=0)
+    assert not result['measured']
+    assert (controller.workers, controller.rate, controller.delay) == (2, 1.0, 12)
+    assert controller.healthy_batches == 0 and controller.batches == 1
+    assert 'giữ nguyên' in controller.describe(100, now=60)
+
+def test_fixed_mode_and_eta():
+    """adaptive=False giữ nguyên tham số; throughput và ETA tính từ thời gian thực đo"""
+    controller = AIMDController(workers=4, rate=2.0, delay=30, adaptive=False, settings=SETTINGS)
+    providers = FakeProviders()
+    assert controller.eta_minutes(100, now=0) is None
+    
+    _run_batch(controller, providers, 50, now=0, requests=50, errors=25)
+    _run_batch(controller, providers, 50, now=0, requests=50)
+    assert (controller.workers, controller.rate, controller.delay) == (4, 2.0, 30)
+    assert controller.healthy_batches == 1 and controller.batches == 2
+    
+    assert controller.throughput(now=120) == 50.0
+    assert controller.eta_minutes(500, now=120) == 10.0
+    assert 'ETA 10.0 phút' in controller.describe(500, now=120)
+
+def main():
+    """Main test function"""
+    print("🚀 Testing AIMDController")
+    print("=" * 50)
+    
+    test_additive_increase()
+    print("✅ Additive increase while healthy")
+    test_multiplicative_decrease()
+    print("✅ Multiplicative decrease on errors and latency spikes")
+    test_no_requests_holds()
+    print("✅ Batches without provider requests hold the parameters")
+    test_fixed_mode_and_eta()
+    print("✅ Fixed mode, throughput and ETA")
+
+if __name__ == "__main__":
+    main()
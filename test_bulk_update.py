@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Test script cho bulk cache update song song với fake Quote provider
+"""
+
+import tempfile
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+import data_fetcher
+from data_cache import DataCache
+from data_fetcher import DataFetcher
+from rate_limiter import TokenBucket, get_shared_limiter
+from config import UPDATE_SETTINGS, NEGATIVE_CACHE_SETTINGS
+
+class FakeQuote:
+    """Giả lập vnstock Quote: có độ trễ và lỗi 429 theo cấu hình"""
+    
+    latency = 0.05
+    failures = {}  # symbol -> số lần trả lỗi 429 trước khi thành công
+    dead = set()   # mã luôn trả về rỗng (hủy niêm yết)
+    calls = {}
+    _lock = threading.Lock()
+    
+    def __init__(self, symbol, source=None):
+        self.symbol = symbol
+    
+    @classmethod
+    def reset(cls, latency=0.05, failures=None, dead=None):
+        cls.latency = latency
+        cls.failures = dict(failures or {})
+        cls.dead = set(dead or [])
+        cls.calls = {}
+    
+    def history(self, start, end, interval='1D'):
+        with FakeQuote._lock:
+            FakeQuote.calls[self.symbol] = FakeQuote.calls.get(self.symbol, 0) + 1
+            should_fail = FakeQuote.failures.get(self.symbol, 0) > 0
+            if should_fail:
+                FakeQuote.failures[self.symbol] -= 1
+        
+        time.sleep(FakeQuote.latency)
+        if should_fail:
+            raise Exception("429 Too Many Requests")
+        if self.symbol in FakeQuote.dead:
+            return pd.DataFrame()
+        
+        dates = pd.bdate_range(start, end)
+        seed = sum(ord(c) for c in self.symbol)
+        close = 20 + np.cumsum(np.random.default_rng(seed).normal(0, 0.3, len(dates)))
+        return pd.DataFrame({
+            'time': dates,
+            'open': close,
+            'high': close + 0.5,
+            'low': close - 0.5,
+            'close': close,
+            'volume': np.full(len(dates), 100000)
+        })
+
+def _make_cache(tmp_dir):
+    """Tạo DataCache tạm với fake provider"""
+    data_fetcher.Quote = FakeQuote
+    DataFetcher.get_stock_data.clear()
+    return DataCache(cache_dir=tmp_dir)
+
+def test_token_bucket_rate():
+    """Token bucket phải giữ đúng tốc độ sau khi hết burst"""
+    bucket = TokenBucket(rate=20, burst=5)
+    start = time.monotonic()
+    for _ in range(25):
+        bucket.acquire()
+    elapsed = time.monotonic() - start
+    
+    # 5 token có sẵn, 20 token còn lại cần ~1 giây
+    assert 0.85 <= elapsed <= 1.5, elapsed
+    assert bucket.get_stats()['total_acquired'] == 25
+
+def test_bulk_update_concurrent():
+    """Cập nhật song song phải cache đủ mã và nhanh hơn chạy tuần tự"""
+    original_quote = data_fetcher.Quote
+    symbols = [f"S{i:02d}" for i in range(20)]
+    FakeQuote.reset(latency=0.2)
+    
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = _make_cache(tmp_dir)
+            success = cache.bulk_cache_update(
+                symbols_list=symbols, max_workers=8, requests_per_second=100, burst=20
+            )
+            
+            assert success == len(symbols)
+            assert cache.get_cache_stats()['total_symbols'] == len(symbols)
+            # Tuần tự mất >= 20 * 0.2s = 4s
+            assert cache.last_update_stats['elapsed_seconds'] < 2.0
+            assert cache.last_update_stats['provider_requests'] == len(symbols)
+            
+            # Tốc độ truyền vào chỉ áp dụng cho lần cập nhật đó
+            limiter = get_shared_limiter()
+            assert (limiter.rate, limiter.burst) == (UPDATE_SETTINGS['REQUESTS_PER_SECOND'], UPDATE_SETTINGS['BURST'])
+    finally:
+        data_fetcher.Quote = original_quote
+        get_shared_limiter().configure(
+            rate=UPDATE_SETTINGS['REQUESTS_PER_SECOND'], burst=UPDATE_SETTINGS['BURST']
+        )
+
+def test_bulk_update_rate_limited_with_429():
+    """Rate limit phải được tôn trọng và lỗi 429 được retry"""
+    original_quote = data_fetcher.Quote
+    symbols = [f"R{i:02d}" for i in range(10)]
+    FakeQuote.reset(latency=0.01, failures={'R03': 1, 'R07': 1})
+    
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = _make_cache(tmp_dir)
+            success = cache.bulk_cache_update(
+                symbols_list=symbols, max_workers=4, requests_per_second=10, burst=2
+            )
+            
+            stats = cache.last_update_stats
+            assert success == len(symbols)
+            assert stats['provider_requests'] == len(symbols) + 2
+            # 12 request, burst 2, 10 req/s => tối thiểu ~1 giây
+            assert stats['elapsed_seconds'] >= 0.9
+            assert stats['requests_per_second'] <= 12
+    finally:
+        data_fetcher.Quote = original_quote
+        get_shared_limiter().configure(
+            rate=UPDATE_SETTINGS['REQUESTS_PER_SECOND'], burst=UPDATE_SETTINGS['BURST']
+        )
+
+def test_upsert_is_idempotent():
+    """Ghi đè dữ liệu trùng (symbol, date) không được lỗi IntegrityError"""
+    original_quote = data_fetcher.Quote
+    FakeQuote.reset(latency=0)
+    
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = _make_cache(tmp_dir)
+            assert cache.cache_stock_data('AAA')
+            records = cache.get_cache_stats()['total_records']
+            
+            # Full update chồng lên toàn bộ dữ liệu đã có
+            assert cache.cache_stock_data('AAA', force_full_update=True)
+            assert cache.get_cache_stats()['total_records'] >= records
+            
+            # Giá trị mới ghi đè giá trị cũ
+            df = cache.get_cached_data('AAA')
+            changed = df.tail(3).copy()
+            changed['close'] = 99.0
+            cache.upsert_stock_data({'AAA': changed})
+            assert (cache.get_cached_data('AAA')['close'].tail(3) == 99.0).all()
+            assert len(cache.get_cached_data('AAA')) == len(df)
+    finally:
+        data_fetcher.Quote = original_quote
+
+def test_negative_cache():
+    """Mã không có dữ liệu bị bỏ qua đến hạn kiểm tra lại, thời gian chờ tăng gấp đôi"""
+    original_quote = data_fetcher.Quote
+    FakeQuote.reset(latency=0, dead=['DEAD'])
+    
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = _make_cache(tmp_dir)
+            assert cache.bulk_cache_update(symbols_list=['AAA', 'DEAD']) == 1
+            failures = cache.get_symbol_failures().set_index('symbol')
+            assert list(failures.index) == ['DEAD']
+            assert failures.loc['DEAD', 'failures'] == 1 and failures.loc['DEAD', 'last_error'] == 'NoData'
+            
+            # Lần chạy sau: DEAD không tốn request nào
+            calls = FakeQuote.calls['DEAD']
+            DataFetcher.get_stock_data.clear()
+            cache.bulk_cache_update(symbols_list=['AAA', 'DEAD'])
+            assert FakeQuote.calls['DEAD'] == calls
+            assert cache.last_update_stats['skipped_known_failures'] == 1
+            assert cache.last_update_stats['provider_requests'] == 0
+            assert cache.get_cache_stats()['known_failures'] == 1
+            
+            # Thử lại bắt buộc: lỗi lần 2, chờ gấp đôi
+            DataFetcher.get_stock_data.clear()
+            cache.bulk_cache_update(symbols_list=['DEAD'], retry_failed=True)
+            failures = cache.get_symbol_failures().set_index('symbol')
+            assert failures.loc['DEAD', 'failures'] == 2
+            interval = (pd.Timestamp(failures.loc['DEAD', 'next_check_at']) -
+                        pd.Timestamp(failures.loc['DEAD', 'last_failed_at']))
+            assert interval == pd.Timedelta(hours=2 * NEGATIVE_CACHE_SETTINGS['BASE_RECHECK_HOURS'])
+            
+            # Có dữ liệu trở lại nhưng ghi lỗi: vẫn giữ trong negative cache
+            FakeQuote.dead.clear()
+            DataFetcher.get_stock_data.clear()
+            
+            def failing_upsert(frames):
+                raise RuntimeError("disk full")
+            
+            cache.upsert_stock_data = failing_upsert
+            assert cache.bulk_cache_update(symbols_list=['DEAD'], retry_failed=True) == 0
+            assert list(cache.get_symbol_failures()['symbol']) == ['DEAD']
+            del cache.upsert_stock_data
+            
+            # Có dữ liệu trở lại: xóa khỏi negative cache
+            DataFetcher.get_stock_data.clear()
+            assert cache.cache_stock_data('DEAD')
+            assert cache.get_symbol_failures().empty
+    finally:
+        data_fetcher.Quote = original_quote
+
+def main():
+    """Main test function"""
+    print("🚀 Testing Bulk Cache Update")
+    print("=" * 50)
+    
+    test_token_bucket_rate()
+    print("✅ Token bucket")
+    test_bulk_update_concurrent()
+    print("✅ Concurrent bulk update")
+    test_bulk_update_rate_limited_with_429()
+    print("✅ Rate limit + 429 retry")
+    test_upsert_is_idempotent()
+    print("✅ Idempotent upsert")
+    test_negative_cache()
+    print("✅ Negative cache")
+
+if __name__ == "__main__":
+    main()
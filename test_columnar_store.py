@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Test script cho kho giá dạng cột (ColumnarPriceStore) và backend 'columnar' của DataCache
+"""
+
+import tempfile
+import numpy as np
+import pandas as pd
+
+from columnar_store import ColumnarPriceStore
+from data_cache import DataCache
+from indicator_panel import PRICE_FIELDS
+
+def _frame(start, days, base=10.0):
+    """DataFrame giá mẫu theo ngày làm việc"""
+    dates = pd.bdate_range(start, periods=days)
+    close = base + np.arange(days, dtype=float)
+    return pd.DataFrame({
+        'open': close, 'high': close + 1, 'low': close - 1, 'close': close,
+        'volume': np.arange(days) * 100 + 1000
+    }, index=dates)
+
+def test_append_in_place_and_rewrite():
+    """Phiên mới ghi tại chỗ; sửa phiên cũ ghi sang khối mới mà không đổi dữ liệu cũ"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = ColumnarPriceStore(tmp_dir)
+        store.write({'AAA': _frame('2024-01-01', 100), 'BBB': _frame('2024-01-01', 10)})
+        offset = store.index['AAA'][0]
+        
+        store.write({'AAA': _frame('2024-05-20', 5, base=500.0)})
+        assert store.index['AAA'][:2] == [offset, 105]
+        assert store.last_date('AAA').isoformat() == '2024-05-24'
+        
+        # Sửa một phiên cũ: gộp, giá mới thắng, khối mới
+        old_view = store.read('AAA')
+        fix = _frame('2024-01-03', 1, base=999.0)
+        store.write({'AAA': fix})
+        assert store.index['AAA'][0] != offset and store.index['AAA'][1] == 105
+        assert store.read('AAA', '2024-01-03', '2024-01-03')['close'].tolist() == [999.0]
+        assert old_view['close'][2] == 12.0
+        
+        # View chỉ đọc, không sao chép
+        view = store.read('AAA')
+        assert not view['close'].flags.writeable
+        assert not view['close'].flags.owndata
+        
+        # Process khác (instance mới) thấy dữ liệu đã ghi
+        other = ColumnarPriceStore(tmp_dir)
+        assert other.row_count() == 115
+        store.write({'BBB': _frame('2024-01-15', 1, base=77.0)})
+        assert other.read('BBB')['close'][-1] == 77.0
+
+def test_data_cache_backend_parity():
+    """Backend 'columnar' trả về giống hệt backend SQLite"""
+    frames = {'AAA': _frame('2024-01-01', 120), 'BBB': _frame('2024-03-01', 40, base=20.0)}
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sqlite_cache = DataCache(cache_dir=tmp_dir)
+        sqlite_cache.upsert_stock_data(frames)
+        
+        # Bật columnar trên cache đã có dữ liệu: dựng lại từ stock_price
+        columnar_cache = DataCache(cache_dir=tmp_dir, price_backend='columnar')
+        columnar_cache.upsert_stock_data({'AAA': _frame('2024-06-17', 3, base=300.0)})
+        
+        for symbol in frames:
+            expected = sqlite_cache.get_cached_data(symbol, start_date='2024-02-01')
+            result = columnar_cache.get_cached_data(symbol, start_date='2024-02-01')
+            pd.testing.assert_frame_equal(result, expected, check_index_type=False)
+            assert columnar_cache.get_last_date(symbol) == sqlite_cache.get_last_date(symbol)
+        
+        pd.testing.assert_frame_equal(
+            columnar_cache.get_cached_data_many(start_date='2024-02-01'),
+            sqlite_cache.get_cached_data_many(start_date='2024-02-01')
+        )
+        
+        expected = sqlite_cache.get_cached_data_many(as_panel=True, lookback=50)
+        panel = columnar_cache.get_cached_data_many(as_panel=True, lookback=50)
+        assert panel['symbols'] == expected['symbols']
+        assert np.array_equal(panel['dates'], expected['dates'], equal_nan=True)
+        for field in PRICE_FIELDS:
+            assert np.array_equal(panel[field], expected[field], equal_nan=True), field
+        
+        assert columnar_cache.get_cached_data('ZZZ').empty
+
+def test_columnar_rebuilt_after_sqlite_write():
+    """Process chỉ ghi SQLite sửa phiên đã có (số dòng không đổi): kho dạng cột được dựng lại khi mở"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        DataCache(cache_dir=tmp_dir, price_backend='columnar').upsert_stock_data({'AAA': _frame('2024-01-01', 20)})
+        DataCache(cache_dir=tmp_dir).upsert_stock_data({'AAA': _frame('2024-01-03', 1, base=999.0)})
+        
+        columnar_cache = DataCache(cache_dir=tmp_dir, price_backend='columnar')
+        assert columnar_cache.columnar.row_count() == 20
+        assert columnar_cache.get_cached_data('AAA', '2024-01-03', '2024-01-03')['close'].tolist() == [999.0]
+        
+        # Không có ghi mới: mở lại không dựng lại
+        generation = columnar_cache.columnar._generation
+        assert DataCache(cache_dir=tmp_dir, price_backend='columnar').columnar._generation == generation
+
+def main():
+    """Main test function"""
+    print("🚀 Testing ColumnarPriceStore")
+    print("=" * 50)
+    
+    test_append_in_place_and_rewrite()
+    print("✅ Append in place and rewrite")
+    test_data_cache_backend_parity()
+    print("✅ DataCache backend parity")
+    test_columnar_rebuilt_after_sqlite_write()
+    print("✅ Columnar store rebuilt after SQLite-only writes")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Test script cho các chức năng đọc/ghi của DataCache (không gọi API)
+"""
+
+import os
+import sqlite3
+import tempfile
+import numpy as np
+import pandas as pd
+
+from data_cache import DataCache
+from cached_stock_screener import CachedStockScreener
+from technical_analysis import TechnicalAnalyzer
+from indicator_panel import INDICATOR_COLUMNS, PRICE_FIELDS, build_price_panel
+from config import TECHNICAL_INDICATORS
+
+def _sample_frame(start, days, base=10.0):
+    """Tạo DataFrame giá mẫu với giá tăng dần"""
+    dates = pd.bdate_range(start, periods=days)
+    close = base + np.arange(days, dtype=float)
+    return pd.DataFrame({
+        'open': close,
+        'high': close + 1,
+        'low': close - 1,
+        'close': close,
+        'volume': np.arange(days) * 100 + 1000
+    }, index=dates)
+
+def _add_info(cache, symbols):
+    """Thêm thông tin cơ bản cho các mã"""
+    cache.update_stock_info(pd.DataFrame({
+        'symbol': symbols,
+        'organName': [f"Company {s}" for s in symbols],
+        'exchange': ['HOSE'] * len(symbols)
+    }))
+
+def test_latest_bar_overview():
+    """get_market_overview đọc từ latest_bar và được cập nhật theo mỗi lần ghi"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = DataCache(cache_dir=tmp_dir)
+        _add_info(cache, ['AAA', 'BBB'])
+        
+        cache.upsert_stock_data({'AAA': _sample_frame('2023-01-02', 300), 'BBB': _sample_frame('2024-01-01', 5)})
+        overview = cache.get_market_overview().set_index('symbol')
+        
+        aaa = cache.get_cached_data('AAA')
+        assert overview.loc['AAA', 'current_price'] == aaa['close'].iloc[-1]
+        assert overview.loc['AAA', 'prev_close'] == aaa['close'].iloc[-2]
+        assert overview.loc['AAA', 'last_update'] == aaa.index[-1].strftime('%Y-%m-%d')
+        assert overview.loc['AAA', 'avg_volume_20'] == aaa['volume'].tail(20).mean()
+        assert overview.loc['AAA', 'high_52w'] == aaa['high'].tail(252).max()
+        assert overview.loc['AAA', 'low_52w'] == aaa['low'].tail(252).min()
+        assert overview.loc['BBB', 'low_52w'] == 9.0
+        
+        # Thêm phiên mới -> latest_bar được cập nhật
+        cache.upsert_stock_data({'BBB': _sample_frame('2024-01-08', 1, base=50.0)})
+        overview = cache.get_market_overview().set_index('symbol')
+        assert overview.loc['BBB', 'current_price'] == 50.0
+        assert overview.loc['BBB', 'prev_close'] == 14.0
+        assert overview.loc['BBB', 'last_update'] == '2024-01-08'
+        assert cache.get_cache_stats()['total_symbols'] == 2
+
+def test_latest_bar_backfill_for_existing_db():
+    """Database cũ (chưa có latest_bar) được dựng lại khi khởi tạo"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = DataCache(cache_dir=tmp_dir)
+        _add_info(cache, ['AAA'])
+        cache.upsert_stock_data({'AAA': _sample_frame('2024-01-01', 30)})
+        
+        with cache.db.writer() as conn:
+            conn.execute("DROP TABLE latest_bar")
+        
+        cache = DataCache(cache_dir=tmp_dir)
+        overview = cache.get_market_overview()
+        assert len(overview) == 1
+        assert overview.iloc[0]['current_price'] == 39.0
+
+def test_incremental_indicator_state():
+    """Trạng thái chỉ báo cập nhật tăng dần cho kết quả như tính lại toàn bộ"""
+    rng = np.random.default_rng(0)
+    df = _sample_frame('2023-01-02', 320)
+    # Giá nghìn đồng 2 chữ số thập phân (cache lưu giá dạng số nguyên đã nhân PRICE_SCALE)
+    df['close'] = (50 * np.exp(np.cumsum(rng.normal(0, 0.02, len(df))))).round(2)
+    df['high'] = (df['close'] * 1.02).round(2)
+    df['low'] = (df['close'] * 0.98).round(2)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = DataCache(cache_dir=tmp_dir)
+        cache.upsert_stock_data({'AAA': df.iloc[:300]})
+        assert cache.update_indicator_states()['AAA'].bars == 300
+        
+        # Chỉ các phiên mới được đưa vào trạng thái đã lưu
+        cache.upsert_stock_data({'AAA': df.iloc[300:]})
+        state = cache.update_indicator_states(['AAA'])['AAA']
+        assert state.bars == 320
+        assert cache.update_indicator_states(['AAA']) == {}
+        
+        expected = TechnicalAnalyzer(df).add_all_indicators().iloc[-1]
+        for column in INDICATOR_COLUMNS:
+            assert np.isclose(state.values[column], expected[column], rtol=1e-7, equal_nan=True), column
+        
+        # Chỉ báo từng phiên được lưu vào technical_indicators
+        stored = cache.get_indicators('AAA')
+        assert len(stored) == 320
+        assert np.isclose(stored['rsi'].iloc[-1], expected['rsi'])
+        assert np.isnan(stored['sma_200'].iloc[198]) and not np.isnan(stored['sma_200'].iloc[199])
+        assert cache.get_stock_with_indicators('AAA', period_days=100000)['obv'].notna().all()
+        
+        # Ghi đè phiên cũ làm mất hiệu lực trạng thái -> dựng lại toàn bộ
+        cache.upsert_stock_data({'AAA': df.iloc[[10]]})
+        assert cache.load_indicator_states(['AAA']) == {}
+        assert cache.update_indicator_states(['AAA'])['AAA'].bars == 320
+
+def test_get_cached_data_many():
+    """Đọc gộp nhiều mã cho kết quả như đọc từng mã; panel giống build_price_panel"""
+    frames = {
+        'AAA': _sample_frame('2024-01-01', 120),
+        'BBB': _sample_frame('2024-03-01', 40, base=20.0),
+        'CCC': _sample_frame('2024-02-01', 80, base=30.0)
+    }
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = DataCache(cache_dir=tmp_dir)
+        cache.upsert_stock_data(frames)
+        
+        long_df = cache.get_cached_data_many(['CCC', 'AAA', 'BBB'], start_date='2024-02-15')
+        assert long_df['symbol'].unique().tolist() == ['AAA', 'BBB', 'CCC']
+        for symbol, df in long_df.groupby('symbol'):
+            expected = cache.get_cached_data(symbol, start_date='2024-02-15')
+            assert (df['date'].to_numpy() == expected.index.to_numpy()).all()
+            assert np.allclose(df[PRICE_FIELDS].to_numpy(), expected[PRICE_FIELDS].to_numpy(dtype=float))
+        
+        # Panel căn phải theo phiên, giới hạn lookback
+        panel = cache.get_cached_data_many(as_panel=True, lookback=60)
+        expected = build_price_panel({s: cache.get_cached_data(s) for s in ['AAA', 'BBB', 'CCC']}, lookback=60)
+        assert panel['symbols'] == expected['symbols']
+        assert (panel['dates'] == expected['dates']).sum() == (~np.isnat(expected['dates'])).sum()
+        for field in PRICE_FIELDS:
+            assert np.array_equal(panel[field], expected[field], equal_nan=True), field
+        
+        # Kèm chỉ báo đã lưu
+        cache.update_indicator_states()
+        with_indicators = cache.get_cached_data_many(['AAA'], with_indicators=True)
+        stored = cache.get_indicators('AAA')
+        assert np.allclose(with_indicators['rsi'].to_numpy(), stored['rsi'].to_numpy(), equal_nan=True)
+        
+        assert cache.get_cached_data_many(['ZZZ']).empty
+        assert cache.get_cached_data_many(['ZZZ'], as_panel=True)['symbols'] == []
+
+def test_schema_v2_migration():
+    """Database dạng cũ (stock_price TEXT/REAL) được chuyển sang price_bar số nguyên ngay tại chỗ"""
+    frames = {'AAA': _sample_frame('2024-01-01', 300), 'BBB': _sample_frame('2024-06-03', 50, base=23.45)}
+    frames['BBB']['close'] += 0.05
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        conn = sqlite3.connect(os.path.join(tmp_dir, "stock_data.db"))
+        conn.execute('''
+            CREATE TABLE stock_price (
+                symbol TEXT, date TEXT, open REAL, high REAL, low REAL, close REAL, volume INTEGER,
+                PRIMARY KEY (symbol, date)
+            )
+        ''')
+        for symbol, df in frames.items():
+            conn.executemany("INSERT INTO stock_price VALUES (?, ?, ?, ?, ?, ?, ?)", [
+                (symbol, date.strftime('%Y-%m-%d'), *map(float, row[:4]), int(row[4]))
+                for date, row in zip(df.index, df[['open', 'high', 'low', 'close', 'volume']].to_numpy())
+            ])
+        conn.commit()
+        conn.close()
+        
+        cache = DataCache(cache_dir=tmp_dir)
+        for symbol, df in frames.items():
+            cached = cache.get_cached_data(symbol)
+            assert (cached.index == df.index).all()
+            assert np.array_equal(cached['close'].to_numpy(), df['close'].to_numpy())
+            assert cached['volume'].tolist() == df['volume'].tolist()
+        assert cache.get_last_date('BBB').isoformat() == frames['BBB'].index[-1].strftime('%Y-%m-%d')
+        
+        stats = cache.get_cache_stats()
+        assert stats['schema_version'] == 2 and stats['total_records'] == 350
+        report = stats['schema_migration']
+        assert report['records'] == 350
+        assert {'max_date_ms_v1', 'max_date_ms_v2', 'range_scan_ms_v1', 'range_scan_ms_v2', 'size_after_mb'} <= set(report)
+        
+        # Bảng mới là WITHOUT ROWID, bảng cũ được thay bằng view chỉ đọc cùng định dạng
+        reader = cache.db.reader()
+        sql = reader.execute("SELECT sql FROM sqlite_master WHERE name = 'price_bar'").fetchone()[0]
+        assert 'WITHOUT ROWID' in sql
+        assert reader.execute("SELECT type FROM sqlite_master WHERE name = 'stock_price'").fetchone()[0] == 'view'
+        assert reader.execute(
+            "SELECT close FROM stock_price WHERE symbol = 'BBB' ORDER BY date LIMIT 1"
+        ).fetchone()[0] == 23.5
+        
+        # Mở lại không chuyển lần nữa
+        assert DataCache(cache_dir=tmp_dir).get_cache_stats()['schema_migration'] == report
+
+def test_indicator_config_change():
+    """Đổi TECHNICAL_INDICATORS (hash khác) thì chỉ báo đã lưu bị xóa và tính lại"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = DataCache(cache_dir=tmp_dir)
+        cache.upsert_stock_data({'AAA': _sample_frame('2023-01-02', 60)})
+        cache.update_indicator_states()
+        assert not np.isnan(cache.get_indicators('AAA')['sma_50'].iloc[49])
+        
+        original = TECHNICAL_INDICATORS['SMA_MEDIUM']
+        TECHNICAL_INDICATORS['SMA_MEDIUM'] = 55
+        try:
+            cache = DataCache(cache_dir=tmp_dir)
+            assert cache.get_indicators('AAA').empty
+            assert cache.update_indicator_states()['AAA'].bars == 60
+            stored = cache.get_indicators('AAA')
+            assert np.isnan(stored['sma_50'].iloc[53]) and not np.isnan(stored['sma_50'].iloc[54])
+        finally:
+            TECHNICAL_INDICATORS['SMA_MEDIUM'] = original
+        
+        # Quay lại tham số cũ: hash khớp với config hiện tại nên phải tính lại lần nữa
+        cache = DataCache(cache_dir=tmp_dir)
+        assert cache.get_indicators('AAA').empty
+
+def test_market_snapshot_refresh():
+    """Snapshot thị trường chỉ tính lại các mã có phiên mới"""
+    # Dữ liệu kết thúc gần hiện tại (screener đọc 1 năm gần nhất từ cache)
+    dates = pd.bdate_range(end=pd.Timestamp.today().normalize() - pd.Timedelta(days=7), periods=300)
+    start = dates[0].strftime('%Y-%m-%d')
+    next_day = (dates[-1] + pd.offsets.BDay()).strftime('%Y-%m-%d')
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = DataCache(cache_dir=tmp_dir)
+        _add_info(cache, ['AAA', 'BBB', 'CCC'])
+        cache.upsert_stock_data({
+            'AAA': _sample_frame(start, 300),
+            'BBB': _sample_frame(start, 300, base=50.0),
+            'CCC': _sample_frame(dates[-10], 10)
+        })
+        cache.update_indicator_states()
+        
+        screener = CachedStockScreener(cache)
+        assert screener.refresh_market_snapshot() == 3
+        assert screener.refresh_market_snapshot() == 0
+        
+        # CCC không đủ dữ liệu nên không có trong bảng
+        df = screener.get_market_comparison_table()
+        assert sorted(df['symbol']) == ['AAA', 'BBB']
+        assert df.set_index('symbol').loc['AAA', 'current_price'] == 309.0
+        
+        cache.upsert_stock_data({'AAA': _sample_frame(next_day, 1, base=400.0)})
+        assert list(cache.get_stale_snapshot_symbols()) == ['AAA']
+        
+        df = screener.get_market_comparison_table().set_index('symbol')
+        assert df.loc['AAA', 'current_price'] == 400.0
+        assert df.loc['AAA', 'data_date'] == next_day
+        
+        # Ghi đè phiên đã có (full update, điều chỉnh giá) không thêm phiên mới nhưng vẫn phải tính lại
+        cache.upsert_stock_data({'BBB': _sample_frame(dates[-5], 5, base=100.0)})
+        assert list(cache.get_stale_snapshot_symbols()) == ['BBB']
+        
+        df = screener.get_market_comparison_table().set_index('symbol')
+        assert df.loc['BBB', 'current_price'] == 104.0
+        assert screener.refresh_market_snapshot() == 0
+
+def test_market_comparison_max_symbols():
+    """max_symbols lấy các mã điểm cao nhất, không phải các mã đầu bảng chữ cái"""
+    dates = pd.bdate_range(end=pd.Timestamp.today().normalize() - pd.Timedelta(days=7), periods=300)
+    falling = _sample_frame(dates[0], 300, base=400.0)
+    falling[['open', 'high', 'low', 'close']] = falling[['open', 'high', 'low', 'close']].values[::-1]
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = DataCache(cache_dir=tmp_dir)
+        _add_info(cache, ['AAA', 'ZZZ'])
+        cache.upsert_stock_data({'AAA': falling, 'ZZZ': _sample_frame(dates[0], 300)})
+        cache.update_indicator_states()
+        
+        screener = CachedStockScreener(cache)
+        scores = screener.get_market_comparison_table().set_index('symbol')['overall_score']
+        assert scores['ZZZ'] > scores['AAA']
+        assert list(screener.get_market_comparison_table(max_symbols=1)['symbol']) == ['ZZZ']
+
+def main():
+    """Main test function"""
+    print("🚀 Testing DataCache")
+    print("=" * 50)
+    
+    test_latest_bar_overview()
+    print("✅ latest_bar overview")
+    test_latest_bar_backfill_for_existing_db()
+    print("✅ latest_bar backfill")
+    test_incremental_indicator_state()
+    print("✅ Incremental indicator state")
+    test_get_cached_data_many()
+    print("✅ Bulk read of many symbols")
+    test_schema_v2_migration()
+    print("✅ Schema v2 migration")
+    test_indicator_config_change()
+    print("✅ Indicator config change")
+    test_market_snapshot_refresh()
+    print("✅ Market snapshot refresh")
+    test_market_comparison_max_symbols()
+    print("✅ Market comparison keeps the top-scored symbols")
+
+if __name__ == "__main__":
+    main()
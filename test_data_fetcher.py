@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test script cho DataFetcher đọc qua cache (read-through, chỉ lấy phần thiếu từ API)
+"""
+
+import tempfile
+import numpy as np
+import pandas as pd
+
+import data_fetcher
+from data_cache import DataCache
+from data_fetcher import DataFetcher
+
+class RecordingQuote:
+    """Giả lập vnstock Quote: ghi lại khoảng ngày của mỗi request"""
+    
+    calls = []
+    
+    def __init__(self, symbol, source=None):
+        self.symbol = symbol
+    
+    def history(self, start, end, interval='1D'):
+        RecordingQuote.calls.append((self.symbol, start, end))
+        dates = pd.bdate_range(start, end)
+        close = 20 + np.arange(len(dates)) * 0.1 + dates.dayofyear * 0.01
+        return pd.DataFrame({
+            'time': dates, 'open': close, 'high': close + 0.5, 'low': close - 0.5,
+            'close': close, 'volume': np.full(len(dates), 100000)
+        })
+
+def _fetch(fetcher, start_date, end_date):
+    # Xóa kết quả get_stock_data trong FetchCache để mỗi lần gọi đều đi qua read-through
+    DataFetcher.get_stock_data.clear()
+    RecordingQuote.calls = []
+    return fetcher.get_stock_data('AAA', start_date=start_date, end_date=end_date)
+
+def test_read_through_delta():
+    """Lần đầu lấy cả khoảng, sau đó chỉ lấy phần đuôi/phần đầu còn thiếu"""
+    original_quote = data_fetcher.Quote
+    data_fetcher.Quote = RecordingQuote
+    
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = DataCache(cache_dir=tmp_dir)
+            fetcher = DataFetcher(cache=cache)
+            
+            df = _fetch(fetcher, '2024-01-01', '2024-03-29')
+            assert RecordingQuote.calls == [('AAA', '2024-01-01', '2024-03-29')]
+            assert cache.get_last_date('AAA').isoformat() == '2024-03-29'
+            
+            # Cùng khoảng: không gọi API
+            again = _fetch(fetcher, '2024-01-01', '2024-03-29')
+            assert RecordingQuote.calls == []
+            assert np.allclose(again['close'].to_numpy(), df['close'].to_numpy())
+            
+            # Khoảng dài hơn: chỉ lấy phần đuôi từ sau ngày cuối cùng đã lưu
+            longer = _fetch(fetcher, '2024-01-01', '2024-04-30')
+            assert RecordingQuote.calls == [('AAA', '2024-03-30', '2024-04-30')]
+            assert len(longer) == len(pd.bdate_range('2024-01-01', '2024-04-30'))
+            assert longer.index.is_monotonic_increasing
+            assert cache.get_last_date('AAA').isoformat() == '2024-04-30'
+            
+            # Cuối tuần sau ngày cuối cùng: không có gì để lấy
+            _fetch(fetcher, '2024-01-01', '2024-05-05')
+            assert RecordingQuote.calls == [('AAA', '2024-05-01', '2024-05-05')]
+            _fetch(fetcher, '2024-01-01', '2024-05-05')
+            assert RecordingQuote.calls == []
+            
+            # Bắt đầu sớm hơn dữ liệu đã lưu: lấy thêm phần đầu
+            earlier = _fetch(fetcher, '2023-11-01', '2024-03-29')
+            assert RecordingQuote.calls == [('AAA', '2023-11-01', '2023-12-31')]
+            assert earlier.index[0] == pd.Timestamp('2023-11-01')
+            assert earlier.index[-1] == pd.Timestamp('2024-03-29')
+            
+            # Chỉ báo được cập nhật cùng dữ liệu ghi lại
+            assert cache.get_indicators('AAA').index[-1] == pd.Timestamp('2024-05-03')
+    finally:
+        data_fetcher.Quote = original_quote
+        DataFetcher.get_stock_data.clear()
+
+def test_without_cache_uses_requested_range():
+    """Không có cache: gọi API đúng khoảng start_date/end_date"""
+    original_quote = data_fetcher.Quote
+    data_fetcher.Quote = RecordingQuote
+    
+    try:
+        df = _fetch(DataFetcher(), '2024-02-01', '2024-02-29')
+        assert RecordingQuote.calls == [('AAA', '2024-02-01', '2024-02-29')]
+        assert df.index[0] == pd.Timestamp('2024-02-01')
+    finally:
+        data_fetcher.Quote = original_quote
+        DataFetcher.get_stock_data.clear()
+
+def main():
+    """Main test function"""
+    print("🚀 Testing DataFetcher read-through")
+    print("=" * 50)
+    
+    test_read_through_delta()
+    print("✅ Read-through delta")
+    test_without_cache_uses_requested_range()
+    print("✅ Requested range without cache")
+
+if __name__ == "__main__":
+    main()
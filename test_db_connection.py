@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Test script cho connection manager SQLite (WAL, reader/writer dùng chung)
+"""
+
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+
+from data_cache import DataCache
+from db_connection import get_connection_manager
+
+def _sample_frame(start, days):
+    """Tạo DataFrame giá mẫu"""
+    dates = pd.bdate_range(start, periods=days)
+    close = np.linspace(10, 20, days)
+    return pd.DataFrame({
+        'open': close, 'high': close + 1, 'low': close - 1,
+        'close': close, 'volume': np.full(days, 1000)
+    }, index=dates)
+
+def test_wal_and_pragmas():
+    """Database phải chạy ở chế độ WAL với synchronous=NORMAL"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = DataCache(cache_dir=tmp_dir)
+        reader = cache.db.reader()
+        
+        assert reader.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+        assert reader.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+        assert cache.db is get_connection_manager(cache.db_path)
+        assert DataCache(cache_dir=tmp_dir).db is cache.db
+        
+        # Reader trong cùng thread được dùng lại, reader không được ghi
+        assert cache.db.reader() is reader
+        try:
+            reader.execute("DELETE FROM price_bar")
+            assert False, "reader must be read-only"
+        except Exception as e:
+            assert 'readonly' in str(e).lower() or 'query_only' in str(e).lower() or 'read-only' in str(e).lower()
+
+def test_concurrent_readers_and_writer():
+    """Đọc song song trong lúc ghi không bị lỗi database is locked"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = DataCache(cache_dir=tmp_dir)
+        errors = []
+        stop = threading.Event()
+        
+        def read_loop():
+            try:
+                while not stop.is_set():
+                    cache.get_cached_data('AAA')
+                    cache.get_last_date('BBB')
+                    cache.get_cache_stats()
+            except Exception as e:
+                errors.append(e)
+        
+        readers = [threading.Thread(target=read_loop) for _ in range(4)]
+        for thread in readers:
+            thread.start()
+        
+        try:
+            for i in range(30):
+                cache.upsert_stock_data({
+                    'AAA': _sample_frame('2024-01-01', 50 + i),
+                    'BBB': _sample_frame('2024-03-01', 20 + i)
+                })
+        finally:
+            stop.set()
+            for thread in readers:
+                thread.join()
+        
+        assert not errors, errors
+        assert len(cache.get_cached_data('AAA')) == 79
+        assert cache.get_last_date('BBB') is not None
+
+def main():
+    """Main test function"""
+    print("🚀 Testing SQLite Connection Manager")
+    print("=" * 50)
+    
+    test_wal_and_pragmas()
+    print("✅ WAL + pragmas")
+    test_concurrent_readers_and_writer()
+    print("✅ Concurrent readers + single writer")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Test script cho FetchCache (cache kết quả DataFetcher không phụ thuộc Streamlit)
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+import data_fetcher
+from data_fetcher import DataFetcher
+from fetch_cache import FetchCache, get_fetch_cache
+
+class CountingQuote:
+    """Giả lập vnstock Quote: đếm số request"""
+    
+    calls = 0
+    
+    def __init__(self, symbol, source=None):
+        self.symbol = symbol
+    
+    def history(self, start, end, interval='1D'):
+        CountingQuote.calls += 1
+        dates = pd.bdate_range(start, end)
+        close = 10 + np.arange(len(dates), dtype=float)
+        return pd.DataFrame({
+            'time': dates, 'open': close, 'high': close, 'low': close,
+            'close': close, 'volume': np.full(len(dates), 1000)
+        })
+
+def _frame(rows):
+    return pd.DataFrame({'close': np.arange(rows, dtype=float)})
+
+def test_lru_evicts_by_size():
+    """Vượt dung lượng thì bỏ mục ít dùng gần đây nhất"""
+    cache = FetchCache(max_memory_mb=0.01, disk_enabled=False)  # ~10 KB
+    for name in ['A', 'B', 'C']:
+        cache.set(('stock_data', name), _frame(400), ttl=60)  # ~3,3 KB mỗi mục
+    
+    assert cache.get(('stock_data', 'A'))[0]  # A vừa được dùng
+    cache.set(('stock_data', 'D'), _frame(400), ttl=60)
+    
+    assert not cache.get(('stock_data', 'B'))[0]
+    assert cache.get(('stock_data', 'A'))[0] and cache.get(('stock_data', 'D'))[0]
+    assert cache.get_stats()['evictions'] == 1
+    assert cache.get_stats()['memory_mb'] <= 0.01
+
+def test_ttl_and_copies():
+    """Mục hết hạn bị bỏ; người gọi sửa kết quả không làm hỏng bản trong cache"""
+    cache = FetchCache(disk_enabled=False)
+    cache.set(('company_overview', 'VNM'), _frame(3), ttl=0.1)
+    
+    found, df = cache.get(('company_overview', 'VNM'))
+    df['close'] = -1
+    assert (cache.get(('company_overview', 'VNM'))[1]['close'] >= 0).all()
+    
+    time.sleep(0.15)
+    assert cache.get(('company_overview', 'VNM')) == (False, None)
+
+def test_disk_tier_shared():
+    """Kết quả ghi xuống đĩa được một cache khác (process khác) đọc lại; clear theo phương thức"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        writer = FetchCache(disk_dir=tmp_dir, disk_enabled=True)
+        writer.set(('all_stocks', ()), _frame(5), ttl=60)
+        writer.set(('stock_data', 'FPT'), _frame(5), ttl=60)
+        
+        reader = FetchCache(disk_dir=tmp_dir, disk_enabled=True)
+        found, df = reader.get(('all_stocks', ()))
+        assert found and len(df) == 5
+        assert reader.get_stats()['disk_hits'] == 1
+        
+        reader.clear('stock_data')
+        assert not FetchCache(disk_dir=tmp_dir).get(('stock_data', 'FPT'))[0]
+        assert FetchCache(disk_dir=tmp_dir).get(('all_stocks', ()))[0]
+
+def test_fetcher_cached_by_arguments():
+    """Cùng tham số (vị trí hay từ khóa) chỉ gọi API một lần; clear() xóa kết quả của phương thức"""
+    original_quote = data_fetcher.Quote
+    data_fetcher.Quote = CountingQuote
+    DataFetcher.get_stock_data.clear()
+    CountingQuote.calls = 0
+    
+    try:
+        fetcher = DataFetcher()
+        first = fetcher.get_stock_data('VNM', '1Y', start_date='2024-01-01', end_date='2024-03-01')
+        second = fetcher.get_stock_data('VNM', period='1Y', resolution='1D',
+                                        start_date='2024-01-01', end_date='2024-03-01')
+        assert CountingQuote.calls == 1
+        pd.testing.assert_frame_equal(first, second)
+        
+        DataFetcher.get_stock_data.clear()
+        fetcher.get_stock_data('VNM', start_date='2024-01-01', end_date='2024-03-01')
+        assert CountingQuote.calls == 2
+    finally:
+        data_fetcher.Quote = original_quote
+        DataFetcher.get_stock_data.clear()
+    
+    assert get_fetch_cache().get_stats()['hits'] >= 1
+
+def test_cli_does_not_import_streamlit():
+    """Các công cụ dòng lệnh không còn kéo Streamlit vào"""
+    code = "import sys, cache_manager, full_market_update, gradual_update; print('streamlit' in sys.modules)"
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert output.stdout.strip() == 'False', output.stderr
+
+def main():
+    """Main test function"""
+    print("🚀 Testing FetchCache")
+    print("=" * 50)
+    
+    test_lru_evicts_by_size()
+    print("✅ Size-aware LRU eviction")
+    test_ttl_and_copies()
+    print("✅ TTL expiry and defensive copies")
+    test_disk_tier_shared()
+    print("✅ Disk tier shared between caches")
+    test_fetcher_cached_by_arguments()
+    print("✅ DataFetcher results cached by arguments")
+    test_cli_does_not_import_streamlit()
+    print("✅ CLI tools start without Streamlit")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Test script cho PanelIndicatorEngine: so khớp với TechnicalAnalyzer và đo tốc độ
+"""
+
+import time
+import numpy as np
+import pandas as pd
+
+from technical_analysis import TechnicalAnalyzer
+from indicator_panel import PanelIndicatorEngine, build_price_panel, INDICATOR_COLUMNS
+
+def _random_frames(lengths, seed=0):
+    """Tạo dữ liệu OHLCV ngẫu nhiên với độ dài khác nhau cho từng mã"""
+    rng = np.random.default_rng(seed)
+    frames = {}
+    for i, length in enumerate(lengths):
+        dates = pd.bdate_range('2020-01-01', periods=length)
+        close = 50 * np.exp(np.cumsum(rng.normal(0, 0.02, length)))
+        frames[f"S{i:02d}"] = pd.DataFrame({
+            'open': close * (1 + rng.normal(0, 0.01, length)),
+            'high': close * (1 + rng.uniform(0, 0.03, length)),
+            'low': close * (1 - rng.uniform(0, 0.03, length)),
+            'close': close,
+            'volume': rng.integers(1000, 100000, length)
+        }, index=dates)
+    return frames
+
+def test_matches_technical_analyzer():
+    """Kết quả panel trùng với tính riêng từng mã (kể cả mã ít dữ liệu)"""
+    frames = _random_frames([35, 60, 120, 260, 500])
+    engine = PanelIndicatorEngine()
+    panel = build_price_panel(frames)
+    indicators = engine.compute_panel(panel)
+    
+    for symbol, df in frames.items():
+        expected = TechnicalAnalyzer(df).add_all_indicators()
+        result = engine.symbol_frame(panel, indicators, symbol)
+        assert (result.index == expected.index).all()
+        
+        for column in INDICATOR_COLUMNS:
+            assert np.allclose(
+                result[column].to_numpy(), expected[column].to_numpy(dtype=float),
+                rtol=1e-7, atol=1e-7, equal_nan=True
+            ), f"{symbol}.{column}"
+
+def test_latest_snapshot():
+    """latest() trả về phiên cuối của mỗi mã"""
+    frames = _random_frames([80, 250], seed=1)
+    engine = PanelIndicatorEngine()
+    panel = build_price_panel(frames, lookback=200)
+    snapshot = engine.latest(panel, engine.compute_panel(panel))
+    
+    assert list(snapshot.index) == ['S00', 'S01']
+    assert snapshot.loc['S01', 'close'] == frames['S01']['close'].iloc[-1]
+    assert not np.isnan(snapshot.loc['S01', 'sma_200'])
+    assert np.isnan(snapshot.loc['S00', 'sma_200'])
+
+def test_full_market_speed():
+    """Toàn thị trường (~1.700 mã, 1 năm) tính xong trong chưa tới 1 giây"""
+    rng = np.random.default_rng(2)
+    close = 50 * np.exp(np.cumsum(rng.normal(0, 0.02, (260, 1700)), axis=0))
+    volume = rng.integers(1000, 100000, close.shape).astype(float)
+    
+    start = time.time()
+    PanelIndicatorEngine().compute(close, close * 1.01, close * 0.99, close, volume)
+    elapsed = time.time() - start
+    
+    print(f"   1700 mã x 260 phiên: {elapsed:.2f}s")
+    assert elapsed < 1.0
+
+def main():
+    """Main test function"""
+    print("🚀 Testing PanelIndicatorEngine")
+    print("=" * 50)
+    
+    test_matches_technical_analyzer()
+    print("✅ Parity with TechnicalAnalyzer")
+    test_latest_snapshot()
+    print("✅ Latest snapshot")
+    test_full_market_speed()
+    print("✅ Full market speed")
+
+if __name__ == "__main__":
+    main()
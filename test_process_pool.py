@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Test script cho cập nhật bằng nhiều process (FetchProcessPool) và token bucket dùng chung trong SQLite
+"""
+
+import os
+import tempfile
+import multiprocessing
+import numpy as np
+import pandas as pd
+
+import data_fetcher
+from aimd_controller import AIMDController, batch_counters
+from data_cache import DataCache
+from data_fetcher import DataFetcher
+from process_pool import FetchProcessPool
+from rate_limiter import SQLiteTokenBucket
+
+class WorkerQuote:
+    """Giả lập vnstock Quote trong process con: 'DEAD' không có dữ liệu, 'BUSY' luôn bị 429"""
+    
+    def __init__(self, symbol, source=None):
+        self.symbol = symbol
+    
+    def history(self, start, end, interval='1D'):
+        if self.symbol == 'DEAD':
+            return pd.DataFrame()
+        if self.symbol == 'BUSY':
+            raise Exception("429 Too Many Requests")
+        dates = pd.bdate_range(start, end)
+        close = 10 + np.arange(len(dates), dtype=float)
+        return pd.DataFrame({
+            'time': dates, 'open': close, 'high': close, 'low': close,
+            'close': close, 'volume': np.full(len(dates), 1000)
+        })
+
+def _take_tokens(db_path, count, results):
+    bucket = SQLiteTokenBucket(db_path)
+    results.put(sum(bucket.try_acquire() for _ in range(count)))
+
+def test_shared_token_bucket():
+    """Các process dùng chung một ngân sách: token một process đã lấy thì process khác không lấy được"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'rate_limit.db')
+        bucket = SQLiteTokenBucket(db_path, rate=0.001, burst=3)
+        assert (bucket.rate, bucket.burst) == (0.001, 3)
+        
+        # Bucket đã có giữ nguyên tham số; configure áp dụng cho mọi process
+        other = SQLiteTokenBucket(db_path, rate=50, burst=50)
+        assert other.rate == 0.001
+        
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        child = context.Process(target=_take_tokens, args=(db_path, 2, results))
+        child.start()
+        child.join()
+        assert results.get() == 2
+        
+        assert bucket.try_acquire() and not other.try_acquire()
+        assert bucket.total_acquired == 3 and not bucket.acquire(timeout=0.05)
+        
+        other.configure(rate=0)
+        assert bucket.acquire() and bucket.get_stats()['total_acquired'] == 4
+
+def test_bulk_update_with_processes():
+    """Process con lấy dữ liệu, process chính ghi; số request đếm chung qua bucket"""
+    original_quote = data_fetcher.Quote
+    data_fetcher.Quote = WorkerQuote
+    DataFetcher.get_stock_data.clear()
+    
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = DataCache(cache_dir=tmp_dir)
+            symbols = ['AAA', 'BBB', 'CCC', 'DEAD']
+            job_id = cache.create_update_job('full', symbols)
+            
+            with FetchProcessPool(tmp_dir, processes=2, start_method='fork') as pool:
+                rate = pool.limiter.rate
+                assert cache.bulk_cache_update(symbols_list=symbols, requests_per_second=0, job_id=job_id,
+                                               process_pool=pool) == 3
+                assert pool.limiter.rate == rate
+            
+            assert all(cache.get_last_date(symbol) is not None for symbol in ['AAA', 'BBB', 'CCC'])
+            assert cache.get_update_job(job_id)['done'] == 3
+            assert cache.get_job_symbols(job_id, ['failed']) == ['DEAD']
+            assert list(cache.get_symbol_failures()['symbol']) == ['DEAD']
+            assert cache.last_update_stats['provider_requests'] >= 4
+            assert not cache.get_indicators('AAA').empty
+    finally:
+        data_fetcher.Quote = original_quote
+        DataFetcher.get_stock_data.clear()
+
+def test_aimd_measures_worker_processes():
+    """Request chạy ở process con: AIMD đo lỗi qua bộ đếm process con gửi về và giảm tốc"""
+    original_quote = data_fetcher.Quote
+    data_fetcher.Quote = WorkerQuote
+    DataFetcher.get_stock_data.clear()
+    
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = DataCache(cache_dir=tmp_dir)
+            symbols = ['AAA', 'BBB', 'BUSY']
+            controller = AIMDController(rate=4, tune_workers=False)
+            
+            with FetchProcessPool(tmp_dir, processes=2, start_method='fork') as pool:
+                controller.begin_batch(provider_totals=batch_counters({}))
+                assert cache.bulk_cache_update(symbols_list=symbols, requests_per_second=0, process_pool=pool) == 2
+                totals = cache.last_update_stats['provider_totals']
+                batch = controller.record_batch(len(symbols), provider_totals=batch_counters(totals))
+            
+            # Process chính không gửi request nào: thống kê chi tiết để trống, bộ đếm lấy từ process con
+            assert cache.last_update_stats['providers'] == {}
+            assert totals['requests'] >= 5 and totals['rate_limited'] >= 3
+            assert batch['measured'] and not batch['healthy']
+            assert controller.rate == 2.0
+            assert 'luồng' not in controller.describe(0)
+    finally:
+        data_fetcher.Quote = original_quote
+        DataFetcher.get_stock_data.clear()
+
+def main():
+    """Main test function"""
+    print("🚀 Testing process-pool updates")
+    print("=" * 50)
+    
+    test_shared_token_bucket()
+    print("✅ Token bucket shared across processes")
+    test_bulk_update_with_processes()
+    print("✅ Worker processes fetch, the calling process writes")
+    test_aimd_measures_worker_processes()
+    print("✅ AIMD slows down on worker-process provider errors")
+
+if __name__ == "__main__":
+    main()
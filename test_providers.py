@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Test script cho lớp nhà cung cấp dữ liệu (circuit breaker, backoff, rate limit, dự phòng)
+"""
+
+import time
+from datetime import datetime
+import pandas as pd
+
+from providers import (CircuitBreaker, Provider, ProviderChain, ProviderUnavailable, NoDataError,
+                       backoff_delay, is_rate_limited, CLOSED, OPEN, HALF_OPEN)
+
+SETTINGS = {
+    'MAX_ATTEMPTS': 3,
+    'BACKOFF_BASE_SECONDS': 0.001,
+    'BACKOFF_MAX_SECONDS': 0.01,
+    'RATE_LIMIT_BACKOFF_SECONDS': 0.001,
+    'FAILURE_THRESHOLD': 3,
+    'RECOVERY_SECONDS': 0.2
+}
+
+class ScriptedProvider(Provider):
+    """Nhà cung cấp giả: lỗi mạng khi down=True, ValueError cho mã 'BAD', dữ liệu cho mã khác"""
+    
+    def __init__(self, name, down=False):
+        super().__init__(SETTINGS)
+        self.name = name
+        self.down = down
+        self.calls = 0
+    
+    def _history(self, symbol, start_date, end_date, resolution):
+        self.calls += 1
+        if self.down:
+            raise ConnectionError("connection reset")
+        if symbol == 'BAD':
+            raise ValueError("invalid symbol")
+        if symbol == 'EMPTY':
+            return None
+        return pd.DataFrame({'close': [1.0]}, index=pd.DatetimeIndex([start_date]))
+
+def _history(chain, symbol):
+    return chain.history(symbol, datetime(2024, 1, 1), datetime(2024, 1, 31))
+
+def test_circuit_breaker_states():
+    """closed -> open sau N lỗi liên tiếp -> half_open một request thử -> closed/open"""
+    breaker = CircuitBreaker(failure_threshold=2, recovery_seconds=0.1)
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allow()
+    
+    time.sleep(0.12)
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    assert not breaker.allow()  # chỉ một request thử
+    breaker.record_failure()
+    assert breaker.state == OPEN and breaker.times_opened == 2
+    
+    time.sleep(0.12)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow()
+
+def test_backoff_and_rate_limit_detection():
+    """Backoff có jitter nằm trong [0, min(cap, base*2^n)]; nhận diện 429"""
+    delays = [backoff_delay(3, 0.5, 2.0) for _ in range(200)]
+    assert all(0 <= d <= 2.0 for d in delays) and len(set(delays)) > 100
+    assert is_rate_limited(Exception("HTTP 429 Too Many Requests"))
+    assert is_rate_limited(Exception("Rate limit exceeded"))
+    assert not is_rate_limited(ConnectionError("timeout"))
+
+def test_chain_routes_to_fallback():
+    """Nhà cung cấp chính lỗi: breaker mở và request sau đi thẳng sang dự phòng"""
+    primary = ScriptedProvider('primary', down=True)
+    fallback = ScriptedProvider('fallback')
+    chain = ProviderChain([primary, fallback])
+    
+    df, name = _history(chain, 'AAA')
+    assert name == 'fallback' and not df.empty
+    assert primary.calls == 3 and primary.breaker.state == OPEN
+    
+    # Breaker mở: không tốn request/backoff vào nhà cung cấp chính
+    for _ in range(5):
+        assert _history(chain, 'AAA')[1] == 'fallback'
+    assert primary.calls == 3
+    
+    stats = chain.get_stats()
+    assert stats['primary']['state'] == OPEN and stats['primary']['short_circuited'] == 5
+    assert stats['fallback']['successes'] == 6 and stats['fallback']['avg_latency_ms'] is not None
+    
+    # Hồi phục: request thử thành công đóng breaker
+    primary.down = False
+    time.sleep(0.25)
+    assert _history(chain, 'AAA')[1] == 'primary'
+    assert primary.breaker.state == CLOSED
+
+def test_symbol_errors_and_outage():
+    """Lỗi do mã không thử lại/không mở breaker; mọi nhà cung cấp down -> ProviderUnavailable"""
+    primary = ScriptedProvider('primary')
+    chain = ProviderChain([primary])
+    for symbol, cause in [('BAD', 'ValueError'), ('EMPTY', 'NoData')]:
+        try:
+            _history(chain, symbol)
+            raise AssertionError("Expected NoDataError")
+        except NoDataError as e:
+            assert e.cause == cause
+    assert primary.calls == 2 and primary.breaker.state == CLOSED
+    
+    primary.down = True
+    try:
+        _history(chain, 'AAA')
+        raise AssertionError("Expected ProviderUnavailable")
+    except ProviderUnavailable:
+        pass
+
+def main():
+    """Main test function"""
+    print("🚀 Testing providers")
+    print("=" * 50)
+    
+    test_circuit_breaker_states()
+    print("✅ Circuit breaker states")
+    test_backoff_and_rate_limit_detection()
+    print("✅ Backoff and rate limit detection")
+    test_chain_routes_to_fallback()
+    print("✅ Fallback routing")
+    test_symbol_errors_and_outage()
+    print("✅ Symbol errors and outage")
+
+if __name__ == "__main__":
+    main()
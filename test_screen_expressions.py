@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Test script cho biểu thức lọc (screen_expressions) và bộ lọc đã lưu
+"""
+
+import tempfile
+import numpy as np
+import pandas as pd
+
+from screen_expressions import ScreenExpression
+from data_cache import DataCache
+from cached_stock_screener import CachedStockScreener
+
+def _market_df():
+    """Bảng so sánh mẫu có giá trị thiếu"""
+    return pd.DataFrame({
+        'symbol': ['AAA', 'BBB', 'CCC', 'DDD'],
+        'current_price': [10.0, 20.0, 30.0, 40.0],
+        'rsi': [25.0, 35.0, np.nan, 20.0],
+        'sma_200': [9.0, 25.0, np.nan, 50.0],
+        'volume_ratio': [2.0, 1.0, 3.0, 1.6],
+        'monthly_return': [5.0, -2.0, 1.0, -20.0],
+        'overall_score': [70.0, 40.0, 65.0, 55.0],
+        'trend': ['TĂNG MẠNH (Mạnh)', 'GIẢM (Yếu)', None, 'TĂNG (Yếu)'],
+        'signal': ['MUA MẠNH', 'BÁN', 'MUA', None]
+    })
+
+def _symbols(expression, df):
+    return ScreenExpression(expression).filter(df)['symbol'].tolist()
+
+def test_expressions():
+    """So sánh, and/or/not, chuỗi so sánh, in, hàm và alias cột"""
+    df = _market_df()
+    assert _symbols("rsi < 30 and close > sma_200 and volume_ratio > 1.5", df) == ['AAA']
+    assert _symbols("signal in ('MUA', 'MUA MẠNH')", df) == ['AAA', 'CCC']
+    assert _symbols("contains(trend, 'TĂNG') or rsi > 30", df) == ['AAA', 'BBB', 'DDD']
+    assert _symbols("20 < rsi <= 25", df) == ['AAA']
+    assert _symbols("not rsi < 30", df) == ['BBB', 'CCC']
+    assert _symbols("abs(close - sma_200) / close > 0.2", df) == ['BBB', 'DDD']
+    assert _symbols("isnull(rsi)", df) == ['CCC']
+
+def test_invalid_expressions():
+    """Biểu thức sai cú pháp, cấu trúc lạ hoặc cột không tồn tại báo ValueError"""
+    df = _market_df()
+    for text in ["rsi <", "__import__('os').system('ls')", "rsi.real > 1", "[x for x in rsi]", "unknown > 1"]:
+        try:
+            ScreenExpression(text).mask(df)
+        except ValueError:
+            continue
+        raise AssertionError(f"Expected ValueError for {text!r}")
+
+def test_type_mismatch():
+    """So sánh / tính toán giữa chuỗi và số báo ValueError kèm biểu thức con bị lỗi"""
+    df = _market_df()
+    cases = {
+        'rsi > "a"': 'rsi > \'a\'',
+        'symbol > 1': 'symbol > 1',
+        'abs(symbol) > 1': 'abs(symbol)',
+        'rsi + symbol > 1': 'rsi + symbol',
+        '-signal < 0': '-signal'
+    }
+    for text, failing in cases.items():
+        try:
+            ScreenExpression(text).mask(df)
+        except ValueError as e:
+            assert failing in str(e), (text, str(e))
+            continue
+        raise AssertionError(f"Expected ValueError for {text!r}")
+
+def test_filter_by_criteria_unchanged():
+    """filter_by_criteria (dựa trên biểu thức) giữ nguyên kết quả cũ"""
+    df = _market_df()
+    criteria = {
+        'min_overall_score': 50,
+        'rsi_range': (10, 30),
+        'min_volume_ratio': 1.5,
+        'min_monthly_return': -25,
+        'trend_filter': ['TĂNG'],
+        'signal_filter': ['MUA', 'MUA MẠNH']
+    }
+    
+    expected = df[
+        (df['overall_score'] >= 50) & (df['rsi'] >= 10) & (df['rsi'] <= 30) &
+        (df['volume_ratio'] >= 1.5) & (df['monthly_return'] >= -25) &
+        df['trend'].str.contains('TĂNG', na=False) & df['signal'].isin(['MUA', 'MUA MẠNH'])
+    ]
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        screener = CachedStockScreener(DataCache(cache_dir=tmp_dir))
+        result = screener.filter_by_criteria(df, criteria)
+    assert result['symbol'].tolist() == expected['symbol'].tolist() == ['AAA']
+
+def test_saved_screens():
+    """Lưu, đọc và xóa bộ lọc trong cache"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = DataCache(cache_dir=tmp_dir)
+        cache.save_screen('oversold', ' rsi < 30 ')
+        assert cache.get_saved_screen('oversold') == 'rsi < 30'
+        assert cache.get_saved_screens()['name'].tolist() == ['oversold']
+        
+        screener = CachedStockScreener(cache)
+        assert screener.run_saved_screen('oversold', _market_df())['symbol'].tolist() == ['AAA', 'DDD']
+        
+        try:
+            cache.save_screen('bad', 'rsi <')
+            raise AssertionError("Expected ValueError")
+        except ValueError:
+            pass
+        
+        cache.delete_screen('oversold')
+        assert cache.get_saved_screen('oversold') is None
+
+def main():
+    """Main test function"""
+    print("🚀 Testing screen expressions")
+    print("=" * 50)
+    
+    test_expressions()
+    print("✅ Expressions")
+    test_invalid_expressions()
+    print("✅ Invalid expressions")
+    test_type_mismatch()
+    print("✅ Type mismatches reported as ValueError")
+    test_filter_by_criteria_unchanged()
+    print("✅ filter_by_criteria")
+    test_saved_screens()
+    print("✅ Saved screens")
+
+if __name__ == "__main__":
+    main()
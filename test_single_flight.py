@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Test script cho single-flight: các request giống nhau chạy đồng thời chỉ gọi nhà cung cấp một lần
+"""
+
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+import data_fetcher
+from data_fetcher import DataFetcher
+from single_flight import SingleFlight, get_single_flight
+
+class SlowQuote:
+    """Giả lập vnstock Quote chậm, đếm số request"""
+    
+    calls = 0
+    _lock = threading.Lock()
+    
+    def __init__(self, symbol, source=None):
+        self.symbol = symbol
+    
+    def history(self, start, end, interval='1D'):
+        with SlowQuote._lock:
+            SlowQuote.calls += 1
+        time.sleep(0.3)
+        dates = pd.bdate_range(start, end)
+        close = 10 + np.arange(len(dates), dtype=float)
+        return pd.DataFrame({
+            'time': dates, 'open': close, 'high': close, 'low': close,
+            'close': close, 'volume': np.full(len(dates), 1000)
+        })
+
+def _run_concurrently(target, count):
+    results = [None] * count
+    def worker(i):
+        results[i] = target()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def test_single_flight_coalesces():
+    """10 lời gọi cùng khóa: một lần chạy, 9 lời gọi dùng chung kết quả; lỗi được chia sẻ"""
+    group = SingleFlight()
+    executions = []
+    
+    def slow():
+        executions.append(1)
+        time.sleep(0.2)
+        return 42
+    
+    results = _run_concurrently(lambda: group.do('key', slow), 10)
+    assert len(executions) == 1
+    assert sorted(shared for _, shared in results) == [False] + [True] * 9
+    assert all(value == 42 for value, _ in results)
+    assert group.get_stats() == {'total_calls': 10, 'upstream_calls': 1, 'coalesced_calls': 9, 'in_flight': 0}
+    
+    # Gọi lại sau khi xong: chạy mới
+    assert group.do('key', slow) == (42, False)
+    
+    def failing():
+        time.sleep(0.1)
+        raise ConnectionError("down")
+    
+    errors = []
+    def call_failing():
+        try:
+            group.do('bad', failing)
+        except ConnectionError as e:
+            errors.append(e)
+    _run_concurrently(call_failing, 5)
+    assert len(errors) == 5
+
+def test_data_fetcher_concurrent_requests():
+    """Nhiều phiên cùng hỏi một mã/khoảng ngày (viết theo cách khác nhau): một request lên nhà cung cấp"""
+    original_quote = data_fetcher.Quote
+    data_fetcher.Quote = SlowQuote
+    SlowQuote.calls = 0
+    DataFetcher.get_stock_data.clear()
+    before = get_single_flight().get_stats()['coalesced_calls']
+    
+    today = pd.Timestamp.now()
+    requests = [
+        {'period': '3M'}, {'period': '90D'},
+        {'start_date': (today - pd.Timedelta(days=90)).strftime('%Y-%m-%d'), 'end_date': today.strftime('%Y-%m-%d')}
+    ] * 2
+    
+    try:
+        fetchers = [DataFetcher() for _ in requests]
+        counter = iter(range(len(requests)))
+        lock = threading.Lock()
+        
+        def fetch():
+            with lock:
+                i = next(counter)
+            return fetchers[i].get_stock_data('AAA', **requests[i])
+        
+        results = _run_concurrently(fetch, len(requests))
+        assert SlowQuote.calls == 1
+        assert get_single_flight().get_stats()['coalesced_calls'] - before >= 2
+        assert all(len(df) == len(results[0]) for df in results)
+        assert len({id(df) for df in results}) == len(results)
+    finally:
+        data_fetcher.Quote = original_quote
+        DataFetcher.get_stock_data.clear()
+
+def main():
+    """Main test function"""
+    print("🚀 Testing single-flight")
+    print("=" * 50)
+    
+    test_single_flight_coalesces()
+    print("✅ Coalescing")
+    test_data_fetcher_concurrent_requests()
+    print("✅ DataFetcher concurrent requests")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Test script cho StockScreener.screen (quét một lượt nhiều chiến lược, không gọi API)
+"""
+
+import numpy as np
+import pandas as pd
+
+from stock_screener import StockScreener, PERIOD_DAYS
+
+class FakeFetcher:
+    """Thay DataFetcher: trả dữ liệu giả và đếm số lần lấy giá"""
+    
+    def __init__(self, frames):
+        self.frames = frames
+        self.calls = []
+    
+    def get_all_stocks(self):
+        return pd.DataFrame({
+            'symbol': list(self.frames),
+            'organ_name': [f"Company {s}" for s in self.frames],
+            'exchange': ['HOSE'] * len(self.frames)
+        })
+    
+    def get_stock_data(self, symbol, period='1Y'):
+        self.calls.append((symbol, period))
+        df = self.frames[symbol]
+        return df[df.index >= df.index[-1] - pd.Timedelta(days=PERIOD_DAYS[period])]
+
+def _frame(close):
+    """DataFrame giá theo ngày làm việc từ chuỗi giá đóng cửa"""
+    close = np.asarray(close, dtype=float)
+    dates = pd.bdate_range(end='2024-06-28', periods=len(close))
+    return pd.DataFrame({
+        'open': close, 'high': close * 1.01, 'low': close * 0.99, 'close': close,
+        'volume': np.full(len(close), 10000.0)
+    }, index=dates)
+
+def _make_screener():
+    rng = np.random.default_rng(0)
+    frames = {
+        # Giảm liên tục -> RSI quá bán
+        'DOWN': _frame(np.linspace(100, 50, 300)),
+        # Tăng liên tục
+        'UP': _frame(np.linspace(50, 100, 300)),
+        'RAND': _frame(50 * np.exp(np.cumsum(rng.normal(0, 0.02, 300))))
+    }
+    screener = StockScreener()
+    screener.data_fetcher = FakeFetcher(frames)
+    return screener
+
+def test_single_pass_multiple_strategies():
+    """Mỗi mã chỉ lấy dữ liệu một lần dù đánh giá nhiều chiến lược"""
+    screener = _make_screener()
+    results = screener.screen(
+        ['oversold', 'technical', 'breakout'],
+        params={'technical': {'trend': 'TĂNG'}}
+    )
+    
+    assert set(results) == {'oversold', 'technical', 'breakout'}
+    assert [r['symbol'] for r in results['oversold']] == ['DOWN']
+    assert 'UP' in [r['symbol'] for r in results['technical']]
+    assert 'DOWN' not in [r['symbol'] for r in results['technical']]
+    
+    # Một request cho mỗi mã, với khung thời gian dài nhất (6M của breakout)
+    assert screener.data_fetcher.calls == [('DOWN', '6M'), ('UP', '6M'), ('RAND', '6M')]
+
+def test_legacy_wrappers_and_limit():
+    """Các hàm cũ dùng chung lượt quét; max_symbols giới hạn số mã"""
+    screener = _make_screener()
+    assert [r['symbol'] for r in screener.find_oversold_stocks()] == ['DOWN']
+    assert len(screener.data_fetcher.calls) == 3
+    
+    screener.data_fetcher.calls.clear()
+    screener.scan_market('MEDIUM_TERM', max_symbols=2)
+    assert screener.data_fetcher.calls == [('DOWN', '1Y'), ('UP', '1Y')]
+
+def main():
+    """Main test function"""
+    print("🚀 Testing StockScreener")
+    print("=" * 50)
+    
+    test_single_pass_multiple_strategies()
+    print("✅ Single pass multiple strategies")
+    test_legacy_wrappers_and_limit()
+    print("✅ Legacy wrappers and limit")
+
+if __name__ == "__main__":
+    main()
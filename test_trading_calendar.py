@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Test script cho lịch giao dịch HOSE/HNX (trading_calendar) và việc bỏ qua request không cần thiết
+"""
+
+import tempfile
+from datetime import date, datetime
+import numpy as np
+import pandas as pd
+
+from data_cache import DataCache
+from trading_calendar import TradingCalendar, tet_date, lunar_to_solar
+from update_planner import UpdatePlanner
+
+def test_lunar_holidays():
+    """Mùng 1 Tết và Giỗ Tổ Hùng Vương (10/3 âm lịch) tính từ âm lịch"""
+    tet = {2019: date(2019, 2, 5), 2020: date(2020, 1, 25), 2023: date(2023, 1, 22),
+           2024: date(2024, 2, 10), 2025: date(2025, 1, 29), 2026: date(2026, 2, 17)}
+    for year, expected in tet.items():
+        assert tet_date(year) == expected, year
+    assert lunar_to_solar(10, 3, 2024) == date(2024, 4, 18)
+    assert lunar_to_solar(10, 3, 2023) == date(2023, 4, 29)
+    # Năm 2023 nhuận tháng 2, không có tháng 3 nhuận
+    assert lunar_to_solar(1, 2, 2023, leap=True) == date(2023, 3, 22)
+    assert lunar_to_solar(1, 3, 2023, leap=True) is None
+
+def test_holidays_and_compensation():
+    """Nghỉ Tết, lễ cố định và nghỉ bù khi lễ rơi vào cuối tuần"""
+    calendar = TradingCalendar(extra_holidays=[], extra_trading_days=[])
+    
+    # Tết Giáp Thìn 2024: nghỉ 08/02 - 14/02
+    assert calendar.trading_days('2024-02-05', '2024-02-16') == [
+        date(2024, 2, 5), date(2024, 2, 6), date(2024, 2, 7), date(2024, 2, 15), date(2024, 2, 16)
+    ]
+    
+    # 2023: Giỗ Tổ (thứ 7) và 30/4 (chủ nhật) được nghỉ bù 02/05 và 03/05
+    assert not any(calendar.is_trading_day(d) for d in ['2023-05-01', '2023-05-02', '2023-05-03'])
+    assert calendar.is_trading_day('2023-05-04')
+    assert not calendar.is_trading_day('2023-01-02')  # bù Tết Dương lịch
+    
+    assert calendar.next_trading_day('2024-02-07') == date(2024, 2, 15)
+    assert calendar.previous_trading_day('2024-02-15') == date(2024, 2, 7)
+
+def test_overrides():
+    """Ngày nghỉ / ngày giao dịch bổ sung ghi đè lịch tính toán"""
+    calendar = TradingCalendar(extra_holidays=['2024-09-03'], extra_trading_days=['2024-02-14'])
+    assert not calendar.is_trading_day('2024-09-03')
+    assert calendar.is_trading_day('2024-02-14')
+    
+    calendar.override(holidays=['2024-06-14'])
+    assert not calendar.is_trading_day(date(2024, 6, 14))
+
+def test_last_closed_session():
+    """Phiên đã đóng cửa theo giờ đóng cửa, cuối tuần và ngày lễ"""
+    calendar = TradingCalendar(extra_holidays=[], extra_trading_days=[], session_close='15:00')
+    assert calendar.last_closed_session(datetime(2024, 6, 14, 10, 0)) == date(2024, 6, 13)
+    assert calendar.last_closed_session(datetime(2024, 6, 14, 16, 0)) == date(2024, 6, 14)
+    assert calendar.last_closed_session(datetime(2024, 6, 17, 8, 0)) == date(2024, 6, 14)
+    assert calendar.last_closed_session(datetime(2024, 2, 13, 18, 0)) == date(2024, 2, 7)
+
+def test_planner_skips_non_trading_days():
+    """Sáng thứ 2 và trong kỳ nghỉ Tết: không mã nào cần gọi API"""
+    dates = pd.bdate_range('2024-01-02', '2024-02-07')
+    close = np.linspace(10, 20, len(dates))
+    frame = pd.DataFrame({
+        'open': close, 'high': close, 'low': close, 'close': close, 'volume': np.full(len(dates), 1000)
+    }, index=dates)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = DataCache(cache_dir=tmp_dir)
+        cache.upsert_stock_data({'AAA': frame, 'BBB': frame.loc[:'2024-02-02']})
+        planner = UpdatePlanner(cache)
+        
+        # Tết: AAA đã có phiên 07/02, chỉ BBB thiếu phiên
+        plan = planner.plan(['AAA', 'BBB'], now=datetime(2024, 2, 13, 9, 0)).set_index('symbol')
+        assert plan.loc['AAA', 'skip'] and not plan.loc['BBB', 'skip']
+        
+        # Sáng thứ 2: BBB có dữ liệu đến thứ 6 là đủ
+        assert planner.plan(['BBB'], now=datetime(2024, 2, 5, 8, 0))['skip'].all()
+        
+        # Ngày đầu sau Tết: trước giờ đóng cửa chưa có phiên mới, sau đó thì có
+        plan = planner.plan(['AAA'], now=datetime(2024, 2, 15, 9, 0))
+        assert plan['skip'].all()
+        plan = planner.plan(['AAA'], now=datetime(2024, 2, 15, 16, 0))
+        assert not plan['skip'].any() and plan['start_date'].iloc[0] == '2024-02-08'
+
+def main():
+    """Main test function"""
+    print("🚀 Testing trading calendar")
+    print("=" * 50)
+    
+    test_lunar_holidays()
+    print("✅ Lunar holidays")
+    test_holidays_and_compensation()
+    print("✅ Holidays and compensation days")
+    test_overrides()
+    print("✅ Overrides")
+    test_last_closed_session()
+    print("✅ Last closed session")
+    test_planner_skips_non_trading_days()
+    print("✅ Planner skips non-trading days")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Test script cho daemon cập nhật chạy nền (hàng đợi update_queue, lịch chạy, tiến độ trong SQLite)
+"""
+
+import tempfile
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+import data_fetcher
+from data_cache import DataCache
+from data_fetcher import DataFetcher
+from update_daemon import UpdateDaemon
+
+SETTINGS = {
+    'POLL_SECONDS': 5,
+    'SCHEDULE_TIMES': ['15:30', '20:00'],
+    'BATCH_SIZE': 2,
+    'DELAY_BETWEEN_BATCHES': 12,
+    'HEARTBEAT_STALE_SECONDS': 60
+}
+
+class CountingQuote:
+    """Giả lập vnstock Quote: ghi lại các mã được yêu cầu"""
+    
+    calls = []
+    
+    def __init__(self, symbol, source=None):
+        self.symbol = symbol
+    
+    def history(self, start, end, interval='1D'):
+        CountingQuote.calls.append(self.symbol)
+        dates = pd.bdate_range(start, end)
+        close = 10 + np.arange(len(dates), dtype=float)
+        return pd.DataFrame({
+            'time': dates, 'open': close, 'high': close, 'low': close,
+            'close': close, 'volume': np.full(len(dates), 1000)
+        })
+
+def test_queue_and_status():
+    """Yêu cầu trùng không bị thêm hai lần; nhận, hủy, trả lại hàng đợi; heartbeat cũ = daemon đã dừng"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = DataCache(cache_dir=tmp_dir)
+        assert cache.claim_next_update() is None and cache.get_daemon_status() is None
+        
+        first = cache.enqueue_update('market', {'batch_size': 20})
+        assert cache.enqueue_update('market', {'batch_size': 50}) == first
+        scheduled = cache.enqueue_update('scheduled', scheduled_for='2024-06-14 15:30')
+        assert cache.enqueue_update('scheduled', scheduled_for='2024-06-14 15:30') == scheduled
+        
+        request = cache.claim_next_update()
+        assert request['request_id'] == first and request['params'] == {'batch_size': 20}
+        assert cache.get_update_request(first)['status'] == 'running'
+        assert cache.cancel_update_request(scheduled) == 'cancelled'
+        assert cache.claim_next_update() is None
+        
+        # Daemon bị tắt giữa chừng: lần khởi động sau nhận lại yêu cầu cùng job
+        cache.set_update_request_job(first, 'market-1')
+        assert cache.requeue_running_updates() == 1
+        assert cache.claim_next_update()['job_id'] == 'market-1'
+        assert cache.cancel_update_request(first) == 'cancelling'
+        assert cache.cancel_update_request(scheduled) is None
+        assert list(cache.get_update_queue()['status']) == ['cancelled', 'cancelling']
+        
+        cache.set_daemon_status('running', 'Batch 1/3', request_id=first, started=True)
+        status = cache.get_daemon_status()
+        assert status['alive'] and status['message'] == 'Batch 1/3' and status['request_id'] == first
+        assert not cache.get_daemon_status(now=datetime.now() + timedelta(minutes=5))['alive']
+
+def test_schedule():
+    """Chỉ xếp lịch vào ngày giao dịch, sau khung giờ; mỗi khung giờ một yêu cầu"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        daemon = UpdateDaemon(DataCache(cache_dir=tmp_dir), settings=SETTINGS)
+        friday = datetime(2024, 6, 14)
+        
+        assert daemon.due_schedule(friday.replace(hour=14)) is None
+        assert daemon.due_schedule(friday.replace(hour=16)) == '2024-06-14 15:30'
+        assert daemon.due_schedule(friday.replace(hour=21)) == '2024-06-14 20:00'
+        assert daemon.due_schedule(datetime(2024, 6, 15, 16)) is None
+        
+        request_id = daemon.enqueue_scheduled(friday.replace(hour=16))
+        assert daemon.enqueue_scheduled(friday.replace(hour=17)) == request_id
+        assert daemon.enqueue_scheduled(friday.replace(hour=21)) != request_id
+
+def test_daemon_runs_queue():
+    """Daemon chạy yêu cầu theo batch, nghỉ giữa batch, ghi tiến độ; yêu cầu bị hủy không gọi API"""
+    original_quote = data_fetcher.Quote
+    data_fetcher.Quote = CountingQuote
+    DataFetcher.get_stock_data.clear()
+    CountingQuote.calls = []
+    sleeps = []
+    
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = DataCache(cache_dir=tmp_dir)
+            daemon = UpdateDaemon(cache, settings=SETTINGS, sleep=sleeps.append)
+            saturday = datetime(2024, 6, 15, 16)
+            
+            cancelled = cache.enqueue_update('market', {'symbols': ['XXX']})
+            cache.cancel_update_request(cancelled)
+            request_id = cache.enqueue_update('market', {
+                'symbols': ['AAA', 'BBB', 'CCC'], 'adaptive': False, 'max_symbols': 3
+            })
+            
+            assert daemon.run_once(now=saturday) == (request_id, 'done')
+            assert sorted(CountingQuote.calls) == ['AAA', 'BBB', 'CCC']
+            assert sleeps == [5, 5, 2]
+            
+            request = cache.get_update_request(request_id)
+            job = cache.get_update_job(request['job_id'])
+            assert request['status'] == 'done' and request['job_id'].startswith('market-')
+            assert (job['status'], job['done'], job['total']) == ('done', 3, 3)
+            
+            status = cache.get_daemon_status()
+            assert status['state'] == 'idle' and '3/3' in status['message']
+            assert daemon.run_once(now=saturday) is None
+            
+            # Mã đã cập nhật không được đưa vào job mới
+            second = cache.enqueue_update('market', {'symbols': ['AAA', 'BBB']})
+            assert daemon.run_once(now=saturday) == (second, 'done')
+            assert cache.get_update_job(cache.get_update_request(second)['job_id'])['total'] == 0
+            assert len(CountingQuote.calls) == 3
+    finally:
+        data_fetcher.Quote = original_quote
+        DataFetcher.get_stock_data.clear()
+
+def main():
+    """Main test function"""
+    print("🚀 Testing update daemon")
+    print("=" * 50)
+    
+    test_queue_and_status()
+    print("✅ Update queue and daemon heartbeat")
+    test_schedule()
+    print("✅ Scheduled updates after the close on trading days")
+    test_daemon_runs_queue()
+    print("✅ Daemon runs queued requests and publishes progress")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Test script cho job cập nhật có thể tiếp tục (--resume) sau khi process bị dừng
+"""
+
+import tempfile
+import numpy as np
+import pandas as pd
+
+import data_fetcher
+from data_cache import DataCache
+from data_fetcher import DataFetcher
+
+class InterruptingQuote:
+    """Giả lập vnstock Quote: đếm request, giả lập Ctrl-C khi lấy mã `interrupt_at`"""
+    
+    calls = []
+    interrupt_at = None
+    
+    def __init__(self, symbol, source=None):
+        self.symbol = symbol
+    
+    def history(self, start, end, interval='1D'):
+        InterruptingQuote.calls.append(self.symbol)
+        if self.symbol == InterruptingQuote.interrupt_at:
+            raise KeyboardInterrupt
+        if self.symbol == 'DEAD':
+            return pd.DataFrame()
+        
+        dates = pd.bdate_range(start, end)
+        close = 10 + np.arange(len(dates), dtype=float)
+        return pd.DataFrame({
+            'time': dates, 'open': close, 'high': close, 'low': close,
+            'close': close, 'volume': np.full(len(dates), 1000)
+        })
+
+def _run(cache, symbols, job_id):
+    return cache.bulk_cache_update(symbols_list=symbols, max_workers=1, requests_per_second=0, job_id=job_id)
+
+def test_job_states():
+    """Mã chỉ 'done' sau khi đã ghi; mã lỗi 'failed' kèm lớp lỗi; job đóng khi hết mã"""
+    original_quote = data_fetcher.Quote
+    data_fetcher.Quote = InterruptingQuote
+    DataFetcher.get_stock_data.clear()
+    InterruptingQuote.calls, InterruptingQuote.interrupt_at = [], None
+    
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = DataCache(cache_dir=tmp_dir)
+            job_id = cache.create_update_job('full', ['AAA', 'DEAD', 'AAA'], {'batch_size': 2})
+            assert job_id.startswith('full-')
+            assert cache.create_update_job('full', ['AAA']) != job_id
+            
+            job = cache.get_update_job(job_id)
+            assert job['total'] == 2 and job['pending'] == 2 and job['params'] == {'batch_size': 2}
+            
+            assert _run(cache, ['AAA', 'DEAD'], job_id) == 1
+            job = cache.get_update_job(job_id)
+            assert (job['done'], job['failed'], job['pending'], job['running']) == (1, 1, 0, 0)
+            assert cache.get_job_symbols(job_id, ['failed']) == ['DEAD']
+            assert cache.finish_update_job(job_id) == 'done'
+            
+            jobs = cache.get_update_jobs()
+            assert list(jobs['job_id'])[-1] == job_id
+            assert jobs.set_index('job_id').loc[job_id, 'remaining'] == 0
+    finally:
+        data_fetcher.Quote = original_quote
+        DataFetcher.get_stock_data.clear()
+
+def test_resume_after_interrupt():
+    """Ctrl-C giữa chừng: phần đã lấy được ghi lại, --resume chỉ gọi API cho các mã chưa xong"""
+    original_quote = data_fetcher.Quote
+    data_fetcher.Quote = InterruptingQuote
+    DataFetcher.get_stock_data.clear()
+    InterruptingQuote.calls, InterruptingQuote.interrupt_at = [], 'CCC'
+    symbols = ['AAA', 'BBB', 'CCC', 'DDD', 'EEE']
+    
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = DataCache(cache_dir=tmp_dir)
+            job_id = cache.create_update_job('full', symbols)
+            
+            try:
+                _run(cache, symbols, job_id)
+                assert False, "KeyboardInterrupt phải được ném lại"
+            except KeyboardInterrupt:
+                cache.finish_update_job(job_id, 'interrupted')
+            
+            job = cache.get_update_job(job_id)
+            assert job['status'] == 'interrupted' and job['done'] == 2
+            assert cache.get_last_date('BBB') is not None
+            remaining = cache.get_job_symbols(job_id)
+            assert remaining == ['CCC', 'DDD', 'EEE']
+            
+            # Mã đã lấy xong nhưng chưa kịp ghi được trả lại từ fetch cache, không hỏi API lần nữa
+            InterruptingQuote.interrupt_at = None
+            assert _run(cache, remaining, job_id) == 3
+            assert sorted(InterruptingQuote.calls) == ['AAA', 'BBB', 'CCC', 'CCC', 'DDD', 'EEE']
+            assert cache.finish_update_job(job_id) == 'done'
+            
+            attempts = dict(cache.db.reader().execute(
+                "SELECT symbol, attempts FROM update_job_items WHERE job_id = ?", (job_id,)
+            ).fetchall())
+            assert attempts == {'AAA': 1, 'BBB': 1, 'CCC': 2, 'DDD': 2, 'EEE': 2}
+    finally:
+        data_fetcher.Quote = original_quote
+        DataFetcher.get_stock_data.clear()
+
+def main():
+    """Main test function"""
+    print("🚀 Testing resumable update jobs")
+    print("=" * 50)
+    
+    test_job_states()
+    print("✅ Per-symbol job states")
+    test_resume_after_interrupt()
+    print("✅ Resume continues after Ctrl-C without repeating provider calls")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Test script cho UpdatePlanner (kế hoạch cập nhật từ một truy vấn coverage)
+"""
+
+import tempfile
+import time
+from datetime import date
+import numpy as np
+import pandas as pd
+
+import data_fetcher
+from data_cache import DataCache
+from data_fetcher import DataFetcher
+from update_planner import UpdatePlanner
+
+class CountingQuote:
+    """Giả lập vnstock Quote: đếm số request theo mã"""
+    
+    calls = []
+    
+    def __init__(self, symbol, source=None):
+        self.symbol = symbol
+    
+    def history(self, start, end, interval='1D'):
+        CountingQuote.calls.append((self.symbol, start, end))
+        dates = pd.bdate_range(start, end)
+        close = 10 + np.arange(len(dates)) * 0.1
+        return pd.DataFrame({
+            'time': dates, 'open': close, 'high': close, 'low': close,
+            'close': close, 'volume': np.full(len(dates), 1000)
+        })
+
+def _frame(end, days=30):
+    dates = pd.bdate_range(end=end, periods=days)
+    close = np.linspace(10, 20, days)
+    return pd.DataFrame({
+        'open': close, 'high': close, 'low': close, 'close': close, 'volume': np.full(days, 1000)
+    }, index=dates)
+
+def test_plan_modes():
+    """Mã mới, mã thiếu dữ liệu, mã đã cập nhật và full update"""
+    now = date(2024, 6, 14)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = DataCache(cache_dir=tmp_dir)
+        cache.upsert_stock_data({'OLD': _frame('2024-06-07'), 'NOW': _frame('2024-06-13')})
+        
+        coverage = cache.get_coverage()
+        assert sorted(coverage['symbol']) == ['NOW', 'OLD']
+        assert coverage.set_index('symbol').loc['OLD', 'last_date'] == date(2024, 6, 7)
+        
+        plan = UpdatePlanner(cache).plan(['OLD', 'NEW', 'NOW', 'OLD'], now=now).set_index('symbol')
+        assert list(plan.index) == ['OLD', 'NEW', 'NOW']
+        assert plan.loc['OLD', 'mode'] == 'incremental' and plan.loc['OLD', 'start_date'] == '2024-06-08'
+        assert plan.loc['OLD', 'end_date'] == '2024-06-14'
+        assert plan.loc['NEW', 'mode'] == 'new' and plan.loc['NEW', 'start_date'] == '2022-06-15'
+        assert plan.loc['NOW', 'skip'] and plan.loc['NOW', 'mode'] == 'up_to_date'
+        
+        full = UpdatePlanner(cache).plan(['NOW'], force_full_update=True, now=now)
+        assert not full['skip'].iloc[0] and full['start_date'].iloc[0] == '2019-06-16'
+
+def test_plan_full_market_fast():
+    """Lập kế hoạch cho ~1.700 mã phải tính bằng mili giây"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = DataCache(cache_dir=tmp_dir)
+        frame = _frame('2024-06-07', days=250)
+        cache.upsert_stock_data({f"S{i:04d}": frame for i in range(1700)})
+        
+        symbols = [f"S{i:04d}" for i in range(1800)]
+        start = time.perf_counter()
+        plan = UpdatePlanner(cache).plan(symbols, now=date(2024, 6, 14))
+        elapsed = time.perf_counter() - start
+        
+        assert (plan['mode'] == 'new').sum() == 100
+        assert (plan['start_date'] == '2024-06-08').sum() == 1700
+        assert elapsed < 0.5, elapsed
+
+def test_bulk_update_skips_up_to_date():
+    """bulk_cache_update không gọi API cho mã đã có đủ dữ liệu"""
+    original_quote = data_fetcher.Quote
+    data_fetcher.Quote = CountingQuote
+    DataFetcher.get_stock_data.clear()
+    CountingQuote.calls = []
+    
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = DataCache(cache_dir=tmp_dir)
+            today = pd.Timestamp.now().normalize()
+            current = _frame(today, days=5)
+            current.index = pd.date_range(end=today, periods=5)
+            cache.upsert_stock_data({'CUR': current})
+            
+            assert cache.bulk_cache_update(symbols_list=['CUR', 'NEW']) == 2
+            assert [call[0] for call in CountingQuote.calls] == ['NEW']
+            assert cache.last_update_stats['skipped_up_to_date'] == 1
+            assert cache.get_last_date('NEW') is not None
+    finally:
+        data_fetcher.Quote = original_quote
+        DataFetcher.get_stock_data.clear()
+
+def main():
+    """Main test function"""
+    print("🚀 Testing UpdatePlanner")
+    print("=" * 50)
+    
+    test_plan_modes()
+    print("✅ Plan modes")
+    test_plan_full_market_fast()
+    print("✅ Full market plan in milliseconds")
+    test_bulk_update_skips_up_to_date()
+    print("✅ Bulk update skips up-to-date symbols")
+
+if __name__ == "__main__":
+    main()
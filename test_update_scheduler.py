@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Test script cho UpdateScheduler (thứ tự ưu tiên khi cập nhật có giới hạn)
+"""
+
+import tempfile
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+import data_fetcher
+from data_cache import DataCache
+from data_fetcher import DataFetcher
+from update_scheduler import UpdateScheduler
+from update_planner import PLAN_COLUMNS
+
+class CountingQuote:
+    """Giả lập vnstock Quote: ghi lại các mã được yêu cầu"""
+    
+    calls = []
+    
+    def __init__(self, symbol, source=None):
+        self.symbol = symbol
+    
+    def history(self, start, end, interval='1D'):
+        CountingQuote.calls.append(self.symbol)
+        dates = pd.bdate_range(start, end)
+        close = 10 + np.arange(len(dates), dtype=float)
+        return pd.DataFrame({
+            'time': dates, 'open': close, 'high': close, 'low': close,
+            'close': close, 'volume': np.full(len(dates), 1000)
+        })
+
+def _frame(end, volume, days=30):
+    dates = pd.bdate_range(end=end, periods=days)
+    close = np.full(days, 20.0)
+    return pd.DataFrame({
+        'open': close, 'high': close, 'low': close, 'close': close, 'volume': np.full(days, volume)
+    }, index=dates)
+
+def _market(cache, end):
+    """LIQ thanh khoản cao, MID trung bình, ILL thấp, cùng ngày cuối"""
+    cache.upsert_stock_data({
+        'LIQ': _frame(end, 5_000_000), 'MID': _frame(end, 100_000), 'ILL': _frame(end, 1_000)
+    })
+
+def test_priority_order():
+    """Giá trị giao dịch, theo dõi, lượt xem và độ cũ quyết định thứ tự; mã đã cập nhật nằm cuối"""
+    now = datetime(2024, 6, 14, 18, 0)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = DataCache(cache_dir=tmp_dir)
+        _market(cache, '2024-06-12')
+        cache.upsert_stock_data({'OLD': _frame('2024-03-01', 1_000), 'NOW': _frame('2024-06-14', 9_000_000)})
+        
+        scheduler = UpdateScheduler(cache)
+        queue = scheduler.prioritize(['ILL', 'NOW', 'MID', 'OLD', 'LIQ', 'NEW'], now=now)
+        assert list(queue['symbol']) == ['OLD', 'LIQ', 'MID', 'NEW', 'ILL', 'NOW']
+        row = queue.set_index('symbol').loc['LIQ']
+        assert row['missing_sessions'] == 2 and row['traded_value'] == 20.0 * 5_000_000
+        assert not queue.set_index('symbol').loc['NOW', 'needs_update']
+        
+        # Mã đang theo dõi / vừa xem vượt lên trước mã thanh khoản hơn
+        cache.add_to_watchlist(['ill'])
+        assert list(scheduler.prioritize(['MID', 'ILL'], now=now)['symbol']) == ['ILL', 'MID']
+        cache.record_symbol_view('MID', now=now)
+        cache.record_symbol_view('MID', now=now)
+        queue = scheduler.prioritize(['ILL', 'MID'], now=now)
+        assert list(queue['symbol']) == ['MID', 'ILL']
+        assert cache.get_watchlist() == ['ILL']
+        assert cache.get_symbol_views().set_index('symbol').loc['MID', 'views'] == 2
+        
+        # Lượt xem cũ giảm dần tác dụng
+        later = scheduler.prioritize(['MID'], now=datetime(2024, 6, 24, 18, 0)).iloc[0]['score']
+        assert later < queue.set_index('symbol').loc['MID', 'score']
+        
+        cache.remove_from_watchlist(['ILL'])
+        assert sorted(scheduler.top(['ILL', 'MID', 'LIQ'], 2, now=now)) == ['LIQ', 'MID']
+        plan = scheduler.top_plan(['ILL', 'MID', 'LIQ'], 2, now=now)
+        assert list(plan['symbol']) == scheduler.top(['ILL', 'MID', 'LIQ'], 2, now=now)
+        assert list(plan.columns) == PLAN_COLUMNS
+
+def test_max_symbols_uses_priority():
+    """--max N cập nhật N mã ưu tiên nhất thay vì N mã đầu danh sách"""
+    original_quote = data_fetcher.Quote
+    data_fetcher.Quote = CountingQuote
+    DataFetcher.get_stock_data.clear()
+    CountingQuote.calls = []
+    
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = DataCache(cache_dir=tmp_dir)
+            _market(cache, pd.Timestamp.now().normalize() - pd.Timedelta(days=10))
+            cache.add_to_watchlist(['ILL'])
+            
+            # Kế hoạch lập khi xếp thứ tự được dùng lại: một truy vấn coverage cho cả lần cập nhật
+            coverage_calls = []
+            get_coverage = cache.get_coverage
+            cache.get_coverage = lambda symbols=None: coverage_calls.append(symbols) or get_coverage(symbols)
+            
+            assert cache.bulk_cache_update(symbols_list=['ILL', 'MID', 'LIQ'], max_symbols=2) == 2
+            assert sorted(CountingQuote.calls) == ['ILL', 'LIQ']
+            assert len(coverage_calls) == 1
+    finally:
+        data_fetcher.Quote = original_quote
+        DataFetcher.get_stock_data.clear()
+
+def main():
+    """Main test function"""
+    print("🚀 Testing UpdateScheduler")
+    print("=" * 50)
+    
+    test_priority_order()
+    print("✅ Priority from traded value, staleness, watchlist and views")
+    test_max_symbols_uses_priority()
+    print("✅ Bounded updates take the highest-priority symbols")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Module lịch giao dịch HOSE/HNX: cuối tuần, ngày lễ dương lịch, Tết Nguyên đán và Giỗ Tổ Hùng Vương
+(âm lịch), ngày nghỉ bù và các ngày nghỉ/giao dịch bổ sung theo thông báo từng năm
+"""
+
+import math
+import threading
+from datetime import date, datetime, time as dt_time, timedelta
+import pandas as pd
+from config import TRADING_CALENDAR_SETTINGS
+
+# Múi giờ dùng để tính âm lịch Việt Nam (UTC+7)
+VN_TIMEZONE = 7
+
+# Ngày lễ dương lịch (tháng, ngày): Tết Dương lịch, Giải phóng miền Nam, Quốc tế Lao động, Quốc khánh
+FIXED_HOLIDAYS = [(1, 1), (4, 30), (5, 1), (9, 2)]
+
+# Hệ số trong thuật toán âm lịch của Hồ Ngọc Đức (số ngày Julius của điểm sóc 1900-01-01, độ dài tháng giao hội)
+_JD_EPOCH_1900 = 2415021.076998695
+_SYNODIC_MONTH = 29.530588853
+_JD_ORDINAL_OFFSET = 1721425  # date.toordinal() + offset = số ngày Julius
+
+def _to_date(value):
+    """Chuỗi/datetime/Timestamp -> date"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return pd.Timestamp(value).date()
+
+def _new_moon(k):
+    """Thời điểm (ngày Julius) của điểm sóc thứ k tính từ 1900-01-01"""
+    T = k / 1236.85
+    T2 = T * T
+    T3 = T2 * T
+    dr = math.pi / 180
+    jd = 2415020.75933 + 29.53058868 * k + 0.0001178 * T2 - 0.000000155 * T3
+    jd += 0.00033 * math.sin((166.56 + 132.87 * T - 0.009173 * T2) * dr)
+    M = 359.2242 + 29.10535608 * k - 0.0000333 * T2 - 0.00000347 * T3
+    Mpr = 306.0253 + 385.81691806 * k + 0.0107306 * T2 + 0.00001236 * T3
+    F = 21.2964 + 390.67050646 * k - 0.0016528 * T2 - 0.00000239 * T3
+    C1 = (0.1734 - 0.000393 * T) * math.sin(M * dr) + 0.0021 * math.sin(2 * dr * M)
+    C1 = C1 - 0.4068 * math.sin(Mpr * dr) + 0.0161 * math.sin(dr * 2 * Mpr)
+    C1 = C1 - 0.0004 * math.sin(dr * 3 * Mpr)
+    C1 = C1 + 0.0104 * math.sin(dr * 2 * F) - 0.0051 * math.sin(dr * (M + Mpr))
+    C1 = C1 - 0.0074 * math.sin(dr * (M - Mpr)) + 0.0004 * math.sin(dr * (2 * F + M))
+    C1 = C1 - 0.0004 * math.sin(dr * (2 * F - M)) - 0.0006 * math.sin(dr * (2 * F + Mpr))
+    C1 = C1 + 0.0010 * math.sin(dr * (2 * F - Mpr)) + 0.0005 * math.sin(dr * (2 * Mpr + M))
+    if T < -11:
+        delta_t = 0.001 + 0.000839 * T + 0.0002261 * T2 - 0.00000845 * T3 - 0.000000081 * T * T3
+    else:
+        delta_t = -0.000278 + 0.000265 * T + 0.000262 * T2
+    return jd + C1 - delta_t
+
+def _sun_longitude(jdn):
+    """Kinh độ mặt trời (radian, 0..2π) tại ngày Julius jdn"""
+    T = (jdn - 2451545.0) / 36525
+    T2 = T * T
+    dr = math.pi / 180
+    M = 357.52910 + 35999.05030 * T - 0.0001559 * T2 - 0.00000048 * T * T2
+    L0 = 280.46645 + 36000.76983 * T + 0.0003032 * T2
+    DL = (1.914600 - 0.004817 * T - 0.000014 * T2) * math.sin(dr * M)
+    DL += (0.019993 - 0.000101 * T) * math.sin(dr * 2 * M) + 0.000290 * math.sin(dr * 3 * M)
+    L = (L0 + DL) * dr
+    return L - math.pi * 2 * math.floor(L / (math.pi * 2))
+
+def _new_moon_day(k, tz=VN_TIMEZONE):
+    return int(math.floor(_new_moon(k) + 0.5 + tz / 24))
+
+def _sun_sector(day_number, tz=VN_TIMEZONE):
+    """Cung hoàng đạo (0..11) của mặt trời đầu ngày day_number"""
+    return int(math.floor(_sun_longitude(day_number - 0.5 - tz / 24) / math.pi * 6))
+
+def _lunar_month_11(year, tz=VN_TIMEZONE):
+    """Ngày Julius bắt đầu tháng 11 âm lịch (tháng chứa Đông chí) của năm"""
+    off = date(year, 12, 31).toordinal() + _JD_ORDINAL_OFFSET - 2415021
+    k = int(math.floor(off / _SYNODIC_MONTH))
+    nm = _new_moon_day(k, tz)
+    if _sun_sector(nm, tz) >= 9:
+        nm = _new_moon_day(k - 1, tz)
+    return nm
+
+def _leap_month_offset(a11, tz=VN_TIMEZONE):
+    """Vị trí tháng nhuận tính từ tháng 11 âm lịch a11"""
+    k = int(math.floor((a11 - _JD_EPOCH_1900) / _SYNODIC_MONTH + 0.5))
+    i = 1
+    arc = _sun_sector(_new_moon_day(k + i, tz), tz)
+    while True:
+        last = arc
+        i += 1
+        arc = _sun_sector(_new_moon_day(k + i, tz), tz)
+        if arc == last or i >= 14:
+            break
+    return i - 1
+
+def lunar_to_solar(lunar_day, lunar_month, lunar_year, leap=False, tz=VN_TIMEZONE):
+    """
+    Đổi ngày âm lịch Việt Nam sang dương lịch
+    
+    Returns:
+        date, hoặc None nếu tháng nhuận không tồn tại trong năm đó
+    """
+    if lunar_month < 11:
+        a11 = _lunar_month_11(lunar_year - 1, tz)
+        b11 = _lunar_month_11(lunar_year, tz)
+    else:
+        a11 = _lunar_month_11(lunar_year, tz)
+        b11 = _lunar_month_11(lunar_year + 1, tz)
+    
+    k = int(math.floor(0.5 + (a11 - _JD_EPOCH_1900) / _SYNODIC_MONTH))
+    off = lunar_month - 11
+    if off < 0:
+        off += 12
+    
+    if b11 - a11 > 365:
+        leap_off = _leap_month_offset(a11, tz)
+        leap_month = leap_off - 2
+        if leap_month < 0:
+            leap_month += 12
+        if leap and lunar_month != leap_month:
+            return None
+        if leap or off >= leap_off:
+            off += 1
+    elif leap:
+        return None
+    
+    month_start = _new_moon_day(k + off, tz)
+    return date.fromordinal(month_start + lunar_day - 1 - _JD_ORDINAL_OFFSET)
+
+def tet_date(year):
+    """Mùng 1 Tết Nguyên đán của năm dương lịch"""
+    return lunar_to_solar(1, 1, year)
+
+class TradingCalendar:
+    def __init__(self, extra_holidays=None, extra_trading_days=None, session_close=None):
+        """
+        Khởi tạo lịch giao dịch
+        
+        Args:
+            extra_holidays: Ngày nghỉ bổ sung (mặc định: TRADING_CALENDAR_SETTINGS['EXTRA_HOLIDAYS'])
+            extra_trading_days: Ngày vẫn giao dịch dù lịch tính là nghỉ
+                                (mặc định: TRADING_CALENDAR_SETTINGS['EXTRA_TRADING_DAYS'])
+            session_close: Giờ có dữ liệu phiên ngày (HH:MM, mặc định theo config)
+        """
+        settings = TRADING_CALENDAR_SETTINGS
+        if extra_holidays is None:
+            extra_holidays = settings['EXTRA_HOLIDAYS']
+        if extra_trading_days is None:
+            extra_trading_days = settings['EXTRA_TRADING_DAYS']
+        
+        self.extra_holidays = {_to_date(d) for d in extra_holidays}
+        self.extra_trading_days = {_to_date(d) for d in extra_trading_days}
+        self.session_close = dt_time.fromisoformat(session_close or settings['SESSION_CLOSE'])
+        self.tet_days_before = settings['TET_DAYS_BEFORE']
+        self.tet_days_after = settings['TET_DAYS_AFTER']
+        self._holidays_by_year = {}
+        self._lock = threading.Lock()
+    
+    def override(self, holidays=None, trading_days=None):
+        """Thêm ngày nghỉ / ngày giao dịch (ví dụ theo thông báo mới của sở)"""
+        with self._lock:
+            self.extra_holidays.update(_to_date(d) for d in holidays or [])
+            self.extra_trading_days.update(_to_date(d) for d in trading_days or [])
+            self._holidays_by_year.clear()
+    
+    def holidays(self, year):
+        """
+        Các ngày thường (thứ 2 - thứ 6) sở không giao dịch trong năm
+        
+        Returns:
+            Set các date
+        """
+        with self._lock:
+            if year not in self._holidays_by_year:
+                self._holidays_by_year[year] = self._compute_holidays(year)
+            return self._holidays_by_year[year]
+    
+    def _compute_holidays(self, year):
+        # Ngày lễ một ngày: rơi vào cuối tuần thì nghỉ bù vào ngày làm việc kế tiếp
+        single_days = [date(year, month, day) for month, day in FIXED_HOLIDAYS]
+        single_days.append(lunar_to_solar(10, 3, year))  # Giỗ Tổ Hùng Vương
+        holidays = {d for d in single_days if d.weekday() < 5}
+        
+        for day in sorted(d for d in single_days if d.weekday() >= 5):
+            compensation = day + timedelta(days=1)
+            while compensation.weekday() >= 5 or compensation in holidays or compensation in single_days:
+                compensation += timedelta(days=1)
+            holidays.add(compensation)
+        
+        # Tết Nguyên đán: nghỉ liền từ trước giao thừa đến hết mùng 5 (không nghỉ bù)
+        tet = tet_date(year)
+        for offset in range(-self.tet_days_before, self.tet_days_after + 1):
+            day = tet + timedelta(days=offset)
+            if day.weekday() < 5:
+                holidays.add(day)
+        
+        holidays.update(d for d in self.extra_holidays if d.year == year)
+        holidays.difference_update(self.extra_trading_days)
+        return {d for d in holidays if d.year == year and d.weekday() < 5}
+    
+    def is_trading_day(self, day):
+        """Ngày có phiên giao dịch không"""
+        day = _to_date(day)
+        if day in self.extra_trading_days:
+            return True
+        return day.weekday() < 5 and day not in self.holidays(day.year)
+    
+    def trading_days(self, start, end):
+        """Danh sách ngày giao dịch trong [start, end]"""
+        day, end = _to_date(start), _to_date(end)
+        days = []
+        while day <= end:
+            if self.is_trading_day(day):
+                days.append(day)
+            day += timedelta(days=1)
+        return days
+    
+    def next_trading_day(self, day):
+        """Ngày giao dịch đầu tiên sau `day`"""
+        day = _to_date(day) + timedelta(days=1)
+        while not self.is_trading_day(day):
+            day += timedelta(days=1)
+        return day
+    
+    def previous_trading_day(self, day):
+        """Ngày giao dịch gần nhất trước `day`"""
+        day = _to_date(day) - timedelta(days=1)
+        while not self.is_trading_day(day):
+            day -= timedelta(days=1)
+        return day
+    
+    def last_closed_session(self, now=None):
+        """
+        Phiên gần nhất đã đóng cửa (đã có dữ liệu ngày)
+        
+        Args:
+            now: Thời điểm tính (datetime; date = đầu ngày; mặc định bây giờ)
+        """
+        now = now or datetime.now()
+        if not isinstance(now, datetime):
+            now = datetime.combine(_to_date(now), dt_time.min)
+        
+        today = now.date()
+        if self.is_trading_day(today) and now.time() >= self.session_close:
+            return today
+        return self.previous_trading_day(today)
+
+_shared_calendar = None
+_shared_lock = threading.Lock()
+
+def get_trading_calendar():
+    """Lịch giao dịch dùng chung trong process"""
+    global _shared_calendar
+    with _shared_lock:
+        if _shared_calendar is None:
+            _shared_calendar = TradingCalendar()
+        return _shared_calendar
@@ -9,9 +9,10 @@ from fundamental_analysis import FundamentalAnalyzer
 from config import SCORING_WEIGHTS
 
 class TradingSignalGenerator:
-    def __init__(self, stock_data, financial_data=None, ratios_data=None):
+    def __init__(self, stock_data, financial_data=None, ratios_data=None, indicators_ready=False):
         """
         Khởi tạo với dữ liệu giá và dữ liệu tài chính
+        indicators_ready=True: stock_data đã có sẵn các cột chỉ báo, không cần tính lại
         """
         self.stock_data = stock_data
         self.financial_data = financial_data
@@ -20,7 +21,8 @@ class TradingSignalGenerator:
         # Khởi tạo các analyzer
         self.technical_analyzer = TechnicalAnalyzer(stock_data)
         # QUAN TRỌNG: Cập nhật stock_data với các chỉ báo kỹ thuật
-        self.stock_data = self.technical_analyzer.add_all_indicators()
+        if not indicators_ready:
+            self.stock_data = self.technical_analyzer.add_all_indicators()
         
         if financial_data is not None and ratios_data is not None:
             self.fundamental_analyzer = FundamentalAnalyzer(financial_data, ratios_data)
@@ -0,0 +1,219 @@
+"""
+Module daemon cập nhật chạy nền: lấy yêu cầu từ hàng đợi update_queue trong SQLite, tự xếp lịch cập nhật
+toàn thị trường sau giờ đóng cửa và ghi tiến độ (heartbeat, trạng thái từng mã) vào SQLite để mọi session
+của app đều theo dõi được mà không phải tự chạy cập nhật
+
+Chạy: python cache_manager.py --action daemon
+"""
+
+import time
+from datetime import datetime, time as dt_time
+from data_cache import DataCache
+from aimd_controller import AIMDController
+from update_scheduler import UpdateScheduler
+from cached_stock_screener import CachedStockScreener
+from trading_calendar import get_trading_calendar
+from config import DAEMON_SETTINGS
+
+# Khoảng cách tối thiểu giữa hai lần ghi heartbeat trong lúc một batch đang chạy (giây)
+_PROGRESS_HEARTBEAT_SECONDS = 5
+
+class UpdateDaemon:
+    def __init__(self, cache=None, settings=None, calendar=None, sleep=time.sleep):
+        """
+        Khởi tạo daemon
+        
+        Args:
+            cache: DataCache cần cập nhật (mặc định DataCache())
+            settings: Chu kỳ, lịch chạy và batch (mặc định DAEMON_SETTINGS)
+            calendar: Lịch giao dịch (mặc định get_trading_calendar())
+            sleep: Hàm nghỉ (thay được trong test)
+        """
+        self.cache = cache or DataCache()
+        self.settings = settings or DAEMON_SETTINGS
+        self.calendar = calendar or get_trading_calendar()
+        self.sleep = sleep
+        self._last_heartbeat = 0.0
+    
+    def due_schedule(self, now=None):
+        """
+        Khung giờ cập nhật theo lịch gần nhất đã đến trong ngày (ví dụ '2024-06-14 15:30')
+        
+        Returns:
+            None nếu hôm nay không phải ngày giao dịch hoặc chưa đến khung giờ đầu tiên
+        """
+        now = now or datetime.now()
+        if not self.calendar.is_trading_day(now.date()):
+            return None
+        
+        passed = [slot for slot in sorted(self.settings['SCHEDULE_TIMES'])
+                  if now.time() >= dt_time.fromisoformat(slot)]
+        return f"{now.date().isoformat()} {passed[-1]}" if passed else None
+    
+    def enqueue_scheduled(self, now=None):
+        """Thêm yêu cầu cập nhật theo lịch nếu khung giờ hiện tại chưa được thêm (request id hoặc None)"""
+        slot = self.due_schedule(now)
+        if slot is None:
+            return None
+        return self.cache.enqueue_update('scheduled', scheduled_for=slot)
+    
+    def run_once(self, now=None):
+        """
+        Xếp lịch nếu đến giờ rồi chạy yêu cầu đang chờ lâu nhất
+        
+        Returns:
+            (request_id, trạng thái kết thúc) hoặc None nếu hàng đợi trống
+        """
+        self.enqueue_scheduled(now)
+        request = self.cache.claim_next_update()
+        if request is None:
+            return None
+        return request['request_id'], self.run_request(request)
+    
+    def run_forever(self):
+        """Vòng lặp chính: chạy hết hàng đợi, rảnh thì ghi heartbeat và chờ POLL_SECONDS"""
+        requeued = self.cache.requeue_running_updates()
+        self.cache.set_daemon_status('idle', "Đã khởi động", started=True)
+        print(f"🛰️ Update daemon đã khởi động (kiểm tra hàng đợi mỗi {self.settings['POLL_SECONDS']}s, "
+              f"lịch: {', '.join(self.settings['SCHEDULE_TIMES'])} các ngày giao dịch)")
+        if requeued:
+            print(f"🔁 Tiếp tục {requeued} yêu cầu đang chạy dở từ lần trước")
+        
+        try:
+            while True:
+                if self.run_once() is None:
+                    self.cache.set_daemon_status('idle', "Chờ yêu cầu cập nhật")
+                    self.sleep(self.settings['POLL_SECONDS'])
+        except KeyboardInterrupt:
+            self.cache.set_daemon_status('stopped', "Đã dừng")
+            print("\n⏹️ Update daemon đã dừng")
+    
+    def _heartbeat(self, state, message, request_id, job_id, force=True):
+        """Ghi trạng thái daemon; force=False bỏ qua nếu vừa ghi cách đây chưa đến vài giây"""
+        if not force and time.monotonic() - self._last_heartbeat < _PROGRESS_HEARTBEAT_SECONDS:
+            return
+        self._last_heartbeat = time.monotonic()
+        self.cache.set_daemon_status(state, message, request_id=request_id, job_id=job_id)
+    
+    def _cancelled(self, request_id):
+        """Người dùng đã yêu cầu dừng (cancel_update_request)"""
+        request = self.cache.get_update_request(request_id)
+        return request is None or request['status'] == 'cancelling'
+    
+    def _job_symbols(self, request):
+        """Danh sách mã cho job mới: mã cần cập nhật theo thứ tự ưu tiên, giới hạn max_symbols"""
+        params = request['params']
+        symbols = params.get('symbols')
+        if not symbols:
+            all_stocks = self.cache.get_all_symbols()
+            if all_stocks.empty:
+                return []
+            self.cache.update_stock_info(all_stocks)
+            symbols = all_stocks['symbol'].tolist()
+        
+        queue = UpdateScheduler(self.cache).prioritize(
+            symbols, force_full_update=params.get('force_full_update', False),
+            retry_failed=params.get('retry_failed', False)
+        )
+        symbols = queue.loc[queue['needs_update'], 'symbol'].tolist()
+        return symbols[:params['max_symbols']] if params.get('max_symbols') else symbols
+    
+    def run_request(self, request):
+        """
+        Chạy một yêu cầu theo batch với AIMD, ghi tiến độ sau mỗi batch
+        
+        Yêu cầu đã có job (daemon trước bị tắt giữa chừng) chỉ cập nhật các mã chưa xong của job đó.
+        
+        Returns:
+            'done', 'cancelled' hoặc 'failed'
+        """
+        request_id, params = request['request_id'], request['params']
+        batch_size = params.get('batch_size') or self.settings['BATCH_SIZE']
+        job_id = request['job_id']
+        
+        try:
+            if job_id and self.cache.get_update_job(job_id):
+                symbols = self.cache.get_job_symbols(job_id)
+            else:
+                symbols = self._job_symbols(request)
+                job_id = self.cache.create_update_job(request['kind'], symbols, params)
+                self.cache.set_update_request_job(request_id, job_id)
+        except Exception as e:
+            print(f"❌ Yêu cầu #{request_id} lỗi: {e}")
+            self.cache.finish_update_request(request_id, 'failed', str(e)[:200])
+            return 'failed'
+        
+        batches = [symbols[i:i + batch_size] for i in range(0, len(symbols), batch_size)]
+        print(f"🚀 Yêu cầu #{request_id} ({request['kind']}): job {job_id}, {len(symbols)} mã, {len(batches)} batch")
+        
+        controller = AIMDController(
+            delay=params.get('delay_between_batches', self.settings['DELAY_BETWEEN_BATCHES']),
+            adaptive=params.get('adaptive', True)
+        )
+        processed = 0
+        
+        def progress_callback(current, total, message):
+            self._heartbeat('running', f"Batch {batch_idx}/{len(batches)}: {current}/{total} - {message}",
+                            request_id, job_id, force=False)
+        
+        try:
+            for batch_idx, batch_symbols in enumerate(batches, 1):
+                if self._cancelled(request_id):
+                    self.cache.finish_update_job(job_id, 'interrupted')
+                    self.cache.finish_update_request(request_id, 'cancelled')
+                    self._heartbeat('idle', f"Đã hủy yêu cầu #{request_id}", None, None)
+                    print(f"⏹️ Đã hủy yêu cầu #{request_id} (tiếp tục: --resume {job_id})")
+                    return 'cancelled'
+                
+                self._heartbeat('running', f"Batch {batch_idx}/{len(batches)} - {len(batch_symbols)} mã",
+                                request_id, job_id)
+                controller.begin_batch()
+                self.cache.bulk_cache_update(
+                    symbols_list=batch_symbols,
+                    progress_callback=progress_callback,
+                    max_workers=controller.workers,
+                    requests_per_second=controller.rate,
+                    force_full_update=params.get('force_full_update', False),
+                    retry_failed=params.get('retry_failed', False),
+                    job_id=job_id
+                )
+                controller.record_batch(len(batch_symbols))
+                processed += len(batch_symbols)
+                
+                message = f"Batch {batch_idx}/{len(batches)} xong | {controller.describe(len(symbols) - processed)}"
+                print(f"   {message}")
+                if batch_idx < len(batches):
+                    self._pause(controller.delay, message, request_id, job_id)
+        except KeyboardInterrupt:
+            # Daemon bị dừng: trả yêu cầu về hàng đợi, lần khởi động sau tiếp tục job này
+            self.cache.finish_update_job(job_id, 'interrupted')
+            self.cache.finish_update_request(request_id, 'queued')
+            raise
+        except Exception as e:
+            print(f"❌ Yêu cầu #{request_id} lỗi: {e}")
+            self.cache.finish_update_job(job_id, 'interrupted')
+            self.cache.finish_update_request(request_id, 'failed', str(e)[:200])
+            return 'failed'
+        
+        status = self.cache.finish_update_job(job_id)
+        try:
+            # Tính sẵn bảng so sánh thị trường cho các mã vừa có phiên mới
+            CachedStockScreener(self.cache).refresh_market_snapshot()
+        except Exception as e:
+            print(f"⚠️ Không thể cập nhật market snapshot: {e}")
+        
+        self.cache.finish_update_request(request_id, 'done')
+        job = self.cache.get_update_job(job_id)
+        self._heartbeat('idle', f"Yêu cầu #{request_id} xong: {job['done']}/{job['total']} mã, job {status}",
+                        None, None)
+        print(f"✅ Yêu cầu #{request_id} xong: {job['done']}/{job['total']} mã, {job['failed']} lỗi")
+        return 'done'
+    
+    def _pause(self, seconds, message, request_id, job_id):
+        """Nghỉ giữa batch theo từng đoạn ngắn, vẫn ghi heartbeat và dừng sớm nếu yêu cầu bị hủy"""
+        remaining = seconds
+        while remaining > 0 and not self._cancelled(request_id):
+            self._heartbeat('sleeping', f"{message} | nghỉ {remaining:.0f}s", request_id, job_id)
+            step = min(remaining, self.settings['POLL_SECONDS'])
+            self.sleep(step)
+            remaining -= step
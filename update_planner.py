@@ -0,0 +1,84 @@
+"""
+Module lập kế hoạch cập nhật cache: đọc khoảng dữ liệu đã có của mọi mã trong một truy vấn
+và tính khoảng cần lấy từ API cho từng mã
+"""
+
+import pandas as pd
+from datetime import datetime, timedelta
+from trading_calendar import get_trading_calendar
+
+# Số năm lịch sử lấy khi full update và khi mã chưa có trong cache
+FULL_UPDATE_YEARS = 5
+NEW_SYMBOL_YEARS = 2
+
+PLAN_COLUMNS = ['symbol', 'start_date', 'end_date', 'last_date', 'mode', 'skip']
+
+class UpdatePlanner:
+    def __init__(self, cache):
+        """
+        Khởi tạo planner
+        
+        Args:
+            cache: DataCache cần cập nhật
+        """
+        self.cache = cache
+    
+    def plan(self, symbols, force_full_update=False, now=None, retry_failed=False):
+        """
+        Lập kế hoạch lấy dữ liệu cho nhiều mã
+        
+        Args:
+            symbols: Danh sách mã
+            force_full_update: Lấy lại toàn bộ FULL_UPDATE_YEARS năm cho mọi mã
+            now: Thời điểm chạy (datetime hoặc date; mặc định bây giờ), dùng cho test
+            retry_failed: Thử lại cả các mã trong negative cache chưa đến hạn kiểm tra lại
+        
+        Returns:
+            DataFrame theo thứ tự `symbols` với các cột:
+                symbol, start_date/end_date (YYYY-MM-DD, khoảng cần lấy),
+                last_date (ngày cuối đã cache hoặc None),
+                mode ('full', 'new', 'incremental', 'up_to_date', 'known_failure'),
+                skip (True = không cần gọi API)
+        
+        Mã đã có dữ liệu đến phiên đóng cửa gần nhất theo lịch giao dịch được bỏ qua,
+        nên cập nhật vào cuối tuần, ngày lễ hay sáng thứ 2 không gọi API. Mã lỗi gần đây
+        (hủy niêm yết, không có dữ liệu) được bỏ qua đến hạn kiểm tra lại.
+        """
+        now = now or datetime.now()
+        today = now.date() if isinstance(now, datetime) else now
+        calendar = get_trading_calendar()
+        last_session = calendar.last_closed_session(now)
+        end_date = today.strftime('%Y-%m-%d')
+        full_start = (today - timedelta(days=FULL_UPDATE_YEARS * 365)).strftime('%Y-%m-%d')
+        new_start = (today - timedelta(days=NEW_SYMBOL_YEARS * 365)).strftime('%Y-%m-%d')
+        
+        symbols = list(dict.fromkeys(symbols))
+        coverage = self.cache.get_coverage(symbols)
+        last_dates = dict(zip(coverage['symbol'], coverage['last_date']))
+        
+        known_failures = set()
+        if not retry_failed:
+            now_dt = now if isinstance(now, datetime) else datetime.combine(now, datetime.min.time())
+            known_failures = set(self.cache.get_symbol_failures(due_before=now_dt)['symbol'])
+        
+        rows = []
+        for symbol in symbols:
+            last_date = last_dates.get(symbol)
+            if symbol in known_failures:
+                rows.append((symbol, None, None, last_date, 'known_failure', True))
+            elif force_full_update:
+                rows.append((symbol, full_start, end_date, last_date, 'full', False))
+            elif last_date is None:
+                rows.append((symbol, new_start, end_date, None, 'new', False))
+            elif last_date >= last_session:
+                rows.append((symbol, None, None, last_date, 'up_to_date', True))
+            else:
+                start_date = (last_date + timedelta(days=1)).strftime('%Y-%m-%d')
+                rows.append((symbol, start_date, end_date, last_date, 'incremental', False))
+        
+        return pd.DataFrame(rows, columns=PLAN_COLUMNS).astype({'skip': bool})
+    
+    def pending_symbols(self, symbols, force_full_update=False, retry_failed=False):
+        """Danh sách mã cần gọi API (bỏ các mã đã có đủ các phiên đã đóng cửa và mã lỗi gần đây)"""
+        plan = self.plan(symbols, force_full_update, retry_failed=retry_failed)
+        return plan.loc[~plan['skip'], 'symbol'].tolist()
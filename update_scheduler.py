@@ -0,0 +1,116 @@
+"""
+Module xếp thứ tự ưu tiên cập nhật: mã thanh khoản cao, dữ liệu cũ, đang theo dõi hoặc vừa được xem
+được cập nhật trước khi số mã mỗi lần cập nhật bị giới hạn
+"""
+
+import math
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from update_planner import UpdatePlanner
+from trading_calendar import get_trading_calendar
+from config import PRIORITY_SETTINGS
+
+PRIORITY_COLUMNS = ['symbol', 'score', 'needs_update', 'mode', 'last_date', 'missing_sessions',
+                    'traded_value', 'watchlist', 'last_viewed_at']
+
+# Chỉ đếm số phiên thiếu trong khoảng này (xa hơn thì độ cũ đã bão hòa)
+_STALENESS_LOOKBACK_DAYS = 400
+
+class UpdateScheduler:
+    def __init__(self, cache, settings=None):
+        """
+        Khởi tạo scheduler
+        
+        Args:
+            cache: DataCache cần cập nhật
+            settings: Trọng số và tham số (mặc định PRIORITY_SETTINGS)
+        """
+        self.cache = cache
+        self.settings = settings or PRIORITY_SETTINGS
+    
+    def prioritize(self, symbols, force_full_update=False, now=None, retry_failed=False):
+        """
+        Xếp các mã theo thứ tự cần cập nhật trước
+        
+        Args:
+            symbols: Danh sách mã
+            force_full_update, retry_failed: Như UpdatePlanner.plan
+            now: Thời điểm chạy (datetime hoặc date; mặc định bây giờ), dùng cho test
+        
+        Returns:
+            DataFrame (các cột PRIORITY_COLUMNS): mã cần gọi API trước, trong mỗi nhóm điểm cao trước.
+            Mã đã cập nhật hoặc đang trong negative cache nằm cuối.
+        """
+        return self._rank(symbols, force_full_update, now, retry_failed)[0]
+    
+    def _rank(self, symbols, force_full_update=False, now=None, retry_failed=False):
+        """Thứ tự ưu tiên (như prioritize) kèm kế hoạch UpdatePlanner đã lập để tính thứ tự đó"""
+        now = now or datetime.now()
+        now_dt = now if isinstance(now, datetime) else datetime.combine(now, datetime.min.time())
+        weights = self.settings['WEIGHTS']
+        
+        plan = UpdatePlanner(self.cache).plan(symbols, force_full_update, now=now, retry_failed=retry_failed)
+        df = plan[['symbol', 'mode', 'last_date']].copy()
+        df['needs_update'] = ~plan['skip']
+        
+        # Độ cũ: số phiên đã đóng cửa sau ngày cuối cùng đã cache (mã chưa có = bão hòa)
+        df['missing_sessions'] = self._missing_sessions(df['last_date'], now)
+        cap = self.settings['STALE_SESSIONS_CAP']
+        staleness = np.minimum(np.log1p(df['missing_sessions']) / math.log1p(cap), 1.0)
+        staleness[df['last_date'].isna()] = 1.0
+        
+        # Thanh khoản: phân vị giá trị giao dịch trong toàn bộ cache (ổn định dù danh sách mã khác nhau)
+        values = self.cache.get_traded_values().dropna()
+        value_rank = values['traded_value'].rank(pct=True)
+        df['traded_value'] = df['symbol'].map(dict(zip(values['symbol'], values['traded_value'])))
+        liquidity = df['symbol'].map(dict(zip(values['symbol'], value_rank))).fillna(0.0)
+        
+        watchlist = set(self.cache.get_watchlist())
+        df['watchlist'] = df['symbol'].isin(watchlist)
+        
+        # Lượt xem gần đây: 1 khi vừa xem, giảm một nửa sau mỗi VIEW_HALF_LIFE_DAYS ngày
+        views = self.cache.get_symbol_views()
+        df['last_viewed_at'] = df['symbol'].map(dict(zip(views['symbol'], views['last_viewed_at'])))
+        viewed_days = (now_dt - pd.to_datetime(df['last_viewed_at'])).dt.total_seconds() / 86400
+        recency = (0.5 ** (viewed_days.clip(lower=0) / self.settings['VIEW_HALF_LIFE_DAYS'])).fillna(0.0)
+        
+        df['score'] = (
+            weights['TRADED_VALUE'] * liquidity +
+            weights['STALENESS'] * staleness +
+            weights['WATCHLIST'] * df['watchlist'] +
+            weights['RECENTLY_VIEWED'] * recency
+        ).round(4)
+        
+        df = df.sort_values(['needs_update', 'score'], ascending=[False, False], kind='stable')
+        return df[PRIORITY_COLUMNS].reset_index(drop=True), plan
+    
+    def _missing_sessions(self, last_dates, now):
+        """Số phiên trong (last_date, phiên đóng cửa gần nhất] của mỗi mã (0 nếu chưa có dữ liệu)"""
+        calendar = get_trading_calendar()
+        last_session = calendar.last_closed_session(now)
+        sessions = np.array(
+            calendar.trading_days(last_session - timedelta(days=_STALENESS_LOOKBACK_DAYS), last_session),
+            dtype='datetime64[D]'
+        )
+        
+        known = last_dates.notna()
+        missing = np.zeros(len(last_dates), dtype=np.int64)
+        if known.any():
+            days = np.array(last_dates[known].tolist(), dtype='datetime64[D]')
+            missing[known.to_numpy()] = len(sessions) - np.searchsorted(sessions, days, side='right')
+        return missing
+    
+    def top(self, symbols, limit, **kwargs):
+        """`limit` mã ưu tiên nhất (mã cần cập nhật trước)"""
+        return self.prioritize(symbols, **kwargs)['symbol'].head(limit).tolist()
+    
+    def top_plan(self, symbols, limit, **kwargs):
+        """
+        Kế hoạch UpdatePlanner của `limit` mã ưu tiên nhất, theo thứ tự ưu tiên
+        
+        Dùng lại kế hoạch đã lập khi xếp thứ tự nên bulk_cache_update không phải lập kế hoạch lần hai.
+        """
+        queue, plan = self._rank(symbols, **kwargs)
+        chosen = queue['symbol'].head(limit)
+        return plan.set_index('symbol').loc[chosen].reset_index()[plan.columns]